@@ -14,6 +14,7 @@ from backend.database import get_db
 from backend.models.user import User, UserPhoto, UserStatus
 from backend.models.moderation import ModerationQueueItem as ModerationQueueItemModel, BannedUser
 from backend.models.system import AuditLog
+from backend.services.profile_cards import refresh_profile_cards
 from .deps import get_current_admin
 
 router = APIRouter()
@@ -168,6 +169,8 @@ async def review_moderation_item(
     db.add(audit_log)
     
     await db.commit()
+    if action == "reject" and item.content_type == "photo":
+        await refresh_profile_cards(db, [item.user_id])
     
     return {
         "status": "success",
@@ -1,24 +1,32 @@
 """
-Admin Monetization endpoints: revenue, subscriptions, promos.
+Admin Monetization endpoints: revenue, subscriptions, promos, payment events.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc, and_, or_, cast, Date, select
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 import uuid as uuid_module
 
 from backend.database import get_db
 from backend.models.user import User, SubscriptionTier
-from backend.models.monetization import UserSubscription, RevenueTransaction, PromoCode
+from backend.models.monetization import UserSubscription, RevenueTransaction, PromoCode, PaymentEvent
+from backend.services import payment_events
 from backend.models.system import AuditLog
 from .deps import get_current_admin
 
 router = APIRouter()
 
 
+class PaymentEventReplay(BaseModel):
+    event_ids: Optional[List[str]] = None  # None = all events with `status`
+    status: str = "failed"
+    since: Optional[datetime] = None
+    force: bool = False  # required to replay processed events
+
+
 class PromoCodeCreate(BaseModel):
     code: str
     name: str = ""
@@ -304,3 +312,73 @@ async def delete_promo_code(
     promo.is_active = False
     await db.commit()
     return {"status": "success", "message": "Промокод деактивирован"}
+
+
+@router.get("/monetization/payment-events")
+async def get_payment_events(
+    status: Optional[str] = None,
+    provider: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Payment webhook journal (newest first)"""
+    conditions = []
+    if status:
+        conditions.append(PaymentEvent.status == status)
+    if provider:
+        conditions.append(PaymentEvent.provider == provider)
+
+    query = select(PaymentEvent).where(*conditions).order_by(desc(PaymentEvent.received_at))
+    result = await db.execute(query.offset((page - 1) * page_size).limit(page_size))
+    total = (await db.execute(select(func.count(PaymentEvent.id)).where(*conditions))).scalar() or 0
+
+    return {
+        "events": [
+            {
+                "id": str(e.id),
+                "provider": e.provider,
+                "event_id": e.event_id,
+                "event_type": e.event_type,
+                "status": e.status,
+                "result": e.result,
+                "attempts": e.attempts,
+                "error": e.error,
+                "received_at": e.received_at.isoformat() if e.received_at else None,
+                "processed_at": e.processed_at.isoformat() if e.processed_at else None,
+            }
+            for e in result.scalars().all()
+        ],
+        "total": total,
+        "page": page,
+        "page_size": page_size
+    }
+
+
+@router.post("/monetization/payment-events/replay")
+async def replay_payment_events(
+    data: PaymentEventReplay,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Re-queue journaled payment events for the worker"""
+    try:
+        event_ids = [uuid_module.UUID(i) for i in data.event_ids] if data.event_ids is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный ID")
+
+    try:
+        count = await payment_events.replay(db, event_ids, status=data.status, since=data.since, force=data.force)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    db.add(AuditLog(
+        admin_id=current_user.id,
+        action="replay_payment_events",
+        target_resource=f"payment_events:{data.status}",
+        changes={"event_ids": data.event_ids, "since": data.since.isoformat() if data.since else None,
+                 "force": data.force, "count": count}
+    ))
+    await db.commit()
+    return {"status": "success", "replayed": count}
@@ -2,6 +2,8 @@
 Admin Notifications endpoints: broadcast, audit logs.
 """
 
+import uuid
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc, and_, select
@@ -12,6 +14,8 @@ from pydantic import BaseModel
 from backend.database import get_db
 from backend.models.user import User
 from backend.models.system import AuditLog
+from backend.models.notifications import Broadcast
+from backend.services.broadcasts import create_broadcast
 from .deps import get_current_admin
 
 router = APIRouter()
@@ -31,10 +35,11 @@ async def send_broadcast(
     current_user: User = Depends(get_current_admin)
 ):
     """Send broadcast notification to users"""
-    result = await db.execute(
-        select(func.count(User.id)).where(User.is_active == True)
+    # Рассылка сохраняется и уходит пачками из воркера (services.broadcasts), переживает рестарт
+    broadcast = await create_broadcast(
+        db, current_user.id, data.title, data.message, data.channels, data.target
     )
-    target_count = result.scalar() or 0
+    target_count = broadcast.target_count
 
     db.add(AuditLog(
         admin_id=current_user.id,
@@ -44,15 +49,40 @@ async def send_broadcast(
             "title": data.title,
             "message": data.message,
             "channels": data.channels,
-            "target_count": target_count
+            "target_count": target_count,
+            "broadcast_id": str(broadcast.id)
         }
     ))
     await db.commit()
 
     return {
-        "status": "success",
-        "message": f"Рассылка отправлена {target_count} пользователям",
-        "target_count": target_count
+        "status": "queued",
+        "message": f"Рассылка поставлена в очередь: {target_count} пользователей",
+        "target_count": target_count,
+        "broadcast_id": str(broadcast.id)
+    }
+
+
+@router.get("/notifications/broadcasts/{broadcast_id}")
+async def get_broadcast(
+    broadcast_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Broadcast delivery progress"""
+    broadcast = await db.get(Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return {
+        "id": str(broadcast.id),
+        "status": broadcast.status,
+        "channels": broadcast.channels,
+        "target_count": broadcast.target_count,
+        "sent_count": broadcast.sent_count,
+        "failed_count": broadcast.failed_count,
+        "error": broadcast.error,
+        "created_at": broadcast.created_at.isoformat(),
+        "completed_at": broadcast.completed_at.isoformat() if broadcast.completed_at else None,
     }
 
 
@@ -1,5 +1,5 @@
 """
-Admin Security endpoints: alerts, auto-ban rules.
+Admin Security endpoints: alerts, auto-ban rules, text safety dictionaries.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -33,6 +33,10 @@ class AutoBanRuleCreate(BaseModel):
     description: Optional[str] = None
 
 
+class TextDictionaryUpdate(BaseModel):
+    words: List[str]
+
+
 @router.get("/security/alerts")
 async def get_security_alerts(
     db: AsyncSession = Depends(get_db),
@@ -218,3 +222,41 @@ async def delete_auto_ban_rule(
     await db.delete(rule)
     await db.commit()
     return {"status": "success", "message": "Правило удалено"}
+
+
+@router.get("/security/text-dictionaries")
+async def get_text_dictionaries(
+    current_user: User = Depends(get_current_admin)
+):
+    """Get word lists of the text safety engine (spam, banned, toxicity)"""
+    from backend.services.text_safety import text_safety
+
+    return {"dictionaries": await text_safety.get_dictionaries()}
+
+
+@router.put("/security/text-dictionaries/{category}")
+async def update_text_dictionary(
+    category: str,
+    data: TextDictionaryUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Replace a word list; all workers pick it up without a restart"""
+    from backend.services.text_safety import text_safety, DEFAULT_DICTIONARIES
+
+    if category not in DEFAULT_DICTIONARIES:
+        raise HTTPException(status_code=400, detail="Неизвестная категория")
+    try:
+        await text_safety.set_dictionary(category, data.words)
+    except RuntimeError:
+        raise HTTPException(status_code=503, detail="Redis недоступен")
+
+    db.add(AuditLog(
+        admin_id=current_user.id,
+        action="update_text_dictionary",
+        target_resource=f"text_dictionary:{category}",
+        changes={"words": len(data.words)}
+    ))
+
+    await db.commit()
+    return {"status": "success", "message": "Словарь обновлён"}
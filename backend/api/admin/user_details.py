@@ -20,6 +20,7 @@ from backend.models.chat import Message
 from backend.models.social import Conversation
 from backend.models.system import AuditLog
 from backend.models.user_management import UserNote
+from backend.services.profile_cards import refresh_profile_cards
 from .deps import get_current_admin
 
 router = APIRouter()
@@ -739,6 +740,7 @@ async def update_user_subscription(
         changes={"old": old_tier, "new": data.plan, "duration_days": data.duration_days}
     ))
     await db.commit()
+    await refresh_profile_cards(db, [uid])
 
     return {"status": "success", "message": f"Подписка обновлена на {data.plan}"}
 
@@ -786,6 +788,7 @@ async def edit_user_profile(
             changes=changes
         ))
         await db.commit()
+        await refresh_profile_cards(db, [uid])
 
     return {"status": "success", "message": "Профиль обновлён", "changes": list(changes.keys())}
 
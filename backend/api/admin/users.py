@@ -24,6 +24,7 @@ from backend.models.system import AuditLog
 from backend.models.user_management import FraudScore
 from backend.services.fraud_detection import fraud_service
 from backend.core.redis import redis_manager
+from backend.services.profile_cards import refresh_profile_cards
 from .deps import get_current_admin
 
 router = APIRouter()
@@ -290,15 +291,13 @@ async def _get_users_list_impl(
     result = await db.execute(query)
     rows = result.all()
     
-    # Check online status via Redis
-    online_statuses = {}
+    # Check online status via presence (one ZMSCORE for the whole page)
+    presence_map = {}
     try:
-        r = await redis_manager.get_redis()
-        if r:
-            for row in rows:
-                uid_str = str(row.User.id)
-                is_online = await r.get(f"user:online:{uid_str}")
-                online_statuses[uid_str] = is_online == "true"
+        from backend.services.chat.state import state_manager
+        presence_map = await state_manager.get_presence_batch(
+            [str(row.User.id) for row in rows]
+        )
     except Exception:
         pass
     
@@ -320,7 +319,9 @@ async def _get_users_list_impl(
                 "matches": (row.matches_as_user1 or 0) + (row.matches_as_user2 or 0),
                 "messages": row.messages_count or 0,
                 "photo_url": row.photo_url,
-                "is_online": online_statuses.get(str(row.User.id), False)
+                "is_online": presence_map.get(str(row.User.id), {}).get("is_online", False),
+                "last_seen": presence_map.get(str(row.User.id), {}).get("last_seen")
+                    or (row.User.last_seen.isoformat() if row.User.last_seen else None),
             }
             for row in rows
         ],
@@ -503,13 +504,17 @@ async def get_user_segments(
 
 @router.post("/users/fraud-scores/recalculate")
 async def recalculate_fraud_scores(
-    limit: int = Query(100, ge=1, le=1000),
+    limit: int = Query(100, ge=1, le=50000),
     only_missing: bool = Query(False),
+    incremental: bool = Query(False),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin)
 ):
-    """Batch recalculate fraud scores for users."""
-    result = await fraud_service.batch_recalculate(db, limit=limit, only_missing=only_missing)
+    """Batch recalculate fraud scores for users (incremental: only users whose signals changed)."""
+    if incremental:
+        result = await fraud_service.rescore_changed(db)
+    else:
+        result = await fraud_service.batch_recalculate(db, limit=limit, only_missing=only_missing)
     return {
         "success": True,
         "processed": result['processed'],
@@ -787,6 +792,8 @@ async def perform_user_action(
     db.add(audit_log)
     
     await db.commit()
+    if action in ("verify", "unverify"):
+        await refresh_profile_cards(db, [uid])
     
     return {
         "status": "success",
@@ -809,6 +816,7 @@ async def perform_bulk_user_action(
     """Perform action on multiple users"""
     
     success_count = 0
+    updated_ids = []
     for user_id in data.user_ids:
         try:
             uid = uuid_module.UUID(user_id)
@@ -824,10 +832,13 @@ async def perform_bulk_user_action(
                 elif data.action == "activate":
                     user.status = UserStatus.ACTIVE
                 success_count += 1
+                updated_ids.append(uid)
         except Exception:
             continue
     
     await db.commit()
+    if data.action == "verify":
+        await refresh_profile_cards(db, updated_ids)
     
     return {
         "status": "success",
@@ -13,6 +13,7 @@ import uuid as uuid_module
 from backend.database import get_db
 from backend.models.user import User
 from backend.models.user_management import VerificationRequest
+from backend.services.profile_cards import refresh_profile_cards
 from .deps import get_current_admin
 
 router = APIRouter()
@@ -114,5 +115,6 @@ async def review_verification_request(
     req.reviewed_at = datetime.utcnow()
     
     await db.commit()
+    await refresh_profile_cards(db, [req.user_id])
     
     return {"status": "success", "message": f"Верификация {review_data.action} выполнена"}
@@ -85,3 +85,4 @@ class ReportGenerateRequest(BaseModel):
     custom_sql: Optional[str] = None
     parameters: Optional[Dict[str, Any]] = None
     schedule: Optional[str] = None
+    format: str = "xlsx"  # xlsx, csv (xlsx falls back to csv without openpyxl)
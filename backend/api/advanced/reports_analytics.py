@@ -1,12 +1,17 @@
 # Advanced API - Reports & Analytics
 
-from fastapi import APIRouter, Depends, BackgroundTasks, Request
+import os
+import uuid
+
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Request
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 from backend.database import get_db
 from backend.models import User
-from backend.models.advanced import CustomReport
+from backend.models.advanced import CustomReport, ReportJob
+from backend.services import reporting
 from backend.crud import advanced as advanced_crud
 from backend.services.analytics import analytics_service
 from backend.api.advanced.deps import get_current_admin, ReportGenerateRequest
@@ -45,6 +50,23 @@ async def get_saved_reports(
     }
 
 
+def _job_status(job: ReportJob) -> dict:
+    return {
+        "job_id": str(job.id),
+        "report_id": str(job.report_id),
+        "type": job.report_type,
+        "format": job.format,
+        "status": job.status,
+        "rows_written": job.rows_written,
+        "size_bytes": job.size_bytes,
+        "error": job.error,
+        "created_at": str(job.created_at),
+        "completed_at": str(job.completed_at) if job.completed_at else None,
+        "expires_at": str(job.expires_at) if job.expires_at else None,
+        "download_url": f"/admin/advanced/reports/jobs/{job.id}/download" if job.status == "completed" else None,
+    }
+
+
 @router.post("/reports/generate")
 async def generate_report(
     req: ReportGenerateRequest,
@@ -52,6 +74,11 @@ async def generate_report(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_admin)
 ):
+    """Создать отчёт; файл собирается в фоне в пуле процессов, статус — GET /reports/jobs/{job_id}."""
+    if req.report_type not in reporting.report_types():
+        raise HTTPException(status_code=400, detail=f"Unknown report type: {req.report_type}")
+    fmt = req.format if req.format in reporting.available_formats() else "csv"
+
     new_report = CustomReport(
         name=f"{req.report_type} Report - {datetime.utcnow().date()}",
         report_type=req.report_type,
@@ -60,16 +87,14 @@ async def generate_report(
         configuration={
             "period": req.period,
             "custom_sql": req.custom_sql,
-            "parameters": req.parameters
+            "parameters": req.parameters,
+            "format": fmt,
+            "status": "pending",
         }
     )
     saved = await advanced_crud.create_custom_report(db, new_report)
-    
-    try:
-        from backend.services.reporting import generate_report_task as _generate_report_task
-        background_tasks.add_task(_generate_report_task, saved.id)
-    except ImportError:
-        pass
+    job = await reporting.request_report(db, saved, fmt, requested_by=current_user.id)
+    background_tasks.add_task(reporting.run_report_job, job.id)
 
     return {
         "status": "pending",
@@ -82,13 +107,63 @@ async def generate_report(
             "created_at": saved.created_at
         },
         "report_id": saved.id,
+        "job_id": str(job.id),
         "type": req.report_type,
         "period": req.period,
+        "format": fmt,
         "estimated_time_sec": 30,
+        "status_url": f"/admin/advanced/reports/jobs/{job.id}",
         "download_url": None
     }
 
 
+@router.get("/reports/{report_id}/jobs")
+async def get_report_jobs(
+    report_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    jobs = await reporting.latest_jobs(db, report_id)
+    return {"jobs": [_job_status(j) for j in jobs]}
+
+
+@router.get("/reports/jobs/{job_id}")
+async def get_report_job(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    job = await db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_status(job)
+
+
+@router.get("/reports/jobs/{job_id}/download")
+async def download_report_job(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Скачать готовый файл отчёта (отдаётся с диска потоково)."""
+    job = await db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != "completed" or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=409 if job.status in reporting.ACTIVE_STATUSES else 410,
+                            detail=f"Report is {job.status}")
+
+    media_type = (
+        "text/csv" if job.format == "csv"
+        else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+    return FileResponse(
+        job.file_path,
+        media_type=media_type,
+        filename=f"report_{job.report_type}_{job.created_at:%Y%m%d%H%M}.{job.format}",
+    )
+
+
 # --- Analytics stubs ---
 
 @router.get("/localization/stats")
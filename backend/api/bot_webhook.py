@@ -13,6 +13,7 @@ Telegram Bot Webhook Integration
 3. Бот автоматически зарегистрирует webhook при старте
 """
 
+import asyncio
 import os
 import logging
 from aiogram import Bot, Dispatcher, types
@@ -20,6 +21,8 @@ from aiogram.types import Update
 from fastapi import APIRouter, Request, HTTPException
 from dotenv import load_dotenv
 
+from backend.services.telegram_updates import update_queue
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -73,21 +76,21 @@ async def telegram_webhook(request: Request):
         raise HTTPException(status_code=500, detail="Bot token not configured")
     
     try:
-        bot, dp = get_bot_and_dp()
-        
-        # Parse incoming update
         update_data = await request.json()
-        update = Update(**update_data)
-        
-        # Process update
-        await dp.feed_update(bot, update)
-        
-        return {"ok": True}
+        Update(**update_data)  # validate before queueing
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         # Return 200 to prevent Telegram from retrying
         return {"ok": False, "error": str(e)}
 
+    # Обработка — в воркерах очереди; Telegram получает ответ сразу
+    try:
+        queued = await update_queue.enqueue(update_data)
+    except asyncio.QueueFull:
+        logger.error("Webhook: update queue is full")
+        raise HTTPException(status_code=503, detail="Update queue is full")
+    return {"ok": True, "queued": queued}
+
 # ============================================================================
 # WEBHOOK SETUP
 # ============================================================================
@@ -5,7 +5,7 @@ Chat REST endpoints: icebreakers, conversation prompts, question of the day.
 from uuid import UUID
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -21,14 +21,16 @@ router = APIRouter(tags=["Chat"])
 
 @router.get("/chat/icebreakers")
 async def get_icebreakers(
+    background_tasks: BackgroundTasks,
     match_id: str = Query(..., description="Match ID"),
-    refresh: bool = Query(False, description="Bypass cache"),
+    refresh: bool = Query(False, description="Show the next batch"),
     current_user: str = Depends(auth.get_current_user),
     db: AsyncSession = Depends(database.get_db),
 ):
-    """Get AI-generated icebreakers for a match (cached 24h)."""
+    """Get icebreakers for a match from the pre-generated inventory."""
     from backend.models.interaction import Match
     from backend.services.ai import ai_service
+    from backend.services.ai.conversation_starters import get_icebreakers as serve_icebreakers, prepare_icebreakers
 
     match_obj = await db.get(Match, UUID(match_id))
     if not match_obj:
@@ -37,14 +39,13 @@ async def get_icebreakers(
     if current_user not in (u1, u2):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    cache_key = f"icebreakers:{match_id}"
-    if not refresh:
-        cached = await redis_manager.get_json(cache_key)
-        if cached and isinstance(cached, list) and len(cached) > 0:
-            return {"icebreakers": cached}
+    icebreakers = await serve_icebreakers(match_id, refresh=refresh)
+    if icebreakers:
+        return {"icebreakers": icebreakers}
 
+    # Промах (старый матч / Redis недоступен): живая генерация, инвентарь — в фоне
     icebreakers = await ai_service.generate_icebreakers(u1, u2, db, count=3)
-    await redis_manager.set_json(cache_key, icebreakers, expire=86400)
+    background_tasks.add_task(prepare_icebreakers, match_id)
     return {"icebreakers": icebreakers}
 
 
@@ -99,7 +99,7 @@ async def send_message(
     from backend.services.security import spam_detector
 
     if msg.text:
-        check = await spam_detector.check_message(current_user, msg.text)
+        check = await spam_detector.check_message(current_user, msg.text, conversation_id=msg.match_id)
         if check["is_spam"]:
             raise HTTPException(400, check["message"])
 
@@ -14,6 +14,7 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from backend.core.security import verify_token
 from backend.core.config import settings
 from backend.core.redis import redis_manager
+from backend.services.chat.protocol import negotiate
 from backend.services.chat import (
     manager,
     set_typing,
@@ -26,6 +27,7 @@ from backend.services.chat import (
     increment_unread,
 )
 from backend.db.session import async_session_maker
+from backend.core.instrumentation import ws_message
 from backend.metrics import ACTIVE_USERS_GAUGE, MESSAGES_COUNTER
 
 logger = logging.getLogger(__name__)
@@ -47,6 +49,8 @@ async def websocket_endpoint(websocket: WebSocket):
     to prevent token leakage in server logs.
 
     First message must be: {"type": "auth", "token": "..."}
+    Optional "protocol": "json" (default) | "compact" | "msgpack" selects the
+    wire format for the rest of the session (see services/chat/protocol.py).
     """
     await websocket.accept()
 
@@ -60,6 +64,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 return
 
             token = auth_msg["token"]
+            codec = negotiate(auth_msg.get("protocol"))
             user_id = verify_token(token)
             if not user_id:
                 await websocket.close(code=4001, reason="Invalid token")
@@ -76,22 +81,34 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.close(code=4001, reason="Auth failed")
         return
 
-    await manager.connect(websocket, user_id)
+    await manager.connect(websocket, user_id, codec)
     ACTIVE_USERS_GAUGE.inc()
 
-    await websocket.send_json({"type": "auth_success", "user_id": user_id})
+    await manager.send_to_socket(websocket, {
+        "type": "auth_success", "user_id": user_id, "protocol": codec.name,
+    })
 
     try:
         while True:
-            data = await websocket.receive_text()
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            data = frame.get("text") if frame.get("text") is not None else frame.get("bytes")
 
             if not await redis_manager.rate_limit(f"chat:ws:{user_id}", limit=5, period=1):
-                await websocket.send_json({"type": "error", "message": "Rate limit exceeded. Slow down."})
+                await manager.send_to_socket(websocket, {"type": "error", "message": "Rate limit exceeded. Slow down."})
+                continue
+
+            try:
+                message = codec.decode(data)
+            except ValueError:
+                # json.JSONDecodeError / bad msgpack frame
+                await manager.send_to_socket(websocket, {"type": "error", "message": "Invalid JSON"})
                 continue
 
             try:
-                message = json.loads(data)
                 event_type = message.get("type", "message")
+                ws_message("in", event_type)
 
                 if event_type == "message":
                     await _handle_message(websocket, user_id, message)
@@ -136,13 +153,12 @@ async def websocket_endpoint(websocket: WebSocket):
                     await _handle_webrtc_end(user_id, message)
 
                 elif event_type == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    manager.heartbeat(user_id)
+                    await manager.send_to_socket(websocket, {"type": "pong"})
 
-            except json.JSONDecodeError:
-                await websocket.send_json({"type": "error", "message": "Invalid JSON"})
             except Exception as e:
                 logger.error(f"WS Error: {e}")
-                await websocket.send_json({"type": "error", "message": "Internal error"})
+                await manager.send_to_socket(websocket, {"type": "error", "message": "Internal error"})
 
     except WebSocketDisconnect:
         logger.info(f"User {user_id} disconnected from WebSocket")
@@ -150,18 +166,10 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WS unexpected error for user {user_id}: {e}")
     finally:
         ACTIVE_USERS_GAUGE.dec()
+        # users.last_seen is written in bulk by last_seen_flusher (scheduler),
+        # fed from presence connect/offline events — no per-disconnect commit
         manager.disconnect(websocket, user_id)
 
-        try:
-            from backend.models.user import User
-            async with async_session_maker() as db:
-                user = await db.get(User, UUID(user_id))
-                if user:
-                    user.last_seen = datetime.now(timezone.utc)
-                    await db.commit()
-        except Exception as e:
-            logger.error(f"Failed to update last_seen: {e}")
-
 
 # ============================================================================
 # WS HANDLERS (private)
@@ -180,9 +188,9 @@ async def _handle_message(websocket: WebSocket, sender_id: str, data: dict):
 
     from backend.services.security import spam_detector
     if text:
-        check = await spam_detector.check_message(sender_id, text)
+        check = await spam_detector.check_message(sender_id, text, conversation_id=match_id)
         if check["is_spam"]:
-            await websocket.send_json({
+            await manager.send_to_socket(websocket, {
                 "type": "error",
                 "detail": check["message"],
                 "reason": check["reason"]
@@ -195,7 +203,7 @@ async def _handle_message(websocket: WebSocket, sender_id: str, data: dict):
     async with async_session_maker() as db:
         match_obj = await db.get(Match, UUID(match_id))
         if not match_obj:
-            await websocket.send_json({"type": "error", "message": "Match not found"})
+            await manager.send_to_socket(websocket, {"type": "error", "message": "Match not found"})
             return
 
         recipient_id = str(match_obj.user2_id) if str(match_obj.user1_id) == sender_id else str(match_obj.user1_id)
@@ -471,7 +479,7 @@ async def _handle_gift_read(user_id: str, data: dict, websocket: WebSocket):
                     tx.is_read = True
                     tx.read_at = datetime.now(timezone.utc)
                     await db.commit()
-                    await websocket.send_json({
+                    await manager.send_to_socket(websocket, {
                         "type": "gift_read_ack",
                         "transaction_id": transaction_id,
                         "status": "success"
@@ -1,18 +1,17 @@
 """Client-side log collection endpoint for Telegram WebApp debugging."""
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, Header, Query
 from pydantic import BaseModel
 from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
-import logging
 from datetime import datetime
 
-router = APIRouter(tags=["Debug"])
-logger = logging.getLogger("client_logs")
+from backend import auth
+from backend.config.settings import settings
+from backend.db.session import get_db
+from backend.services.client_logs import client_log_collector
 
-# In-memory ring buffer (last 500 logs)
-_logs: List[dict] = []
-MAX_LOGS = 500
+router = APIRouter(tags=["Debug"])
 
 
 class ClientLogEntry(BaseModel):
@@ -27,51 +26,85 @@ class ClientLogBatch(BaseModel):
     logs: List[ClientLogEntry]
 
 
+def _client_ip(request: Request) -> str:
+    """
+    Address seen by our outermost trusted proxy. Entries to the left of it in
+    X-Forwarded-For are whatever the client sent and can be spoofed.
+    """
+    peer = request.client.host if request.client else "unknown"
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    if not hops or settings.TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    return hops[-min(settings.TRUSTED_PROXY_HOPS, len(hops))]
+
+
+async def _optional_user_id(authorization: Optional[str]) -> Optional[str]:
+    """Reporter's user id if the WebApp sent its token; logs are accepted either way."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    return await auth.decode_jwt(authorization.split(" ", 1)[1])
+
+
 @router.post("/api/client-logs")
-async def receive_client_logs(batch: ClientLogBatch, request: Request):
-    """Receive console logs from frontend (Telegram WebApp)."""
-    client_ip = request.headers.get("x-forwarded-for", request.client.host if request.client else "unknown")
-    
-    for entry in batch.logs:
-        log_record = {
-            "time": entry.timestamp or datetime.utcnow().isoformat(),
-            "level": entry.level.upper(),
-            "message": entry.message[:2000],  # limit size
-            "url": entry.url,
-            "ip": client_ip.split(",")[0].strip(),
-        }
-        _logs.append(log_record)
-        
-        # Log to server console too (goes to Vercel Function Logs)
-        level = entry.level.lower()
-        prefix = f"[CLIENT:{client_ip.split(',')[0].strip()}]"
-        if level == "error":
-            logger.error(f"{prefix} {entry.message[:500]}")
-        elif level == "warn":
-            logger.warning(f"{prefix} {entry.message[:500]}")
-        else:
-            logger.info(f"{prefix} {entry.message[:500]}")
-    
-    # Trim buffer
-    while len(_logs) > MAX_LOGS:
-        _logs.pop(0)
-    
-    return {"ok": True, "count": len(batch.logs)}
+async def receive_client_logs(
+    batch: ClientLogBatch,
+    request: Request,
+    authorization: Optional[str] = Header(None),
+):
+    """Receive console logs from frontend (Telegram WebApp). Rate-limited and sampled."""
+    accepted = await client_log_collector.ingest(
+        [entry.model_dump() for entry in batch.logs],
+        ip=_client_ip(request),
+        user_id=await _optional_user_id(authorization),
+    )
+    return {"ok": True, "count": accepted}
 
 
 @router.get("/api/client-logs")
-async def get_client_logs(limit: int = 50, level: Optional[str] = None):
-    """Read collected client logs. Use ?limit=100&level=ERROR to filter."""
-    logs = _logs
-    if level:
-        logs = [l for l in logs if l["level"] == level.upper()]
-    return {"logs": logs[-limit:], "total": len(logs)}
+async def get_client_logs(
+    limit: int = 50,
+    level: Optional[str] = None,
+    current_admin: auth.User = Depends(auth.get_current_admin),
+):
+    """Read recent client logs (shared buffer). Use ?limit=100&level=ERROR to filter."""
+    logs, total = await client_log_collector.recent(limit, level)
+    return {"logs": logs, "total": total}
+
+
+@router.get("/api/client-logs/signatures")
+async def search_client_logs(
+    level: Optional[str] = None,
+    since: Optional[datetime] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+    current_admin: auth.User = Depends(auth.get_current_admin),
+):
+    """Persisted client errors grouped by signature, most recently seen first."""
+    rows = await client_log_collector.search(db, level=level, since=since, q=q, limit=limit, offset=offset)
+    return {
+        "items": [
+            {
+                "signature": row.signature,
+                "level": row.level,
+                "message": row.message,
+                "url": row.url,
+                "count": row.count,
+                "first_seen": row.first_seen.isoformat() if row.first_seen else None,
+                "last_seen": row.last_seen.isoformat() if row.last_seen else None,
+                "user_id": row.user_id,
+                "user_agent": row.user_agent,
+            }
+            for row in rows
+        ]
+    }
 
 
 @router.delete("/api/client-logs")
-async def clear_client_logs():
-    """Clear all collected client logs."""
-    _logs.clear()
+async def clear_client_logs(current_admin: auth.User = Depends(auth.get_current_admin)):
+    """Clear the recent client log buffer (persisted signatures are kept)."""
+    await client_log_collector.clear()
     return {"ok": True, "cleared": True}
 
 
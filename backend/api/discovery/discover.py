@@ -81,9 +81,10 @@ async def discover_profiles(
     except Exception as e:
         logger.warning(f"Redis cache read error: {e}")
     
-    # Получаем VIP статус
-    user = await crud.get_user_profile(db, current_user)
-    is_vip = user.is_vip if user else False
+    # Получаем VIP статус (снапшот из Redis, без загрузки ORM-профиля)
+    from backend.services.profile_cards import get_profile_snapshot
+    user = await get_profile_snapshot(db, current_user)
+    is_vip = user["is_vip"] if user else False
 
     res = await get_filtered_profiles(
         db=db,
@@ -98,11 +99,17 @@ async def discover_profiles(
     # PERF: Переиспользуем user из первого вызова вместо повторного запроса к БД
     user_profile = user
     if user_profile:
-        current_interests = set(user_profile.interests)
+        current_interests = set(user_profile["interests"])
         for profile in res.get("profiles", []):
             p_interests = set(profile.get("interests", []))
             profile["common_interests"] = list(p_interests & current_interests)
             profile["compatibility_score"] = ai_service.calculate_compatibility(user_profile, profile)
+
+        # Co-like ранжирование внутри страницы: похожие на уже лайкнутых — выше
+        from backend.services.ai.co_like import recommend
+        co_like = dict(await recommend(current_user, k=200))
+        if co_like:
+            res["profiles"].sort(key=lambda p: co_like.get(str(p.get("id")), 0.0), reverse=True)
     
     # PERF: Cache result for 5 minutes
     try:
@@ -124,21 +131,24 @@ async def prefetch_profiles(
     Возвращает до 10 профилей с минимальными данными.
     """
     from backend.crud.interaction import get_user_feed
+    from backend.services.profile_cards import get_profile_cards
     from uuid import UUID
     
-    profiles = await get_user_feed(db, UUID(current_user), limit=limit)
+    profile_ids = await get_user_feed(db, UUID(current_user), limit=limit, ids_only=True)
+    cards = await get_profile_cards(db, profile_ids, view="thumb")
     
     # Минимальный набор данных для prefetch
     return [
         {
-            "id": str(p.id),
-            "name": p.name,
-            "age": p.age,
-            "photos": p.photos[:1] if p.photos else [],  # Только первое фото
-            "distance": getattr(p, 'distance_km', 0),
-            "is_verified": p.is_verified
+            "id": card["id"],
+            "name": card["name"],
+            "age": card["age"],
+            "photos": [card["photo"]] if card["photo"] else [],  # Только первое фото
+            "distance": 0,
+            "is_verified": card["is_verified"]
         }
-        for p in profiles
+        for card in (cards.get(str(pid)) for pid in profile_ids)
+        if card
     ]
 
 
@@ -6,6 +6,7 @@ from backend import crud, schemas, auth, database
 from backend.services.moderation import ModerationService
 from backend.services.geo import geo_service
 from backend.services.storage import storage_service
+from backend.services.profile_cards import refresh_profile_cards
 import logging
 
 logger = logging.getLogger(__name__)
@@ -99,6 +100,7 @@ async def update_location(
         profile.latitude = loc.get("lat")
         profile.longitude = loc.get("lon")
         await db.commit()
+        await refresh_profile_cards(db, [profile.id])
         
         # Sync to High-Performance Redis Geo Index
         try:
@@ -3,7 +3,7 @@
 import uuid
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_, and_
 
@@ -24,18 +24,12 @@ async def get_matches(
     """
     Получить список матчей текущего пользователя.
     """
-    matches = await get_user_matches(db, current_user_id)
+    matches = await get_user_matches(db, current_user_id, load_users=False)
     
-    # Batch: собираем все partner IDs и делаем один запрос в Redis
-    partner_ids = []
-    for m in matches:
-        pid = str(m.user2.id if m.user1_id == current_user_id else m.user1.id) if (m.user2 if m.user1_id == current_user_id else m.user1) else None
-        if pid:
-            partner_ids.append(pid)
-    
-    from backend.services.chat.state import state_manager
-    online_map = await state_manager.is_users_online_batch(partner_ids)
-    last_seen_map = await state_manager.get_last_seen_batch(partner_ids)
+    # Карточки партнёров: Redis MGET + один запрос на промахи, presence батчем
+    from backend.services.profile_cards import get_profile_cards
+    partner_ids = [m.user2_id if m.user1_id == current_user_id else m.user1_id for m in matches]
+    cards = await get_profile_cards(db, partner_ids, with_presence=True)
     
     # Batch fetch last messages for all matches (N+1 → 2 запроса)
     from backend.models.chat import Message
@@ -57,30 +51,22 @@ async def get_matches(
         last_msgs_map = {}
     
     response_matches = []
-    for m in matches:
-        if m.user1_id == current_user_id:
-            partner = m.user2
-        else:
-            partner = m.user1
-            
+    for m, partner_id in zip(matches, partner_ids):
         partner_data = None
-        if partner:
-            is_online = online_map.get(str(partner.id), False)
-            redis_last_seen = last_seen_map.get(str(partner.id))
-            last_seen = redis_last_seen or (partner.last_seen.isoformat() if getattr(partner, 'last_seen', None) else None)
-            
+        card = cards.get(str(partner_id))
+        if card:
             partner_data = {
-                 "id": str(partner.id),
-                 "name": partner.name,
-                 "photos": partner.photos,
-                 "is_online": is_online,
-                 "online_status": "online" if is_online else "offline",
-                 "last_seen": last_seen,
-                 "age": getattr(partner, 'age', None),
-                 "bio": getattr(partner, 'bio', None),
-                 "is_verified": getattr(partner, 'is_verified', False),
-                 "is_premium": getattr(partner, 'is_vip', False),
-                 "city": getattr(partner, 'city', None),
+                 "id": card["id"],
+                 "name": card["name"],
+                 "photos": card["photos"],
+                 "is_online": card["is_online"],
+                 "online_status": "online" if card["is_online"] else "offline",
+                 "last_seen": card["last_seen"],
+                 "age": card["age"],
+                 "bio": card["bio"],
+                 "is_verified": card["is_verified"],
+                 "is_premium": card["is_vip"],
+                 "city": card["city"],
             }
 
         # Получаем последнее сообщение из batch-запроса
@@ -148,8 +134,9 @@ async def get_match_by_id(
     partner_data = None
     if partner:
         from backend.services.chat.state import state_manager
-        is_online = await state_manager.is_user_online(str(partner.id))
-        redis_last_seen = await state_manager.get_last_seen(str(partner.id))
+        presence = (await state_manager.get_presence_batch([str(partner.id)]))[str(partner.id)]
+        is_online = presence["is_online"]
+        redis_last_seen = presence["last_seen"]
         # Prefer Redis last_seen (updated by heartbeat), fallback to DB
         last_seen = redis_last_seen or (partner.last_seen.isoformat() if partner.last_seen else None)
         
@@ -216,6 +203,7 @@ async def get_match_messages(
 @router.post("/chat/start/{target_user_id}")
 async def start_chat_with_user(
     target_user_id: UUID,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user_id: UUID = Depends(get_current_user_id)
 ):
@@ -265,5 +253,11 @@ async def start_chat_with_user(
     db.add(new_match)
     await db.commit()
     await db.refresh(new_match)
+
+    from backend.services.chat.presence import invalidate_partners
+    await invalidate_partners(current_user_id, target_user_id)
+
+    from backend.services.ai.conversation_starters import prepare_icebreakers
+    background_tasks.add_task(prepare_icebreakers, str(new_match.id))
     
     return {"match_id": str(new_match.id), "is_new": True}
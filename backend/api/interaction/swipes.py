@@ -106,6 +106,11 @@ async def swipe(
                 partner_name=partner_name,
                 match_id=str(match_obj.id) if match_obj else None,
             )
+
+            if match_obj:
+                # Инвентарь айсбрейкеров готовим сразу, до первого открытия чата
+                from backend.services.ai.conversation_starters import prepare_icebreakers
+                background_tasks.add_task(prepare_icebreakers, str(match_obj.id))
     except Exception as e:
         # Don't fail the swipe if notification fails
         import logging
@@ -120,11 +125,10 @@ async def swipe(
         }
     )
 
-    # Redis Persistence for AI
+    # Redis Persistence for AI: история лайков + инкрементальный co-like индекс
     if swipe_data.action.value in ["like", "superlike"]:
-        history_key = f"interactions:{current_user_id}:liked"
-        await redis_manager.client.lpush(history_key, str(swipe_data.to_user_id))
-        await redis_manager.client.ltrim(history_key, 0, 99)
+        from backend.services.ai.co_like import record_like
+        await record_like(current_user_id, swipe_data.to_user_id)
 
     # PERF: Invalidate discover cache on swipe
     try:
@@ -191,6 +195,10 @@ async def undo_last_swipe(
         
         await db.delete(swipe_obj)
         await db.commit()
+
+        if last_swipe_data["action"] in ["like", "superlike"]:
+            from backend.services.chat.presence import invalidate_partners
+            await invalidate_partners(current_user_id, last_swipe_data["to_user_id"])
     
     if not user.is_vip:
         await mark_undo_used(str(current_user_id))
@@ -5,6 +5,8 @@ Virtual Gifts — public gifts_router + admin gift management endpoints.
 import json
 from backend.api.monetization._common import *
 from backend.services.chat import manager
+from backend.services import star_ledger
+from backend.services.gifts import claim_gift_slot, rebalance_gift_shards, GiftUnavailable
 
 # Public gifts router (accessible by authenticated users)
 gifts_router = APIRouter(prefix="/gifts", tags=["gifts"])
@@ -110,83 +112,80 @@ async def send_gift(
     if gift.available_until and gift.available_until < datetime.utcnow():
         raise HTTPException(status_code=400, detail="This gift is no longer available")
     
-    # Wrap everything in an ATOMIC TRANSACTION
+    if sender_id == request.receiver_id:
+        raise HTTPException(status_code=400, detail="Cannot send gift to yourself")
+    
+    # No row is locked up front: the gift counter is sharded and balances
+    # change through conditional UPDATEs, so concurrent senders don't queue.
     try:
-        async with db.begin():
-            # 1. Validate gift still available
-            result = await db.execute(select(VirtualGift).where(VirtualGift.id == request.gift_id).with_for_update())
-            gift = result.scalar_one_or_none()
-            if not gift:
-                raise HTTPException(status_code=404, detail="Gift not found")
-            if not gift.is_active:
-                raise HTTPException(status_code=400, detail="This gift is no longer available")
-            if gift.max_quantity and gift.times_sent >= gift.max_quantity:
-                raise HTTPException(status_code=400, detail="This gift has reached its maximum quantity")
-
-            # 2. Lock Sender and Receiver to prevent race conditions
-            user_ids = sorted([sender_id, request.receiver_id])
-            result = await db.execute(
-                select(User).where(User.id.in_(user_ids)).with_for_update()
-            )
-            users_map = {str(u.id): u for u in result.scalars().all()}
-            
-            sender = users_map.get(str(sender_id))
-            receiver = users_map.get(str(request.receiver_id))
-            
-            if not sender: raise HTTPException(status_code=404, detail="Sender not found")
-            if not receiver: raise HTTPException(status_code=404, detail="Receiver not found")
-            if sender_id == request.receiver_id:
-                raise HTTPException(status_code=400, detail="Cannot send gift to yourself")
-
-            # 3. Budget Check and Deduct
-            if sender.stars_balance < gift.price:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Insufficient balance. Required: {gift.price} XTR, Available: {sender.stars_balance} XTR"
-                )
-            
-            # ATOMIC UPDATES via locked records
-            sender.stars_balance = sender.stars_balance - gift.price
-            
-            receiver_bonus = int(gift.price * 0.1)
-            if receiver_bonus > 0:
-                receiver.stars_balance = (receiver.stars_balance or 0) + receiver_bonus
-            
-            # 5. Create transactions
-            transaction = GiftTransaction(
-                sender_id=sender_id,
-                receiver_id=request.receiver_id,
-                gift_id=gift.id,
-                price_paid=gift.price,
-                currency=gift.currency,
-                message=request.message,
-                status="completed",
-                is_anonymous=request.is_anonymous
-            )
-            db.add(transaction)
-            
-            gift.times_sent += 1
-            
-            revenue_tx = RevenueTransaction(
-                user_id=sender_id,
-                transaction_type="gift",
-                amount=gift.price,
-                currency=gift.currency,
-                status="completed",
-                payment_gateway="telegram_stars",
-                custom_metadata={
-                    "gift_id": str(gift.id),
-                    "gift_name": gift.name,
-                    "receiver_id": str(request.receiver_id)
-                }
-            )
-            db.add(revenue_tx)
-            await db.flush()
-            transaction.payment_transaction_id = revenue_tx.id
-            
+        # 2. Sender and receiver must exist
+        sender = await db.get(User, sender_id)
+        receiver = await db.get(User, request.receiver_id)
+        if not sender: raise HTTPException(status_code=404, detail="Sender not found")
+        if not receiver: raise HTTPException(status_code=404, detail="Receiver not found")
+        
+        # 3. Count the send on a counter shard (enforces max_quantity)
+        await claim_gift_slot(db, gift)
+        
+        revenue_tx = RevenueTransaction(
+            user_id=sender_id,
+            transaction_type="gift",
+            amount=gift.price,
+            currency=gift.currency,
+            status="completed",
+            payment_gateway="telegram_stars",
+            custom_metadata={
+                "gift_id": str(gift.id),
+                "gift_name": gift.name,
+                "receiver_id": str(request.receiver_id)
+            }
+        )
+        db.add(revenue_tx)
+        await db.flush()
+        
+        # 4. Debit sender (WHERE balance >= price) and credit receiver bonus
+        receiver_bonus = int(gift.price * Decimal("0.1"))
+        await star_ledger.apply(
+            db,
+            [
+                (sender_id, -gift.price, "gift"),
+                (request.receiver_id, receiver_bonus, "gift_bonus"),
+            ],
+            reference_id=revenue_tx.id,
+            metadata={"gift_id": str(gift.id)},
+        )
+        
+        # 5. Create gift transaction
+        transaction = GiftTransaction(
+            sender_id=sender_id,
+            receiver_id=request.receiver_id,
+            gift_id=gift.id,
+            price_paid=gift.price,
+            currency=gift.currency,
+            message=request.message,
+            status="completed",
+            is_anonymous=request.is_anonymous,
+            payment_transaction_id=revenue_tx.id
+        )
+        db.add(transaction)
+        await db.commit()
+        
     except HTTPException:
+        await db.rollback()
         raise
+    except GiftUnavailable as e:
+        await db.rollback()
+        if e.reason == "sold_out":
+            raise HTTPException(status_code=400, detail="This gift has reached its maximum quantity")
+        raise HTTPException(status_code=409, detail="This gift is in high demand, please try again")
+    except star_ledger.InsufficientStars as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Insufficient balance. Required: {e.required} XTR, Available: {e.available} XTR"
+        )
     except Exception as e:
+        await db.rollback()
         logger.error(f"Atomic gift delivery failed: {e}")
         raise HTTPException(status_code=500, detail="Transaction failed")
 
@@ -499,10 +498,14 @@ async def update_virtual_gift(
     gift.is_limited = gift_data.is_limited
     gift.is_active = gift_data.is_active if hasattr(gift_data, 'is_active') else True
     gift.available_until = gift_data.available_until
+    max_quantity_changed = gift.max_quantity != gift_data.max_quantity
     gift.max_quantity = gift_data.max_quantity
     gift.category_id = gift_data.category_id
     gift.sort_order = gift_data.sort_order if hasattr(gift_data, 'sort_order') else gift.sort_order
     
+    if max_quantity_changed:
+        await rebalance_gift_shards(db, gift)
+    
     await db.commit()
     await db.refresh(gift)
     return VirtualGiftResponse.model_validate(gift)
@@ -111,6 +111,7 @@ async def create_top_up_invoice(
 # ============================================
 
 from backend.services.monetization import buy_subscription_with_stars
+from backend.services.profile_cards import refresh_profile_cards
 
 
 class SubscriptionRequest(PydanticBaseModel):
@@ -136,6 +137,9 @@ async def buy_subscription(
     """Purchase a subscription with Telegram Stars."""
     user_id = uuid.UUID(current_user)
     result = await buy_subscription_with_stars(db, user_id, request.tier)
+    if result.get("success"):
+        await db.commit()
+        await refresh_profile_cards(db, [user_id])
     return SubscriptionResponse(**result)
 
 
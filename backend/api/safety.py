@@ -10,6 +10,7 @@ from backend.auth import get_current_admin
 from backend.models.user import User, UserStatus
 from backend.models.moderation import ModerationLog
 from backend.models.interaction import Report
+from backend.services.profile_cards import refresh_profile_cards
 from enum import Enum
 
 router = APIRouter(prefix="/safety", tags=["Safety"])
@@ -125,6 +126,8 @@ async def resolve_moderation_item(
              await redis_manager.blacklist_user_tokens(str(report.reported_id))
              
         await db.commit()
+        if action == ModerationAction.BAN_USER:
+            await refresh_profile_cards(db, [report.reported_id])
         return {"status": "success", "message": f"Report resolved with action {action.value}"}
         
     # Check if it's a moderation log (not fully implemented 'resolution' for logs yet without a status column)
@@ -15,6 +15,7 @@ import uuid
 from sqlalchemy import update
 from backend.db.session import get_db
 from backend.models.user import User, UserStatus
+from backend.services.profile_cards import refresh_profile_cards
 
 logger = logging.getLogger(__name__)
 from backend.services.security import (
@@ -343,6 +344,7 @@ async def admin_resolve_report(
                     )
                 )
                 await db.commit()
+                await refresh_profile_cards(db, [user_uuid])
                 logger.info(f"User {result.reported_user_id} suspended in DB by {admin_user.id}")
             except Exception as e:
                 logger.error(f"Failed to suspend user in DB: {e}")
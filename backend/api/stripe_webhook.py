@@ -1,4 +1,5 @@
 import stripe
+import json
 import logging
 import uuid
 from datetime import datetime, timedelta
@@ -6,9 +7,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from fastapi import APIRouter, Request, HTTPException, Depends, Header
 from backend.config.settings import settings
-from backend.db.session import get_db
+from backend.db.session import get_db, async_session_maker
 from backend.models import monetization as models
 from backend.models import User
+from backend.services.profile_cards import refresh_profile_cards
+from backend.services import payment_events
+from backend.services.payment_events import EventContext, payment_handler
 
 logger = logging.getLogger(__name__)
 
@@ -16,113 +20,162 @@ router = APIRouter()
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
-async def handle_checkout_completed(session: dict, db: AsyncSession):
+@payment_handler("stripe", "checkout.session.completed")
+async def on_checkout_completed(ctx: EventContext):
+    await handle_checkout_completed(ctx.data["data"]["object"], ctx)
+
+
+async def handle_checkout_completed(session: dict, ctx: EventContext):
     """
     Handle successful payment session.
     Grant subscription or credits.
+    Runs in the payment event worker; the worker commits.
     """
-    try:
-        # Extract metadata
-        client_reference_id = session.get("client_reference_id")
-        metadata = session.get("metadata", {})
-        
-        user_id = client_reference_id or metadata.get("user_id")
-        product_type = metadata.get("product_type") # subscription, boost, superlike
-        
-        if not user_id:
-            logger.error("Stripe Webhook: No user_id found in metadata")
-            return
+    db = ctx.db
+
+    # Extract metadata
+    client_reference_id = session.get("client_reference_id")
+    metadata = session.get("metadata", {})
+    
+    user_id = client_reference_id or metadata.get("user_id")
+    product_type = metadata.get("product_type") # subscription, boost, superlike
+    
+    if not user_id:
+        logger.error("Stripe Webhook: No user_id found in metadata")
+        ctx.result = "no_user_id"
+        return
 
-        amount = session.get("amount_total", 0) / 100.0
-        currency = session.get("currency", "usd")
-        payment_intent = session.get("payment_intent")
+    amount = session.get("amount_total", 0) / 100.0
+    currency = session.get("currency", "usd")
+    payment_intent = session.get("payment_intent")
+
+    # Idempotency: одна транзакция на сессию оплаты (повтор/replay события)
+    gateway_id = payment_intent or session.get("id")
+    existing = await db.execute(
+        select(models.RevenueTransaction.id).where(
+            models.RevenueTransaction.payment_gateway == "stripe",
+            models.RevenueTransaction.gateway_transaction_id == gateway_id,
+        )
+    )
+    if existing.scalars().first():
+        logger.warning(f"Stripe payment {gateway_id} already recorded")
+        ctx.result = "duplicate_payment"
+        return
+    
+    logger.info(f"Processing payment for user {user_id}: {product_type} - {amount} {currency}")
+    
+    # 1. Record Transaction
+    transaction = models.RevenueTransaction(
+        user_id=user_id,
+        transaction_type=product_type or "unknown",
+        amount=amount,
+        currency=currency,
+        status="completed",
+        payment_gateway="stripe",
+        gateway_transaction_id=gateway_id,
+        custom_metadata=metadata
+    )
+    db.add(transaction)
+    await db.flush() # Get ID
+    
+    # 2. Grant Logic
+    if product_type == "subscription":
+        plan_id = metadata.get("plan_id")
         
-        logger.info(f"Processing payment for user {user_id}: {product_type} - {amount} {currency}")
+        # Fetch Plan Duration
+        plan = None
+        if plan_id:
+            try:
+                plan_uuid = uuid.UUID(plan_id)
+                res = await db.execute(select(models.SubscriptionPlan).where(models.SubscriptionPlan.id == plan_uuid))
+                plan = res.scalars().first()
+            except:
+                logger.warning(f"Invalid plan_id in metadata: {plan_id}")
+
+        duration_days = plan.duration_days if plan else 30
+        expires_at = datetime.utcnow() + timedelta(days=duration_days)
         
-        # 1. Record Transaction
-        transaction = models.RevenueTransaction(
+        sub = models.UserSubscription(
             user_id=user_id,
-            transaction_type=product_type or "unknown",
-            amount=amount,
-            currency=currency,
-            status="completed",
-            payment_gateway="stripe",
-            gateway_transaction_id=payment_intent,
-            custom_metadata=metadata
+            plan_id=plan.id if plan else None, 
+            status="active",
+            started_at=datetime.utcnow(),
+            expires_at=expires_at,
+            payment_method="stripe",
+            stripe_subscription_id=session.get("subscription")
         )
-        db.add(transaction)
-        await db.flush() # Get ID
+        db.add(sub)
         
-        # 2. Grant Logic
-        # 2. Grant Logic
-        if product_type == "subscription":
-            plan_id = metadata.get("plan_id")
-            
-            # Fetch Plan Duration
-            plan = None
-            if plan_id:
-                try:
-                    plan_uuid = uuid.UUID(plan_id)
-                    res = await db.execute(select(models.SubscriptionPlan).where(models.SubscriptionPlan.id == plan_uuid))
-                    plan = res.scalars().first()
-                except:
-                    logger.warning(f"Invalid plan_id in metadata: {plan_id}")
-
-            duration_days = plan.duration_days if plan else 30
-            expires_at = datetime.utcnow() + timedelta(days=duration_days)
-            
-            sub = models.UserSubscription(
-                user_id=user_id,
-                plan_id=plan.id if plan else None, 
-                status="active",
-                started_at=datetime.utcnow(),
-                expires_at=expires_at,
-                payment_method="stripe",
-                stripe_subscription_id=session.get("subscription")
-            )
-            db.add(sub)
+        # Update User status
+        user_res = await db.execute(select(User).where(User.id == user_id))
+        user = user_res.scalars().first()
+        if user:
+            user.is_vip = True
             
-            # Update User status
-            user_res = await db.execute(select(User).where(User.id == user_id))
-            user = user_res.scalars().first()
-            if user:
-                user.is_vip = True
-                
-        elif product_type == "superlike":
-             qty = int(metadata.get("quantity", 5))
-             purchase = models.SuperLikePurchase(
-                 user_id=user_id,
-                 transaction_id=transaction.id,
-                 quantity_purchased=qty,
-                 quantity_remaining=qty,
-                 source="purchase"
-             )
-             db.add(purchase)
-             
-        elif product_type == "boost":
-            duration = int(metadata.get("duration", 30))
-            boost = models.BoostPurchase(
-                user_id=user_id,
-                transaction_id=transaction.id,
-                boost_type=metadata.get("boost_type", "standard"),
-                duration_minutes=duration
-            )
-            db.add(boost)
-
-        await db.commit()
-        logger.info(f"Payment processed successfully for {user_id}")
-
-    except Exception as e:
-        logger.error(f"Error handling checkout: {e}")
-        await db.rollback()
-        raise e
+    elif product_type == "superlike":
+         qty = int(metadata.get("quantity", 5))
+         purchase = models.SuperLikePurchase(
+             user_id=user_id,
+             transaction_id=transaction.id,
+             quantity_purchased=qty,
+             quantity_remaining=qty,
+             source="purchase"
+         )
+         db.add(purchase)
+         
+    elif product_type == "boost":
+        duration = int(metadata.get("duration", 30))
+        boost = models.BoostPurchase(
+            user_id=user_id,
+            transaction_id=transaction.id,
+            boost_type=metadata.get("boost_type", "standard"),
+            duration_minutes=duration
+        )
+        db.add(boost)
+
+    if product_type == "subscription":
+        ctx.defer(_refresh_cards, user_id)
+    ctx.result = product_type or "unknown"
+    logger.info(f"Payment processed successfully for {user_id}")
+
+
+async def _refresh_cards(user_id):
+    async with async_session_maker() as db:
+        await refresh_profile_cards(db, [user_id])
+
+
+@payment_handler("stripe", "payment_intent.succeeded")
+async def on_payment_intent_succeeded(ctx: EventContext):
+    # Handled via checkout usually, but kept for custom flows
+    logger.info(f"Payment intent succeeded: {ctx.data['data']['object'].get('id')}")
+
+
+@payment_handler("stripe", "customer.subscription.deleted")
+async def on_subscription_deleted(ctx: EventContext):
+    # Handle churn
+    sub_data = ctx.data["data"]["object"]
+    stripe_sub_id = sub_data.get("id")
+    
+    # Find subscription and cancel
+    txn = await ctx.db.execute(select(models.UserSubscription).where(models.UserSubscription.stripe_subscription_id == stripe_sub_id))
+    sub = txn.scalars().first()
+    if sub:
+        sub.status = "cancelled"
+        sub.cancelled_at = datetime.utcnow()
+        sub.auto_renew = False
+        
+        # Remove VIP? Depending on logic (period end vs immediate)
+        # Usually we let it run until expires_at
+    else:
+        ctx.result = "subscription_not_found"
 
 
 @router.post("/webhook/stripe")
 async def stripe_webhook(request: Request, stripe_signature: str = Header(None), db: AsyncSession = Depends(get_db)):
     """
     Stripe Webhook Handler.
-    Verifies signature and processes events.
+    Verifies the signature, journals the event and acknowledges;
+    the payment event worker applies it.
     """
     if not settings.STRIPE_WEBHOOK_SECRET:
         raise HTTPException(status_code=500, detail="Webhook Secret not configured")
@@ -142,30 +195,7 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None),
         logger.error("Stripe Webhook Error: Invalid signature")
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    # Handle the event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        await handle_checkout_completed(session, db)
-        
-    elif event['type'] == 'payment_intent.succeeded':
-        # Handled via checkout usually, but kept for custom flows
-        logger.info(f"Payment intent succeeded: {event['data']['object'].get('id')}")
-        
-    elif event['type'] == 'customer.subscription.deleted':
-        # Handle churn
-        sub_data = event['data']['object']
-        stripe_sub_id = sub_data.get("id")
-        
-        # Find subscription and cancel
-        txn = await db.execute(select(models.UserSubscription).where(models.UserSubscription.stripe_subscription_id == stripe_sub_id))
-        sub = txn.scalars().first()
-        if sub:
-            sub.status = "cancelled"
-            sub.cancelled_at = datetime.utcnow()
-            sub.auto_renew = False
-            
-            # Remove VIP? Depending on logic (period end vs immediate)
-            # Usually we let it run until expires_at
-            await db.commit()
+    # Подпись проверена — храним исходный JSON как есть
+    await payment_events.record(db, "stripe", event["id"], event["type"], json.loads(payload))
 
     return {"status": "success"}
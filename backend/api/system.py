@@ -16,7 +16,8 @@ try:
 except ImportError:
     psutil = None
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from sqlalchemy import select, func, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
@@ -27,7 +28,11 @@ from backend.auth import get_current_user_from_token, get_current_admin
 from backend.models.user import User
 from backend.models.interaction import Match, Swipe
 from backend.models.system import AuditLog, FeatureFlag, SecurityAlert, BackupStatus
+from backend.services.features import feature_service
 from backend.services.chat import manager as chat_manager
+from backend.config.settings import settings
+from backend.core.instrumentation import histogram_summary, loop_monitor, top_queries
+from backend.metrics import HTTP_REQUEST_DURATION, REDIS_COMMAND_DURATION, WS_CONNECTIONS
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -53,10 +58,42 @@ class AlertSeverity(str, Enum):
 # SYSTEM HEALTH & METRICS
 # ============================================
 
-@router.get("/metrics")
+async def require_metrics_access(request: Request, db: AsyncSession = Depends(get_db)) -> None:
+    """METRICS_TOKEN (Bearer) for scrapers when it is set, otherwise an admin session."""
+    authorization = request.headers.get("authorization")
+    if settings.METRICS_TOKEN:
+        if authorization != f"Bearer {settings.METRICS_TOKEN}":
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+        return
+    # Токен не задан — не отдаём маршруты и SQL-отпечатки анонимам
+    await get_current_admin(await get_current_user_from_token(authorization, db))
+
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_access)])
 async def get_metrics():
-    """Prometheus metrics stub (Real implementation requires prometheus_client middleware)"""
-    return {"status": "available", "info": "Enable prometheus_client middleware for full metrics"}
+    """Prometheus exposition (see require_metrics_access)."""
+    return Response(content=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+@router.get("/metrics/summary")
+async def get_metrics_summary(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: User = Depends(get_current_admin)
+):
+    """Slowest routes, SQL fingerprints and Redis commands since process start"""
+    websocket = {}
+    for metric in WS_CONNECTIONS.collect():
+        for sample in metric.samples:
+            websocket[sample.labels["protocol"]] = int(sample.value)
+    return {
+        "routes": histogram_summary(HTTP_REQUEST_DURATION, limit),
+        "queries": top_queries(limit),
+        "redis": histogram_summary(REDIS_COMMAND_DURATION, limit),
+        "websocket": websocket,
+        "event_loop": {
+            "last_lag_ms": round(loop_monitor.last_lag * 1000, 1),
+            "window_max_ms": round(loop_monitor.window_max * 1000, 1),
+        },
+    }
 
 @router.get("/health")
 async def get_system_health(
@@ -383,7 +420,8 @@ async def get_backup_status(
     result = await db.execute(stmt)
     backups = result.scalars().all()
     
-    return {"backups": backups}
+    from backend.services.backup import backup_service
+    return {"backups": backups, "active": backup_service.progress()}
 
 @router.post("/backups/trigger")
 async def trigger_backup(
@@ -476,6 +514,7 @@ async def update_feature_flag(
         flag.updated_by = current_user.email
         
     await db.commit()
+    await feature_service.notify_changed(flag_key)
     
     return {
         "status": "success",
@@ -503,6 +542,7 @@ async def update_flag_rollout(
     flag.updated_at = datetime.utcnow()
     flag.updated_by = current_user.email
     await db.commit()
+    await feature_service.notify_changed(flag_key)
     
     return {
         "status": "success",
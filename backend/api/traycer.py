@@ -9,6 +9,7 @@ from backend.config.traycer import TRAYCER_API_TOKEN
 from backend.database import get_db
 from backend.models.system import AuditLog, SecurityAlert
 from backend.models.user import User
+from backend.services.profile_cards import refresh_profile_cards
 # Assuming UserStatus is an Enum or string, usually cleaner to use string if import difficult, 
 # but models.user usually has it.
 from backend.models.user import UserStatus 
@@ -78,6 +79,7 @@ async def traycer_webhook(
                     user.is_active = True
                 
                 await db.commit()
+                await refresh_profile_cards(db, [user.id])
                 logger.info(f"Traycer updated user {user_id} status to {new_status}")
             else:
                 logger.warning(f"Traycer tried to update non-existent user {user_id}")
@@ -1,12 +1,13 @@
 # Users API - GDPR экспорт, лайки, stars (dev)
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import text
 from datetime import datetime, timezone
 from pydantic import BaseModel
 import logging
+import uuid
 
 from backend.db.session import get_db
 from backend.schemas.user import Location
@@ -27,52 +28,38 @@ async def get_likes_received(
     """
     Get users who have liked the current user.
     Returns user profiles with isSuper flag.
-    FIX: Single query with photos aggregated (no N+1)
+    Profiles come from the shared batched card cache (services.profile_cards).
     """
-    user_id = str(current_user.id).replace('-', '')  # Remove dashes for CHAR(32) format
-    logger.info(f"Getting likes for user_id: {user_id}")
-    
-    # FIX: Single query with photos aggregated using GROUP_CONCAT
-    stmt = text("""
-        SELECT 
-            s.from_user_id, 
-            s.action, 
-            s.timestamp,
-            u.name,
-            u.age,
-            u.is_active,
-            STRING_AGG(p.url, ',') as photos
-        FROM swipes s
-        JOIN users u ON s.from_user_id = u.id
-        LEFT JOIN user_photos p ON p.user_id = s.from_user_id
-        WHERE s.to_user_id = :user_id 
-        AND s.action IN ('like', 'superlike')
-        GROUP BY s.from_user_id, s.action, s.timestamp, u.name, u.age, u.is_active
-        ORDER BY s.timestamp DESC
-        LIMIT :limit
-    """)
-    
-    result = await db.execute(stmt, {"user_id": user_id, "limit": limit})
-    rows = result.fetchall()
-    logger.info(f"Found {len(rows)} likes for user {user_id}")
+    from backend.models.interaction import Swipe
+    from backend.models.user import User
+    from backend.services.profile_cards import get_profile_cards
+
+    result = await db.execute(
+        select(Swipe.from_user_id, Swipe.action, Swipe.timestamp)
+        .join(User, User.id == Swipe.from_user_id)
+        .where(
+            Swipe.to_user_id == current_user.id,
+            Swipe.action.in_(("like", "superlike")),
+            User.is_active == True,
+        )
+        .order_by(Swipe.timestamp.desc())
+        .limit(limit)
+    )
+    rows = result.all()
+    cards = await get_profile_cards(db, [row.from_user_id for row in rows])
     
-    # Build response - photos already included
     likes = []
     for row in rows:
-        from_user_id, action, timestamp, name, age, is_active, photos_str = row
-        if not is_active:
+        card = cards.get(str(row.from_user_id))
+        if not card:
             continue
-        
-        # Parse photos from GROUP_CONCAT result
-        photos = photos_str.split(',') if photos_str else []
-        
         likes.append({
-            "id": from_user_id,
-            "name": name,
-            "age": age,
-            "photos": photos,
-            "isSuper": action == 'superlike',
-            "likedAt": timestamp if timestamp else None
+            "id": card["id"],
+            "name": card["name"],
+            "age": card["age"],
+            "photos": card["photos"],
+            "isSuper": row.action == 'superlike',
+            "likedAt": row.timestamp if row.timestamp else None
         })
     
     return {"likes": likes, "total": len(likes)}
@@ -120,111 +107,121 @@ async def spend_stars_dev(
     return {"status": "ok", "new_balance": current_user.stars_balance}
 
 
+def _export_status(job) -> dict:
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "progress": job.progress,
+        "current_section": job.current_section,
+        "rows_written": job.rows_written,
+        "size_bytes": job.size_bytes,
+        "checksum": job.checksum,
+        "error": job.error,
+        "created_at": str(job.created_at),
+        "completed_at": str(job.completed_at) if job.completed_at else None,
+        "expires_at": str(job.expires_at) if job.expires_at else None,
+        "download_url": f"/api/users/me/export/{job.id}/download" if job.status == "completed" else None,
+    }
+
+
+async def _get_own_export(db: AsyncSession, job_id: uuid.UUID, user_id):
+    from backend.models.user_management import DataExportJob
+
+    job = await db.get(DataExportJob, job_id)
+    if not job or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+
+@router.post("/me/export", status_code=status.HTTP_202_ACCEPTED)
+async def request_data_export(
+    background_tasks: BackgroundTasks,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    GDPR Data Export — запустить выгрузку всех данных пользователя.
+    Архив (gzip NDJSON) собирается в фоне; статус — GET /me/export/{job_id}.
+    """
+    from backend.services.data_export import request_export, run_export_job, ExportRateLimited
+
+    try:
+        job = await request_export(db, current_user.id)
+    except ExportRateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"message": "Export already requested recently", "job_id": str(e.job.id) if e.job else None},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    background_tasks.add_task(run_export_job, job.id)
+    return _export_status(job)
+
+
 @router.get("/me/export")
-async def export_my_data(
+async def get_latest_data_export(
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Статус последней выгрузки пользователя."""
+    from backend.services.data_export import latest_job
+
+    job = await latest_job(db, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No exports yet")
+    return _export_status(job)
+
+
+@router.get("/me/export/{job_id}")
+async def get_data_export(
+    job_id: uuid.UUID,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    job = await _get_own_export(db, job_id, current_user.id)
+    return _export_status(job)
+
+
+async def _get_ready_export(db: AsyncSession, job_id: uuid.UUID, user_id):
+    job = await _get_own_export(db, job_id, user_id)
+    if job.status != "completed" or not job.file_path:
+        raise HTTPException(status_code=409 if job.status in ("pending", "running") else 410,
+                            detail=f"Export is {job.status}")
+    return job
+
+
+@router.get("/me/export/{job_id}/download")
+async def download_data_export(
+    job_id: uuid.UUID,
     current_user = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    GDPR Data Export — полный экспорт всех данных пользователя.
-    Включает профиль, сообщения, лайки, матчи, жалобы, покупки.
+    Ссылка на готовый архив. Архив лежит в S3, отдаётся подписанный URL —
+    браузер качает напрямую из хранилища, инстанс не важен.
+    Без S3 (dev) — /file на этом же инстансе.
     """
-    from backend.models.interaction import Swipe, Match, Like, Report
-    from backend.models.chat import Message
-    from backend.models.monetization import RevenueTransaction, GiftTransaction
-    from backend.models.profile_enrichment import UserPrompt, UserPreference
+    from backend.services.data_export import download_url
 
-    uid = current_user.id
+    job = await _get_ready_export(db, job_id, current_user.id)
+    url = await download_url(job)
+    if url:
+        return {"url": url, "expires_in": settings.DATA_EXPORT_URL_TTL_SECONDS}
+    return {"url": f"/api/users/me/export/{job.id}/file", "expires_in": None}
 
-    # Messages sent
-    msgs_result = await db.execute(
-        select(Message).where(Message.sender_id == uid).order_by(Message.created_at)
-    )
-    messages = [
-        {"id": str(m.id), "match_id": str(m.match_id), "text": m.text,
-         "created_at": str(m.created_at), "is_read": m.is_read}
-        for m in msgs_result.scalars().all()
-    ]
-
-    # Likes given
-    likes_result = await db.execute(
-        select(Like).where(Like.liker_id == uid).order_by(Like.created_at)
-    )
-    likes = [
-        {"target_id": str(l.liked_id), "created_at": str(l.created_at)}
-        for l in likes_result.scalars().all()
-    ]
-
-    # Swipes
-    swipes_result = await db.execute(
-        select(Swipe).where(Swipe.from_user_id == uid).order_by(Swipe.timestamp)
-    )
-    swipes = [
-        {"target_id": str(s.to_user_id), "action": s.action, "created_at": str(s.timestamp)}
-        for s in swipes_result.scalars().all()
-    ]
-
-    # Matches
-    matches_result = await db.execute(
-        select(Match).where((Match.user1_id == uid) | (Match.user2_id == uid)).order_by(Match.created_at)
-    )
-    matches = [
-        {"id": str(mt.id), "user1_id": str(mt.user1_id), "user2_id": str(mt.user2_id),
-         "created_at": str(mt.created_at)}
-        for mt in matches_result.scalars().all()
-    ]
-
-    # Reports filed by user
-    reports_result = await db.execute(
-        select(Report).where(Report.reporter_id == uid).order_by(Report.created_at)
-    )
-    reports = [
-        {"reported_id": str(r.reported_id), "reason": r.reason, "created_at": str(r.created_at)}
-        for r in reports_result.scalars().all()
-    ]
-
-    # Prompts & preferences
-    prompts_result = await db.execute(select(UserPrompt).where(UserPrompt.user_id == uid))
-    prompts = [
-        {"prompt": p.prompt_text, "answer": p.answer_text}
-        for p in prompts_result.scalars().all()
-    ]
-
-    prefs_result = await db.execute(select(UserPreference).where(UserPreference.user_id == uid))
-    prefs_row = prefs_result.scalar_one_or_none()
-    preferences = None
-    if prefs_row:
-        preferences = {
-            "min_age": prefs_row.min_age, "max_age": prefs_row.max_age,
-            "max_distance_km": prefs_row.max_distance_km,
-            "gender_preference": prefs_row.gender_preference,
-        }
 
-    return {
-        "export_date": str(datetime.now(timezone.utc)),
-        "user_profile": {
-            "id": str(current_user.id),
-            "name": current_user.name,
-            "email": current_user.email,
-            "phone": current_user.phone,
-            "telegram_id": current_user.telegram_id,
-            "bio": current_user.bio,
-            "interests": current_user.interests,
-            "photos": current_user.photos,
-            "gender": current_user.gender,
-            "age": current_user.age,
-            "location": {"lat": current_user.latitude, "lon": current_user.longitude} if current_user.latitude else None,
-            "created_at": str(current_user.created_at),
-            "status": current_user.status,
-            "role": current_user.role,
-            "subscription_tier": current_user.subscription_tier,
-        },
-        "preferences": preferences,
-        "prompts": prompts,
-        "messages_sent": messages,
-        "likes_given": likes,
-        "swipes": swipes,
-        "matches": matches,
-        "reports_filed": reports,
-        "privacy_note": "This is a complete export of your personal data stored on MambaX per GDPR Article 20."
-    }
+@router.get("/me/export/{job_id}/file")
+async def download_data_export_file(
+    job_id: uuid.UUID,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Архив с локального диска — только когда S3 не настроен."""
+    from backend.services.data_export import local_archive_path, export_filename
+
+    job = await _get_ready_export(db, job_id, current_user.id)
+    path = await local_archive_path(job)
+    if not path:
+        raise HTTPException(status_code=410, detail="Export archive is not available here")
+
+    return FileResponse(path, media_type="application/gzip", filename=export_filename(job))
@@ -21,6 +21,7 @@ router = APIRouter()
 
 
 from backend.models.user_management import VerificationRequest
+from backend.services.profile_cards import refresh_profile_cards
 
 
 @router.get("/me/verification-status")
@@ -96,6 +97,8 @@ async def upload_verification_photo(
     db.add(current_user)
     await db.commit()
     await db.refresh(current_user)
+    # is_verified лежит в снапшоте карточки — иначе бейдж виден ещё до 24ч
+    await refresh_profile_cards(db, [current_user.id])
     
     # Return response
     return UserResponse.model_validate(current_user)
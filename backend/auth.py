@@ -1,7 +1,6 @@
 import random
 import secrets
 import string
-import aiohttp
 import hmac
 import hashlib
 import json
@@ -214,19 +213,10 @@ async def send_otp_via_telegram(telegram_id: str, otp: str) -> bool:
     if not TELEGRAM_BOT_TOKEN:
         return False
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    from backend.services.telegram_sender import telegram_sender
+
     message = f"🔐  Ваш код: {otp}\n⏱️  Код истекает через 5 минут."
-    payload = {
-        "chat_id": telegram_id,
-        "text": message
-    }
-    
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(url, json=payload) as resp:
-                return resp.status == 200
-        except Exception:
-            return False
+    return await telegram_sender.send_message(telegram_id, message, parse_mode=None)
 
 
 # --- FastAPI Dependency for getting current user ---
@@ -21,6 +21,7 @@ from aiogram import Bot, Dispatcher
 # Import Routers
 from backend.telegram_bot.handlers.commands import router as commands_router
 from backend.telegram_bot.handlers.payment import router as payment_router
+from backend.services.telegram_sender import RateLimitMiddleware, telegram_limiter
 
 # Configure logging
 logging.basicConfig(
@@ -44,6 +45,8 @@ if not BOT_TOKEN:
 
 if BOT_TOKEN:
     bot = Bot(token=BOT_TOKEN)
+    # Ответы хендлеров идут через тот же лимитер, что и уведомления
+    bot.session.middleware(RateLimitMiddleware(telegram_limiter))
 else:
     bot = None
 
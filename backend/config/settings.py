@@ -37,6 +37,7 @@ class Settings(BaseSettings):
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: Optional[str] = None
+    TELEGRAM_API_URL: str = "https://api.telegram.org"  # override to point at a fake Bot API server
     
     # Vercel Blob Storage
     BLOB_READ_WRITE_TOKEN: Optional[str] = None
@@ -59,6 +60,7 @@ class Settings(BaseSettings):
     HUGGINGFACE_API_KEY: Optional[str] = None
     GEMINI_API_KEY: Optional[str] = None
     GROQ_API_KEY: Optional[str] = None
+    NSFW_BLOCK_UPLOADS: bool = False           # отклонять фото профиля локальным NSFW-классификатором при загрузке
     
     # Payments (Stripe)
     STRIPE_SECRET_KEY: Optional[str] = None
@@ -74,6 +76,24 @@ class Settings(BaseSettings):
     S3_ENDPOINT_URL: Optional[str] = None
     BACKUP_BUCKET: str = "app-backups"
     BACKUP_RETENTION_DAYS: int = 30
+    BACKUP_LOCAL_DIR: str = "/tmp/backups"     # таргет без S3 и staging для pg_dump -Fd
+    BACKUP_DUMP_JOBS: int = 1                  # >1: directory-формат, pg_dump -j N
+    BACKUP_VERIFY: bool = True                 # перечитать бэкап и сверить чек-суммы
+    
+    # GDPR data exports (archives are NOT served from static/)
+    DATA_EXPORT_DIR: str = str(BACKEND_DIR / "exports")
+    DATA_EXPORT_TTL_HOURS: int = 72
+    DATA_EXPORT_BUCKET: Optional[str] = None   # архивы в S3 (по умолчанию BACKUP_BUCKET); без S3 — DATA_EXPORT_DIR
+    DATA_EXPORT_URL_TTL_SECONDS: int = 900     # срок подписанной ссылки на скачивание
+
+    # Admin reports (CSV/XLSX, built in a process pool)
+    REPORT_DIR: str = str(BACKEND_DIR / "reports")
+    REPORT_TTL_HOURS: int = 24
+    REPORT_WORKERS: int = 2
+
+    # Instrumentation (backend.core.instrumentation)
+    SLOW_QUERY_MS: int = 200                   # медленнее — счётчик + лог с request id
+    METRICS_TOKEN: Optional[str] = None        # Bearer для /admin/system/metrics (Prometheus)
     
     # SMTP (Email)
     SMTP_SERVER: Optional[str] = None
@@ -84,6 +104,7 @@ class Settings(BaseSettings):
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
+    TRUSTED_PROXY_HOPS: int = 1                # сколько наших прокси дописывают X-Forwarded-For
 
     # Admin Configuration
     ADMIN_PHONE: str = ""
@@ -0,0 +1,392 @@
+"""
+Instrumentation: HTTP, SQL, Redis, WebSocket and event loop metrics.
+
+- MetricsMiddleware: pure ASGI, latency per route template (scope["route"]),
+  X-Request-ID in/out, request id + route in contextvars.
+- instrument_engine: SQLAlchemy cursor events, every statement timed under a
+  normalized SQL fingerprint; slow statements are counted and logged with the
+  request id (at most once per SLOW_LOG_INTERVAL per fingerprint).
+- instrument_redis: wraps execute_command / pipeline execute of a redis-py
+  client, one histogram series per command name.
+- LoopLagMonitor: periodic sleep, the overshoot is the event loop lag.
+
+Label cardinality is bounded by bounded_label(); past the limit values
+collapse into "other". Metrics are defined in backend/metrics.py.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+from backend.config.settings import settings
+from backend.metrics import (
+    HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT,
+    DB_QUERY_DURATION, DB_SLOW_QUERIES, DB_QUERY_ERRORS,
+    REDIS_COMMAND_DURATION, REDIS_COMMAND_ERRORS,
+    WS_MESSAGES, EVENT_LOOP_LAG, EVENT_LOOP_LAG_MAX,
+)
+
+logger = logging.getLogger(__name__)
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# scope запроса: шаблон роута появляется в нём только после роутинга
+_scope_var: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+MAX_FINGERPRINTS = 500
+MAX_LABEL_VALUES = 100
+SLOW_LOG_INTERVAL = 60.0        # сек: не чаще одного лога на fingerprint
+LOOP_LAG_INTERVAL = 0.5
+LOOP_LAG_WARN = 0.5
+LOOP_LAG_WINDOW = 60.0
+
+_label_values: Dict[str, Set[str]] = {}
+
+
+def bounded_label(family: str, value: str, limit: int = MAX_LABEL_VALUES) -> str:
+    """First `limit` distinct values per family are kept as-is, the rest become "other"."""
+    seen = _label_values.setdefault(family, set())
+    if value in seen:
+        return value
+    if len(seen) >= limit:
+        return "other"
+    seen.add(value)
+    return value
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return "unmatched"
+
+
+def current_route() -> Optional[str]:
+    scope = _scope_var.get()
+    return _route_template(scope) if scope is not None else None
+
+
+class MetricsMiddleware:
+    """Outermost ASGI middleware: request id + per-route latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        scope_token = _scope_var.set(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = _route_template(scope)
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], bounded_label("route", route, 1000), f"{status // 100}xx",
+            ).observe(duration)
+            request_id_var.reset(token)
+            _scope_var.reset(scope_token)
+
+
+# ============================================================================
+# SQL
+# ============================================================================
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<![:\w]):\w+|\?|__\[POSTCOMPILE_\w+\]")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))+", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+class QueryStat:
+    __slots__ = ("sql", "operation", "count", "total", "max", "errors")
+
+    def __init__(self, sql: str, operation: str):
+        self.sql = sql
+        self.operation = operation
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+
+_query_stats: Dict[str, QueryStat] = {}
+_slow_logged_at: Dict[str, float] = {}
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> Tuple[str, str, str]:
+    """(fingerprint id, operation, normalized SQL). Literals and parameters become '?'."""
+    sql = _STRING.sub("?", statement)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _SPACES.sub(" ", sql).strip()
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _VALUES_LIST.sub(r"VALUES \1, ...", sql)
+    operation = sql.split(" ", 1)[0].upper() if sql else "OTHER"
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        operation = "OTHER"
+    return hashlib.sha1(sql.encode()).hexdigest()[:12], operation, sql
+
+
+def _stat_for(statement: str) -> Tuple[str, QueryStat]:
+    fp, operation, sql = fingerprint(statement)
+    stat = _query_stats.get(fp)
+    if stat is None:
+        if len(_query_stats) >= MAX_FINGERPRINTS:
+            fp = "other"
+            stat = _query_stats.get(fp)
+            if stat is None:
+                stat = _query_stats[fp] = QueryStat("(fingerprint limit reached)", "OTHER")
+        else:
+            stat = _query_stats[fp] = QueryStat(sql, operation)
+    return fp, stat
+
+
+def record_query(statement: str, duration: float, failed: bool = False):
+    fp, stat = _stat_for(statement)
+    stat.count += 1
+    stat.total += duration
+    stat.max = max(stat.max, duration)
+    DB_QUERY_DURATION.labels(stat.operation, fp).observe(duration)
+    if failed:
+        stat.errors += 1
+        DB_QUERY_ERRORS.labels(fp).inc()
+
+    if duration * 1000 >= settings.SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.labels(fp).inc()
+        now = time.monotonic()
+        if now - _slow_logged_at.get(fp, -SLOW_LOG_INTERVAL) >= SLOW_LOG_INTERVAL:
+            _slow_logged_at[fp] = now
+            logger.warning(
+                f"Slow query {fp} {duration * 1000:.0f}ms "
+                f"request_id={request_id_var.get() or '-'} route={current_route() or '-'}: {stat.sql[:500]}"
+            )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if starts:
+        record_query(statement, time.perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts and exception_context.statement:
+        record_query(exception_context.statement, time.perf_counter() - starts.pop(), failed=True)
+
+
+def instrument_engine(engine):
+    """Attach timing hooks to an (async) engine. Idempotent."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def top_queries(limit: int = 20) -> List[Dict[str, Any]]:
+    stats = sorted(_query_stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+    return [
+        {
+            "fingerprint": fp,
+            "operation": s.operation,
+            "sql": s.sql[:1000],
+            "count": s.count,
+            "total_ms": round(s.total * 1000, 1),
+            "avg_ms": round(s.total / s.count * 1000, 2) if s.count else 0,
+            "max_ms": round(s.max * 1000, 1),
+            "errors": s.errors,
+        }
+        for fp, s in stats
+    ]
+
+
+# ============================================================================
+# REDIS
+# ============================================================================
+
+def _command_label(args) -> str:
+    name = args[0] if args else "UNKNOWN"
+    if isinstance(name, bytes):
+        name = name.decode("latin-1")
+    return bounded_label("redis", str(name).split(" ", 1)[0].upper())
+
+
+def instrument_redis(client):
+    """Time every command of a redis.asyncio client (and pipeline executes). Idempotent."""
+    if getattr(client, "_instrumented", False):
+        return client
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    async def timed_execute_command(*args, **options):
+        command = _command_label(args)
+        start = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        except Exception:
+            REDIS_COMMAND_ERRORS.labels(command).inc()
+            raise
+        finally:
+            REDIS_COMMAND_DURATION.labels(command).observe(time.perf_counter() - start)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def timed_execute(*a, **kw):
+            start = time.perf_counter()
+            try:
+                return await execute(*a, **kw)
+            except Exception:
+                REDIS_COMMAND_ERRORS.labels("PIPELINE").inc()
+                raise
+            finally:
+                REDIS_COMMAND_DURATION.labels("PIPELINE").observe(time.perf_counter() - start)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    client._instrumented = True
+    return client
+
+
+# ============================================================================
+# WEBSOCKET
+# ============================================================================
+
+def ws_message(direction: str, message_type: Optional[str]):
+    WS_MESSAGES.labels(direction, bounded_label(f"ws_{direction}", str(message_type or "unknown"), 50)).inc()
+
+
+# ============================================================================
+# EVENT LOOP
+# ============================================================================
+
+class LoopLagMonitor:
+    """Sleeps LOOP_LAG_INTERVAL in a loop; how late it wakes up is the loop lag."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.window_max = 0.0
+        self._window_started = 0.0
+        self._last_warning = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, lag: float, now: float):
+        self.last_lag = lag
+        EVENT_LOOP_LAG.observe(lag)
+        if now - self._window_started >= LOOP_LAG_WINDOW:
+            self._window_started = now
+            self.window_max = 0.0
+        self.window_max = max(self.window_max, lag)
+        EVENT_LOOP_LAG_MAX.set(self.window_max)
+        if lag >= LOOP_LAG_WARN and now - self._last_warning >= SLOW_LOG_INTERVAL:
+            self._last_warning = now
+            logger.warning(f"Event loop lag {lag * 1000:.0f}ms")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.record(max(0.0, now - scheduled), now)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+loop_monitor = LoopLagMonitor()
+
+
+# ============================================================================
+# SUMMARY
+# ============================================================================
+
+def histogram_summary(histogram, limit: int = 20) -> List[Dict[str, Any]]:
+    """count / avg / p95 (bucket upper bound) per label set, slowest total first."""
+    series: Dict[Tuple, Dict[str, Any]] = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            labels = {k: v for k, v in sample.labels.items() if k != "le"}
+            key = tuple(sorted(labels.items()))
+            entry = series.setdefault(key, {"labels": labels, "buckets": [], "count": 0, "sum": 0.0})
+            if sample.name.endswith("_bucket"):
+                entry["buckets"].append((float(sample.labels["le"]), sample.value))
+            elif sample.name.endswith("_count"):
+                entry["count"] = sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+
+    rows = []
+    for entry in series.values():
+        count = entry["count"]
+        if not count:
+            continue
+        p95 = None
+        for bound, cumulative in sorted(entry["buckets"]):
+            if cumulative >= 0.95 * count:
+                p95 = bound
+                break
+        rows.append({
+            **entry["labels"],
+            "count": int(count),
+            "total_ms": round(entry["sum"] * 1000, 1),
+            "avg_ms": round(entry["sum"] / count * 1000, 2),
+            "p95_ms": None if p95 is None or p95 == float("inf") else round(p95 * 1000, 1),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows[:limit]
@@ -1,5 +1,6 @@
 import redis.asyncio as redis
 from backend.core.config import settings
+from backend.core.instrumentation import instrument_redis
 import json
 import hashlib
 import logging
@@ -7,6 +8,9 @@ from typing import Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Блокирующие читатели: поток апдейтов Telegram + pub/sub фич-флагов (+ запас)
+BLOCKING_MAX_CONNECTIONS = 4
+
 
 class SafeRedisClient:
     """
@@ -159,6 +163,8 @@ class SafeRedisClient:
 class RedisManager:
     def __init__(self):
         self._redis: Optional[redis.Redis] = None
+        self._binary_redis: Optional[redis.Redis] = None
+        self._blocking_redis: Optional[redis.Redis] = None
         self._configured = bool(settings.REDIS_URL)
         self._client: Optional[SafeRedisClient] = None
         if not self._configured:
@@ -186,11 +192,59 @@ class RedisManager:
                     socket_timeout=5,
                     retry_on_error=[ConnectionError, TimeoutError],
                 )
+                instrument_redis(self._redis)
             except Exception as e:
                 logger.error(f"Failed to connect to Redis: {e}")
                 return None
         return self._redis
 
+    async def get_binary_redis(self) -> Optional[redis.Redis]:
+        """Client without response decoding — for binary payloads (msgpack)."""
+        if not self._configured:
+            return None
+        if self._binary_redis is None:
+            try:
+                self._binary_redis = await redis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=False,
+                    max_connections=10,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                    retry_on_error=[ConnectionError, TimeoutError],
+                )
+                instrument_redis(self._binary_redis)
+            except Exception as e:
+                logger.error(f"Failed to connect to Redis (binary): {e}")
+                return None
+        return self._binary_redis
+
+    async def get_blocking_redis(self) -> Optional[redis.Redis]:
+        """
+        Separate small pool for long-blocking reads (XREADGROUP block=, pub/sub
+        listen): they hold a connection while waiting and must not starve
+        request traffic on the shared pool.
+        """
+        if not self._configured:
+            return None
+        if self._blocking_redis is None:
+            try:
+                self._blocking_redis = await redis.from_url(
+                    settings.REDIS_URL,
+                    encoding="utf-8",
+                    decode_responses=True,
+                    max_connections=BLOCKING_MAX_CONNECTIONS,
+                    socket_connect_timeout=5,
+                    socket_timeout=None,        # ожидание сообщений не ограничено
+                    socket_keepalive=True,
+                    health_check_interval=30,
+                    retry_on_error=[ConnectionError, TimeoutError],
+                )
+                instrument_redis(self._blocking_redis)
+            except Exception as e:
+                logger.error(f"Failed to connect to Redis (blocking): {e}")
+                return None
+        return self._blocking_redis
+
     async def set_json(self, key: str, value: Any, expire: int = 3600):
         r = await self.get_redis()
         if r:
@@ -263,6 +317,10 @@ class RedisManager:
     async def close(self):
         if self._redis:
             await self._redis.close()
+        if self._binary_redis:
+            await self._binary_redis.close()
+        if self._blocking_redis:
+            await self._blocking_redis.close()
 
     # === Token Blacklist ===
     
@@ -15,8 +15,9 @@ from backend.schemas.interaction import SwipeCreate, SwipeAction
 async def get_user_feed(
     db: AsyncSession,
     user_id: UUID,
-    limit: int = 10
-) -> list[User]:
+    limit: int = 10,
+    ids_only: bool = False
+) -> list:
     """
     Получает ленту анкет для пользователя.
     
@@ -29,10 +30,13 @@ async def get_user_feed(
         db: Асинхронная сессия
         user_id: ID текущего пользователя
         limit: Максимальное количество анкет
+        ids_only: Вернуть только ID (карточки — services.profile_cards)
     
     Returns:
-        Список пользователей для показа
+        Список пользователей (или их ID) для показа
     """
+    entity = User.id if ids_only else User
+
     # Подзапрос: ID пользователей, которых мы уже свайпнули
     swiped_users_subquery = (
         select(Swipe.to_user_id)
@@ -47,7 +51,7 @@ async def get_user_feed(
     
     # Основной запрос: пользователи, которых еще НЕ свайпнули
     stmt = (
-        select(User)
+        select(entity)
         .where(
             and_(
                 User.id != user_id,           # Не показываем себя
@@ -67,7 +71,7 @@ async def get_user_feed(
     # Если нет новых профилей - показываем всех заново (бесконечная лента)
     if not profiles:
         stmt_all = (
-            select(User)
+            select(entity)
             .where(
                 and_(
                     User.id != user_id,
@@ -165,13 +169,17 @@ async def create_swipe(
             )
             db.add(db_match)
             await db.commit()
+
+            from backend.services.chat.presence import invalidate_partners
+            await invalidate_partners(from_user_id, swipe_data.to_user_id)
     
     return db_swipe, is_match
 
 
 async def get_user_matches(
     db: AsyncSession,
-    user_id: UUID
+    user_id: UUID,
+    load_users: bool = True
 ) -> list[Match]:
     """
     Получает все матчи пользователя с загруженными relationships.
@@ -179,12 +187,15 @@ async def get_user_matches(
     Args:
         db: Асинхронная сессия
         user_id: ID пользователя
+        load_users: Загружать user1/user2 (False — карточки берутся
+            из services.profile_cards)
     
     Returns:
         Список матчей
     """
-    from sqlalchemy.orm import selectinload
+    from sqlalchemy.orm import selectinload, noload
     
+    loader = selectinload if load_users else noload
     stmt = select(Match).where(
         and_(
             or_(
@@ -194,8 +205,8 @@ async def get_user_matches(
             Match.is_active == True
         )
     ).options(
-        selectinload(Match.user1),
-        selectinload(Match.user2),
+        loader(Match.user1),
+        loader(Match.user2),
     ).order_by(Match.created_at.desc())
     
     result = await db.execute(stmt)
@@ -33,6 +33,10 @@ async def block_user(db: AsyncSession, blocker_id: UUID, blocked_id: UUID, reaso
         m.is_active = False
         
     await db.commit()
+
+    if matches:
+        from backend.services.chat.presence import invalidate_partners
+        await invalidate_partners(blocker_id, blocked_id)
     return True
 
 async def create_report(db: AsyncSession, reporter_id: UUID, reported_id: UUID, reason: str, description: str = None):
@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from backend.core.security import hash_password
 from backend.models.user import User, Gender
 from backend.schemas.user import UserCreate
+from backend.services.profile_cards import invalidate_profile_cards, refresh_profile_cards
 
 
 def _generate_referral_code() -> str:
@@ -150,6 +151,7 @@ async def add_user_photo(db: AsyncSession, user: User, photo_url: str) -> User:
             user.is_complete = True
     
     await db.commit()
+    await refresh_profile_cards(db, [user.id])
     # Expire user to force reload of relationships on next access
     await db.refresh(user)
     
@@ -253,8 +255,9 @@ async def delete_user(db: AsyncSession, user_id: UUID) -> bool:
                     break
             
             # Clean up online/presence keys
-            await r.delete(f"user:online:{user_id_str}")
-            await r.delete(f"user:last_seen:{user_id_str}")
+            from backend.services.chat.presence import PRESENCE_KEY, PARTNERS_KEY
+            await r.zrem(PRESENCE_KEY, user_id_str)
+            await r.delete(PARTNERS_KEY.format(user_id_str))
             await r.delete(f"unread:{user_id_str}")
                 
             # Also remove from Geo Index
@@ -266,6 +269,7 @@ async def delete_user(db: AsyncSession, user_id: UUID) -> bool:
 
     await db.delete(user)
     await db.commit()
+    await invalidate_profile_cards([user_id])
     return True
 
 
@@ -369,6 +373,7 @@ async def update_profile(db: AsyncSession, user_id: str, update_data: UserCreate
         user.height = update_data.height
 
     await db.commit()
+    await refresh_profile_cards(db, [user.id])
     await db.refresh(user)
     return user
 
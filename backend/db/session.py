@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from sqlalchemy.pool import NullPool
 
 from backend.config.settings import settings
+from backend.core.instrumentation import instrument_engine
 
 
 # Database URL from settings - ONLY Neon PostgreSQL
@@ -63,6 +64,9 @@ engine_kwargs = {
 # Async Engine
 engine = create_async_engine(_async_url, **engine_kwargs)
 
+# Тайминги всех запросов по fingerprint (db_query_duration_seconds)
+instrument_engine(engine)
+
 # Async Session Factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -7,6 +7,7 @@ from contextlib import asynccontextmanager
 from sqlalchemy import text
 from pathlib import Path
 from dotenv import load_dotenv
+import asyncio
 import os
 import logging
 
@@ -130,6 +131,28 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"Failed to start scheduler: {e}")
     
+    # Feature flags: reload on admin changes published over Redis pub/sub
+    from backend.services.features import feature_service
+    feature_service.start_listener()
+    
+    # NSFW classifier: load + warm up in the background, uploads wait on it
+    from backend.services.nsfw_detection import nsfw_worker
+    asyncio.create_task(nsfw_worker.start())
+    
+    # Telegram: webhook updates are handled by queue workers, sends go through the rate-limited sender
+    from backend.services.telegram_updates import update_queue
+    from backend.services.telegram_sender import telegram_sender
+    if os.getenv("TELEGRAM_BOT_TOKEN"):
+        update_queue.start()
+    
+    # Payment webhooks only journal events; the worker applies them
+    from backend.services.payment_events import payment_worker
+    payment_worker.start()
+    
+    # Event loop lag sampler (exported as event_loop_lag_seconds)
+    from backend.core.instrumentation import loop_monitor
+    loop_monitor.start()
+    
     set_context("app", {
         "environment": settings.ENVIRONMENT,
         "version": os.getenv('APP_VERSION', '1.0.0')
@@ -138,6 +161,19 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("Shutting down...")
+    try:
+        from backend.services.chat.last_seen import last_seen_flusher
+        await last_seen_flusher.flush()
+    except Exception as e:
+        logger.warning(f"Final last_seen flush failed: {e}")
+    await nsfw_worker.stop()
+    await update_queue.stop()
+    await payment_worker.stop()
+    await telegram_sender.close()
+    await feature_service.stop_listener()
+    from backend.services.reporting import shutdown_executor
+    shutdown_executor()
+    await loop_monitor.stop()
     if settings.ENABLE_SCHEDULER:
         try:
             from backend.tasks.retention_calculator import stop_scheduler
@@ -266,6 +302,11 @@ async def rate_limit_middleware(request: Request, call_next):
             return JSONResponse(status_code=503, content={"detail": "Service temporarily unavailable"})
         return await call_next(request)
 
+# Added last so it is the outermost layer: timings include every middleware above,
+# and the route template is read after the router has matched
+from backend.core.instrumentation import MetricsMiddleware
+app.add_middleware(MetricsMiddleware)
+
 # --- Routers ---
 
 from backend.api.health import router as health_router
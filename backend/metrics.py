@@ -1,6 +1,41 @@
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
 # Metrics
 ACTIVE_USERS_GAUGE = Gauge("active_users", "Number of currently connected active users")
 MATCHES_COUNTER = Counter("matches_total", "Total number of matches formed")
 MESSAGES_COUNTER = Counter("messages_total", "Total number of messages sent")
+FEATURE_EXPOSURES = Counter(
+    "feature_flag_exposures_total", "Feature flag evaluations (once per request context)", ["flag", "enabled"]
+)
+
+# Instrumentation (backend.core.instrumentation). Label values are bounded:
+# route templates, SQL fingerprints, command names — never raw paths or ids.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being processed")
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by normalized fingerprint",
+    ["operation", "fingerprint"], buckets=LATENCY_BUCKETS,
+)
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ["fingerprint"])
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Statements that raised", ["fingerprint"])
+
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis command latency", ["command"], buckets=LATENCY_BUCKETS,
+)
+REDIS_COMMAND_ERRORS = Counter("redis_command_errors_total", "Redis commands that raised", ["command"])
+
+WS_CONNECTIONS = Gauge("ws_connections", "Open chat WebSocket connections", ["protocol"])
+WS_MESSAGES = Counter("ws_messages_total", "Chat WebSocket messages", ["direction", "type"])
+WS_MESSAGES_DROPPED = Counter("ws_messages_dropped_total", "Outbound WS events dropped for slow consumers", ["type"])
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay of a periodic asyncio wake-up beyond its schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_LAG_MAX = Gauge("event_loop_lag_max_seconds", "Worst event loop lag in the last window")
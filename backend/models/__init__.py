@@ -4,18 +4,19 @@ from .user import User
 from .interaction import Swipe, Match, Like, Report, Block
 from .chat import Message
 from .notification import PushSubscription
-from .advanced import AlgorithmSettings, Icebreaker, DatingEvent, Partner, CustomReport, AIUsageLog
+from .advanced import AlgorithmSettings, Icebreaker, DatingEvent, Partner, CustomReport, ReportJob, AIUsageLog
 from .moderation import ModerationLog, BannedUser, ModerationQueueItem, NSFWDetection, Appeal
 from .monetization import (
     SubscriptionPlan, UserSubscription, RevenueTransaction, 
-    PromoCode, PromoRedemption, PaymentGatewayLog,
+    PromoCode, PromoRedemption, PaymentGatewayLog, PaymentEvent,
     BoostPurchase, SuperLikePurchase,
-    GiftCategory, VirtualGift, GiftTransaction
+    GiftCategory, VirtualGift, GiftTransaction,
+    GiftSendCounter, StarLedgerEntry
 )
 from .analytics import DailyMetric, RetentionCohort, AnalyticsEvent
 from .marketing import MarketingCampaign, PushCampaign, EmailCampaign, Referral, AcquisitionChannel
-from .system import AuditLog, FeatureFlag, SecurityAlert, BackupStatus
-from .user_management import FraudScore, UserSegment, UserNote, VerificationRequest
+from .system import AuditLog, FeatureFlag, SecurityAlert, BackupStatus, ClientLog
+from .user_management import FraudScore, UserSegment, UserNote, VerificationRequest, DataExportJob
 from .profile_enrichment import UserPrompt, UserPreference
 
 # New models
@@ -38,7 +39,7 @@ from .location import (
 )
 from .notifications import (
     NotificationTemplate, NotificationLog,
-    UserNotificationPreference, InAppNotification,
+    UserNotificationPreference, InAppNotification, Broadcast,
 )
 from .content import (
     MediaUpload, PhotoModerationQueue, ContentFilter,
@@ -62,6 +63,7 @@ __all__ = [
     "DatingEvent",
     "Partner",
     "CustomReport",
+    "ReportJob",
     "AIUsageLog",
     "ModerationLog",
     "BannedUser",
@@ -74,11 +76,14 @@ __all__ = [
     "PromoCode", 
     "PromoRedemption", 
     "PaymentGatewayLog",
+    "PaymentEvent",
     "BoostPurchase", 
     "SuperLikePurchase",
     "GiftCategory",
     "VirtualGift",
     "GiftTransaction",
+    "GiftSendCounter",
+    "StarLedgerEntry",
     "DailyMetric",
     "RetentionCohort",
     "AnalyticsEvent",
@@ -91,6 +96,7 @@ __all__ = [
     "FeatureFlag",
     "SecurityAlert",
     "BackupStatus",
+    "ClientLog",
     "FraudScore",
     "UserSegment",
     "UserNote",
@@ -133,6 +139,7 @@ __all__ = [
     "NotificationLog",
     "UserNotificationPreference",
     "InAppNotification",
+    "Broadcast",
     # Content & Media
     "MediaUpload",
     "PhotoModerationQueue",
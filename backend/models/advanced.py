@@ -103,6 +103,34 @@ class CustomReport(Base):
     # Store custom SQL, list of columns, or filter parameters
     configuration: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
 
+
+class ReportJob(Base):
+    """
+    One run of a CustomReport. The CSV/XLSX file is written by a worker
+    process (backend.services.reporting) and served by the admin download
+    endpoint until expires_at.
+    """
+    __tablename__ = "report_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    report_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("custom_reports.id", ondelete="CASCADE"), index=True)
+    report_type: Mapped[str] = mapped_column(String(50))
+    format: Mapped[str] = mapped_column(String(10), default="xlsx") # csv, xlsx
+
+    status: Mapped[str] = mapped_column(String(20), default="pending") # pending, running, completed, failed, expired
+    rows_written: Mapped[int] = mapped_column(Integer, default=0)
+
+    file_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    size_bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    requested_by: Mapped[Optional[uuid.UUID]] = mapped_column(Uuid, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True) # running: bumped by the API process
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
 class AIUsageLog(Base):
     """
     Log of AI usage for analytics.
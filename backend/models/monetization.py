@@ -10,6 +10,7 @@ Database models for:
 - Refunds
 - Pricing A/B Tests
 - Payment Gateway Logs
+- Payment Events (webhook journal)
 """
 
 import uuid
@@ -19,9 +20,9 @@ from decimal import Decimal
 
 from sqlalchemy import (
     String, Integer, Boolean, Float, Text, DateTime, 
-    JSON, Uuid, Numeric, ForeignKey, Enum as SQLEnum, Index
+    JSON, Uuid, Numeric, ForeignKey, Enum as SQLEnum, Index, UniqueConstraint
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, synonym
 import enum
 
 from backend.db.base import Base
@@ -171,10 +172,11 @@ class RevenueTransaction(Base):
     )
     
     # Transaction details
-    type: Mapped[str] = mapped_column(
+    transaction_type: Mapped[str] = mapped_column(
         String(30), nullable=False,
         comment="subscription, boost, superlike, gift, feature"
     )
+    type = synonym("transaction_type")
     amount: Mapped[Decimal] = mapped_column(
         Numeric(10, 2), nullable=False
     )
@@ -425,6 +427,49 @@ class PaymentGatewayLog(Base):
     )
 
 
+class PaymentEvent(Base):
+    """
+    Journal of raw payment provider events
+
+    Webhooks only verify and insert here (unique per provider event id) and
+    acknowledge; backend.services.payment_events applies the state
+    transitions in a worker, marking the event processed in the same
+    transaction as its effects.
+    """
+    __tablename__ = "payment_events"
+    __table_args__ = (
+        UniqueConstraint("provider", "event_id", name="uq_payment_events_provider_event"),
+        Index("idx_payment_events_status_received", "status", "received_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        Uuid, primary_key=True, default=uuid.uuid4
+    )
+    provider: Mapped[str] = mapped_column(String(20), nullable=False)  # stripe, telegram
+    event_id: Mapped[str] = mapped_column(
+        String(255), nullable=False,
+        comment="Stripe event id / Telegram payment charge id"
+    )
+    event_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="pending",
+        comment="pending, processing, processed, failed"
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    result: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    received_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<PaymentEvent {self.provider}:{self.event_id} {self.status}>"
+
+
 class BoostPurchase(Base):
     """
     Profile boost purchases and usage
@@ -676,3 +721,59 @@ class GiftTransaction(Base):
     
     def __repr__(self) -> str:
         return f"<GiftTransaction {self.sender_id} -> {self.receiver_id}>"
+
+
+class GiftSendCounter(Base):
+    """
+    Sharded send counter for a virtual gift
+
+    Senders increment one of GIFT_COUNTER_SHARDS rows instead of the
+    VirtualGift row; VirtualGift.times_sent is rolled up from SUM(sent).
+    For limited gifts max_quantity is pre-split into per-shard capacity,
+    so sum(capacity) == max_quantity and enforcement stays exact.
+    """
+    __tablename__ = "gift_send_counters"
+
+    gift_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid, ForeignKey("virtual_gifts.id", ondelete="CASCADE"), primary_key=True
+    )
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sent: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    capacity: Mapped[Optional[int]] = mapped_column(
+        Integer, nullable=True, comment="NULL = unlimited"
+    )
+
+    def __repr__(self) -> str:
+        return f"<GiftSendCounter {self.gift_id}#{self.shard} {self.sent}/{self.capacity}>"
+
+
+class StarLedgerEntry(Base):
+    """
+    Append-only Telegram Stars ledger
+
+    One row per change of users.stars_balance, with the resulting balance
+    snapshot. Written by backend.services.star_ledger only.
+    """
+    __tablename__ = "star_ledger"
+    __table_args__ = (
+        Index("idx_star_ledger_user_created", "user_id", "created_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        Uuid, primary_key=True, default=uuid.uuid4
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    delta: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    balance_after: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    reason: Mapped[str] = mapped_column(
+        String(50), nullable=False,
+        comment="gift, gift_bonus, subscription, swipes, superlike, boost, spotlight, top_up, refund"
+    )
+    reference_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    custom_metadata: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"<StarLedgerEntry {self.user_id} {self.delta:+} -> {self.balance_after}>"
@@ -74,3 +74,30 @@ class InAppNotification(Base):
     is_read: Mapped[bool] = mapped_column(Boolean, default=False)
     read_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Broadcast(Base):
+    """
+    Admin broadcast. Delivered in chunks by backend.services.broadcasts;
+    `cursor` is the last user id sent, so a restarted worker resumes there.
+    """
+    __tablename__ = "broadcasts"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    admin_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
+    message: Mapped[str] = mapped_column(Text, nullable=False)
+    target: Mapped[str] = mapped_column(String(50), default="all")
+    channels: Mapped[List[str]] = mapped_column(JSON, default=list)  # ["push", "telegram"]
+
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)  # pending, running, completed, failed
+    cursor: Mapped[Optional[uuid.UUID]] = mapped_column(Uuid, nullable=True)
+    target_count: Mapped[int] = mapped_column(Integer, default=0)
+    sent_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # running: bumped per chunk
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
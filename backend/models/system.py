@@ -117,3 +117,24 @@ class AutoBanRule(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+
+
+class ClientLog(Base):
+    """
+    Aggregated client-side (WebApp) log entries.
+    One row per signature: identical errors are counted, not duplicated.
+    """
+    __tablename__ = "client_logs"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    signature: Mapped[str] = mapped_column(String(64), unique=True, index=True)  # sha256(level + normalized message + path)
+    level: Mapped[str] = mapped_column(String(10), index=True)  # LOG, INFO, WARN, ERROR
+    message: Mapped[str] = mapped_column(Text)
+    url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    ip: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    user_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # Last reporter
+    user_agent: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+
+    count: Mapped[int] = mapped_column(Integer, default=1)
+    first_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
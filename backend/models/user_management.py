@@ -23,6 +23,32 @@ class FraudScore(Base):
     
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+class DataExportJob(Base):
+    """
+    GDPR data export job (Article 20). The archive is a gzip'd NDJSON file
+    written incrementally by backend.services.data_export.
+    """
+    __tablename__ = "data_export_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+
+    status: Mapped[str] = mapped_column(String(20), default="pending") # pending, running, completed, failed, expired
+    progress: Mapped[int] = mapped_column(Integer, default=0) # 0-100
+    current_section: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    rows_written: Mapped[int] = mapped_column(Integer, default=0)
+
+    file_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    size_bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    checksum: Mapped[Optional[str]] = mapped_column(String(64), nullable=True) # sha256 of the archive
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True) # running: bumped by the worker
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
 class UserSegment(Base):
     """
     User segmentation for marketing and analytics.
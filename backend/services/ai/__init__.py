@@ -5,6 +5,7 @@ AI Service Package
 """
 
 from backend.services.ai.providers import AIService
+from backend.services.ai.gateway import AIGateway
 from backend.services.ai.recommendations import (
     calculate_compatibility,
     generate_daily_picks,
@@ -13,6 +14,8 @@ from backend.services.ai.recommendations import (
     get_question_of_the_day,
     suggest_smart_filters,
 )
+from backend.services.ai.co_like import record_like, recommend, recommend_batch
+from backend.services.ai.daily_picks import generate_all_daily_picks
 
 # Singleton — сохраняем обратную совместимость
 ai_service = AIService()
@@ -45,6 +48,7 @@ ai_service.calculate_compatibility = staticmethod(calculate_compatibility)
 
 __all__ = [
     "AIService",
+    "AIGateway",
     "ai_service",
     "calculate_compatibility",
     "generate_daily_picks",
@@ -52,4 +56,8 @@ __all__ = [
     "generate_conversation_prompts",
     "get_question_of_the_day",
     "suggest_smart_filters",
+    "generate_all_daily_picks",
+    "record_like",
+    "recommend",
+    "recommend_batch",
 ]
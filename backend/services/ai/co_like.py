@@ -0,0 +1,248 @@
+"""
+Co-Like Index - item-to-item recommendations over the swipes like matrix
+
+A = sparse user x user like matrix (row = who the user liked).
+The index keeps, for every liked user i, the top co-liked users j of
+Aᵀ·A (how many people liked both i and j) plus the column degree |likers(i)|.
+Similarity is cosine over likers: co(i, j) / sqrt(|likers(i)| * |likers(j)|).
+
+Redis keys (all bounded):
+    interactions:{user}:liked   LIST, last LIKES_WINDOW likes (row of A)
+    colike:{i}                  ZSET j -> co(i, j), top MAX_NEIGHBOURS
+    colike:degree               HASH i -> |likers(i)|
+
+Updates are incremental: record_like() adds the new like against the
+liker's recent likes. A full rebuild from swipes (store_graph) runs with
+the daily picks batch and also repopulates the like lists. Building the
+graph and counting Aᵀ·A is pure Python CPU work, so it runs in a worker
+thread (asyncio.to_thread) batch by batch; the event loop only does I/O.
+"""
+
+import asyncio
+import logging
+import math
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, and_, desc
+
+from backend.core.redis import redis_manager
+from backend.models.interaction import Swipe
+
+logger = logging.getLogger(__name__)
+
+LIKED_KEY = "interactions:{}:liked"
+CO_KEY = "colike:{}"
+DEGREE_KEY = "colike:degree"
+INDEX_TTL = 30 * 86400
+
+LIKES_WINDOW = 100          # длина списка лайков пользователя
+MAX_NEIGHBOURS = 200        # соседей на один профиль в colike:{i}
+UPDATE_WINDOW = 50          # с каким числом последних лайков связывается новый
+QUERY_LIKES = 30            # лайков пользователя на один запрос рекомендаций
+NEIGHBOURS_PER_LIKE = 50
+
+# Полная перестройка
+LOOKBACK_DAYS = 90
+MAX_LIKES_PER_USER = 200    # строка матрицы: последние N лайков
+MAX_LIKERS_PER_ITEM = 500   # столбец матрицы: последние N лайкнувших
+STREAM_BATCH = 5000
+WRITE_BATCH = 500
+
+
+class LikeGraph:
+    """Sparse user x user like matrix (row and column adjacency lists)."""
+
+    def __init__(self):
+        self.ids: List[uuid.UUID] = []
+        self.index: Dict[uuid.UUID, int] = {}
+        self.likes: Dict[int, List[int]] = defaultdict(list)
+        self.likers: Dict[int, List[int]] = defaultdict(list)
+
+    def _intern(self, user_id: uuid.UUID) -> int:
+        idx = self.index.get(user_id)
+        if idx is None:
+            idx = self.index[user_id] = len(self.ids)
+            self.ids.append(user_id)
+        return idx
+
+    def add_many(self, edges: Iterable[Tuple[uuid.UUID, uuid.UUID]]):
+        for liker, liked in edges:
+            self.add(liker, liked)
+
+    def add(self, liker: uuid.UUID, liked: uuid.UUID):
+        """Add an edge; newest first, so the caps keep the most recent likes."""
+        u, i = self._intern(liker), self._intern(liked)
+        # .get: строка/столбец появляются только вместе с принятым ребром
+        if len(self.likes.get(u, ())) < MAX_LIKES_PER_USER and len(self.likers.get(i, ())) < MAX_LIKERS_PER_ITEM:
+            self.likes[u].append(i)
+            self.likers[i].append(u)
+
+    def popular(self, n: int) -> List[uuid.UUID]:
+        top = sorted(self.likers.items(), key=lambda kv: len(kv[1]), reverse=True)[:n]
+        return [self.ids[i] for i, _ in top]
+
+    def co_likes(self, i: int, n: int = MAX_NEIGHBOURS) -> List[Tuple[int, int]]:
+        """Row i of Aᵀ·A: top-n (j, co-like count), j != i."""
+        counts = Counter(j for v in self.likers[i] for j in self.likes[v] if j != i)
+        return counts.most_common(n)
+
+    def co_like_rows(self, items: List[int]) -> List[Tuple[str, Dict[str, int], int]]:
+        """(item id, {neighbour id: co-like count}, degree) for a batch of columns."""
+        return [
+            (
+                str(self.ids[i]),
+                {str(self.ids[j]): count for j, count in self.co_likes(i)},
+                len(self.likers[i]),
+            )
+            for i in items
+        ]
+
+
+async def build_like_graph(db, since: Optional[datetime] = None) -> LikeGraph:
+    """Stream recent likes once (server-side cursor) into a LikeGraph."""
+    since = since or datetime.utcnow() - timedelta(days=LOOKBACK_DAYS)
+    graph = LikeGraph()
+    result = await db.stream(
+        select(Swipe.from_user_id, Swipe.to_user_id)
+        .where(Swipe.action.in_(["like", "superlike"]), Swipe.timestamp >= since)
+        .order_by(Swipe.timestamp.desc())
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    async for partition in result.partitions(STREAM_BATCH):
+        # Граф не трогается больше никем, пока идёт сборка
+        await asyncio.to_thread(graph.add_many, partition)
+    return graph
+
+
+async def store_graph(graph: LikeGraph) -> int:
+    """Replace the Redis index with Aᵀ·A computed from the graph. Returns rows written."""
+    r = await redis_manager.get_redis()
+    if not r:
+        return 0
+
+    written = 0
+    items = list(graph.likers)
+    for start in range(0, len(items), WRITE_BATCH):
+        rows = await asyncio.to_thread(graph.co_like_rows, items[start:start + WRITE_BATCH])
+        async with r.pipeline(transaction=False) as pipe:
+            for item_id, row, degree in rows:
+                key = CO_KEY.format(item_id)
+                pipe.delete(key)
+                if row:
+                    pipe.zadd(key, row)
+                    pipe.expire(key, INDEX_TTL)
+                pipe.hset(DEGREE_KEY, item_id, degree)
+                written += 1
+            await pipe.execute()
+
+    # Списки лайков: после потери Redis рекомендации снова работают
+    users = [u for u, row in graph.likes.items() if row]
+    for start in range(0, len(users), WRITE_BATCH):
+        async with r.pipeline(transaction=False) as pipe:
+            for u in users[start:start + WRITE_BATCH]:
+                key = LIKED_KEY.format(graph.ids[u])
+                pipe.delete(key)
+                pipe.rpush(key, *[str(graph.ids[i]) for i in graph.likes[u][:LIKES_WINDOW]])
+            await pipe.execute()
+
+    logger.info(f"Co-like index rebuilt: {written} rows, {len(users)} like lists")
+    return written
+
+
+async def record_like(liker_id: Any, liked_id: Any):
+    """Incremental update for a new like (call after the swipe is stored)."""
+    r = await redis_manager.get_redis()
+    if not r:
+        return
+    liked = str(liked_id)
+    history_key = LIKED_KEY.format(liker_id)
+    try:
+        recent = [j for j in await r.lrange(history_key, 0, UPDATE_WINDOW - 1) if j != liked]
+        async with r.pipeline(transaction=False) as pipe:
+            for j in recent:
+                pipe.zincrby(CO_KEY.format(liked), 1, j)
+                pipe.zincrby(CO_KEY.format(j), 1, liked)
+                pipe.zremrangebyrank(CO_KEY.format(j), 0, -(MAX_NEIGHBOURS + 1))
+                pipe.expire(CO_KEY.format(j), INDEX_TTL)
+            pipe.zremrangebyrank(CO_KEY.format(liked), 0, -(MAX_NEIGHBOURS + 1))
+            pipe.expire(CO_KEY.format(liked), INDEX_TTL)
+            pipe.hincrby(DEGREE_KEY, liked, 1)
+            pipe.lpush(history_key, liked)
+            pipe.ltrim(history_key, 0, LIKES_WINDOW - 1)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Co-like update failed for {liker_id}: {e}")
+
+
+async def recent_likes(user_id: Any, limit: int = QUERY_LIKES, db=None) -> List[str]:
+    """User's latest likes from Redis, falling back to swipes when db is given."""
+    liked = await redis_manager.client.lrange(LIKED_KEY.format(user_id), 0, limit - 1)
+    if liked or db is None:
+        return liked
+    u_id = uuid.UUID(str(user_id))
+    result = await db.execute(
+        select(Swipe.to_user_id)
+        .where(and_(Swipe.from_user_id == u_id, Swipe.action.in_(["like", "superlike"])))
+        .order_by(desc(Swipe.timestamp))
+        .limit(limit)
+    )
+    return [str(row[0]) for row in result.all()]
+
+
+async def recommend_batch(
+    likes_by_user: Dict[str, List[str]],
+    k: int = 50,
+    exclude: Optional[Dict[str, Set[str]]] = None,
+) -> Dict[str, List[Tuple[str, float]]]:
+    """
+    Top-k (user_id, score) for many users in two Redis round trips.
+    likes_by_user: {user_id: recent liked ids}; exclude: {user_id: ids to skip}.
+    """
+    r = await redis_manager.get_redis()
+    if not r or not any(likes_by_user.values()):
+        return {uid: [] for uid in likes_by_user}
+
+    items = list(dict.fromkeys(i for liked in likes_by_user.values() for i in liked))
+    async with r.pipeline(transaction=False) as pipe:
+        for i in items:
+            pipe.zrevrange(CO_KEY.format(i), 0, NEIGHBOURS_PER_LIKE - 1, withscores=True)
+        rows = dict(zip(items, await pipe.execute()))
+
+    nodes = list(dict.fromkeys(items + [j for row in rows.values() for j, _ in row]))
+    degree = dict(zip(nodes, await r.hmget(DEGREE_KEY, nodes)))
+
+    result = {}
+    for uid, liked in likes_by_user.items():
+        skip = set(liked) | {uid} | (exclude or {}).get(uid, set())
+        scores: Dict[str, float] = defaultdict(float)
+        for i in liked:
+            d_i = float(degree.get(i) or 0)
+            for j, co in rows.get(i, []):
+                d_j = float(degree.get(j) or 0)
+                if j not in skip and d_i and d_j:
+                    scores[j] += co / math.sqrt(d_i * d_j)
+        result[uid] = sorted(scores.items(), key=lambda js: js[1], reverse=True)[:k]
+    return result
+
+
+async def recommend(
+    user_id: Any,
+    k: int = 50,
+    exclude: Optional[Iterable[Any]] = None,
+    db=None,
+) -> List[Tuple[str, float]]:
+    """
+    Top-k (user_id, score) for one user: sum of item-item cosine similarity
+    to the user's recent likes. Already liked users and `exclude` are skipped.
+    """
+    uid = str(user_id)
+    try:
+        liked = await recent_likes(uid, db=db)
+        skip = {uid: {str(x) for x in exclude}} if exclude else None
+        return (await recommend_batch({uid: liked}, k=k, exclude=skip))[uid]
+    except Exception as e:
+        logger.warning(f"Co-like recommend failed for {uid}: {e}")
+        return []
@@ -0,0 +1,183 @@
+"""
+Conversation Starters - pre-generated icebreakers and conversation prompts per match
+
+Icebreakers: when a match is created, a background task asks the LLM once
+for INVENTORY_SIZE icebreakers and stores them as a Redis list. The chat
+API serves the head of the list (LRANGE, O(1)); "refresh" drops the served
+batch and, when the list runs low, tops it up in the background.
+
+Conversation prompts: a periodic job finds chats that just went quiet
+(last message 24-48h ago) and writes prompts under the key the
+/chat/conversation-prompts endpoint already reads.
+
+The live LLM path in the API is only a fallback for a miss.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import select, func
+
+from backend.core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+ICEBREAKERS_KEY = "icebreakers:inv:{}"
+GENERATING_KEY = "icebreakers:gen:{}"
+PROMPTS_KEY = "conversation_prompts:{}"     # тот же ключ, что у /chat/conversation-prompts
+INVENTORY_SIZE = 9
+SERVE_COUNT = 3
+INVENTORY_TTL = 7 * 86400
+PROMPTS_TTL = 86400
+
+STALL_AFTER = timedelta(hours=24)
+STALL_WINDOW = timedelta(hours=24)          # подсказки только для "свежих" пауз
+STALLED_BATCH = 200
+PARALLEL_GENERATIONS = 5
+
+
+def _session(session_factory):
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+    return session_factory
+
+
+async def prepare_icebreakers(match_id: Any, session_factory=None) -> int:
+    """Generate the icebreaker inventory for a match. Returns items stored."""
+    from backend.models.interaction import Match
+    from backend.services.ai import ai_service
+    from backend.services.ai.recommendations import pair_context
+    from backend.services.profile_cards import get_profile_cards
+
+    r = await redis_manager.get_redis()
+    if not r:
+        return 0
+    # Одна генерация на матч за раз (матч + частые refresh)
+    if not await r.set(GENERATING_KEY.format(match_id), "1", nx=True, ex=60):
+        return 0
+    session_factory = _session(session_factory)
+    try:
+        async with session_factory() as db:
+            match = await db.get(Match, uuid.UUID(str(match_id)))
+            if not match:
+                return 0
+            cards = await get_profile_cards(db, [match.user1_id, match.user2_id])
+        user1, user2 = cards.get(str(match.user1_id)), cards.get(str(match.user2_id))
+        if not user1 or not user2:
+            return 0
+
+        # Инвентарь сам по себе кэш: при пополнении нужны новые варианты
+        suggestions, _ = await ai_service.generate_content(
+            "icebreaker", context=pair_context(user1, user2), tone="friendly",
+            count=INVENTORY_SIZE, cache=False,
+        )
+        suggestions = [s for s in suggestions if s]
+        if not suggestions:
+            return 0
+        key = ICEBREAKERS_KEY.format(match_id)
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, *suggestions)
+            pipe.expire(key, INVENTORY_TTL)
+            await pipe.execute()
+        return len(suggestions)
+    except Exception as e:
+        logger.warning(f"Icebreaker inventory failed for match {match_id}: {e}")
+        return 0
+    finally:
+        await r.delete(GENERATING_KEY.format(match_id))
+
+
+async def get_icebreakers(match_id: Any, refresh: bool = False) -> Optional[List[str]]:
+    """
+    Serve icebreakers from the inventory. None on a miss (caller falls back
+    to live generation). refresh=True skips the batch served last time.
+    """
+    r = await redis_manager.get_redis()
+    if not r:
+        return None
+    key = ICEBREAKERS_KEY.format(match_id)
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            if refresh:
+                pipe.ltrim(key, SERVE_COUNT, -1)
+            pipe.lrange(key, 0, SERVE_COUNT - 1)
+            pipe.llen(key)
+            results = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Icebreaker inventory read failed: {e}")
+        return None
+
+    batch, remaining = results[-2], results[-1]
+    if remaining < SERVE_COUNT * 2:
+        # Запас на исходе — пополняем в фоне, пользователь не ждёт
+        _spawn(prepare_icebreakers(match_id))
+    return batch if len(batch) == SERVE_COUNT else None
+
+
+_background: set = set()
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def refresh_stalled_prompts(session_factory=None) -> int:
+    """Pre-generate conversation prompts for chats that recently went quiet."""
+    from backend.models.chat import Message
+    from backend.services.ai import ai_service
+
+    r = await redis_manager.get_redis()
+    if not r:
+        return 0
+    session_factory = _session(session_factory)
+
+    now = datetime.utcnow()
+    last_message = func.max(Message.created_at)
+    # Более новые сообщения тоже попадают в WHERE, так что max() остаётся верным
+    stalled = (
+        select(Message.match_id)
+        .where(Message.created_at >= now - STALL_AFTER - STALL_WINDOW)
+        .group_by(Message.match_id)
+        .having(last_message < now - STALL_AFTER)
+        .order_by(Message.match_id)
+        .limit(STALLED_BATCH)
+    )
+
+    # Листаем по match_id мимо чатов, у которых подсказки уже есть,
+    # иначе каждый запуск упирался бы в одни и те же STALLED_BATCH матчей
+    match_ids: list = []
+    cursor = None
+    async with session_factory() as db:
+        while len(match_ids) < STALLED_BATCH:
+            query = stalled if cursor is None else stalled.where(Message.match_id > cursor)
+            page = [row[0] for row in (await db.execute(query)).all()]
+            if not page:
+                break
+            cursor = page[-1]
+            existing = await r.mget([PROMPTS_KEY.format(mid) for mid in page])
+            match_ids += [str(mid) for mid, value in zip(page, existing) if not value]
+            if len(page) < STALLED_BATCH:
+                break
+    match_ids = match_ids[:STALLED_BATCH]
+    if not match_ids:
+        return 0
+
+    semaphore = asyncio.Semaphore(PARALLEL_GENERATIONS)
+
+    async def generate(mid: str) -> bool:
+        async with semaphore:
+            async with session_factory() as db:
+                prompts = await ai_service.generate_conversation_prompts(mid, db, count=SERVE_COUNT)
+            if prompts:
+                await redis_manager.set_json(PROMPTS_KEY.format(mid), prompts, expire=PROMPTS_TTL)
+            return bool(prompts)
+
+    done = await asyncio.gather(*(generate(mid) for mid in match_ids), return_exceptions=True)
+    generated = sum(1 for ok in done if ok is True)
+    logger.info(f"Conversation prompts pre-generated for {generated}/{len(match_ids)} stalled chats")
+    return generated
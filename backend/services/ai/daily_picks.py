@@ -0,0 +1,168 @@
+"""
+Daily Picks Batch - offline generation of daily picks for all active users
+
+Runs once a day before the 9:00 notification:
+1. One pass over recent likes builds the sparse like matrix, which also
+   rebuilds the co-like index (services/ai/co_like).
+2. Candidates per user come from co_like.recommend_batch (item-item cosine
+   over likers); users without likes get popular profiles.
+3. Users are processed in chunks, several chunks concurrently; each chunk
+   does one query for already-swiped pairs and one batched profile lookup.
+4. Picks land in the same Redis key the /discover/daily-picks endpoint
+   reads, so serving is a single GET. On-demand generation stays as the
+   fallback for a miss.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+
+from backend.core.redis import redis_manager
+from backend.models.interaction import Swipe
+from backend.models.user import User
+from backend.services.ai.co_like import LikeGraph, build_like_graph, store_graph, recommend_batch, QUERY_LIKES
+from backend.services.ai.recommendations import calculate_compatibility
+
+logger = logging.getLogger(__name__)
+
+PICKS_KEY = "daily_picks:{}:{}"      # тот же ключ, что читает /discover/daily-picks
+PICKS_TTL = 86400
+PICKS_LIMIT = 5
+
+CANDIDATES_PER_USER = 50
+POPULAR_POOL = 200          # фолбэк для пользователей без лайков
+
+CHUNK_SIZE = 200
+PARALLEL_CHUNKS = 4
+
+
+def _pick(user: Dict[str, Any], candidate: Dict[str, Any]) -> Dict[str, Any]:
+    common = list(set(user["interests"]) & set(candidate["interests"]))
+    reasoning = (
+        f"Вам может понравиться, потому что вы оба любите {', '.join(common[:2])}"
+        if common else "У вас отличная совместимость по интересам!"
+    )
+    return {
+        "id": candidate["id"],
+        "name": candidate["name"],
+        "age": candidate["age"],
+        "photos": candidate["photos"],
+        "compatibility_score": calculate_compatibility(user, candidate),
+        "common_interests": common,
+        "ai_reasoning": reasoning,
+    }
+
+
+def rank_picks(
+    user: Dict[str, Any],
+    candidates: List[Tuple[str, float]],
+    popular: List[uuid.UUID],
+    cards: Dict[str, Dict[str, Any]],
+    seen: set,
+    limit: int = PICKS_LIMIT,
+) -> List[Dict[str, Any]]:
+    """Filter candidates (inactive, already swiped) and order by compatibility."""
+    pool = list(candidates)
+    if not pool:
+        # Нет лайков — популярные профили противоположного пола
+        pool = [
+            (str(c), 0.0) for c in popular
+            if str(c) in cards and cards[str(c)]["gender"] != user["gender"]
+        ]
+
+    picks = []
+    for cid, score in pool:
+        card = cards.get(cid)
+        if not card or not card["is_active"] or cid == user["id"] or cid in seen:
+            continue
+        picks.append((_pick(user, card), score))
+    picks.sort(key=lambda ps: (ps[0]["compatibility_score"], ps[1]), reverse=True)
+    return [p for p, _ in picks[:limit]]
+
+
+async def _build_chunk(session_factory, graph: LikeGraph, popular: List[uuid.UUID], user_ids: List[uuid.UUID], day: str) -> List[uuid.UUID]:
+    from backend.services.profile_cards import get_profile_cards
+
+    likes = {
+        str(uid): [str(graph.ids[i]) for i in graph.likes.get(graph.index.get(uid), [])[:QUERY_LIKES]]
+        for uid in user_ids
+    }
+    candidates = await recommend_batch(likes, k=CANDIDATES_PER_USER)
+    pool = {uuid.UUID(c) for cands in candidates.values() for c, _ in cands} | set(popular)
+
+    async with session_factory() as db:
+        swiped = await db.execute(
+            select(Swipe.from_user_id, Swipe.to_user_id)
+            .where(Swipe.from_user_id.in_(user_ids), Swipe.to_user_id.in_(pool))
+        ) if pool else None
+        seen: Dict[uuid.UUID, set] = defaultdict(set)
+        for from_id, to_id in (swiped.all() if swiped else []):
+            seen[from_id].add(str(to_id))
+        cards = await get_profile_cards(db, list(user_ids) + list(pool), view="snapshot")
+
+    results = {}
+    for uid in user_ids:
+        user = cards.get(str(uid))
+        if user:
+            results[uid] = rank_picks(user, candidates[str(uid)], popular, cards, seen[uid])
+        await asyncio.sleep(0)   # не держать event loop на всём чанке
+
+    r = await redis_manager.get_redis()
+    async with r.pipeline(transaction=False) as pipe:
+        for uid, picks in results.items():
+            pipe.set(PICKS_KEY.format(uid, day), json.dumps(picks), ex=PICKS_TTL)
+        await pipe.execute()
+    return [uid for uid, picks in results.items() if picks]
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def generate_all_daily_picks(session_factory=None) -> List[uuid.UUID]:
+    """
+    Precompute today's picks for every active user.
+    Returns ids of users who got at least one pick.
+    """
+    if not await redis_manager.get_redis():
+        logger.warning("Daily picks batch skipped: Redis is not configured")
+        return []
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+
+    async with session_factory() as db:
+        graph = await build_like_graph(db)
+        result = await db.execute(select(User.id).where(User.is_active == True))
+        user_ids = [row[0] for row in result.all()]
+
+    try:
+        await store_graph(graph)
+    except Exception as e:
+        # Пики всё равно строим: по прошлому индексу и популярным
+        logger.error(f"Co-like index rebuild failed: {e}")
+    popular = await asyncio.to_thread(graph.popular, POPULAR_POOL)
+    day = date.today().isoformat()
+    semaphore = asyncio.Semaphore(PARALLEL_CHUNKS)
+
+    async def run(chunk):
+        async with semaphore:
+            try:
+                return await _build_chunk(session_factory, graph, popular, chunk, day)
+            except Exception as e:
+                logger.error(f"Daily picks chunk failed ({len(chunk)} users): {e}")
+                return []
+
+    done = await asyncio.gather(*(run(chunk) for chunk in _chunks(user_ids, CHUNK_SIZE)))
+    with_picks = [uid for chunk in done for uid in chunk]
+    logger.info(
+        f"Daily picks generated: {len(with_picks)}/{len(user_ids)} users, "
+        f"graph {len(graph.ids)} nodes"
+    )
+    return with_picks
@@ -0,0 +1,307 @@
+"""
+AI Gateway - single entry point for LLM calls
+
+- Providers keep one client each for the process lifetime (connection reuse).
+- Responses are cached by a content hash of (provider, model, prompt):
+  a small in-process LRU in front of Redis, TTL per content type.
+- Concurrent identical prompts are coalesced: one upstream call, every
+  caller gets its result (single-flight).
+- Each provider has a concurrency limit and a timeout.
+- Token/cost accounting is buffered (Redis list, in-process fallback) and
+  written to ai_usage_logs in batches by flush_usage().
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "ai:resp:{}"
+USAGE_BUFFER_KEY = "ai:usage:buffer"
+USAGE_BATCH_KEY = "ai:usage:batch"
+LOCAL_CACHE_SIZE = 512
+LOCAL_USAGE_MAX = 10000
+
+# Сколько живёт ответ в кэше, по типу контента (0 — не кэшировать)
+CACHE_TTL = {
+    "icebreaker": 7 * 86400,
+    "question": 86400,
+    "conversation_prompts": 3600,
+    "bio": 3600,
+}
+DEFAULT_CACHE_TTL = 3600
+
+# USD за 1K токенов (вход+выход усреднённо)
+PRICING = {
+    "gpt-4": 0.045,
+    "llama-3.1-8b-instant": 0.00007,
+    "deepseek-chat": 0.0007,
+    "gemini-1.5-flash": 0.0002,
+}
+
+SYSTEM_PROMPT = "You are a creative assistant for a dating app. Be concise."
+
+
+class LLMProvider:
+    """Base provider: subclasses implement _complete(). Holds limits, not clients."""
+
+    name = "base"
+    model = "none"
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 15.0):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+
+    async def complete(self, prompt: str, max_tokens: int) -> Tuple[str, int]:
+        async with self.semaphore:
+            return await asyncio.wait_for(self._complete(prompt, max_tokens), self.timeout)
+
+    async def _complete(self, prompt: str, max_tokens: int) -> Tuple[str, int]:
+        raise NotImplementedError
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """OpenAI, Groq and DeepSeek (same chat completions API)."""
+
+    def __init__(self, name: str, model: str, api_key: str, base_url: Optional[str] = None, **limits):
+        super().__init__(**limits)
+        self.name = name
+        self.model = model
+        self._client_kwargs = {"api_key": api_key, "base_url": base_url, "timeout": self.timeout, "max_retries": 1}
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            self._client = openai.AsyncOpenAI(**self._client_kwargs)
+        return self._client
+
+    async def _complete(self, prompt: str, max_tokens: int) -> Tuple[str, int]:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=max_tokens,
+        )
+        usage = response.usage.total_tokens if response.usage else 0
+        return response.choices[0].message.content, usage
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    model = "gemini-1.5-flash"
+
+    def __init__(self, api_key: str, **limits):
+        super().__init__(**limits)
+        self._api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self._api_key)
+        return self._client
+
+    async def _complete(self, prompt: str, max_tokens: int) -> Tuple[str, int]:
+        # Нативный async-клиент SDK вместо to_thread на каждый вызов
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+        meta = getattr(response, "usage_metadata", None)
+        return response.text, getattr(meta, "total_token_count", 0) or 0
+
+
+class SimulationProvider(LLMProvider):
+    """Local fake provider: no network, echoes the prompt (tests, no API keys)."""
+
+    name = "simulation"
+    model = "simulation"
+
+    def __init__(self, delay: float = 0.1, **limits):
+        super().__init__(**limits)
+        self.delay = delay
+        self.calls = 0
+
+    async def _complete(self, prompt: str, max_tokens: int) -> Tuple[str, int]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return prompt, 0
+
+
+def parse_suggestions(content: str, count: int) -> List[str]:
+    suggestions = [line.strip("- *").strip() for line in content.split("\n") if line.strip() and len(line.strip()) > 5][:count]
+    return suggestions or [content]
+
+
+class AIGateway:
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self._local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._usage: deque = deque(maxlen=LOCAL_USAGE_MAX)
+
+    def cache_key(self, prompt: str, max_tokens: int) -> str:
+        raw = json.dumps([self.provider.name, self.provider.model, SYSTEM_PROMPT, prompt, max_tokens])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    # --- cache -----------------------------------------------------------
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._local[key] = value
+        self._local.move_to_end(key)
+        while len(self._local) > LOCAL_CACHE_SIZE:
+            self._local.popitem(last=False)
+
+    async def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        if key in self._local:
+            self._local.move_to_end(key)
+            return self._local[key]
+        try:
+            value = await redis_manager.get_json(CACHE_KEY.format(key))
+        except Exception as e:
+            logger.warning(f"AI cache read error: {e}")
+            return None
+        if value:
+            self._remember(key, value)
+        return value
+
+    async def _store(self, key: str, value: Dict[str, Any], ttl: int):
+        self._remember(key, value)
+        try:
+            await redis_manager.set_json(CACHE_KEY.format(key), value, expire=ttl)
+        except Exception as e:
+            logger.warning(f"AI cache write error: {e}")
+
+    # --- usage -----------------------------------------------------------
+
+    async def _record_usage(self, feature: str, tokens: int, cost: float, user_id: Optional[str]):
+        entry = {
+            "feature": feature[:50], "model": self.provider.model, "tokens_used": tokens,
+            "cost": cost, "user_id": user_id, "timestamp": datetime.utcnow().isoformat(),
+        }
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                await r.rpush(USAGE_BUFFER_KEY, json.dumps(entry))
+                return
+            except Exception as e:
+                logger.warning(f"AI usage buffer error: {e}")
+        self._usage.append(entry)
+
+    async def flush_usage(self, db) -> int:
+        """Write buffered usage rows to ai_usage_logs in one INSERT."""
+        from sqlalchemy import insert
+        from backend.models.advanced import AIUsageLog
+
+        local = [self._usage.popleft() for _ in range(len(self._usage))]
+        buffered: List[str] = []
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                await r.rename(USAGE_BUFFER_KEY, USAGE_BATCH_KEY)
+                buffered = await r.lrange(USAGE_BATCH_KEY, 0, -1)
+            except Exception:
+                buffered = []   # буфер пуст (RENAME на несуществующий ключ)
+
+        rows = local + [json.loads(raw) for raw in buffered]
+        if not rows:
+            return 0
+        try:
+            for row in rows:
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+            await db.execute(insert(AIUsageLog), rows)
+            await db.commit()
+        except Exception as e:
+            logger.error(f"AI usage flush failed: {e}")
+            await db.rollback()
+            self._usage.extend(local)
+            if buffered:
+                await r.rpush(USAGE_BUFFER_KEY, *buffered)
+        finally:
+            if buffered:
+                await r.delete(USAGE_BATCH_KEY)
+        return len(rows)
+
+    # --- calls -----------------------------------------------------------
+
+    async def _call(self, key: str, prompt: str, max_tokens: int, feature: str, user_id: Optional[str]) -> Dict[str, Any]:
+        text, tokens = await self.provider.complete(prompt, max_tokens)
+        cost = round(tokens / 1000 * PRICING.get(self.provider.model, 0), 6)
+        await self._record_usage(feature, tokens, cost, user_id)
+        return {"text": text, "tokens": tokens, "cost": cost}
+
+    async def complete(
+        self,
+        prompt: str,
+        feature: str,
+        max_tokens: int = 300,
+        user_id: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Cached, coalesced completion. Returns (text, usage) where usage has
+        tokens, cost, model and cached (True when no upstream call was made).
+        """
+        ttl = CACHE_TTL.get(feature, DEFAULT_CACHE_TTL) if ttl is None else ttl
+        key = self.cache_key(prompt, max_tokens)
+
+        if ttl:
+            hit = await self._cached(key)
+            if hit:
+                return hit["text"], {"tokens": 0, "cost": 0, "model": self.provider.model, "cached": True}
+
+        # Single-flight: одинаковые одновременные запросы ждут один вызов
+        inflight = self._inflight.get(key)
+        if inflight:
+            result = await asyncio.shield(inflight)
+            return result["text"], {"tokens": 0, "cost": 0, "model": self.provider.model, "cached": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._call(key, prompt, max_tokens, feature, user_id)
+            if ttl:
+                await self._store(key, result, ttl)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()   # помечаем как полученное — без "never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        return result["text"], {
+            "tokens": result["tokens"], "cost": result["cost"],
+            "model": self.provider.model, "cached": False,
+        }
+
+
+def build_provider(openai_key=None, deepseek_key=None, gemini_key=None, groq_key=None) -> LLMProvider:
+    """Priority: Groq > Gemini > DeepSeek > OpenAI > simulation."""
+    if groq_key:
+        return OpenAICompatibleProvider(
+            "groq", "llama-3.1-8b-instant", groq_key, "https://api.groq.com/openai/v1",
+            max_concurrency=16, timeout=10.0,
+        )
+    if gemini_key:
+        return GeminiProvider(gemini_key, max_concurrency=8, timeout=15.0)
+    if deepseek_key:
+        return OpenAICompatibleProvider(
+            "deepseek", "deepseek-chat", deepseek_key, "https://api.deepseek.com",
+            max_concurrency=8, timeout=20.0,
+        )
+    if openai_key:
+        return OpenAICompatibleProvider("openai", "gpt-4", openai_key, max_concurrency=4, timeout=20.0)
+    return SimulationProvider()
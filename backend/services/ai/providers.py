@@ -1,5 +1,5 @@
 """
-AI Providers - LLM integration (Groq, Gemini, DeepSeek, OpenAI)
+AI Providers - LLM integration (Groq, Gemini, DeepSeek, OpenAI) via the AI gateway
 """
 
 import os
@@ -7,11 +7,14 @@ import random
 import asyncio
 from typing import List, Optional, Dict, Any, Tuple
 
+from backend.services.ai.gateway import AIGateway, build_provider, parse_suggestions
+
 
 class AIService:
     """
     Service for AI content generation.
     Supports Groq, Gemini (new SDK), DeepSeek, and OpenAI.
+    Upstream calls go through AIGateway (cache, coalescing, limits, accounting).
     """
     
     def __init__(self):
@@ -31,95 +34,43 @@ class AIService:
             self.provider = "openai"
         else:
             self.provider = "simulation"
+        # Один клиент на процесс, кэш ответов, single-flight, лимиты (services/ai/gateway)
+        self.gateway = AIGateway(build_provider(
+            openai_key=self.openai_key, deepseek_key=self.deepseek_key,
+            gemini_key=self.gemini_key, groq_key=self.groq_key,
+        ))
         print(f"AIService initialized with provider: {self.provider}")
         print(f"Keys loaded: Gemini={'Yes' if self.gemini_key else 'No'}, Groq={'Yes' if self.groq_key else 'No'}, DeepSeek={'Yes' if self.deepseek_key else 'No'}")
         
-    async def generate_content(self, content_type: str, context: Optional[str] = None, tone: str = "friendly", count: int = 5) -> Tuple[List[str], dict]:
-        if self.provider == "gemini":
-             return await self._call_gemini(content_type, context, tone, count)
-        elif self.provider in ["openai", "deepseek", "groq"]:
-            return await self._call_llm(content_type, context, tone, count)
-        else:
-            return await self._simulate_response(content_type, count)
-            
-    async def _call_gemini(self, content_type: str, context: str, tone: str, count: int) -> Tuple[List[str], dict]:
-        try:
-            from google import genai
-            client = genai.Client(api_key=self.gemini_key)
-            
-            prompt = f"Generate {count} {tone} {content_type} suggestions for a dating app. Return ONLY the list, separated by newlines."
-            if context:
-                prompt += f" Context: {context}"
-                
-            response = await asyncio.to_thread(
-                client.models.generate_content,
-                model='gemini-1.5-flash',
-                contents=prompt
-            )
-            
-            content = response.text
-            suggestions = [line.strip("- *").strip() for line in content.split("\n") if line.strip() and len(line.strip()) > 5][:count]
-            
-            if not suggestions:
-                suggestions = [content]
-                
-            return suggestions, {"tokens": 0, "cost": 0}
-            
-        except Exception as e:
-            print(f"Gemini Call failed: {e}, falling back to simulation.")
+    async def generate_content(
+        self,
+        content_type: str,
+        context: Optional[str] = None,
+        tone: str = "friendly",
+        count: int = 5,
+        user_id: Optional[str] = None,
+        cache: bool = True,
+    ) -> Tuple[List[str], dict]:
+        if self.provider == "simulation":
             return await self._simulate_response(content_type, count)
 
-    async def _call_llm(self, content_type: str, context: str, tone: str, count: int) -> Tuple[List[str], dict]:
+        prompt = f"Generate {count} {tone} {content_type} suggestions for a dating app. Return ONLY the list, separated by newlines."
+        if context:
+            prompt += f" Context: {context}"
         try:
-            import openai
-            
-            client_kwargs = {}
-            model = "gpt-4"
-            
-            if self.provider == "groq":
-                client_kwargs = {
-                    "api_key": self.groq_key,
-                    "base_url": "https://api.groq.com/openai/v1"
-                }
-                model = "llama-3.1-8b-instant"
-            elif self.provider == "deepseek":
-                client_kwargs = {
-                    "api_key": self.deepseek_key,
-                    "base_url": "https://api.deepseek.com"
-                }
-                model = "deepseek-chat"
-            else:
-                client_kwargs = {
-                    "api_key": self.openai_key
-                }
-                
-            client = openai.AsyncOpenAI(**client_kwargs)
-            
-            prompt = f"Generate {count} {tone} {content_type} suggestions. Return ONLY the list or text, separated by newlines."
-            if context:
-                prompt += f" Context: {context}"
-                
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a creative assistant for a dating app. Be concise."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=150 * count
+            content, usage = await self.gateway.complete(
+                prompt, feature=content_type, max_tokens=150 * count, user_id=user_id,
+                ttl=None if cache else 0,
             )
-            
-            content = response.choices[0].message.content
-            suggestions = [line.strip("- *").strip() for line in content.split("\n") if line.strip() and len(line.strip()) > 5][:count]
-            
-            if not suggestions:
-                suggestions = [content]
-                
-            return suggestions, {"tokens": response.usage.total_tokens, "cost": 0}
-            
+            return parse_suggestions(content, count), usage
         except Exception as e:
             print(f"AI Call failed ({self.provider}): {e}, falling back to simulation.")
             return await self._simulate_response(content_type, count)
 
+    async def flush_usage(self, db) -> int:
+        """Write buffered token/cost accounting to ai_usage_logs."""
+        return await self.gateway.flush_usage(db)
+
     async def _simulate_response(self, content_type: str, count: int) -> Tuple[List[str], dict]:
         await asyncio.sleep(0.1)
         examples = {
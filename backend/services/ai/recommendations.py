@@ -7,7 +7,7 @@ from typing import List, Dict, Any
 from collections import Counter
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, and_
 
 from backend.models.interaction import Swipe, Match
 from backend.models.user import User
@@ -72,62 +72,23 @@ async def generate_daily_picks(
         if not current_user:
             return []
 
-        # 2. Get history of user's likes
-        from backend.core.redis import redis_manager
-        history_key = f"interactions:{u_id}:liked"
-        liked_user_ids = []
-        
-        # Try Redis first
-        redis_history = await redis_manager.client.lrange(history_key, 0, 49)
-        if redis_history:
-            liked_user_ids = [uuid.UUID(uid) for uid in redis_history]
-        else:
-            # Fallback to DB
-            likes_stmt = select(Swipe.to_user_id).where(
-                and_(Swipe.from_user_id == u_id, Swipe.action.in_(["like", "superlike"]))
-            ).order_by(desc(Swipe.timestamp)).limit(50)
-            likes_result = await db.execute(likes_stmt)
-            liked_user_ids = [r[0] for r in likes_result.all()]
+        # 2-3. Co-like index: кандидаты по сходству с последними лайками
+        from backend.services.ai.co_like import recommend
+        recommended = await recommend(u_id, k=50, db=db)
 
-        # 3. Collaborative filtering: find users who liked the same people
-        candidate_ids = []
-        if liked_user_ids:
-            similar_users_stmt = select(Swipe.from_user_id).where(
-                and_(
-                    Swipe.to_user_id.in_(liked_user_ids),
-                    Swipe.from_user_id != u_id
+        if recommended:
+            rec_ids = [uuid.UUID(cid) for cid, _ in recommended]
+            seen_result = await db.execute(
+                select(Swipe.to_user_id).where(
+                    and_(Swipe.from_user_id == u_id, Swipe.to_user_id.in_(rec_ids))
                 )
-            ).group_by(Swipe.from_user_id).order_by(desc(func.count(Swipe.id))).limit(20)
-            similar_users_result = await db.execute(similar_users_stmt)
-            similar_user_ids = [r[0] for r in similar_users_result.all()]
-
-            if similar_user_ids:
-                seen_stmt = select(Swipe.to_user_id).where(Swipe.from_user_id == u_id)
-                seen_result = await db.execute(seen_stmt)
-                seen_ids = [r[0] for r in seen_result.all()]
-
-                exclusion_ids = list(set(seen_ids) | set(liked_user_ids))
-                
-                filters = [
-                    User.id.in_(
-                        select(Swipe.to_user_id).where(
-                            and_(
-                                Swipe.from_user_id.in_(similar_user_ids),
-                                Swipe.action.in_(["like", "superlike"])
-                            )
-                        )
-                    ),
-                    User.id != u_id
-                ]
-                
-                if exclusion_ids:
-                    filters.append(~User.id.in_(exclusion_ids))
-
-                candidates_stmt = select(User).where(and_(*filters)).limit(50)
-                cand_res = await db.execute(candidates_stmt)
-                candidates = cand_res.scalars().all()
-            else:
-                candidates = []
+            )
+            seen_ids = {r[0] for r in seen_result.all()}
+            candidates_stmt = select(User).where(
+                and_(User.id.in_([cid for cid in rec_ids if cid not in seen_ids]), User.is_active == True)
+            )
+            cand_res = await db.execute(candidates_stmt)
+            candidates = cand_res.scalars().all()
         else:
             # Fallback to general discovery if no likes yet
             discovery_stmt = select(User).where(
@@ -171,31 +132,16 @@ async def generate_icebreakers(
 ) -> List[str]:
     """Generate contextual icebreakers for a pair based on their profiles."""
     try:
-        u1 = uuid.UUID(user1_id) if isinstance(user1_id, str) else user1_id
-        u2 = uuid.UUID(user2_id) if isinstance(user2_id, str) else user2_id
-        stmt1 = select(User).where(User.id == u1)
-        stmt2 = select(User).where(User.id == u2)
-        r1, r2 = await db.execute(stmt1), await db.execute(stmt2)
-        user1, user2 = r1.scalar_one_or_none(), r2.scalar_one_or_none()
+        from backend.services.profile_cards import get_profile_cards
+        cards = await get_profile_cards(db, [user1_id, user2_id])
+        user1, user2 = cards.get(str(user1_id)), cards.get(str(user2_id))
         if not user1 or not user2:
             result, _ = await ai_service._simulate_response("icebreaker", count)
             return result[:count]
 
-        interests1 = getattr(user1, "interests", None) or (user1.interests if hasattr(user1, "interests") else [])
-        interests2 = getattr(user2, "interests", None) or (user2.interests if hasattr(user2, "interests") else [])
-        if hasattr(user1, "interests_rel"):
-            interests1 = [i.tag for i in user1.interests_rel] if user1.interests_rel else interests1
-        if hasattr(user2, "interests_rel"):
-            interests2 = [i.tag for i in user2.interests_rel] if user2.interests_rel else interests2
-        bio1 = getattr(user1, "bio", "") or ""
-        bio2 = getattr(user2, "bio", "") or ""
-        common = list(set(interests1) & set(interests2)) if interests1 and interests2 else []
-        ctx = (
-            f"User1: interests={interests1[:10]}, bio={bio1[:200]}. "
-            f"User2: interests={interests2[:10]}, bio={bio2[:200]}. "
-            f"Common: {common[:5]}."
+        suggestions, _ = await ai_service.generate_content(
+            "icebreaker", context=pair_context(user1, user2), tone="friendly", count=count,
         )
-        suggestions, _ = await ai_service.generate_content("icebreaker", context=ctx, tone="friendly", count=count)
         return suggestions[:count] if isinstance(suggestions, list) else [str(suggestions)]
     except Exception as e:
         print(f"Error generating icebreakers: {e}")
@@ -203,6 +149,18 @@ async def generate_icebreakers(
         return result[:count]
 
 
+def pair_context(user1: Dict[str, Any], user2: Dict[str, Any]) -> str:
+    """LLM context for a pair of profile cards (interests, bios, common interests)."""
+    interests1, interests2 = user1.get("interests") or [], user2.get("interests") or []
+    bio1, bio2 = user1.get("bio") or "", user2.get("bio") or ""
+    common = list(set(interests1) & set(interests2))
+    return (
+        f"User1: interests={interests1[:10]}, bio={bio1[:200]}. "
+        f"User2: interests={interests2[:10]}, bio={bio2[:200]}. "
+        f"Common: {common[:5]}."
+    )
+
+
 async def generate_conversation_prompts(
     ai_service,
     match_id: str,
@@ -264,23 +222,15 @@ async def suggest_smart_filters(
     try:
         u_id = uuid.UUID(user_id) if isinstance(user_id, str) else user_id
         
-        from backend.core.redis import redis_manager
-        history_key = f"interactions:{u_id}:liked"
-        liked_user_ids = []
-        
-        redis_history = await redis_manager.client.lrange(history_key, 0, 29)
-        if redis_history:
-            liked_user_ids = [uuid.UUID(uid) for uid in redis_history]
-        else:
-            likes_q = select(Swipe.to_user_id).where(
-                and_(Swipe.from_user_id == u_id, Swipe.action.in_(["like", "superlike"]))
-            ).order_by(desc(Swipe.timestamp)).limit(30)
-            likes_res = await db.execute(likes_q)
-            liked_user_ids = [r[0] for r in likes_res.all()]
+        from backend.services.ai.co_like import recent_likes, recommend
+        liked_user_ids = [uuid.UUID(uid) for uid in await recent_likes(u_id, limit=30, db=db)]
 
         if not liked_user_ids:
             return {}
 
+        # Лайки + похожие на них профили из co-like индекса: больше выборка
+        liked_user_ids += [uuid.UUID(uid) for uid, _ in await recommend(u_id, k=20, db=db)]
+
         stmt = select(User).where(User.id.in_(liked_user_ids))
         result = await db.execute(stmt)
         liked_users = result.scalars().all()
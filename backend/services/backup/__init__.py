@@ -12,6 +12,21 @@ from backend.services.backup.models import (
     BackupType,
     BackupStatus,
     BackupResult,
+    BackupFormat,
+    BackupProgress,
+    ChecksumMismatch,
+)
+
+# Targets
+from backend.services.backup.targets import (
+    BackupTarget,
+    FilesystemTarget,
+    S3Target,
+)
+
+# Blobs
+from backend.services.backup.blobs import (
+    BlobBackup,
 )
 
 # Service
@@ -27,7 +42,11 @@ from backend.services.backup.triggers import (
 
 __all__ = [
     # models
-    "BackupType", "BackupStatus", "BackupResult",
+    "BackupType", "BackupStatus", "BackupResult", "BackupFormat", "BackupProgress", "ChecksumMismatch",
+    # targets
+    "BackupTarget", "FilesystemTarget", "S3Target",
+    # blobs
+    "BlobBackup",
     # service
     "DatabaseBackupService",
     # triggers
@@ -5,7 +5,7 @@ Backup Models
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Dict, Any
 from enum import Enum
 
 
@@ -25,6 +25,44 @@ class BackupStatus(str, Enum):
     VERIFIED = "verified"
 
 
+class BackupFormat(str, Enum):
+    PLAIN = "plain"             # один поток pg_dump → gzip → таргет
+    DIRECTORY = "directory"     # pg_dump -Fd -j N, файлы по одному в таргет
+
+
+class BackupProgress:
+    """Live progress of a running backup/restore (exposed via the admin API)"""
+    def __init__(self, backup_id: str, operation: str = "backup"):
+        self.backup_id = backup_id
+        self.operation = operation
+        self.phase = "starting"
+        self.detail: Optional[str] = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files_done = 0
+        self.files_total = 0
+        self.started_at = datetime.utcnow()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = max((datetime.utcnow() - self.started_at).total_seconds(), 1e-6)
+        return {
+            "backup_id": self.backup_id,
+            "operation": self.operation,
+            "phase": self.phase,
+            "detail": self.detail,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "elapsed_seconds": round(elapsed, 1),
+            "read_mb_per_second": round(self.bytes_read / elapsed / 1e6, 2),
+        }
+
+
+class ChecksumMismatch(Exception):
+    """Stored backup bytes do not match the manifest"""
+
+
 class BackupResult:
     """Result of a backup operation"""
     def __init__(
@@ -35,7 +73,12 @@ class BackupResult:
         file_size: int = 0,
         checksum: Optional[str] = None,
         error: Optional[str] = None,
-        duration_seconds: float = 0
+        duration_seconds: float = 0,
+        key: Optional[str] = None,
+        format: str = BackupFormat.PLAIN.value,
+        raw_size: int = 0,
+        excluded_tables: Optional[List[str]] = None,
+        blobs: Optional[Dict[str, Any]] = None,
     ):
         self.success = success
         self.backup_id = backup_id
@@ -44,4 +87,9 @@ class BackupResult:
         self.checksum = checksum
         self.error = error
         self.duration_seconds = duration_seconds
+        self.key = key
+        self.format = format
+        self.raw_size = raw_size
+        self.excluded_tables = excluded_tables or []
+        self.blobs = blobs
         self.timestamp = datetime.utcnow()
@@ -1,115 +1,163 @@
 """
 Database Backup Service
 =======================
-PostgreSQL pg_dump, S3/MinIO upload, compression, checksums, restore, retention.
+PostgreSQL pg_dump → gzip → S3/MinIO (multipart) или локальная директория,
+без временных файлов; checksums, verify, restore, retention.
+
+Раскладка в таргете:
+    backups/YYYY/MM/DD/backup_<type>_<ts>_<id>.sql.gz                — plain-формат
+    backups/YYYY/MM/DD/backup_<type>_<ts>_<id>/<toc.dat, 1234.dat.gz>  — directory-формат
+    <key>.manifest.json                                               — пишется последним
+    blobs/...                                                         — см. blobs.py
 """
 
 import asyncio
-import gzip
-import hashlib
 import logging
 import os
-import tempfile
+import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 import uuid
 
-from backend.services.backup.models import BackupType, BackupResult
+from backend.services.backup.blobs import BlobBackup
+from backend.services.backup.models import (
+    BackupType, BackupResult, BackupFormat, BackupProgress, ChecksumMismatch,
+)
+from backend.services.backup.streaming import (
+    dump_to_target, file_to_target, stream_to_process, stream_to_file, verify_stream,
+)
+from backend.services.backup.targets import BackupTarget, FilesystemTarget, S3Target
 
 logger = logging.getLogger(__name__)
 
+# bytea фото раздувают дамп — у них свой инкрементальный бэкап (blobs.py)
+EXCLUDED_TABLE_DATA = ("photo_blobs",)
+MANIFEST_SUFFIX = ".manifest.json"
+BACKUP_PREFIX = "backups/"
+
 
 class DatabaseBackupService:
     """
     Professional Database Backup Service.
-    
+
     Features:
-    - Full PostgreSQL backup using pg_dump
-    - Gzip compression
-    - SHA-256 checksums
-    - S3/MinIO upload
+    - PostgreSQL pg_dump streamed through gzip straight into the target
+    - Directory-format parallel dumps (pg_dump -j)
+    - SHA-256 checksums in a per-backup manifest
+    - S3/MinIO multipart upload or local filesystem target
+    - Incremental content-addressed backup of photo blobs
     - Retention policy enforcement
-    - Backup verification
-    - Async execution
+    - Backup verification and checksum-verified restore
+    - Live progress for the admin API
     """
-    
+
     def __init__(self):
         self._s3_client = None
         self._bucket_name: Optional[str] = None
         self._retention_days: int = 30
         self._local_backup_dir: Path = Path("/tmp/backups")
-        
+        self._dump_jobs: int = 1
+        self.pg_dump_bin = os.getenv("PG_DUMP_BIN", "pg_dump")
+        self.pg_restore_bin = os.getenv("PG_RESTORE_BIN", "pg_restore")
+        self.psql_bin = os.getenv("PSQL_BIN", "psql")
+        self._active: Dict[str, BackupProgress] = {}
+        self._lock = asyncio.Lock()
+
     async def initialize(self) -> bool:
         """Initialize S3 client for backup storage"""
+        if self._s3_client:
+            return True
         try:
             import boto3
             from botocore.config import Config
             from backend.config.settings import settings
-            
+
             aws_access_key = getattr(settings, 'AWS_ACCESS_KEY_ID', None) or os.getenv('AWS_ACCESS_KEY_ID')
             aws_secret_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None) or os.getenv('AWS_SECRET_ACCESS_KEY')
             aws_region = getattr(settings, 'AWS_REGION', None) or os.getenv('AWS_REGION', 'us-east-1')
             s3_endpoint = getattr(settings, 'S3_ENDPOINT_URL', None) or os.getenv('S3_ENDPOINT_URL')
             self._bucket_name = getattr(settings, 'BACKUP_BUCKET', None) or os.getenv('BACKUP_BUCKET', 'app-backups')
             self._retention_days = int(getattr(settings, 'BACKUP_RETENTION_DAYS', 30))
-            
+
             if not aws_access_key or not aws_secret_key:
                 logger.warning("AWS credentials not configured. S3 upload disabled.")
                 return False
-            
+
             config = Config(
                 retries={'max_attempts': 3, 'mode': 'adaptive'},
                 connect_timeout=30,
                 read_timeout=60
             )
-            
+
             client_kwargs = {
                 'aws_access_key_id': aws_access_key,
                 'aws_secret_access_key': aws_secret_key,
                 'region_name': aws_region,
                 'config': config
             }
-            
+
             if s3_endpoint:
                 client_kwargs['endpoint_url'] = s3_endpoint
-            
-            self._s3_client = boto3.client('s3', **client_kwargs)
-            
+
+            client = boto3.client('s3', **client_kwargs)
+
             try:
-                self._s3_client.head_bucket(Bucket=self._bucket_name)
-            except:
+                await asyncio.to_thread(client.head_bucket, Bucket=self._bucket_name)
+            except Exception:
                 try:
-                    self._s3_client.create_bucket(
+                    await asyncio.to_thread(
+                        client.create_bucket,
                         Bucket=self._bucket_name,
                         CreateBucketConfiguration={'LocationConstraint': aws_region}
                     )
                     logger.info(f"Created backup bucket: {self._bucket_name}")
                 except Exception as e:
                     logger.warning(f"Could not create bucket (may already exist): {e}")
-            
+
+            self._s3_client = client
             logger.info("Backup service initialized with S3 storage")
             return True
-            
+
         except ImportError:
             logger.warning("boto3 not installed. Run: pip install boto3")
             return False
         except Exception as e:
             logger.error(f"Failed to initialize backup service: {e}")
             return False
-    
+
+    async def s3_target(self, bucket: Optional[str] = None) -> Optional[S3Target]:
+        """S3 target on the shared client (other buckets too, e.g. data exports); None without S3."""
+        if not await self.initialize():
+            return None
+        return S3Target(self._s3_client, bucket or self._bucket_name)
+
+    def _load_settings(self):
+        from backend.config.settings import settings
+
+        self._retention_days = int(getattr(settings, 'BACKUP_RETENTION_DAYS', 30))
+        self._local_backup_dir = Path(getattr(settings, 'BACKUP_LOCAL_DIR', None) or self._local_backup_dir)
+        self._dump_jobs = max(1, int(getattr(settings, 'BACKUP_DUMP_JOBS', 1)))
+
+    async def get_target(self, upload_to_s3: bool = True) -> BackupTarget:
+        """S3 when configured and requested, otherwise the local backup directory."""
+        self._load_settings()
+        if upload_to_s3 and await self.initialize():
+            return S3Target(self._s3_client, self._bucket_name)
+        return FilesystemTarget(self._local_backup_dir)
+
     def _get_db_connection_string(self) -> Dict[str, str]:
         """Extract database connection parameters from settings"""
         from backend.config.settings import settings
         import urllib.parse
-        
+
         db_url = settings.DATABASE_URL
-        
+
         if db_url.startswith("postgresql+asyncpg://"):
             db_url = db_url.replace("postgresql+asyncpg://", "postgresql://")
-        
+
         parsed = urllib.parse.urlparse(db_url)
-        
+
         return {
             'host': parsed.hostname or 'localhost',
             'port': str(parsed.port or 5432),
@@ -117,284 +165,338 @@ class DatabaseBackupService:
             'password': parsed.password or '',
             'database': parsed.path.lstrip('/') or 'postgres'
         }
-    
+
+    def _pg_args(self, db_params: Dict[str, str], database: str) -> List[str]:
+        return [
+            f"--host={db_params['host']}",
+            f"--port={db_params['port']}",
+            f"--username={db_params['user']}",
+            f"--dbname={database}",
+            "--no-password",
+        ]
+
+    def _pg_env(self, db_params: Dict[str, str]) -> Dict[str, str]:
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db_params['password']
+        return env
+
+    def progress(self) -> List[Dict[str, Any]]:
+        """Running backups/restores"""
+        return [p.to_dict() for p in self._active.values()]
+
     async def create_backup(
         self,
         backup_type: BackupType = BackupType.FULL,
         compress: bool = True,
         upload_to_s3: bool = True,
-        tables: Optional[List[str]] = None
+        tables: Optional[List[str]] = None,
+        format: Optional[BackupFormat] = None,
+        jobs: Optional[int] = None,
+        exclude_table_data: Optional[List[str]] = None,
+        include_blobs: bool = False,
+        target: Optional[BackupTarget] = None,
     ) -> BackupResult:
-        """Create a database backup."""
+        """
+        Create a database backup.
+
+        Plain format streams pg_dump stdout through gzip straight into the
+        target. Directory format (jobs > 1) lets pg_dump dump tables in
+        parallel into a staging directory; each file is uploaded and removed
+        as soon as pg_dump is done. photo_blobs data is excluded by default,
+        include_blobs=True runs the incremental blob backup afterwards.
+        """
         start_time = datetime.utcnow()
         backup_id = str(uuid.uuid4())
-        
-        try:
-            self._local_backup_dir.mkdir(parents=True, exist_ok=True)
-            
-            db_params = self._get_db_connection_string()
-            
-            timestamp = start_time.strftime("%Y%m%d_%H%M%S")
-            filename = f"backup_{backup_type.value}_{timestamp}_{backup_id[:8]}.sql"
-            if compress:
-                filename += ".gz"
-            
-            file_path = self._local_backup_dir / filename
-            
-            cmd = [
-                "pg_dump",
-                f"--host={db_params['host']}",
-                f"--port={db_params['port']}",
-                f"--username={db_params['user']}",
-                f"--dbname={db_params['database']}",
-                "--no-password",
-                "--verbose",
-                "--format=plain"
-            ]
-            
-            if backup_type == BackupType.SCHEMA_ONLY:
-                cmd.append("--schema-only")
-            elif backup_type == BackupType.DATA_ONLY:
-                cmd.append("--data-only")
-            
-            if tables:
-                for table in tables:
+
+        if self._lock.locked():
+            return BackupResult(success=False, backup_id=backup_id, error="Another backup is already running")
+
+        async with self._lock:
+            progress = BackupProgress(backup_id)
+            self._active[backup_id] = progress
+            try:
+                target = target or await self.get_target(upload_to_s3)
+                jobs = jobs or self._dump_jobs
+                format = format or (BackupFormat.DIRECTORY if jobs > 1 else BackupFormat.PLAIN)
+                excluded = list(EXCLUDED_TABLE_DATA if exclude_table_data is None else exclude_table_data)
+                db_params = self._get_db_connection_string()
+
+                timestamp = start_time.strftime("%Y%m%d_%H%M%S")
+                base_key = f"{BACKUP_PREFIX}{start_time.strftime('%Y/%m/%d')}/backup_{backup_type.value}_{timestamp}_{backup_id[:8]}"
+
+                cmd = [self.pg_dump_bin, *self._pg_args(db_params, db_params['database']), "--verbose"]
+                if backup_type == BackupType.SCHEMA_ONLY:
+                    cmd.append("--schema-only")
+                elif backup_type == BackupType.DATA_ONLY:
+                    cmd.append("--data-only")
+                for table in tables or []:
                     cmd.extend(["--table", table])
-            
-            env = os.environ.copy()
-            env['PGPASSWORD'] = db_params['password']
-            
-            logger.info(f"Starting backup: {backup_id}")
-            
-            if compress:
-                pg_process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    env=env
+                for table in excluded:
+                    cmd.append(f"--exclude-table-data={table}")
+
+                logger.info(f"Starting backup: {backup_id} ({format.value}) → {target.uri(base_key)}")
+                progress.phase = "dumping"
+
+                if format == BackupFormat.DIRECTORY:
+                    key = base_key
+                    manifest = await self._dump_directory(cmd, db_params, target, key, jobs, compress, progress)
+                else:
+                    key = base_key + (".sql.gz" if compress else ".sql")
+                    cmd.append("--format=plain")
+                    writer = await target.open_writer(key, {"backup-id": backup_id})
+                    stats = await dump_to_target(cmd, self._pg_env(db_params), writer, compress, progress)
+                    manifest = {**stats, "files": []}
+
+                duration = (datetime.utcnow() - start_time).total_seconds()
+                manifest.update({
+                    "backup_id": backup_id,
+                    "backup_type": backup_type.value,
+                    "format": format.value,
+                    "key": key,
+                    "database": db_params['database'],
+                    "compressed": compress,
+                    "excluded_table_data": excluded,
+                    "created_at": start_time.isoformat(),
+                    "duration_seconds": duration,
+                })
+                # Манифест последним: без него бэкап считается незавершённым
+                await target.put_json(key + MANIFEST_SUFFIX, manifest)
+                logger.info(f"Backup created: {target.uri(key)} ({manifest['size']} bytes, {duration:.1f}s)")
+
+                blobs = None
+                if include_blobs and "photo_blobs" in excluded:
+                    progress.phase = "blobs"
+                    blobs = await BlobBackup(target).run(progress)
+
+                return BackupResult(
+                    success=True,
+                    backup_id=backup_id,
+                    file_path=target.uri(key),
+                    file_size=manifest['size'],
+                    checksum=manifest.get('sha256'),
+                    duration_seconds=(datetime.utcnow() - start_time).total_seconds(),
+                    key=key,
+                    format=format.value,
+                    raw_size=manifest.get('raw_size', 0),
+                    excluded_tables=excluded,
+                    blobs=blobs,
                 )
-                
-                stdout, stderr = await pg_process.communicate()
-                
-                if pg_process.returncode != 0:
-                    raise Exception(f"pg_dump failed: {stderr.decode()}")
-                
-                with gzip.open(file_path, 'wb') as f:
-                    f.write(stdout)
-            else:
-                with open(file_path, 'w') as f:
-                    pg_process = await asyncio.create_subprocess_exec(
-                        *cmd,
-                        stdout=f,
-                        stderr=asyncio.subprocess.PIPE,
-                        env=env
-                    )
-                    _, stderr = await pg_process.communicate()
-                    
-                    if pg_process.returncode != 0:
-                        raise Exception(f"pg_dump failed: {stderr.decode()}")
-            
-            checksum = await self._calculate_checksum(file_path)
-            file_size = file_path.stat().st_size
-            
-            logger.info(f"Backup created: {file_path} ({file_size} bytes)")
-            
-            s3_path = None
-            if upload_to_s3:
-                await self.initialize()
-                if self._s3_client:
-                    s3_path = await self._upload_to_s3(file_path, filename, checksum)
-                    if s3_path:
-                        file_path.unlink()
-                        logger.info(f"Backup uploaded to S3: {s3_path}")
-            
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            
-            return BackupResult(
-                success=True,
-                backup_id=backup_id,
-                file_path=s3_path or str(file_path),
-                file_size=file_size,
-                checksum=checksum,
-                duration_seconds=duration
-            )
-            
-        except Exception as e:
-            logger.error(f"Backup failed: {e}")
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            return BackupResult(
-                success=False,
-                backup_id=backup_id,
-                error=str(e),
-                duration_seconds=duration
-            )
-    
-    async def _calculate_checksum(self, file_path: Path) -> str:
-        """Calculate SHA-256 checksum of a file"""
-        sha256 = hashlib.sha256()
-        
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                sha256.update(chunk)
-        
-        return sha256.hexdigest()
-    
-    async def _upload_to_s3(
+
+            except Exception as e:
+                logger.error(f"Backup failed: {e}")
+                duration = (datetime.utcnow() - start_time).total_seconds()
+                return BackupResult(
+                    success=False,
+                    backup_id=backup_id,
+                    error=str(e),
+                    duration_seconds=duration
+                )
+            finally:
+                self._active.pop(backup_id, None)
+
+    async def _dump_directory(
         self,
-        file_path: Path,
-        filename: str,
-        checksum: str
-    ) -> Optional[str]:
-        """Upload backup file to S3"""
-        if not self._s3_client or not self._bucket_name:
-            return None
-        
+        cmd: List[str],
+        db_params: Dict[str, str],
+        target: BackupTarget,
+        key: str,
+        jobs: int,
+        compress: bool,
+        progress: BackupProgress,
+    ) -> Dict[str, Any]:
+        """pg_dump -Fd -j N into staging, then stream every file to the target and drop it."""
+        staging = self._local_backup_dir / "staging" / Path(key).name
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.parent.mkdir(parents=True, exist_ok=True)
+        cmd = [*cmd, "--format=directory", f"--jobs={jobs}", f"--file={staging}"]
+        if not compress:
+            cmd.append("--compress=0")
         try:
-            date_prefix = datetime.utcnow().strftime("%Y/%m/%d")
-            s3_key = f"backups/{date_prefix}/{filename}"
-            
-            self._s3_client.upload_file(
-                str(file_path),
-                self._bucket_name,
-                s3_key,
-                ExtraArgs={
-                    'Metadata': {
-                        'checksum': checksum,
-                        'created_at': datetime.utcnow().isoformat()
-                    },
-                    'StorageClass': 'STANDARD_IA'
-                }
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE, env=self._pg_env(db_params),
             )
-            
-            return f"s3://{self._bucket_name}/{s3_key}"
-            
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"pg_dump failed: {stderr.decode(errors='replace')[-4000:]}")
+
+            paths = sorted(p for p in staging.iterdir() if p.is_file())
+            progress.phase = "uploading"
+            progress.files_total = len(paths)
+            files = []
+            for path in paths:
+                file_key = f"{key}/{path.name}"
+                writer = await target.open_writer(file_key)
+                stats = await file_to_target(path, writer, progress)
+                path.unlink()
+                files.append({"name": path.name, "key": file_key, **stats})
+                progress.files_done += 1
+            return {
+                "files": files,
+                "size": sum(f["size"] for f in files),
+                "jobs": jobs,
+            }
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    async def backup_blobs(self, upload_to_s3: bool = True, target: Optional[BackupTarget] = None) -> Dict[str, int]:
+        """Incremental content-addressed backup of photo_blobs"""
+        target = target or await self.get_target(upload_to_s3)
+        progress = BackupProgress(str(uuid.uuid4()), operation="blob_backup")
+        self._active[progress.backup_id] = progress
+        try:
+            return await BlobBackup(target).run(progress)
+        finally:
+            self._active.pop(progress.backup_id, None)
+
+    async def _load_manifest(self, target: BackupTarget, key: str) -> Optional[Dict[str, Any]]:
+        manifest_key = key + MANIFEST_SUFFIX
+        if await target.exists(manifest_key):
+            return await target.get_json(manifest_key)
+        return None
+
+    async def verify_backup(self, key: str, target: Optional[BackupTarget] = None) -> Dict[str, Any]:
+        """Re-read a stored backup and check it against its manifest (sha256 + gzip CRC)."""
+        target = target or await self.get_target()
+        try:
+            manifest = await self._load_manifest(target, key)
+            if manifest is None:
+                return {"ok": False, "key": key, "error": "manifest not found"}
+            if manifest["format"] == BackupFormat.DIRECTORY.value:
+                for f in manifest["files"]:
+                    await verify_stream(target.read(f["key"]), f["sha256"], decompress=False)
+                return {"ok": True, "key": key, "files": len(manifest["files"])}
+            stats = await verify_stream(target.read(key), manifest["sha256"], decompress=manifest["compressed"])
+            return {"ok": True, "key": key, **stats}
         except Exception as e:
-            logger.error(f"S3 upload failed: {e}")
-            return None
-    
-    async def list_backups(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """List available backups from S3"""
-        if not self._s3_client or not self._bucket_name:
-            return []
-        
+            logger.error(f"Backup verification failed for {key}: {e}")
+            return {"ok": False, "key": key, "error": str(e)}
+
+    async def list_backups(self, limit: int = 50, target: Optional[BackupTarget] = None) -> List[Dict[str, Any]]:
+        """List completed backups (those with a manifest), newest first"""
         try:
-            response = self._s3_client.list_objects_v2(
-                Bucket=self._bucket_name,
-                Prefix="backups/",
-                MaxKeys=limit
-            )
-            
+            target = target or await self.get_target()
+            items = await target.list(BACKUP_PREFIX)
+            manifests = sorted(
+                (i for i in items if i['key'].endswith(MANIFEST_SUFFIX)),
+                key=lambda i: i['last_modified'], reverse=True,
+            )[:limit]
+
             backups = []
-            for obj in response.get('Contents', []):
+            for item in manifests:
+                manifest = await target.get_json(item['key'])
                 backups.append({
-                    'key': obj['Key'],
-                    'size': obj['Size'],
-                    'last_modified': obj['LastModified'].isoformat(),
-                    's3_path': f"s3://{self._bucket_name}/{obj['Key']}"
+                    'key': manifest['key'],
+                    'size': manifest['size'],
+                    'raw_size': manifest.get('raw_size'),
+                    'format': manifest['format'],
+                    'backup_type': manifest['backup_type'],
+                    'checksum': manifest.get('sha256'),
+                    'last_modified': item['last_modified'].isoformat(),
+                    's3_path': target.uri(manifest['key']),
                 })
-            
-            backups.sort(key=lambda x: x['last_modified'], reverse=True)
             return backups
-            
+
         except Exception as e:
             logger.error(f"Failed to list backups: {e}")
             return []
-    
-    async def cleanup_old_backups(self) -> int:
-        """Remove backups older than retention period"""
-        if not self._s3_client or not self._bucket_name:
-            return 0
-        
+
+    async def cleanup_old_backups(self, target: Optional[BackupTarget] = None) -> int:
+        """Remove backup objects older than retention period (content-addressed blobs are kept)"""
         try:
+            target = target or await self.get_target()
             cutoff_date = datetime.utcnow() - timedelta(days=self._retention_days)
-            deleted_count = 0
-            
-            paginator = self._s3_client.get_paginator('list_objects_v2')
-            
-            for page in paginator.paginate(Bucket=self._bucket_name, Prefix="backups/"):
-                for obj in page.get('Contents', []):
-                    if obj['LastModified'].replace(tzinfo=None) < cutoff_date:
-                        self._s3_client.delete_object(
-                            Bucket=self._bucket_name,
-                            Key=obj['Key']
-                        )
-                        deleted_count += 1
-                        logger.info(f"Deleted old backup: {obj['Key']}")
-            
-            return deleted_count
-            
+            old = [i for i in await target.list(BACKUP_PREFIX) if i['last_modified'] < cutoff_date]
+            # Манифесты первыми: наполовину удалённый бэкап не должен выглядеть целым
+            old.sort(key=lambda i: not i['key'].endswith(MANIFEST_SUFFIX))
+            for item in old:
+                await target.delete(item['key'])
+                logger.info(f"Deleted old backup object: {item['key']}")
+            return len(old)
+
         except Exception as e:
             logger.error(f"Cleanup failed: {e}")
             return 0
-    
+
     async def restore_backup(
         self,
         s3_key: str,
-        target_database: Optional[str] = None
+        target_database: Optional[str] = None,
+        target: Optional[BackupTarget] = None,
+        restore_blobs: bool = True,
     ) -> bool:
         """
-        Restore a backup from S3.
+        Restore a backup, verifying its checksum on the fly.
         WARNING: This will overwrite the target database!
+
+        Plain dumps are streamed into psql --single-transaction; on a checksum
+        mismatch psql is killed before EOF so nothing is committed. Directory
+        dumps are downloaded and verified first, then pg_restore -j runs.
         """
-        if not self._s3_client or not self._bucket_name:
-            logger.error("S3 not configured")
-            return False
-        
+        progress = BackupProgress(str(uuid.uuid4()), operation="restore")
+        self._active[progress.backup_id] = progress
         try:
-            with tempfile.NamedTemporaryFile(suffix='.sql.gz', delete=False) as tmp:
-                self._s3_client.download_file(
-                    self._bucket_name,
-                    s3_key,
-                    tmp.name
-                )
-                tmp_path = Path(tmp.name)
-            
+            target = target or await self.get_target()
             db_params = self._get_db_connection_string()
             target_db = target_database or db_params['database']
-            
-            env = os.environ.copy()
-            env['PGPASSWORD'] = db_params['password']
-            
-            if s3_key.endswith('.gz'):
-                with gzip.open(tmp_path, 'rb') as f_in:
-                    sql_content = f_in.read()
-                
-                restore_process = await asyncio.create_subprocess_exec(
-                    "psql",
-                    f"--host={db_params['host']}",
-                    f"--port={db_params['port']}",
-                    f"--username={db_params['user']}",
-                    f"--dbname={target_db}",
-                    "--no-password",
-                    stdin=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    env=env
-                )
-                _, stderr = await restore_process.communicate(input=sql_content)
+            env = self._pg_env(db_params)
+            manifest = await self._load_manifest(target, s3_key)
+            if manifest is None:
+                logger.warning(f"No manifest for {s3_key}: restoring without checksum verification")
+                manifest = {"format": BackupFormat.PLAIN.value, "compressed": s3_key.endswith(".gz"), "sha256": None}
+
+            progress.phase = "restoring"
+            if manifest["format"] == BackupFormat.DIRECTORY.value:
+                await self._restore_directory(target, manifest, db_params, target_db, progress)
             else:
-                with open(tmp_path, 'r') as f:
-                    restore_process = await asyncio.create_subprocess_exec(
-                        "psql",
-                        f"--host={db_params['host']}",
-                        f"--port={db_params['port']}",
-                        f"--username={db_params['user']}",
-                        f"--dbname={target_db}",
-                        "--no-password",
-                        stdin=f,
-                        stderr=asyncio.subprocess.PIPE,
-                        env=env
-                    )
-                    _, stderr = await restore_process.communicate()
-            
-            tmp_path.unlink()
-            
-            if restore_process.returncode != 0:
-                logger.error(f"Restore failed: {stderr.decode()}")
-                return False
-            
+                cmd = [
+                    self.psql_bin, *self._pg_args(db_params, target_db),
+                    "--single-transaction", "--set=ON_ERROR_STOP=1", "--quiet",
+                ]
+                await stream_to_process(
+                    target.read(s3_key), cmd, env, manifest["sha256"],
+                    decompress=manifest["compressed"], progress=progress,
+                )
+
+            if restore_blobs and "photo_blobs" in manifest.get("excluded_table_data", []):
+                progress.phase = "blobs"
+                await BlobBackup(target).restore(progress)
+
             logger.info(f"Backup restored successfully to {target_db}")
             return True
-            
+
+        except ChecksumMismatch as e:
+            logger.error(f"Restore aborted, checksum mismatch for {s3_key}: {e}")
+            return False
         except Exception as e:
             logger.error(f"Restore failed: {e}")
             return False
+        finally:
+            self._active.pop(progress.backup_id, None)
+
+    async def _restore_directory(
+        self,
+        target: BackupTarget,
+        manifest: Dict[str, Any],
+        db_params: Dict[str, str],
+        target_db: str,
+        progress: BackupProgress,
+    ):
+        staging = self._local_backup_dir / "restore" / progress.backup_id
+        progress.files_total = len(manifest["files"])
+        try:
+            # Сначала всё скачать и сверить — pg_restore -j не умеет одну транзакцию
+            for f in manifest["files"]:
+                await stream_to_file(target.read(f["key"]), staging / f["name"], f["sha256"])
+                progress.files_done += 1
+            cmd = [
+                self.pg_restore_bin, *self._pg_args(db_params, target_db),
+                "--exit-on-error", f"--jobs={manifest.get('jobs', 1)}", str(staging),
+            ]
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE, env=self._pg_env(db_params),
+            )
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"pg_restore failed: {stderr.decode(errors='replace')[-4000:]}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
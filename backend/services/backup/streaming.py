@@ -0,0 +1,226 @@
+"""
+Backup Streaming
+================
+Трубы между процессом (pg_dump / psql) и таргетом без временных файлов.
+
+dump_to_target: stdout pg_dump → gzip (zlib, wbits=31) → sha256 → writer.
+Чтение/сжатие и запись в таргет идут в двух задачах через ограниченную
+очередь, так что pg_dump не простаивает, пока уходит часть multipart upload,
+а память ограничена QUEUE_DEPTH чанками.
+
+stream_to_process: чанки из таргета → sha256 → gunzip → stdin psql.
+Чек-сумма сверяется до закрытия stdin: при несовпадении psql убивается,
+и транзакция (--single-transaction) откатывается сервером.
+"""
+
+import asyncio
+import hashlib
+import logging
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from backend.services.backup.models import BackupProgress, ChecksumMismatch
+from backend.services.backup.targets import BackupWriter, CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_LEVEL = 6
+QUEUE_DEPTH = 8
+STDERR_TAIL = 20
+GZIP_WBITS = 31                 # zlib с gzip-заголовком: файл читается обычным gunzip
+
+
+async def _drain_stderr(stream, tail: deque, progress: Optional[BackupProgress]):
+    # pg_dump --verbose пишет в stderr много; держим только хвост для ошибки
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        text = line.decode(errors="replace").rstrip()
+        tail.append(text)
+        if progress:
+            progress.detail = text[:200]
+
+
+def _failure(cmd: List[str], returncode: int, tail: deque) -> RuntimeError:
+    return RuntimeError(f"{Path(cmd[0]).name} failed (exit {returncode}): " + "\n".join(tail))
+
+
+async def _kill(proc):
+    if proc.returncode is None:
+        proc.kill()
+        await proc.wait()
+
+
+async def dump_to_target(
+    cmd: List[str],
+    env: Dict[str, str],
+    writer: BackupWriter,
+    compress: bool = True,
+    progress: Optional[BackupProgress] = None,
+) -> Dict[str, object]:
+    """Run cmd and stream its stdout into writer. Returns sha256/size/raw_size of the stored bytes."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env,
+    )
+    tail: deque = deque(maxlen=STDERR_TAIL)
+    stderr_task = asyncio.create_task(_drain_stderr(proc.stderr, tail, progress))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+    digest = hashlib.sha256()
+    raw_size = 0
+
+    async def produce():
+        nonlocal raw_size
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, GZIP_WBITS) if compress else None
+        while True:
+            chunk = await proc.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            raw_size += len(chunk)
+            if progress:
+                progress.bytes_read += len(chunk)
+            if compressor:
+                chunk = await asyncio.to_thread(compressor.compress, chunk)
+            if chunk:
+                await queue.put(chunk)
+        if compressor:
+            await queue.put(compressor.flush())
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            digest.update(chunk)
+            await writer.write(chunk)
+            if progress:
+                progress.bytes_written += len(chunk)
+        await producer
+        returncode = await proc.wait()
+        await stderr_task
+        if returncode != 0:
+            raise _failure(cmd, returncode, tail)
+        await writer.close()
+    except BaseException:
+        producer.cancel()
+        await _kill(proc)
+        stderr_task.cancel()
+        await asyncio.gather(producer, stderr_task, return_exceptions=True)
+        await writer.abort()
+        raise
+
+    return {"sha256": digest.hexdigest(), "size": writer.size, "raw_size": raw_size}
+
+
+async def file_to_target(path: Path, writer: BackupWriter, progress: Optional[BackupProgress] = None) -> Dict[str, object]:
+    """Copy one already-compressed file (pg_dump -Fd output) into writer."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                await writer.write(chunk)
+                if progress:
+                    progress.bytes_read += len(chunk)
+                    progress.bytes_written += len(chunk)
+        await writer.close()
+    except BaseException:
+        await writer.abort()
+        raise
+    return {"sha256": digest.hexdigest(), "size": writer.size}
+
+
+async def stream_to_process(
+    chunks: AsyncIterator[bytes],
+    cmd: List[str],
+    env: Dict[str, str],
+    expected_sha256: Optional[str],
+    decompress: bool = True,
+    progress: Optional[BackupProgress] = None,
+):
+    """Feed stored backup bytes into cmd's stdin, verifying the checksum before EOF."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE, env=env,
+    )
+    tail: deque = deque(maxlen=STDERR_TAIL)
+    stderr_task = asyncio.create_task(_drain_stderr(proc.stderr, tail, None))
+    decompressor = zlib.decompressobj(GZIP_WBITS) if decompress else None
+    digest = hashlib.sha256()
+    try:
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                if progress:
+                    progress.bytes_read += len(chunk)
+                data = await asyncio.to_thread(decompressor.decompress, chunk) if decompressor else chunk
+                proc.stdin.write(data)
+                await proc.stdin.drain()
+                if progress:
+                    progress.bytes_written += len(data)
+            if decompressor:
+                proc.stdin.write(decompressor.flush())
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # psql сам вышел (ON_ERROR_STOP) — причина в stderr
+            returncode = await proc.wait()
+            await stderr_task
+            raise _failure(cmd, returncode, tail)
+
+        actual = digest.hexdigest()
+        if expected_sha256 and actual != expected_sha256:
+            # Убиваем до EOF: psql не дойдёт до COMMIT
+            raise ChecksumMismatch(f"expected {expected_sha256}, got {actual}")
+        if decompressor and not decompressor.eof:
+            raise ChecksumMismatch("truncated gzip stream")
+
+        proc.stdin.close()
+        returncode = await proc.wait()
+        await stderr_task
+        if returncode != 0:
+            raise _failure(cmd, returncode, tail)
+    except BaseException:
+        await _kill(proc)
+        stderr_task.cancel()
+        await asyncio.gather(stderr_task, return_exceptions=True)
+        raise
+
+
+async def stream_to_file(chunks: AsyncIterator[bytes], path: Path, expected_sha256: Optional[str]):
+    """Download one object to path (pg_restore needs a directory), verifying its checksum."""
+    digest = hashlib.sha256()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        async for chunk in chunks:
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    if expected_sha256 and digest.hexdigest() != expected_sha256:
+        path.unlink(missing_ok=True)
+        raise ChecksumMismatch(f"{path.name}: expected {expected_sha256}, got {digest.hexdigest()}")
+
+
+async def verify_stream(chunks: AsyncIterator[bytes], expected_sha256: Optional[str], decompress: bool) -> Dict[str, object]:
+    """Read a stored object end to end: sha256 of the bytes plus gzip CRC of the content."""
+    digest = hashlib.sha256()
+    decompressor = zlib.decompressobj(GZIP_WBITS) if decompress else None
+    size = raw_size = 0
+    async for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+        if decompressor:
+            raw_size += len(await asyncio.to_thread(decompressor.decompress, chunk))
+    if decompressor:
+        raw_size += len(decompressor.flush())
+        if not decompressor.eof:
+            raise ChecksumMismatch("truncated gzip stream")
+    actual = digest.hexdigest()
+    if expected_sha256 and actual != expected_sha256:
+        raise ChecksumMismatch(f"expected {expected_sha256}, got {actual}")
+    return {"sha256": actual, "size": size, "raw_size": raw_size or size}
@@ -0,0 +1,278 @@
+"""
+Backup Targets
+==============
+Куда пишутся бэкапы: локальная директория или S3/MinIO.
+
+Оба таргета принимают поток чанков (open_writer) и отдают поток чанков
+(read), так что дамп не лежит на диске целиком ни при записи, ни при
+восстановлении:
+- FilesystemTarget пишет в <key>.partial и переименовывает при close();
+- S3Target делает multipart upload частями по PART_SIZE (boto3 —
+  блокирующий, вызовы идут через asyncio.to_thread).
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024     # S3: минимум 5 MB на часть, кроме последней
+
+
+class BackupWriter:
+    """Streaming sink for one object: write() chunks, then close() or abort()."""
+
+    size: int = 0
+
+    async def write(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    async def abort(self):
+        raise NotImplementedError
+
+
+class BackupTarget:
+    name = "target"
+
+    async def open_writer(self, key: str, metadata: Optional[Dict[str, str]] = None) -> BackupWriter:
+        raise NotImplementedError
+
+    def read(self, key: str) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def list(self, prefix: str) -> List[Dict[str, Any]]:
+        """[{key, size, last_modified (naive UTC datetime)}]"""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    def uri(self, key: str) -> str:
+        raise NotImplementedError
+
+    def signed_url(self, key: str, expires_in: int, filename: Optional[str] = None) -> Optional[str]:
+        """Time-limited public download URL; None if the target cannot serve one."""
+        return None
+
+    async def put_bytes(self, key: str, data: bytes, metadata: Optional[Dict[str, str]] = None):
+        writer = await self.open_writer(key, metadata)
+        try:
+            await writer.write(data)
+        except BaseException:
+            await writer.abort()
+            raise
+        await writer.close()
+
+    async def get_bytes(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.read(key)])
+
+    async def put_json(self, key: str, data: Dict[str, Any]):
+        await self.put_bytes(key, json.dumps(data, indent=2, default=str).encode())
+
+    async def get_json(self, key: str) -> Dict[str, Any]:
+        return json.loads(await self.get_bytes(key))
+
+
+# --- filesystem ---------------------------------------------------------------
+
+class _FileWriter(BackupWriter):
+    def __init__(self, path: Path):
+        self.path = path
+        self.partial = path.with_name(path.name + ".partial")
+        self.partial.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.partial, "wb")
+        self.size = 0
+
+    async def write(self, chunk: bytes):
+        await asyncio.to_thread(self._file.write, chunk)
+        self.size += len(chunk)
+
+    async def close(self):
+        self._file.close()
+        os.replace(self.partial, self.path)
+
+    async def abort(self):
+        self._file.close()
+        self.partial.unlink(missing_ok=True)
+
+
+class FilesystemTarget(BackupTarget):
+    name = "filesystem"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Backup key escapes target root: {key}")
+        return path
+
+    async def open_writer(self, key: str, metadata: Optional[Dict[str, str]] = None) -> BackupWriter:
+        return _FileWriter(self._path(key))
+
+    async def read(self, key: str) -> AsyncIterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    async def list(self, prefix: str) -> List[Dict[str, Any]]:
+        base = self.root / prefix
+        if not base.exists():
+            return []
+        items = []
+        for path in base.rglob("*"):
+            if path.is_file() and not path.name.endswith(".partial"):
+                stat = path.stat()
+                items.append({
+                    "key": path.relative_to(self.root).as_posix(),
+                    "size": stat.st_size,
+                    "last_modified": datetime.utcfromtimestamp(stat.st_mtime),
+                })
+        return items
+
+    async def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def uri(self, key: str) -> str:
+        return str(self.root / key)
+
+
+# --- S3 ---------------------------------------------------------------------
+
+class _MultipartWriter(BackupWriter):
+    def __init__(self, client, bucket: str, key: str, metadata: Optional[Dict[str, str]]):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.metadata = metadata or {}
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+
+    async def _start(self):
+        response = await asyncio.to_thread(
+            self.client.create_multipart_upload,
+            Bucket=self.bucket, Key=self.key, Metadata=self.metadata, StorageClass="STANDARD_IA",
+        )
+        self._upload_id = response["UploadId"]
+
+    async def _flush_part(self):
+        if self._upload_id is None:
+            await self._start()
+        body = bytes(self._buffer)
+        self._buffer.clear()
+        number = len(self._parts) + 1
+        response = await asyncio.to_thread(
+            self.client.upload_part,
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=body,
+        )
+        self._parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+    async def write(self, chunk: bytes):
+        self._buffer += chunk
+        self.size += len(chunk)
+        if len(self._buffer) >= PART_SIZE:
+            await self._flush_part()
+
+    async def close(self):
+        if self._upload_id is None:
+            # Маленький объект — одной операцией
+            await asyncio.to_thread(
+                self.client.put_object,
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), Metadata=self.metadata,
+            )
+            return
+        if self._buffer:
+            await self._flush_part()
+        await asyncio.to_thread(
+            self.client.complete_multipart_upload,
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    async def abort(self):
+        if self._upload_id is not None:
+            try:
+                await asyncio.to_thread(
+                    self.client.abort_multipart_upload,
+                    Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                )
+            except Exception as e:
+                logger.warning(f"Could not abort multipart upload {self.key}: {e}")
+
+
+class S3Target(BackupTarget):
+    name = "s3"
+
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    async def open_writer(self, key: str, metadata: Optional[Dict[str, str]] = None) -> BackupWriter:
+        return _MultipartWriter(self.client, self.bucket, key, metadata)
+
+    async def read(self, key: str) -> AsyncIterator[bytes]:
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=key)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            body.close()
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    async def list(self, prefix: str) -> List[Dict[str, Any]]:
+        def _list():
+            items = []
+            paginator = self.client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for obj in page.get("Contents", []):
+                    items.append({
+                        "key": obj["Key"],
+                        "size": obj["Size"],
+                        "last_modified": obj["LastModified"].replace(tzinfo=None),
+                    })
+            return items
+        return await asyncio.to_thread(_list)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def signed_url(self, key: str, expires_in: int, filename: Optional[str] = None) -> Optional[str]:
+        # Подпись считается локально, запроса к S3 нет
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
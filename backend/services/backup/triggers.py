@@ -41,13 +41,22 @@ async def trigger_backup(
     await db.commit()
     
     try:
+        from backend.config.settings import settings
+
         result = await backup_service.create_backup(
             backup_type=BackupType(backup_type),
             compress=True,
-            upload_to_s3=True
+            upload_to_s3=True,
+            include_blobs=backup_type == BackupType.FULL.value,
         )
         
         backup_record.status = BackupStatus.COMPLETED.value if result.success else BackupStatus.FAILED.value
+        if result.success and settings.BACKUP_VERIFY:
+            verification = await backup_service.verify_backup(result.key)
+            if verification["ok"]:
+                backup_record.status = BackupStatus.VERIFIED.value
+            else:
+                result.error = f"Verification failed: {verification['error']}"
         backup_record.completed_at = datetime.utcnow()
         backup_record.file_path = result.file_path
         backup_record.file_size = result.file_size
@@ -63,6 +72,9 @@ async def trigger_backup(
             "file_size": result.file_size,
             "checksum": result.checksum,
             "duration_seconds": result.duration_seconds,
+            "format": result.format,
+            "blobs": result.blobs,
+            "status": backup_record.status,
             "error": result.error
         }
         
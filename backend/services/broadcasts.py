@@ -0,0 +1,172 @@
+# Admin Broadcasts - рассылка всем активным пользователям
+#
+# Рассылка сохраняется в broadcasts и отправляется воркером (планировщик,
+# scheduled_broadcast_job) пачками по BROADCAST_CHUNK получателей, keyset по
+# users.id. После каждой пачки в строку пишутся cursor, счётчики и
+# heartbeat_at, поэтому после рестарта рассылка продолжается с места
+# остановки: повторно может уйти не больше одной пачки.
+#
+# Одну рассылку ведёт один воркер: "pending" -> "running" условным UPDATE.
+# "running" без heartbeat дольше STALE_HEARTBEAT_MINUTES забирает следующий
+# запуск; прежний владелец замечает это по heartbeat_at и останавливается.
+#
+# Доставка — канал "telegram" через telegram_sender (лимиты Bot API);
+# остальные каналы, как и раньше, только фиксируются в аудите.
+
+import asyncio
+import html
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.notifications import Broadcast
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK = 500          # получателей за проход; ~17 с при 30 msg/s
+STALE_HEARTBEAT_MINUTES = 5    # "running" без отметки дольше — воркер умер
+
+
+async def create_broadcast(
+    db: AsyncSession,
+    admin_id: uuid.UUID,
+    title: str,
+    message: str,
+    channels: List[str],
+    target: str = "all",
+) -> Broadcast:
+    """Сохранить рассылку в очередь (commit — на вызывающем, вместе с аудитом)."""
+    result = await db.execute(select(func.count(User.id)).where(User.is_active == True))
+    broadcast = Broadcast(
+        id=uuid.uuid4(),
+        admin_id=admin_id,
+        title=title,
+        message=message,
+        target=target,
+        channels=list(channels),
+        status="pending",
+        target_count=result.scalar() or 0,
+        sent_count=0,
+        failed_count=0,
+    )
+    db.add(broadcast)
+    return broadcast
+
+
+def _text(broadcast: Broadcast) -> str:
+    return f"<b>{html.escape(broadcast.title)}</b>\n{html.escape(broadcast.message)}"
+
+
+def _claimable(now: datetime):
+    return or_(
+        Broadcast.status == "pending",
+        and_(
+            Broadcast.status == "running",
+            func.coalesce(Broadcast.heartbeat_at, Broadcast.started_at)
+            < now - timedelta(minutes=STALE_HEARTBEAT_MINUTES),
+        ),
+    )
+
+
+async def _claim(session_factory, broadcast_id: uuid.UUID) -> Optional[datetime]:
+    """Забрать рассылку. Возвращает наш heartbeat_at (токен владения) или None."""
+    now = datetime.utcnow()
+    async with session_factory() as db:
+        result = await db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, _claimable(now))
+            .values(status="running", started_at=func.coalesce(Broadcast.started_at, now), heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return now if result.rowcount else None
+
+
+async def _update(session_factory, broadcast_id: uuid.UUID, owner: datetime, **values) -> bool:
+    """Update only while we still own the broadcast (status running, our heartbeat)."""
+    async with session_factory() as db:
+        result = await db.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.status == "running",
+                Broadcast.heartbeat_at == owner,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount != 0
+
+
+def _recipients(cursor: Optional[uuid.UUID]):
+    query = select(User.id, User.telegram_id).where(User.is_active == True, User.telegram_id != None)
+    if cursor:
+        query = query.where(User.id > cursor)
+    return query.order_by(User.id).limit(BROADCAST_CHUNK)
+
+
+async def run_broadcast(broadcast_id: uuid.UUID, session_factory=None):
+    """Отправить рассылку (или её остаток после рестарта) пачками."""
+    from backend.services.telegram_sender import telegram_sender
+
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+
+    owner = await _claim(session_factory, broadcast_id)
+    if owner is None:
+        return
+    async with session_factory() as db:
+        broadcast = await db.get(Broadcast, broadcast_id)
+        cursor, channels, text = broadcast.cursor, broadcast.channels or [], _text(broadcast)
+
+    try:
+        if "telegram" in channels:
+            while True:
+                async with session_factory() as db:
+                    rows = (await db.execute(_recipients(cursor))).all()
+                if not rows:
+                    break
+                # Лимитер отправителя разносит пачку по времени; ждём доставки, потом двигаем cursor
+                results = await asyncio.gather(*(telegram_sender.send_message(chat_id, text) for _, chat_id in rows))
+                sent = sum(1 for ok in results if ok)
+                cursor, now = rows[-1][0], datetime.utcnow()
+                if not await _update(
+                    session_factory, broadcast_id, owner,
+                    cursor=cursor, heartbeat_at=now,
+                    sent_count=Broadcast.sent_count + sent,
+                    failed_count=Broadcast.failed_count + (len(rows) - sent),
+                ):
+                    logger.warning(f"Broadcast {broadcast_id} was taken over by another worker, stopping")
+                    return
+                owner = now
+
+        await _update(session_factory, broadcast_id, owner, status="completed", completed_at=datetime.utcnow())
+        logger.info(f"Broadcast {broadcast_id} completed")
+    except Exception as e:
+        logger.error(f"Broadcast {broadcast_id} failed: {e}")
+        await _update(
+            session_factory, broadcast_id, owner,
+            status="failed", error=str(e)[:500], completed_at=datetime.utcnow(),
+        )
+
+
+async def run_pending_broadcasts(session_factory=None) -> int:
+    """Worker entry point: deliver queued broadcasts and resume abandoned ones, oldest first."""
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Broadcast.id).where(_claimable(datetime.utcnow())).order_by(Broadcast.created_at)
+        )
+        ids = [row[0] for row in result.all()]
+
+    for broadcast_id in ids:
+        await run_broadcast(broadcast_id, session_factory)
+    return len(ids)
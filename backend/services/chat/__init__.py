@@ -20,6 +20,20 @@ from backend.services.chat.state import (
     state_manager,
 )
 
+# Presence
+from backend.services.chat.presence import (
+    PresenceService,
+    presence_service,
+    get_partner_ids_batch,
+    invalidate_partners,
+)
+
+# last_seen write coalescing
+from backend.services.chat.last_seen import (
+    LastSeenFlusher,
+    last_seen_flusher,
+)
+
 # Connections
 from backend.services.chat.connections import (
     ConnectionManager,
@@ -69,6 +83,10 @@ __all__ = [
     "CallInfo", "EphemeralMessage", "AVAILABLE_REACTIONS",
     # State
     "ChatStateManager", "state_manager",
+    # Presence
+    "PresenceService", "presence_service",
+    "get_partner_ids_batch", "invalidate_partners",
+    "LastSeenFlusher", "last_seen_flusher",
     # Connections
     "ConnectionManager", "manager",
     # Messages
@@ -0,0 +1,98 @@
+"""
+Chat - per-connection send queue
+
+Every WebSocket gets a bounded queue drained by its own writer task, so a
+sender never awaits a slow client's socket. Slow consumers are handled by
+policy instead of stalling everyone:
+- queue full + droppable event (typing, presence, pong) -> event dropped
+- queue full + anything else, or a send exceeding SEND_TIMEOUT -> socket closed
+  (client reconnects and re-syncs history over REST)
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from backend.core.instrumentation import bounded_label, ws_message
+from backend.metrics import WS_MESSAGES_DROPPED
+from backend.services.chat.protocol import JSON, JsonCodec
+
+logger = logging.getLogger(__name__)
+
+SEND_QUEUE_SIZE = 256
+SEND_TIMEOUT = 10.0
+SLOW_CONSUMER_CLOSE_CODE = 4008
+DROPPABLE_EVENTS = frozenset({"typing", "online_status", "pong"})
+
+
+class ClientChannel:
+    """Bounded outbound queue + writer task for one WebSocket."""
+
+    def __init__(self, websocket, codec: JsonCodec = JSON, maxsize: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.codec = codec
+        self.dropped = 0
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run())
+
+    def send(self, message: dict) -> bool:
+        """Enqueue without waiting. Returns False if dropped or closed."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            if message.get("type") in DROPPABLE_EVENTS:
+                self.dropped += 1
+                WS_MESSAGES_DROPPED.labels(message["type"]).inc()
+                return False
+            logger.warning(
+                f"WS send queue full ({self._queue.maxsize}), closing slow consumer"
+            )
+            self._abort()
+            return False
+
+    async def _run(self):
+        try:
+            while True:
+                message = await self._queue.get()
+                payload = self.codec.encode(message)
+                if self.codec.binary:
+                    send = self.websocket.send_bytes(payload)
+                else:
+                    send = self.websocket.send_text(payload)
+                await asyncio.wait_for(send, timeout=SEND_TIMEOUT)
+                ws_message("out", message.get("type"))
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            logger.warning(f"WS send exceeded {SEND_TIMEOUT}s, closing slow consumer")
+            self.closed = True
+            await self._close_socket()
+        except Exception:
+            # Socket already gone; receive loop will run disconnect cleanup
+            self.closed = True
+
+    def _abort(self):
+        self.closed = True
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Slow consumer")
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop the writer (connection unregistered). Pending events are discarded."""
+        self.closed = True
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
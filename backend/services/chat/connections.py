@@ -4,9 +4,13 @@ Chat - WebSocket Connection Manager
 
 import asyncio
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from backend.services.chat.state import state_manager
+from backend.services.chat.presence import presence_service
+from backend.services.chat.channel import ClientChannel
+from backend.services.chat.protocol import JsonCodec
+from backend.metrics import WS_CONNECTIONS
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +23,23 @@ class ConnectionManager:
     For horizontal scaling (2+ servers), migrate to Redis Pub/Sub:
     - On message: publish to Redis channel
     - Each server: subscribe and forward to local connections
+
+    Outbound traffic goes through a per-socket ClientChannel (bounded queue +
+    writer task, negotiated codec), so send_personal never blocks on a slow
+    client.
     """
     def __init__(self):
         self.active_connections: Dict[str, List] = {}
         self._offline_tasks: Dict[str, asyncio.Task] = {}
+        # id(websocket) -> channel (Starlette WebSocket is not hashable)
+        self._channels: Dict[int, ClientChannel] = {}
     
-    async def connect(self, websocket, user_id: str):
+    async def connect(self, websocket, user_id: str, codec: Optional[JsonCodec] = None):
         # accept() вызывается снаружи (в websocket_endpoint), здесь только регистрация
+        channel = ClientChannel(websocket, codec) if codec else ClientChannel(websocket)
+        channel.start()
+        self._channels[id(websocket)] = channel
+        WS_CONNECTIONS.labels(channel.codec.name).inc()
         
         # Cancel any pending offline task for this user (reconnect within grace period)
         if user_id in self._offline_tasks:
@@ -35,12 +49,15 @@ class ConnectionManager:
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
+        # Presence write is immediate; the online_status fan-out to matches
+        # is debounced and batched by presence_service
         await state_manager.set_user_online(user_id)
-        
-        # Broadcast online status to all matches
-        await self._broadcast_online_status(user_id, True)
     
     def disconnect(self, websocket, user_id: str):
+        channel = self._channels.pop(id(websocket), None)
+        if channel:
+            channel.close()
+            WS_CONNECTIONS.labels(channel.codec.name).dec()
         if user_id in self.active_connections:
             if websocket in self.active_connections[user_id]:
                 self.active_connections[user_id].remove(websocket)
@@ -57,7 +74,6 @@ class ConnectionManager:
                 # Only set offline if user hasn't reconnected
                 if user_id not in self.active_connections:
                     await state_manager.set_user_offline(user_id)
-                    await self._broadcast_online_status(user_id, False)
                     logger.info(f"User {user_id} marked offline after grace period")
             except asyncio.CancelledError:
                 pass  # User reconnected, task cancelled
@@ -68,44 +84,25 @@ class ConnectionManager:
         
         self._offline_tasks[user_id] = asyncio.create_task(set_offline_after_delay())
 
-    async def _broadcast_online_status(self, user_id: str, is_online: bool):
-        """Send online_status event to all matched users who are currently connected."""
-        try:
-            from backend.db.session import async_session_maker
-            from sqlalchemy import select, or_, and_
-            from uuid import UUID
-            
-            async with async_session_maker() as db:
-                from backend.models.interaction import Match
-                uid = UUID(user_id)
-                result = await db.execute(
-                    select(Match).where(
-                        and_(
-                            Match.is_active == True,
-                            or_(Match.user1_id == uid, Match.user2_id == uid)
-                        )
-                    )
-                )
-                matches = result.scalars().all()
-                
-                for match in matches:
-                    partner_id = str(match.user2_id) if str(match.user1_id) == user_id else str(match.user1_id)
-                    if partner_id in self.active_connections:
-                        await self.send_personal(partner_id, {
-                            "type": "online_status",
-                            "user_id": user_id,
-                            "is_online": is_online,
-                        })
-        except Exception as e:
-            logger.error(f"Failed to broadcast online status for {user_id}: {e}")
+    def heartbeat(self, user_id: str):
+        """Client ping: refresh presence TTL (buffered, see presence_service)."""
+        presence_service.heartbeat(user_id)
 
     async def send_personal(self, user_id: str, message: dict):
-        connections = self.active_connections.get(user_id, [])
-        for ws in connections:
-            try:
-                await ws.send_json(message)
-            except:
-                pass
+        """Enqueue to every socket of the user; never waits for the network."""
+        for ws in self.active_connections.get(user_id, []):
+            await self.send_to_socket(ws, message)
+
+    async def send_to_socket(self, websocket, message: dict):
+        """Send to one socket through its channel (encoded with its protocol)."""
+        channel = self._channels.get(id(websocket))
+        if channel:
+            channel.send(message)
+            return
+        try:
+            await websocket.send_json(message)
+        except Exception as e:
+            logger.debug(f"Direct WS send failed: {e}")
 
     async def send_to_match(self, match_id: str, sender_id: str, recipient_id: str, message: dict):
         await self.send_personal(recipient_id, message)
@@ -123,3 +120,4 @@ class ConnectionManager:
 
 
 manager = ConnectionManager()
+presence_service.bind(manager.send_personal, manager.is_online)
@@ -0,0 +1,144 @@
+"""
+Chat - last_seen write coalescing
+
+Connect/disconnect timestamps are accumulated in a Redis hash
+(``last_seen:dirty`` -> {user_id: unix ts}) and periodically written to
+``users.last_seen`` with one bulk ``UPDATE ... FROM (VALUES ...)`` per chunk,
+instead of an ORM load + commit on every WebSocket disconnect.
+
+Readers should prefer presence (Redis) and fall back to the DB column.
+"""
+
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import Uuid, DateTime, column, update, values, or_
+
+from backend.core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "last_seen:dirty"
+FLUSH_CHUNK = 1000
+
+
+def _to_db_datetime(ts: float) -> datetime:
+    # users.last_seen is a naive UTC column (see datetime.utcnow defaults)
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
+
+
+class LastSeenFlusher:
+    """Buffers last_seen timestamps and bulk-writes them to Postgres."""
+
+    def __init__(self):
+        # Used only when Redis is not configured (single-process dev)
+        self._local: Dict[str, float] = {}
+
+    async def record(self, user_id: str, ts: Optional[float] = None, pipe=None):
+        """
+        Remember the latest activity timestamp for a user.
+        Pass ``pipe`` to piggyback on an existing Redis pipeline.
+        """
+        ts = ts or time.time()
+        if pipe is not None:
+            pipe.hset(DIRTY_KEY, user_id, ts)
+            return
+        r = await redis_manager.get_redis()
+        if not r:
+            self._local[user_id] = max(ts, self._local.get(user_id, 0))
+            return
+        try:
+            await r.hset(DIRTY_KEY, user_id, ts)
+        except Exception as e:
+            logger.warning(f"last_seen record error: {e}")
+            self._local[user_id] = max(ts, self._local.get(user_id, 0))
+
+    async def _drain(self) -> Dict[str, float]:
+        pending, self._local = self._local, {}
+        r = await redis_manager.get_redis()
+        if not r:
+            return pending
+        # RENAME is atomic: new records go to a fresh DIRTY_KEY meanwhile
+        batch_key = f"{DIRTY_KEY}:{uuid.uuid4().hex}"
+        try:
+            await r.rename(DIRTY_KEY, batch_key)
+        except Exception:
+            return pending  # "no such key" -> nothing buffered in Redis
+        try:
+            data = await r.hgetall(batch_key)
+            await r.delete(batch_key)
+        except Exception as e:
+            logger.error(f"last_seen drain error: {e}")
+            return pending
+        for uid, ts in data.items():
+            pending[uid] = max(float(ts), pending.get(uid, 0))
+        return pending
+
+    async def _restore(self, entries: Dict[str, float]):
+        """Put back entries that failed to flush; newer records win (HSETNX)."""
+        r = await redis_manager.get_redis()
+        if not r:
+            for uid, ts in entries.items():
+                self._local.setdefault(uid, ts)
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for uid, ts in entries.items():
+                    pipe.hsetnx(DIRTY_KEY, uid, ts)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"last_seen restore error, {len(entries)} updates lost: {e}")
+
+    async def flush(self, db=None) -> int:
+        """Write buffered timestamps to users.last_seen. Returns rows updated."""
+        entries = await self._drain()
+        if not entries:
+            return 0
+
+        rows = []
+        for uid, ts in entries.items():
+            try:
+                rows.append((uuid.UUID(uid), _to_db_datetime(ts)))
+            except ValueError:
+                continue
+
+        from backend.models.user import User
+
+        should_close = db is None
+        if db is None:
+            from backend.db.session import async_session_maker
+            db = async_session_maker()
+
+        updated = 0
+        try:
+            for i in range(0, len(rows), FLUSH_CHUNK):
+                chunk = rows[i:i + FLUSH_CHUNK]
+                v = values(
+                    column("id", Uuid), column("ts", DateTime), name="v"
+                ).data(chunk)
+                result = await db.execute(
+                    update(User)
+                    .where(User.id == v.c.id)
+                    .where(or_(User.last_seen.is_(None), User.last_seen < v.c.ts))
+                    .values(last_seen=v.c.ts)
+                    .execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount or 0
+            await db.commit()
+        except Exception as e:
+            logger.error(f"last_seen flush failed: {e}")
+            await db.rollback()
+            await self._restore(entries)
+            return 0
+        finally:
+            if should_close:
+                await db.close()
+
+        logger.info(f"last_seen flush: {updated} users updated ({len(rows)} buffered)")
+        return updated
+
+
+last_seen_flusher = LastSeenFlusher()
@@ -0,0 +1,308 @@
+"""
+Chat - Presence (heartbeat-driven online status, partner fan-out)
+
+Presence lives in a single Redis sorted set ``presence:last_seen``:
+- score > 0  -> user is connected, score = last heartbeat (unix ts)
+- score < 0  -> user disconnected, abs(score) = last seen (unix ts)
+A positive score older than PRESENCE_TTL is treated as offline (crashed
+worker / dead socket), so one ZMSCORE answers both "online?" and "last seen".
+
+Heartbeats and online/offline events are buffered in-process and flushed by a
+short debounce task: one ZADD for all heartbeats, one batched partner lookup
+(Redis SMEMBERS pipeline + a single DB query for cache misses) for all events.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from backend.core.redis import redis_manager
+from backend.services.chat.last_seen import last_seen_flusher
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = "presence:last_seen"
+PARTNERS_KEY = "presence:partners:{}"
+PARTNERS_EMPTY = "-"  # sentinel so "no partners" is cached too
+
+PRESENCE_TTL = 120            # seconds without heartbeat -> offline
+HEARTBEAT_MIN_INTERVAL = 30   # don't rewrite the same user's score more often
+PARTNERS_TTL = 600            # partner list cache lifetime
+FLUSH_DELAY = 0.5             # debounce window for heartbeats / fan-out
+PRESENCE_RETENTION = 7 * 24 * 3600  # prune entries older than this
+MAX_BROADCAST_STATES = 50000  # above this, offline entries are dropped from _last_broadcast
+
+
+def _to_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class PresenceService:
+    """Heartbeat presence + batched, debounced online/offline fan-out."""
+
+    def __init__(self):
+        self._pending_heartbeats: Dict[str, float] = {}
+        self._pending_events: Dict[str, bool] = {}
+        self._last_written: Dict[str, float] = {}
+        self._last_broadcast: Dict[str, bool] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sender: Optional[Callable] = None
+        self._is_local: Optional[Callable[[str], bool]] = None
+
+    def bind(self, sender: Callable, is_local: Callable[[str], bool]):
+        """Attach the connection manager used to deliver fan-out events."""
+        self._sender = sender
+        self._is_local = is_local
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    async def set_online(self, user_id: str):
+        """Mark user online immediately (connect) and queue an online event."""
+        now = time.time()
+        self._last_written[user_id] = now
+        self._pending_heartbeats.pop(user_id, None)
+        await self._write(user_id, now)
+        self._queue_event(user_id, True)
+
+    async def set_offline(self, user_id: str):
+        """Mark user offline (after disconnect grace) and queue an offline event."""
+        now = time.time()
+        self._last_written.pop(user_id, None)
+        self._pending_heartbeats.pop(user_id, None)
+        await self._write(user_id, -now)
+        self._queue_event(user_id, False)
+
+    async def _write(self, user_id: str, score: float):
+        """ZADD presence + buffer users.last_seen in one round trip."""
+        r = await redis_manager.get_redis()
+        if not r:
+            await last_seen_flusher.record(user_id, abs(score))
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.zadd(PRESENCE_KEY, {user_id: score})
+                await last_seen_flusher.record(user_id, abs(score), pipe=pipe)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Presence write error: {e}")
+
+    def heartbeat(self, user_id: str):
+        """Refresh presence on client ping. Buffered; written in one ZADD per flush."""
+        now = time.time()
+        if now - self._last_written.get(user_id, 0) < HEARTBEAT_MIN_INTERVAL:
+            return
+        self._pending_heartbeats[user_id] = now
+        self._schedule_flush()
+
+    def _queue_event(self, user_id: str, is_online: bool):
+        self._pending_events[user_id] = is_online
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        except RuntimeError:
+            pass  # No running loop (sync context) — next async call will flush
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_DELAY)
+        await self.flush()
+
+    async def flush(self):
+        """Write buffered heartbeats and deliver coalesced online/offline events."""
+        heartbeats, self._pending_heartbeats = self._pending_heartbeats, {}
+        events, self._pending_events = self._pending_events, {}
+
+        if heartbeats:
+            r = await redis_manager.get_redis()
+            if r:
+                try:
+                    await r.zadd(PRESENCE_KEY, heartbeats)
+                    self._last_written.update(heartbeats)
+                except Exception as e:
+                    logger.warning(f"Presence heartbeat flush error: {e}")
+
+        # Drop flapping: reconnect within the window nets out to "no change"
+        events = {
+            uid: online for uid, online in events.items()
+            if self._last_broadcast.get(uid) != online
+        }
+        if events:
+            await self._fan_out(events)
+
+    async def _fan_out(self, events: Dict[str, bool]):
+        if not self._sender or not self._is_local:
+            return
+        try:
+            partners = await get_partner_ids_batch(list(events))
+        except Exception as e:
+            logger.error(f"Presence partner lookup failed: {e}")
+            return
+
+        # Offline is remembered too, so a repeated offline event is not re-sent
+        self._last_broadcast.update(events)
+        if len(self._last_broadcast) > MAX_BROADCAST_STATES:
+            self._last_broadcast = {uid: online for uid, online in self._last_broadcast.items() if online}
+
+        for user_id, is_online in events.items():
+            for partner_id in partners.get(user_id, ()):
+                if self._is_local(partner_id):
+                    await self._sender(partner_id, {
+                        "type": "online_status",
+                        "user_id": user_id,
+                        "is_online": is_online,
+                    })
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    async def get_presence_batch(self, user_ids: List[str]) -> Dict[str, dict]:
+        """
+        Bulk presence via one ZMSCORE.
+        Returns {user_id: {"is_online": bool, "last_seen": iso | None}}.
+        """
+        empty = {uid: {"is_online": False, "last_seen": None} for uid in user_ids}
+        r = await redis_manager.get_redis()
+        if not r or not user_ids:
+            return empty
+        try:
+            scores = await r.zmscore(PRESENCE_KEY, user_ids)
+        except Exception as e:
+            logger.error(f"Presence batch error: {e}")
+            return empty
+
+        cutoff = time.time() - PRESENCE_TTL
+        result = {}
+        for uid, score in zip(user_ids, scores):
+            if score is None:
+                result[uid] = {"is_online": False, "last_seen": None}
+            else:
+                result[uid] = {
+                    "is_online": score > 0 and score >= cutoff,
+                    "last_seen": _to_iso(abs(score)),
+                }
+        return result
+
+    async def is_online(self, user_id: str) -> bool:
+        return (await self.get_presence_batch([user_id]))[user_id]["is_online"]
+
+    async def get_last_seen(self, user_id: str) -> Optional[str]:
+        return (await self.get_presence_batch([user_id]))[user_id]["last_seen"]
+
+    async def prune(self) -> int:
+        """Remove presence entries older than PRESENCE_RETENTION."""
+        r = await redis_manager.get_redis()
+        if not r:
+            return 0
+        edge = time.time() - PRESENCE_RETENTION
+        try:
+            removed = await r.zremrangebyscore(PRESENCE_KEY, 0, edge)
+            removed += await r.zremrangebyscore(PRESENCE_KEY, -edge, 0)
+            return removed
+        except Exception as e:
+            logger.warning(f"Presence prune error: {e}")
+            return 0
+
+
+# ----------------------------------------------------------------------
+# Partner list cache
+# ----------------------------------------------------------------------
+
+async def get_partner_ids_batch(user_ids: Iterable[str]) -> Dict[str, Set[str]]:
+    """
+    Active match partners for many users.
+    Served from Redis sets; misses are loaded with ONE query and cached.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    result: Dict[str, Set[str]] = {}
+    misses: List[str] = list(user_ids)
+
+    r = await redis_manager.get_redis()
+    if r and user_ids:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for uid in user_ids:
+                    pipe.smembers(PARTNERS_KEY.format(uid))
+                cached = await pipe.execute()
+            misses = []
+            for uid, members in zip(user_ids, cached):
+                if members:
+                    result[uid] = {m for m in members if m != PARTNERS_EMPTY}
+                else:
+                    misses.append(uid)
+        except Exception as e:
+            logger.warning(f"Partner cache read error: {e}")
+            misses = [uid for uid in user_ids if uid not in result]
+
+    if not misses:
+        return result
+
+    loaded = await _load_partner_ids(misses)
+    result.update(loaded)
+
+    if r:
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for uid, partners in loaded.items():
+                    key = PARTNERS_KEY.format(uid)
+                    pipe.delete(key)
+                    pipe.sadd(key, *(partners or {PARTNERS_EMPTY}))
+                    pipe.expire(key, PARTNERS_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Partner cache write error: {e}")
+    return result
+
+
+async def _load_partner_ids(user_ids: List[str]) -> Dict[str, Set[str]]:
+    from sqlalchemy import select, or_
+    from backend.db.session import async_session_maker
+    from backend.models.interaction import Match
+
+    uuids = []
+    for uid in user_ids:
+        try:
+            uuids.append(UUID(uid))
+        except ValueError:
+            continue
+
+    result: Dict[str, Set[str]] = {uid: set() for uid in user_ids}
+    if not uuids:
+        return result
+
+    async with async_session_maker() as db:
+        rows = await db.execute(
+            select(Match.user1_id, Match.user2_id).where(
+                Match.is_active == True,
+                or_(Match.user1_id.in_(uuids), Match.user2_id.in_(uuids)),
+            )
+        )
+        for u1, u2 in rows.all():
+            s1, s2 = str(u1), str(u2)
+            if s1 in result:
+                result[s1].add(s2)
+            if s2 in result:
+                result[s2].add(s1)
+    return result
+
+
+async def invalidate_partners(*user_ids) -> None:
+    """Drop cached partner lists (call after match create / unmatch / block)."""
+    r = await redis_manager.get_redis()
+    if not r or not user_ids:
+        return
+    try:
+        await r.delete(*(PARTNERS_KEY.format(str(uid)) for uid in user_ids))
+    except Exception as e:
+        logger.warning(f"Partner cache invalidate error: {e}")
+
+
+presence_service = PresenceService()
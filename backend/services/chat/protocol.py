@@ -0,0 +1,143 @@
+"""
+Chat - WebSocket wire protocols
+
+Negotiated once in the ``auth`` handshake:
+    {"type": "auth", "token": "...", "protocol": "json" | "compact" | "msgpack"}
+
+- ``json``    — legacy verbose JSON (default, unchanged for old clients)
+- ``compact`` — JSON text frames, short keys, duplicated alias fields dropped
+- ``msgpack`` — same short-key payload as binary msgpack frames
+                (falls back to ``compact`` if msgpack is not installed)
+"""
+
+import json
+import logging
+from typing import Any, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+# Long key -> short key. Keep stable: clients hardcode this table.
+SHORT_KEYS: Dict[str, str] = {
+    "type": "t",
+    "id": "i",
+    "match_id": "m",
+    "sender_id": "s",
+    "receiver_id": "r",
+    "recipient_id": "r",
+    "content": "c",
+    "created_at": "ts",
+    "user_id": "u",
+    "is_online": "o",
+    "is_typing": "ty",
+    "message_ids": "ids",
+    "reader_id": "rd",
+    "media_url": "mu",
+    "duration": "d",
+    "msg_type": "mt",
+    "confirmed": "cf",
+    "message": "msg",
+    "emoji": "e",
+    "transaction_id": "tx",
+    "status": "st",
+}
+LONG_KEYS: Dict[str, str] = {v: k for k, v in SHORT_KEYS.items()}
+# "recipient_id" and "receiver_id" share "r"; decode to the canonical one
+LONG_KEYS["r"] = "receiver_id"
+
+# Fields that only duplicate another field in verbose events
+ALIASES: Dict[str, str] = {
+    "message_id": "id",
+    "text": "content",
+    "timestamp": "created_at",
+    "photo_url": "media_url",
+}
+
+
+class JsonCodec:
+    """Legacy verbose JSON."""
+    name = "json"
+    binary = False
+
+    def encode(self, message: dict) -> str:
+        return json.dumps(message, ensure_ascii=False, default=str)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        return json.loads(data)
+
+
+class CompactCodec(JsonCodec):
+    """Short keys, no alias duplicates, compact separators."""
+    name = "compact"
+
+    def shrink(self, message: dict) -> dict:
+        out = {}
+        for key, value in message.items():
+            alias_of = ALIASES.get(key)
+            if alias_of and message.get(alias_of) == value:
+                continue
+            if alias_of and alias_of not in message:
+                key = alias_of
+            out[SHORT_KEYS.get(key, key)] = value
+        return out
+
+    def expand(self, message: dict) -> dict:
+        out = {LONG_KEYS.get(k, k): v for k, v in message.items()}
+        # Обратно к shrink: восстанавливаем алиасы ("i" -> id и message_id),
+        # чтобы обработчики видели те же ключи, что и в verbose JSON
+        for alias, canonical in ALIASES.items():
+            if canonical in out and alias not in out:
+                out[alias] = out[canonical]
+        return out
+
+    def encode(self, message: dict) -> str:
+        return json.dumps(self.shrink(message), ensure_ascii=False,
+                          separators=(",", ":"), default=str)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        message = json.loads(data)
+        if not isinstance(message, dict):
+            raise ValueError("Message must be an object")
+        return self.expand(message)
+
+
+class MsgpackCodec(CompactCodec):
+    """Short-key payload as binary msgpack frames."""
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(self.shrink(message), default=str, use_bin_type=True)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        if isinstance(data, str):
+            return super().decode(data)
+        try:
+            message = msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack frame: {e}")
+        if not isinstance(message, dict):
+            raise ValueError("Message must be a map")
+        return self.expand(message)
+
+
+JSON = JsonCodec()
+COMPACT = CompactCodec()
+MSGPACK = MsgpackCodec() if msgpack is not None else None
+
+
+def negotiate(requested: Any) -> JsonCodec:
+    """Pick codec for the protocol name requested in the auth message."""
+    if requested == "msgpack":
+        if MSGPACK is not None:
+            return MSGPACK
+        logger.info("msgpack requested but not installed, using compact JSON")
+        return COMPACT
+    if requested == "compact":
+        return COMPACT
+    return JSON
@@ -3,10 +3,10 @@ Chat - Redis State Management (online, typing, unread)
 """
 
 import logging
-from datetime import datetime, timezone
 from typing import Dict, List, Optional
 
 from backend.core.redis import redis_manager
+from backend.services.chat.presence import presence_service
 
 logger = logging.getLogger(__name__)
 
@@ -15,49 +15,31 @@ class ChatStateManager:
     """Manages chat state in Redis (online, typing, unread)"""
     
     async def set_user_online(self, user_id: str):
-        await redis_manager.set_value(f"user:online:{user_id}", "true", expire=300)
-        # Also update last_seen timestamp
-        now = datetime.now(timezone.utc).isoformat()
-        await redis_manager.set_value(f"user:last_seen:{user_id}", now, expire=604800)  # 7 days
-        
+        await presence_service.set_online(user_id)
+
     async def set_user_offline(self, user_id: str):
-        await redis_manager.delete(f"user:online:{user_id}")
-        # Update last_seen on disconnect
-        now = datetime.now(timezone.utc).isoformat()
-        await redis_manager.set_value(f"user:last_seen:{user_id}", now, expire=604800)  # 7 days
-        
+        await presence_service.set_offline(user_id)
+
     async def is_user_online(self, user_id: str) -> bool:
-        return await redis_manager.get_value(f"user:online:{user_id}") == "true"
+        return await presence_service.is_online(user_id)
 
     async def get_last_seen(self, user_id: str) -> Optional[str]:
         """Get ISO timestamp of when user was last online."""
-        return await redis_manager.get_value(f"user:last_seen:{user_id}")
+        return await presence_service.get_last_seen(user_id)
 
     async def is_users_online_batch(self, user_ids: list[str]) -> dict[str, bool]:
-        """Batch check online status for multiple users via MGET."""
-        r = await redis_manager.get_redis()
-        if not r or not user_ids:
-            return {uid: False for uid in user_ids}
-        try:
-            keys = [f"user:online:{uid}" for uid in user_ids]
-            results = await r.mget(*keys)
-            return {uid: (val == "true") for uid, val in zip(user_ids, results)}
-        except Exception as e:
-            logger.error(f"Batch online check error: {e}")
-            return {uid: False for uid in user_ids}
+        """Batch check online status for multiple users (one ZMSCORE)."""
+        presence = await presence_service.get_presence_batch(user_ids)
+        return {uid: p["is_online"] for uid, p in presence.items()}
+
+    async def get_presence_batch(self, user_ids: list[str]) -> dict[str, dict]:
+        """Online flag + last seen for many users in one round trip."""
+        return await presence_service.get_presence_batch(user_ids)
 
     async def get_last_seen_batch(self, user_ids: list[str]) -> dict[str, str | None]:
-        """Batch get last seen for multiple users via MGET."""
-        r = await redis_manager.get_redis()
-        if not r or not user_ids:
-            return {uid: None for uid in user_ids}
-        try:
-            keys = [f"user:last_seen:{uid}" for uid in user_ids]
-            results = await r.mget(*keys)
-            return {uid: val for uid, val in zip(user_ids, results)}
-        except Exception as e:
-            logger.error(f"Batch last seen error: {e}")
-            return {uid: None for uid in user_ids}
+        """Batch get last seen for multiple users (one ZMSCORE)."""
+        presence = await presence_service.get_presence_batch(user_ids)
+        return {uid: p["last_seen"] for uid, p in presence.items()}
 
     async def set_typing(self, match_id: str, user_id: str, is_typing: bool):
         """Set/remove typing indicator using Redis Set for efficient retrieval"""
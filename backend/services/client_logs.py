@@ -0,0 +1,277 @@
+"""
+Client log ingestion (Telegram WebApp console)
+
+- Shared ring buffer: Redis stream client_logs:stream trimmed with
+  XADD MAXLEN ~ STREAM_MAXLEN, so every worker serves the same recent logs.
+  Without Redis, a per-process deque(maxlen=STREAM_MAXLEN).
+- Per-source (user, otherwise IP) fixed-window rate limit; entries above
+  the limit are dropped, not queued.
+- WARN/ERROR are always kept, LOG/INFO are sampled at SAMPLE_RATE.
+- Accepted entries are queued in client_logs:pending and written to the
+  client_logs table by a scheduled job: entries with the same signature
+  (level + message with numbers/ids masked + URL path) become one row
+  with a counter. Rows unseen for RETENTION_DAYS are deleted.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, desc, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.core.redis import redis_manager
+from backend.models.system import ClientLog
+
+logger = logging.getLogger("client_logs")
+
+STREAM_KEY = "client_logs:stream"
+PENDING_KEY = "client_logs:pending"
+PENDING_BATCH_KEY = "client_logs:pending:batch"
+RATE_KEY = "client_logs:rate:{}"
+
+STREAM_MAXLEN = 500
+PENDING_CAP = 10000             # не даём очереди расти, если flush-джоб не работает
+MAX_BATCH = 50                  # записей в одном POST
+MAX_MESSAGE = 2000
+RATE_LIMIT = 120                # записей на источник в RATE_WINDOW
+RATE_WINDOW = 60
+SAMPLE_RATE = 0.1               # доля LOG/INFO, которую сохраняем
+LEVELS = {"LOG", "INFO", "WARN", "ERROR"}
+ALWAYS_KEEP = {"WARN", "ERROR"}
+RETENTION_DAYS = 30
+FLUSH_CHUNK = 500               # строк в одном INSERT (10 параметров на строку, лимит asyncpg 32767)
+
+# Числа, hex-идентификаторы и uuid в сообщении не должны давать новую сигнатуру
+_VARIABLE = re.compile(r"\b[0-9a-f]{8}-[0-9a-f-]{27}\b|\b0x[0-9a-f]+\b|\b[0-9a-f]*\d[0-9a-f]*\b", re.IGNORECASE)
+
+
+def signature(level: str, message: str, url: Optional[str]) -> str:
+    path = urlsplit(url).path if url else ""
+    normalized = _VARIABLE.sub("#", message[:500])
+    return hashlib.sha256(f"{level}|{normalized}|{path}".encode()).hexdigest()
+
+
+def _clip(value: Optional[str], length: int) -> Optional[str]:
+    return value[:length] if value else None
+
+
+class ClientLogCollector:
+    def __init__(self, sample_rate: float = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._recent: deque = deque(maxlen=STREAM_MAXLEN)
+        self._pending: deque = deque(maxlen=PENDING_CAP)
+        self._windows: Dict[str, Tuple[int, int]] = {}
+
+    # --- ingestion -------------------------------------------------------
+
+    async def _allowance(self, source: str, requested: int) -> int:
+        """How many of `requested` entries fit into the source's rate window."""
+        r = await redis_manager.get_redis()
+        if r:
+            key = RATE_KEY.format(source)
+            try:
+                async with r.pipeline(transaction=False) as pipe:
+                    pipe.set(key, 0, ex=RATE_WINDOW, nx=True)
+                    pipe.incrby(key, requested)
+                    used = (await pipe.execute())[1]
+            except Exception as e:
+                logger.warning(f"Client log rate limit check failed: {e}")
+                return requested
+        else:
+            window = int(time.time() // RATE_WINDOW)
+            if len(self._windows) > 10000:
+                self._windows = {k: v for k, v in self._windows.items() if v[0] == window}
+            start, used = self._windows.get(source, (window, 0))
+            used = (used if start == window else 0) + requested
+            self._windows[source] = (window, used)
+        return max(0, min(requested, RATE_LIMIT - (used - requested)))
+
+    def _keep(self, level: str) -> bool:
+        return level in ALWAYS_KEEP or random.random() < self.sample_rate
+
+    async def ingest(self, entries: List[Dict[str, Any]], ip: str, user_id: Optional[str] = None) -> int:
+        """Rate-limit, sample and buffer a batch of client entries. Returns how many were accepted."""
+        entries = entries[:MAX_BATCH]
+        ip = _clip(ip, 64) or "unknown"
+        user_id = _clip(user_id, 64)
+        allowed = await self._allowance(user_id or ip, len(entries))
+        now = datetime.utcnow().isoformat()
+
+        records = []
+        for entry in entries[:allowed]:
+            level = str(entry.get("level") or "log").upper()
+            if level not in LEVELS or not self._keep(level):
+                continue
+            message = (entry.get("message") or "")[:MAX_MESSAGE]
+            records.append({
+                "time": entry.get("timestamp") or now,
+                "received_at": now,
+                "level": level,
+                "message": message,
+                "url": _clip(entry.get("url"), 500),
+                "ip": ip,
+                "user_id": user_id,
+                "user_agent": _clip(entry.get("userAgent"), 500),
+                "signature": signature(level, message, entry.get("url")),
+            })
+        if not records:
+            return 0
+
+        await self._buffer(records)
+
+        errors = [rec for rec in records if rec["level"] == "ERROR"]
+        if errors:
+            # Одна строка на запрос вместо строки на каждую запись
+            logger.warning(f"[CLIENT:{ip}] {len(errors)} error(s), first: {errors[0]['message'][:200]}")
+        return len(records)
+
+    async def _buffer(self, records: List[Dict[str, Any]]):
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                payloads = [json.dumps(rec, ensure_ascii=False) for rec in records]
+                async with r.pipeline(transaction=False) as pipe:
+                    for payload in payloads:
+                        pipe.xadd(STREAM_KEY, {"data": payload}, maxlen=STREAM_MAXLEN, approximate=True)
+                    pipe.rpush(PENDING_KEY, *payloads)
+                    pipe.ltrim(PENDING_KEY, -PENDING_CAP, -1)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Client log buffer write failed, keeping locally: {e}")
+        self._recent.extend(records)
+        self._pending.extend(records)
+
+    # --- live buffer -----------------------------------------------------
+
+    async def recent(self, limit: int = 50, level: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Latest buffered entries (oldest first) and the total matching the filter."""
+        records = list(self._recent)
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                entries = await r.xrevrange(STREAM_KEY, count=STREAM_MAXLEN)
+                records = [json.loads(fields["data"]) for _, fields in reversed(entries)] + records
+            except Exception as e:
+                logger.warning(f"Client log stream read failed: {e}")
+        if level:
+            records = [rec for rec in records if rec["level"] == level.upper()]
+        return records[-limit:] if limit > 0 else [], len(records)
+
+    async def clear(self):
+        self._recent.clear()
+        r = await redis_manager.get_redis()
+        if r:
+            await r.delete(STREAM_KEY)
+
+    # --- persistence -----------------------------------------------------
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Write pending entries to client_logs, one upsert row per signature."""
+        local = [self._pending.popleft() for _ in range(len(self._pending))]
+        buffered: List[str] = []
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                await r.rename(PENDING_KEY, PENDING_BATCH_KEY)
+                buffered = await r.lrange(PENDING_BATCH_KEY, 0, -1)
+            except Exception:
+                buffered = []   # очередь пуста (RENAME на несуществующий ключ)
+
+        records = local + [json.loads(raw) for raw in buffered]
+        if not records:
+            return 0
+
+        rows: Dict[str, Dict[str, Any]] = {}
+        for rec in records:
+            if rec["level"] not in LEVELS:
+                continue    # записано до проверки уровня в ingest
+            rec["ip"] = _clip(rec["ip"], 64)
+            seen = datetime.fromisoformat(rec["received_at"])
+            row = rows.get(rec["signature"])
+            if row is None:
+                rows[rec["signature"]] = {
+                    "signature": rec["signature"],
+                    "level": rec["level"],
+                    "message": rec["message"],
+                    "url": rec["url"],
+                    "ip": rec["ip"],
+                    "user_id": rec["user_id"],
+                    "user_agent": rec["user_agent"],
+                    "count": 1,
+                    "first_seen": seen,
+                    "last_seen": seen,
+                }
+                continue
+            row["count"] += 1
+            if seen >= row["last_seen"]:
+                row.update(last_seen=seen, url=rec["url"], ip=rec["ip"], user_id=rec["user_id"], user_agent=rec["user_agent"])
+            row["first_seen"] = min(row["first_seen"], seen)
+
+        try:
+            values = list(rows.values())
+            for i in range(0, len(values), FLUSH_CHUNK):
+                stmt = pg_insert(ClientLog).values(values[i:i + FLUSH_CHUNK])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[ClientLog.signature],
+                    set_={
+                        "count": ClientLog.count + stmt.excluded.count,
+                        "last_seen": stmt.excluded.last_seen,
+                        "url": stmt.excluded.url,
+                        "ip": stmt.excluded.ip,
+                        "user_id": stmt.excluded.user_id,
+                        "user_agent": stmt.excluded.user_agent,
+                    },
+                )
+                await db.execute(stmt)
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Client log flush failed: {e}")
+            await db.rollback()
+            self._pending.extend(local)
+            if buffered:
+                await r.rpush(PENDING_KEY, *buffered)
+            return 0
+        finally:
+            if buffered:
+                await r.delete(PENDING_BATCH_KEY)
+        return len(records)
+
+    async def cleanup(self, db: AsyncSession, days: int = RETENTION_DAYS) -> int:
+        """Delete signatures not seen for `days` days."""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        result = await db.execute(delete(ClientLog).where(ClientLog.last_seen < cutoff))
+        await db.commit()
+        return result.rowcount or 0
+
+    async def search(
+        self,
+        db: AsyncSession,
+        level: Optional[str] = None,
+        since: Optional[datetime] = None,
+        q: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> List[ClientLog]:
+        """Persisted signatures, most recently seen first."""
+        query = select(ClientLog)
+        if level:
+            query = query.where(ClientLog.level == level.upper())
+        if since:
+            query = query.where(ClientLog.last_seen >= since)
+        if q:
+            query = query.where(ClientLog.message.ilike(f"%{q}%"))
+        result = await db.execute(query.order_by(desc(ClientLog.last_seen)).offset(offset).limit(limit))
+        return list(result.scalars().all())
+
+
+client_log_collector = ClientLogCollector()
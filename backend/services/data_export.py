@@ -0,0 +1,424 @@
+# GDPR Data Export - фоновая выгрузка данных пользователя (Article 20)
+#
+# Архив: gzip NDJSON, одна строка на запись:
+#   {"type": "<section>", "data": {...}}
+# Первая строка — заголовок ("export"), последняя — итог ("summary").
+#
+# Каждая таблица читается серверным курсором (db.stream + yield_per),
+# в память попадает не больше EXPORT_BATCH строк, запись во временный
+# файл идёт пачками в отдельном потоке. Прогресс пишется в data_export_jobs после
+# каждой секции короткой отдельной сессией, поэтому читающая транзакция
+# не прерывается.
+#
+# Ограничения: одна активная выгрузка на пользователя и не чаще одной
+# в EXPORT_COOLDOWN_HOURS. Готовые архивы удаляются через
+# settings.DATA_EXPORT_TTL_HOURS (cleanup_expired_exports).
+#
+# Хранение: собранный архив загружается в archive_store() — S3 (тот же
+# клиент, что у бэкапов), ключ exports/<job_id>.ndjson.gz лежит в file_path.
+# Задание и скачивание попадают на разные инстансы, поэтому архив отдаётся
+# подписанной ссылкой S3 (download_url). Без S3 — локальная DATA_EXPORT_DIR,
+# это годится только для одного инстанса (dev).
+#
+# Зависшие задания: работающее обновляет heartbeat_at раз в HEARTBEAT_SECONDS,
+# очистка закрывает "running" только без отметки дольше STALE_HEARTBEAT_MINUTES;
+# "completed" ставится лишь пока задание ещё "running".
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update, or_, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config.settings import settings
+from backend.models.user_management import DataExportJob
+from backend.services.backup.streaming import file_to_target
+from backend.services.backup.targets import BackupTarget, FilesystemTarget
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH = 1000           # строк за один проход курсора
+EXPORT_COOLDOWN_HOURS = 24    # не чаще одной выгрузки в сутки
+STALE_JOB_MINUTES = 60        # "pending" дольше — фоновая задача потерялась (рестарт)
+HEARTBEAT_SECONDS = 60        # как часто работающее задание отмечается в БД
+STALE_HEARTBEAT_MINUTES = 10  # "running" без отметки дольше — воркер умер
+
+ACTIVE_STATUSES = ("pending", "running")
+ARCHIVE_PREFIX = "exports"
+
+PRIVACY_NOTE = "This is a complete export of your personal data stored on MambaX per GDPR Article 20."
+
+
+class ExportRateLimited(Exception):
+    """Выгрузка уже идёт или была недавно."""
+
+    def __init__(self, retry_after: int, job: Optional[DataExportJob] = None):
+        self.retry_after = retry_after
+        self.job = job
+        super().__init__(f"Export rate limited, retry after {retry_after}s")
+
+
+@dataclass
+class ExportSection:
+    name: str
+    query: Callable[[uuid.UUID], Any]
+    row: Callable[[Any], Dict[str, Any]]
+    stream: bool = True   # False — ORM-объект с eager-связями, одна строка
+
+
+def _sections() -> List[ExportSection]:
+    from backend.models.user import User
+    from backend.models.interaction import Swipe, Match, Like, Report
+    from backend.models.chat import Message
+    from backend.models.monetization import RevenueTransaction, GiftTransaction
+    from backend.models.profile_enrichment import UserPrompt, UserPreference
+
+    def profile_row(u) -> Dict[str, Any]:
+        return {
+            "id": u.id,
+            "name": u.name,
+            "email": u.email,
+            "phone": u.phone,
+            "telegram_id": u.telegram_id,
+            "bio": u.bio,
+            "interests": u.interests,
+            "photos": u.photos,
+            "gender": u.gender,
+            "age": u.age,
+            "location": {"lat": u.latitude, "lon": u.longitude} if u.latitude else None,
+            "created_at": u.created_at,
+            "status": u.status,
+            "role": u.role,
+            "subscription_tier": u.subscription_tier,
+        }
+
+    return [
+        ExportSection(
+            "profile",
+            lambda uid: select(User).where(User.id == uid),
+            lambda r: profile_row(r[0]),
+            stream=False,
+        ),
+        # UserPreference — key/value: одна строка на (category, key)
+        ExportSection(
+            "preferences",
+            lambda uid: select(
+                UserPreference.category, UserPreference.key, UserPreference.value,
+                UserPreference.is_dealbreaker, UserPreference.updated_at,
+            ).where(UserPreference.user_id == uid).order_by(UserPreference.category, UserPreference.key),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "prompts",
+            lambda uid: select(
+                UserPrompt.question, UserPrompt.answer, UserPrompt.type, UserPrompt.media_url,
+            ).where(UserPrompt.user_id == uid),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "messages_sent",
+            lambda uid: select(
+                Message.id, Message.match_id, Message.type, Message.text,
+                Message.created_at, Message.is_read,
+            ).where(Message.sender_id == uid).order_by(Message.created_at),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "likes_given",
+            lambda uid: select(
+                Like.liked_id.label("target_id"), Like.is_super, Like.created_at,
+            ).where(Like.liker_id == uid).order_by(Like.created_at),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "swipes",
+            lambda uid: select(
+                Swipe.to_user_id.label("target_id"), Swipe.action, Swipe.timestamp.label("created_at"),
+            ).where(Swipe.from_user_id == uid).order_by(Swipe.timestamp),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "matches",
+            lambda uid: select(
+                Match.id, Match.user1_id, Match.user2_id, Match.created_at,
+            ).where(or_(Match.user1_id == uid, Match.user2_id == uid)).order_by(Match.created_at),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "reports_filed",
+            lambda uid: select(
+                Report.reported_id, Report.reason, Report.created_at,
+            ).where(Report.reporter_id == uid).order_by(Report.created_at),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "purchases",
+            lambda uid: select(
+                RevenueTransaction.id, RevenueTransaction.transaction_type, RevenueTransaction.amount,
+                RevenueTransaction.currency, RevenueTransaction.status, RevenueTransaction.created_at,
+            ).where(RevenueTransaction.user_id == uid).order_by(RevenueTransaction.created_at),
+            lambda r: r._asdict(),
+        ),
+        ExportSection(
+            "gifts_sent",
+            lambda uid: select(
+                GiftTransaction.id, GiftTransaction.receiver_id, GiftTransaction.gift_id,
+                GiftTransaction.price_paid, GiftTransaction.currency, GiftTransaction.created_at,
+            ).where(GiftTransaction.sender_id == uid).order_by(GiftTransaction.created_at),
+            lambda r: r._asdict(),
+        ),
+    ]
+
+
+def _line(kind: str, data: Dict[str, Any]) -> bytes:
+    return (json.dumps({"type": kind, "data": data}, default=str, ensure_ascii=False) + "\n").encode()
+
+
+def archive_key(job_id: uuid.UUID) -> str:
+    return f"{ARCHIVE_PREFIX}/{job_id}.ndjson.gz"
+
+
+def export_filename(job: DataExportJob) -> str:
+    return f"mambax-export-{job.created_at:%Y%m%d}.ndjson.gz"
+
+
+def _staging_path(job_id: uuid.UUID) -> str:
+    # Только на время сборки, готовый архив уходит в archive_store()
+    return os.path.join(tempfile.gettempdir(), f"mambax-export-{job_id}.ndjson.gz")
+
+
+def _remove(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+async def archive_store() -> BackupTarget:
+    """S3 (DATA_EXPORT_BUCKET, иначе BACKUP_BUCKET) when configured, otherwise DATA_EXPORT_DIR."""
+    from backend.services.backup import backup_service
+
+    target = await backup_service.s3_target(settings.DATA_EXPORT_BUCKET)
+    return target or FilesystemTarget(Path(settings.DATA_EXPORT_DIR))
+
+
+async def _discard(store: BackupTarget, key: str):
+    try:
+        await store.delete(key)
+    except Exception as e:
+        logger.warning(f"Could not remove export archive {key}: {e}")
+
+
+async def download_url(job: DataExportJob) -> Optional[str]:
+    """Signed storage URL for a completed job; None when the store cannot sign (local dev)."""
+    store = await archive_store()
+    return store.signed_url(job.file_path, settings.DATA_EXPORT_URL_TTL_SECONDS, export_filename(job))
+
+
+async def local_archive_path(job: DataExportJob) -> Optional[str]:
+    """Path of the archive on this instance's disk (store without signed URLs)."""
+    store = await archive_store()
+    if isinstance(store, FilesystemTarget) and await store.exists(job.file_path):
+        return store.uri(job.file_path)
+    return None
+
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+async def latest_job(db: AsyncSession, user_id: uuid.UUID) -> Optional[DataExportJob]:
+    result = await db.execute(
+        select(DataExportJob)
+        .where(DataExportJob.user_id == user_id)
+        .order_by(DataExportJob.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def request_export(db: AsyncSession, user_id: uuid.UUID) -> DataExportJob:
+    """Создать задание на выгрузку. Raises ExportRateLimited."""
+    last = await latest_job(db, user_id)
+    if last:
+        if last.status in ACTIVE_STATUSES:
+            raise ExportRateLimited(60, last)
+        ready_at = last.created_at + timedelta(hours=EXPORT_COOLDOWN_HOURS)
+        now = datetime.utcnow()
+        if last.status != "failed" and ready_at > now:
+            raise ExportRateLimited(int((ready_at - now).total_seconds()) + 1, last)
+
+    job = DataExportJob(id=uuid.uuid4(), user_id=user_id, status="pending")
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def _update_job(session_factory, job_id: uuid.UUID, only_if_status: Optional[str] = None, **values) -> bool:
+    """Update the job; with only_if_status the update applies only if the status still matches."""
+    query = update(DataExportJob).where(DataExportJob.id == job_id)
+    if only_if_status:
+        query = query.where(DataExportJob.status == only_if_status)
+    async with session_factory() as db:
+        result = await db.execute(query.values(**values))
+        await db.commit()
+    return result.rowcount != 0
+
+
+async def _heartbeat(session_factory, job_id: uuid.UUID):
+    # Отдельно от секций: одна секция (сообщения) может писаться долго
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        try:
+            await _update_job(session_factory, job_id, only_if_status="running", heartbeat_at=datetime.utcnow())
+        except Exception as e:
+            logger.warning(f"Data export {job_id} heartbeat failed: {e}")
+
+
+async def write_export(db: AsyncSession, user_id: uuid.UUID, gz, on_section=None) -> int:
+    """
+    Выгрузить все секции в открытый gzip-файл. Возвращает число записей.
+    on_section(name, index, total, rows) вызывается после каждой секции.
+    """
+    sections = _sections()
+    total_rows = 0
+    counts: Dict[str, int] = {}
+
+    await asyncio.to_thread(gz.write, _line("export", {
+        "user_id": user_id,
+        "export_date": datetime.now(timezone.utc),
+        "format": "ndjson",
+        "sections": [s.name for s in sections],
+    }))
+
+    for index, section in enumerate(sections, start=1):
+        rows = 0
+        if section.stream:
+            result = await db.stream(section.query(user_id).execution_options(yield_per=EXPORT_BATCH))
+            async for partition in result.partitions(EXPORT_BATCH):
+                chunk = b"".join(_line(section.name, section.row(r)) for r in partition)
+                await asyncio.to_thread(gz.write, chunk)
+                rows += len(partition)
+        else:
+            for r in (await db.execute(section.query(user_id))).all():
+                await asyncio.to_thread(gz.write, _line(section.name, section.row(r)))
+                rows += 1
+        counts[section.name] = rows
+        total_rows += rows
+        if on_section:
+            await on_section(section.name, index, len(sections), total_rows)
+
+    await asyncio.to_thread(gz.write, _line("summary", {"counts": counts, "privacy_note": PRIVACY_NOTE}))
+    return total_rows
+
+
+async def run_export_job(job_id: uuid.UUID, session_factory=None):
+    """Фоновая задача: собрать архив и обновить статус задания."""
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+
+    async with session_factory() as db:
+        job = await db.get(DataExportJob, job_id)
+        if not job or job.status != "pending":
+            return
+        user_id = job.user_id
+
+    staging = _staging_path(job_id)
+    key = archive_key(job_id)
+    store: Optional[BackupTarget] = None
+    now = datetime.utcnow()
+    await _update_job(session_factory, job_id, status="running", started_at=now, heartbeat_at=now)
+    heartbeat = asyncio.create_task(_heartbeat(session_factory, job_id))
+
+    async def on_section(name: str, index: int, total: int, rows: int):
+        await _update_job(
+            session_factory, job_id,
+            current_section=name, progress=int(index * 100 / total) - 1, rows_written=rows,
+            heartbeat_at=datetime.utcnow(),
+        )
+
+    try:
+        gz = await asyncio.to_thread(gzip.open, staging, "wb")
+        try:
+            async with session_factory() as db:
+                rows = await write_export(db, user_id, gz, on_section)
+        finally:
+            await asyncio.to_thread(gz.close)
+
+        store = await archive_store()
+        stored = await file_to_target(Path(staging), await store.open_writer(key))
+
+        now = datetime.utcnow()
+        completed = await _update_job(
+            session_factory, job_id, only_if_status="running",
+            status="completed", progress=100, current_section=None, rows_written=rows,
+            file_path=key,
+            size_bytes=stored["size"],
+            checksum=stored["sha256"],
+            completed_at=now,
+            expires_at=now + timedelta(hours=settings.DATA_EXPORT_TTL_HOURS),
+        )
+        if completed:
+            logger.info(f"Data export {job_id} completed: {rows} rows")
+        else:
+            # Задание уже закрыто очисткой — архив никому не достанется
+            logger.warning(f"Data export {job_id} finished after it was closed, discarding the archive")
+            await _discard(store, key)
+    except Exception as e:
+        logger.error(f"Data export {job_id} failed: {e}")
+        if store:
+            await _discard(store, key)
+        await _update_job(
+            session_factory, job_id, only_if_status="running",
+            status="failed", error=str(e)[:500], completed_at=datetime.utcnow(),
+        )
+    finally:
+        heartbeat.cancel()
+        await asyncio.to_thread(_remove, staging)
+
+
+async def cleanup_expired_exports(db: AsyncSession) -> Dict[str, int]:
+    """Удалить просроченные архивы и закрыть зависшие задания."""
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(DataExportJob)
+        .where(DataExportJob.status == "completed", DataExportJob.expires_at < now)
+        .values(status="expired", file_path=None)
+        .returning(DataExportJob.id)
+        .execution_options(synchronize_session=False)
+    )
+    expired = [row[0] for row in result.all()]
+
+    stale = await db.execute(
+        update(DataExportJob)
+        .where(or_(
+            and_(
+                DataExportJob.status == "pending",
+                DataExportJob.created_at < now - timedelta(minutes=STALE_JOB_MINUTES),
+            ),
+            and_(
+                DataExportJob.status == "running",
+                func.coalesce(DataExportJob.heartbeat_at, DataExportJob.started_at)
+                < now - timedelta(minutes=STALE_HEARTBEAT_MINUTES),
+            ),
+        ))
+        .values(status="failed", error="Export timed out", completed_at=now)
+        .returning(DataExportJob.id)
+        .execution_options(synchronize_session=False)
+    )
+    failed = [row[0] for row in stale.all()]
+    await db.commit()
+
+    if expired or failed:
+        store = await archive_store()
+        for job_id in expired + failed:
+            await _discard(store, archive_key(job_id))
+
+    return {"expired": len(expired), "failed": len(failed)}
@@ -1,34 +1,139 @@
-from typing import Dict, Optional, Any
+"""
+Feature flags
+
+Flags are compiled into an immutable snapshot (whitelists as frozensets,
+per-flag SHA-256 prefix state for rollout bucketing) that is swapped
+atomically on reload. Admin changes are published on Redis pub/sub and
+every worker reloads within a second; a periodic reload is only a safety
+net for lost notifications.
+
+Evaluation is in-memory. FeatureContext memoizes results for one request
+and counts each flag exposure once (feature_flag_exposures_total).
+"""
+
+import asyncio
 import hashlib
+import logging
 import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Mapping, Optional
+from types import MappingProxyType
+
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from backend.models.system import FeatureFlag
+
+from backend.core.redis import redis_manager
 from backend.database import async_session_maker
-import logging
+from backend.metrics import FEATURE_EXPOSURES
+from backend.models.system import FeatureFlag
 
 logger = logging.getLogger(__name__)
 
+CHANNEL = "feature_flags:changed"
+SAFETY_RELOAD_INTERVAL = 300    # сек: страховка, если уведомление потерялось
+LISTENER_RETRY = 5
+
+
+@dataclass(frozen=True)
+class CompiledFlag:
+    key: str
+    enabled: bool
+    rollout: int
+    whitelist: FrozenSet[str]
+    salt: Any = field(repr=False)     # sha256 с уже скормленным "key:"
+
+    @classmethod
+    def compile(cls, flag: FeatureFlag) -> "CompiledFlag":
+        return cls(
+            key=flag.key,
+            enabled=bool(flag.is_enabled),
+            rollout=flag.rollout_percentage or 0,
+            whitelist=frozenset(str(uid) for uid in (flag.whitelist_users or [])),
+            salt=hashlib.sha256(f"{flag.key}:".encode()),
+        )
+
+    def evaluate(self, user_id: Optional[str]) -> bool:
+        # 1. Global enable
+        if self.enabled:
+            return True
+        if not user_id:
+            return False
+        # 2. Whitelist
+        if user_id in self.whitelist:
+            return True
+        # 3. Rollout Percentage — тот же бакет, что sha256("key:user") % 100
+        if self.rollout > 0:
+            digest = self.salt.copy()
+            digest.update(user_id.encode())
+            return int.from_bytes(digest.digest(), "big") % 100 < self.rollout
+        return False
+
+
+@dataclass(frozen=True)
+class FlagSnapshot:
+    flags: Mapping[str, CompiledFlag]
+    loaded_at: float
+
+
+class FeatureContext:
+    """Flag evaluation for one request: one snapshot, memoized results."""
+
+    def __init__(self, snapshot: FlagSnapshot, user_id: Optional[Any] = None):
+        self.snapshot = snapshot
+        self.user_id = str(user_id) if user_id else None
+        self._results: Dict[str, bool] = {}
+
+    def is_enabled(self, feature_key: str, default: bool = False) -> bool:
+        if feature_key in self._results:
+            return self._results[feature_key]
+        flag = self.snapshot.flags.get(feature_key)
+        if flag is None:
+            # If flag doesn't exist in DB, return default
+            result = default
+        else:
+            result = flag.evaluate(self.user_id)
+            FEATURE_EXPOSURES.labels(flag=feature_key, enabled=str(result).lower()).inc()
+        self._results[feature_key] = result
+        return result
+
+
 class FeatureService:
-    _cache: Dict[str, Any] = {}
-    _cache_ttl = 60  # seconds
-    _last_update = 0
+    _snapshot: Optional[FlagSnapshot] = None
+    _reload_lock: Optional[asyncio.Lock] = None
+    _listener: Optional[asyncio.Task] = None
 
     @classmethod
-    async def _refresh_cache(cls):
-        now = time.time()
-        if now - cls._last_update < cls._cache_ttl and cls._cache:
-            return
+    async def reload(cls) -> FlagSnapshot:
+        """Compile the FeatureFlag table into a new snapshot and swap it in."""
+        async with async_session_maker() as session:
+            result = await session.execute(select(FeatureFlag))
+            flags = {f.key: CompiledFlag.compile(f) for f in result.scalars().all()}
+        cls._snapshot = FlagSnapshot(MappingProxyType(flags), time.monotonic())
+        logger.debug(f"Feature flags snapshot compiled ({len(flags)} flags)")
+        return cls._snapshot
 
-        try:
-            async with async_session_maker() as session:
-                result = await session.execute(select(FeatureFlag))
-                flags = result.scalars().all()
-                cls._cache = {f.key: {"enabled": f.is_enabled, "rollout": f.rollout_percentage, "whitelist": f.whitelist_users} for f in flags}
-                cls._last_update = now
-                logger.debug("Feature flags cache refreshed")
-        except Exception as e:
-            logger.error(f"Failed to refresh feature flags: {e}")
+    @classmethod
+    async def snapshot(cls) -> FlagSnapshot:
+        current = cls._snapshot
+        if current and time.monotonic() - current.loaded_at < SAFETY_RELOAD_INTERVAL:
+            return current
+        if cls._reload_lock is None:
+            cls._reload_lock = asyncio.Lock()
+        async with cls._reload_lock:
+            if cls._snapshot is not current:
+                return cls._snapshot
+            try:
+                return await cls.reload()
+            except Exception as e:
+                logger.error(f"Failed to refresh feature flags: {e}")
+                # Оставляем прежние флаги и повторяем через LISTENER_RETRY, а не на каждом вызове
+                flags = current.flags if current else MappingProxyType({})
+                cls._snapshot = FlagSnapshot(flags, time.monotonic() - SAFETY_RELOAD_INTERVAL + LISTENER_RETRY)
+                return cls._snapshot
+
+    @classmethod
+    async def context(cls, user_id: Optional[Any] = None) -> FeatureContext:
+        """Per-request evaluation context (use when a request checks several flags)."""
+        return FeatureContext(await cls.snapshot(), user_id)
 
     @classmethod
     async def is_enabled(cls, feature_key: str, user_id: Optional[str] = None, default: bool = False) -> bool:
@@ -36,35 +141,51 @@ class FeatureService:
         Check if a feature is enabled.
         Supports global switch, whitelist, and percentage rollout.
         """
-        await cls._refresh_cache()
-        
-        flag = cls._cache.get(feature_key)
-        
-        # If flag doesn't exist in DB/Cache, return default
-        if flag is None:
-            # Optionally auto-create flag here if requested, but better to keep read-only
-            return default
+        return (await cls.context(user_id)).is_enabled(feature_key, default)
 
-        # 1. Global enable
-        if flag["enabled"]:
-            return True
+    # --- invalidation ----------------------------------------------------
 
-        if not user_id:
-            return False
+    @classmethod
+    async def notify_changed(cls, feature_key: str):
+        """Call after committing a flag change: reload here, tell the other workers."""
+        try:
+            await cls.reload()
+        except Exception as e:
+            logger.error(f"Failed to reload feature flags after change of {feature_key}: {e}")
+        await redis_manager.publish(CHANNEL, {"key": feature_key})
 
-        # 2. Whitelist
-        if flag.get("whitelist") and user_id in flag["whitelist"]:
-            return True
+    @classmethod
+    async def _listen(cls):
+        while True:
+            # Подписка держит соединение постоянно — берём его из отдельного пула
+            r = await redis_manager.get_blocking_redis()
+            if not r:
+                return
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                await cls.reload()      # догоняем изменения, пропущенные без подписки
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await cls.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Feature flag listener error: {e}")
+                await asyncio.sleep(LISTENER_RETRY)
+            finally:
+                await pubsub.reset()
+
+    @classmethod
+    def start_listener(cls):
+        if cls._listener is None or cls._listener.done():
+            cls._listener = asyncio.create_task(cls._listen())
 
-        # 3. Rollout Percentage
-        rollout = flag.get("rollout", 0)
-        if rollout > 0:
-            # Deterministic hash based on feature + user_id
-            hash_input = f"{feature_key}:{user_id}"
-            hash_val = int(hashlib.sha256(hash_input.encode()).hexdigest(), 16)
-            user_percentage = hash_val % 100
-            return user_percentage < rollout
+    @classmethod
+    async def stop_listener(cls):
+        if cls._listener:
+            cls._listener.cancel()
+            cls._listener = None
 
-        return False
 
 feature_service = FeatureService
@@ -1,12 +1,31 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, update
+from sqlalchemy import select, func, or_, and_
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable, Set, Tuple
+import asyncio
+import logging
+import time
 import uuid
 from datetime import datetime, timedelta
 
+from backend.core.redis import redis_manager
 from backend.models.user_management import FraudScore
 from backend.models import User, Report, Message
+from backend.models.user import UserPhoto
+
+logger = logging.getLogger(__name__)
+
+# Users scored per aggregate round trip / bulk upsert
+SCORE_CHUNK = 1000
+# Chunks scored concurrently by recalculate_all (one session each)
+PARALLEL_CHUNKS = 4
+MASS_MESSAGING_THRESHOLD = 100
+# Redis keys filled by the anti-spam near-duplicate detector (services/security/spam.py)
+SPAM_CAMPAIGN_HITS_KEY = "spam:campaign_hits:{}"   # ZSET, пишет services/security/spam.py
+SPAM_CAMPAIGN_HITS_TTL = 7 * 86400
+RESCORE_KEY = "fraud:rescore"
+# Activity penalty steps: more than N days since the last profile update
+INACTIVITY_STEPS = (30, 14, 7)
 
 
 class FraudDetectionService:
@@ -31,36 +50,37 @@ class FraudDetectionService:
         'throwaway', 'fakeinbox', 'trashmail', 'yopmail'
     ]
     
-    async def analyze_user(self, db: AsyncSession, user_id: uuid.UUID) -> FraudScore:
+    def score_signals(
+        self, signals: Dict[str, Any], now: Optional[datetime] = None
+    ) -> Tuple[float, str, Dict[str, Any]]:
         """
-        Analyze a user for fraud risk and create/update their FraudScore.
-        Uses comprehensive multi-factor analysis.
+        Pure scoring of one user's signals (see collect_signals).
+        Returns (score, risk_level, factors). No I/O, so a whole chunk is
+        scored in a tight loop after the aggregate queries.
         """
-        user = await db.get(User, user_id)
-        if not user:
-            raise ValueError("User not found")
-        
+        now = now or datetime.utcnow()
         factors = {}
         
         # 1. Profile Completeness (0-15 points)
         profile_score = 0
-        if not user.bio or len(user.bio) < 20:
+        bio = signals.get('bio')
+        if not bio or len(bio) < 20:
             profile_score += 5
             factors['sparse_bio'] = 5
-        if not user.age:
+        if not signals.get('age'):
             profile_score += 3
             factors['missing_age'] = 3
-        if not user.city and not user.location:
+        if not signals.get('city') and not signals.get('location'):
             profile_score += 4
             factors['no_location'] = 4
-        if not user.gender:
+        if not signals.get('gender'):
             profile_score += 3
             factors['no_gender'] = 3
         factors['profile_completeness_penalty'] = min(profile_score, self.WEIGHTS['profile_completeness'])
         
         # 2. Photo Quality (0-20 points)
         photo_score = 0
-        photo_count = len(user.photos) if user.photos else 0
+        photo_count = signals.get('photo_count') or 0
         if photo_count == 0:
             photo_score = 20
             factors['no_photos'] = 20
@@ -74,14 +94,14 @@ class FraudDetectionService:
         
         # 3. Verification Status (0-15 points)
         verification_score = 0
-        if not user.is_verified:
+        if not signals.get('is_verified'):
             verification_score = 15
             factors['not_verified'] = 15
         factors['verification_penalty'] = min(verification_score, self.WEIGHTS['verification_status'])
         
         # 4. Email Reputation (0-10 points)
         email_score = 0
-        email = (user.email or '').lower()
+        email = (signals.get('email') or '').lower()
         for domain in self.SUSPICIOUS_DOMAINS:
             if domain in email:
                 email_score = 10
@@ -94,8 +114,9 @@ class FraudDetectionService:
         
         # 5. Activity Pattern (0-15 points)
         activity_score = 0
-        if user.updated_at:
-            days_inactive = (datetime.utcnow() - user.updated_at).days
+        updated_at = signals.get('updated_at')
+        if updated_at:
+            days_inactive = (now - updated_at).days
             if days_inactive > 30:
                 activity_score = 15
                 factors['long_inactive'] = 15
@@ -105,43 +126,39 @@ class FraudDetectionService:
             elif days_inactive > 7:
                 activity_score = 3
                 factors['inactive_week'] = 3
-        # Check for suspicious activity patterns (mass messaging)
-        recent_messages = await db.scalar(
-            select(func.count(Message.id))
-            .where(Message.sender_id == user_id)
-            .where(Message.created_at > datetime.utcnow() - timedelta(hours=24))
-        )
-        if recent_messages and recent_messages > 100:
+        # Suspicious activity patterns (mass messaging)
+        recent_messages = signals.get('recent_messages') or 0
+        if recent_messages > MASS_MESSAGING_THRESHOLD:
             activity_score = max(activity_score, 15)
             factors['mass_messaging'] = 15
+        # Near-identical messages sent by many accounts (spam ring)
+        if signals.get('spam_campaign_hits'):
+            activity_score = max(activity_score, 15)
+            factors['spam_campaign'] = 15
         factors['activity_pattern_penalty'] = min(activity_score, self.WEIGHTS['activity_pattern'])
         
         # 6. Report History (0-25 points) - Most important factor
         report_score = 0
-        reports_against = await db.scalar(
-            select(func.count(Report.id))
-            .where(Report.reported_id == user_id)
-        )
-        if reports_against:
-            if reports_against >= 5:
-                report_score = 25
-                factors['many_reports'] = 25
-            elif reports_against >= 3:
-                report_score = 15
-                factors['multiple_reports'] = 15
-            elif reports_against >= 1:
-                report_score = 8
-                factors['has_reports'] = 8
+        reports_against = signals.get('reports_against') or 0
+        if reports_against >= 5:
+            report_score = 25
+            factors['many_reports'] = 25
+        elif reports_against >= 3:
+            report_score = 15
+            factors['multiple_reports'] = 15
+        elif reports_against >= 1:
+            report_score = 8
+            factors['has_reports'] = 8
         factors['report_history_penalty'] = min(report_score, self.WEIGHTS['report_history'])
         
         # Calculate total score (0-100)
         total_score = sum([
-            factors.get('profile_completeness_penalty', 0),
-            factors.get('photo_quality_penalty', 0),
-            factors.get('verification_penalty', 0),
-            factors.get('email_reputation_penalty', 0),
-            factors.get('activity_pattern_penalty', 0),
-            factors.get('report_history_penalty', 0),
+            factors['profile_completeness_penalty'],
+            factors['photo_quality_penalty'],
+            factors['verification_penalty'],
+            factors['email_reputation_penalty'],
+            factors['activity_pattern_penalty'],
+            factors['report_history_penalty'],
         ])
         
         # Determine risk level
@@ -154,29 +171,138 @@ class FraudDetectionService:
         else:
             risk_level = 'low'
         
-        # Upsert FraudScore
-        existing = await db.scalar(
-            select(FraudScore).where(FraudScore.user_id == user_id)
-        )
+        return total_score, risk_level, factors
+    
+    async def collect_signals(
+        self, db: AsyncSession, user_ids: List[uuid.UUID], now: Optional[datetime] = None
+    ) -> Dict[uuid.UUID, Dict[str, Any]]:
+        """
+        Load every scoring signal for a chunk of users in three queries:
+        profile columns + photo count (GROUP BY join), messages sent in the
+        last 24h (GROUP BY sender), reports received (GROUP BY reported);
+        plus one HMGET for spam campaign hits.
+        """
+        now = now or datetime.utcnow()
+        if not user_ids:
+            return {}
         
-        if existing:
-            existing.score = total_score
-            existing.risk_level = risk_level
-            existing.factors = factors
-            existing.updated_at = datetime.utcnow()
-            fraud_score = existing
-        else:
-            fraud_score = FraudScore(
-                user_id=user_id,
-                score=total_score,
-                risk_level=risk_level,
-                factors=factors
+        photo_counts = (
+            select(UserPhoto.user_id, func.count(UserPhoto.id).label('n'))
+            .where(UserPhoto.user_id.in_(user_ids))
+            .group_by(UserPhoto.user_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(
+                User.id, User.bio, User.age, User.city, User.location, User.gender,
+                User.is_verified, User.email, User.updated_at,
+                func.coalesce(photo_counts.c.n, 0).label('photo_count'),
             )
-            db.add(fraud_score)
+            .outerjoin(photo_counts, photo_counts.c.user_id == User.id)
+            .where(User.id.in_(user_ids))
+        )
+        signals = {
+            row.id: {**row._asdict(), 'recent_messages': 0, 'reports_against': 0}
+            for row in result.all()
+        }
+        if not signals:
+            return {}
+        ids = list(signals)
+        
+        result = await db.execute(
+            select(Message.sender_id, func.count(Message.id))
+            .where(Message.sender_id.in_(ids))
+            .where(Message.created_at > now - timedelta(hours=24))
+            .group_by(Message.sender_id)
+        )
+        for sender_id, count in result.all():
+            signals[sender_id]['recent_messages'] = count
+        
+        result = await db.execute(
+            select(Report.reported_id, func.count(Report.id))
+            .where(Report.reported_id.in_(ids))
+            .group_by(Report.reported_id)
+        )
+        for reported_id, count in result.all():
+            signals[reported_id]['reports_against'] = count
+        
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                since = time.time() - SPAM_CAMPAIGN_HITS_TTL
+                async with r.pipeline(transaction=False) as pipe:
+                    for uid in ids:
+                        pipe.zcount(SPAM_CAMPAIGN_HITS_KEY.format(uid), since, "+inf")
+                    hits = await pipe.execute()
+                for uid, count in zip(ids, hits):
+                    signals[uid]['spam_campaign_hits'] = int(count or 0)
+            except Exception as e:
+                logger.warning(f"Spam campaign signal unavailable: {e}")
         
+        return signals
+    
+    async def _score_chunk(self, db: AsyncSession, user_ids: List[uuid.UUID]) -> int:
+        """Aggregate, score and upsert one chunk with a single INSERT ... ON CONFLICT."""
+        now = datetime.utcnow()
+        signals = await self.collect_signals(db, user_ids, now)
+        if not signals:
+            return 0
+        
+        rows = []
+        for user_id, user_signals in signals.items():
+            score, risk_level, factors = self.score_signals(user_signals, now)
+            rows.append({
+                'id': uuid.uuid4(),
+                'user_id': user_id,
+                'score': score,
+                'risk_level': risk_level,
+                'factors': factors,
+                'updated_at': now,
+            })
+        
+        stmt = pg_insert(FraudScore).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FraudScore.user_id],
+            set_={
+                'score': stmt.excluded.score,
+                'risk_level': stmt.excluded.risk_level,
+                'factors': stmt.excluded.factors,
+                'updated_at': stmt.excluded.updated_at,
+            },
+        )
+        await db.execute(stmt)
         await db.commit()
-        await db.refresh(fraud_score)
+        return len(rows)
+    
+    async def score_users(
+        self, db: AsyncSession, user_ids: Iterable[uuid.UUID]
+    ) -> Dict[str, int]:
+        """Score users chunk by chunk. A failed chunk is rolled back and counted as errors."""
+        user_ids = list(user_ids)
+        processed = 0
+        errors = 0
+        for i in range(0, len(user_ids), SCORE_CHUNK):
+            chunk = user_ids[i:i + SCORE_CHUNK]
+            try:
+                processed += await self._score_chunk(db, chunk)
+            except Exception as e:
+                await db.rollback()
+                errors += len(chunk)
+                logger.error(f"Fraud scoring failed for chunk of {len(chunk)} users: {e}")
+        return {'processed': processed, 'errors': errors}
+    
+    async def analyze_user(self, db: AsyncSession, user_id: uuid.UUID) -> FraudScore:
+        """
+        Analyze a user for fraud risk and create/update their FraudScore.
+        Uses comprehensive multi-factor analysis.
+        """
+        if not await self._score_chunk(db, [user_id]):
+            raise ValueError("User not found")
         
+        fraud_score = await db.scalar(
+            select(FraudScore).where(FraudScore.user_id == user_id)
+        )
+        await db.refresh(fraud_score)
         return fraud_score
     
     async def batch_recalculate(
@@ -211,22 +337,115 @@ class FraudDetectionService:
         result = await db.execute(query)
         user_ids = [row[0] for row in result.all()]
         
-        processed = 0
-        errors = 0
+        stats = await self.score_users(db, user_ids)
+        return {**stats, 'total_queued': len(user_ids)}
+    
+    async def changed_user_ids(
+        self, db: AsyncSession, since: datetime, now: Optional[datetime] = None
+    ) -> Set[uuid.UUID]:
+        """
+        Users whose score inputs may have changed since `since`:
+        profile edits, new photos, new reports, senders entering or leaving
+        the 24h message window, users crossing an inactivity step, and
+        spam campaign participants queued by the anti-spam detector.
+        """
+        now = now or datetime.utcnow()
+        window = timedelta(hours=24)
+        # `.days > N` flips once updated_at falls N+1 days behind now
+        crossed_step = or_(*[
+            and_(
+                User.updated_at <= now - timedelta(days=n + 1),
+                User.updated_at > since - timedelta(days=n + 1),
+            )
+            for n in INACTIVITY_STEPS
+        ])
+        queries = [
+            select(User.id).where(or_(User.updated_at > since, crossed_step)),
+            select(UserPhoto.user_id).where(UserPhoto.created_at > since),
+            select(Report.reported_id).where(Report.created_at > since),
+            select(Message.sender_id).where(
+                or_(
+                    Message.created_at > since,
+                    and_(Message.created_at > since - window, Message.created_at <= now - window),
+                )
+            ),
+        ]
+        changed: Set[uuid.UUID] = set()
+        for query in queries:
+            result = await db.execute(query.distinct())
+            changed.update(row[0] for row in result.all())
         
-        for user_id in user_ids:
+        # Participants of spam campaigns flagged by the anti-spam detector
+        r = await redis_manager.get_redis()
+        if r:
             try:
-                await self.analyze_user(db, user_id)
-                processed += 1
+                flagged = await r.spop(RESCORE_KEY, SCORE_CHUNK * PARALLEL_CHUNKS) or []
+                changed.update(uuid.UUID(uid) for uid in flagged)
             except Exception as e:
-                errors += 1
-                print(f"Error analyzing user {user_id}: {e}")
+                logger.warning(f"Fraud rescore queue unavailable: {e}")
+        return changed
+    
+    async def rescore_changed(
+        self, db: AsyncSession, since: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Incremental rescoring. `since` defaults to the newest FraudScore
+        update, i.e. the previous run.
+        """
+        if since is None:
+            since = await db.scalar(select(func.max(FraudScore.updated_at)))
+            if since is None:
+                # Nothing scored yet: score users without a FraudScore
+                return await self.batch_recalculate(db, limit=SCORE_CHUNK * PARALLEL_CHUNKS, only_missing=True)
         
-        return {
-            'processed': processed,
-            'errors': errors,
-            'total_queued': len(user_ids)
-        }
+        user_ids = await self.changed_user_ids(db, since)
+        stats = await self.score_users(db, user_ids)
+        return {**stats, 'total_queued': len(user_ids)}
+    
+    async def recalculate_all(
+        self, session_factory=None, concurrency: int = PARALLEL_CHUNKS
+    ) -> Dict[str, Any]:
+        """
+        Full rescoring of the user base. IDs are paged by keyset on users.id;
+        up to `concurrency` chunks are scored at once, each in its own session.
+        """
+        if session_factory is None:
+            from backend.db.session import async_session_maker as session_factory
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        stats = {'processed': 0, 'errors': 0, 'total_queued': 0}
+        
+        async def run_chunk(chunk: List[uuid.UUID]):
+            async with semaphore:
+                async with session_factory() as db:
+                    result = await self.score_users(db, chunk)
+            stats['processed'] += result['processed']
+            stats['errors'] += result['errors']
+        
+        pending: Set[asyncio.Task] = set()
+        last_id = None
+        async with session_factory() as db:
+            while True:
+                query = select(User.id).order_by(User.id).limit(SCORE_CHUNK)
+                if last_id is not None:
+                    query = query.where(User.id > last_id)
+                result = await db.execute(query)
+                chunk = [row[0] for row in result.all()]
+                if not chunk:
+                    break
+                last_id = chunk[-1]
+                stats['total_queued'] += len(chunk)
+                pending.add(asyncio.create_task(run_chunk(chunk)))
+                # Keep at most `concurrency` chunks of IDs in flight
+                if len(pending) >= concurrency:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            await asyncio.gather(*pending)
+        
+        logger.info(
+            f"Fraud scores recalculated: {stats['processed']} users, {stats['errors']} errors"
+        )
+        return stats
     
     async def get_user_risk(self, db: AsyncSession, user_id: uuid.UUID) -> Dict[str, Any]:
         """Get the latest fraud risk assessment for a user."""
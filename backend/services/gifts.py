@@ -1,9 +1,14 @@
+import random
 from datetime import datetime
+from typing import Awaitable, Callable
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from backend.db.session import async_session_maker
 from backend.models.user import User
-from backend.models.monetization import VirtualGift, GiftTransaction, RevenueTransaction
+from backend.models.monetization import VirtualGift, GiftTransaction, RevenueTransaction, GiftSendCounter
+from backend.services import star_ledger
 from backend.models.interaction import Match
 from backend.models.chat import Message
 from backend.services.chat import manager
@@ -12,6 +17,143 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Gift send counters are spread over this many rows per gift
+GIFT_COUNTER_SHARDS = 16
+# Claim retries when every shard with capacity left is locked by in-flight sends
+GIFT_CLAIM_ATTEMPTS = 3
+# Gifts whose shard rows exist (per process, saves the INSERT ... DO NOTHING)
+_initialized_gifts: set = set()
+
+
+class GiftUnavailable(Exception):
+    """Gift cannot be claimed: reason is "sold_out" or "busy"."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(reason)
+
+
+def _split_capacity(gift: VirtualGift, sent: list) -> list:
+    """Per-shard capacity so that sum(capacity) == max_quantity."""
+    if not gift.max_quantity:
+        return [None] * len(sent)
+    remaining = max(0, gift.max_quantity - sum(sent))
+    base, extra = divmod(remaining, len(sent))
+    return [s + base + (1 if i < extra else 0) for i, s in enumerate(sent)]
+
+
+async def _ensure_gift_shards(db: AsyncSession, gift: VirtualGift):
+    if gift.id in _initialized_gifts:
+        return
+    # Legacy times_sent goes to shard 0 so SUM(sent) stays the true total
+    sent = [gift.times_sent or 0] + [0] * (GIFT_COUNTER_SHARDS - 1)
+    capacity = _split_capacity(gift, sent)
+    await db.execute(
+        pg_insert(GiftSendCounter)
+        .values([
+            {"gift_id": gift.id, "shard": i, "sent": sent[i], "capacity": capacity[i]}
+            for i in range(GIFT_COUNTER_SHARDS)
+        ])
+        .on_conflict_do_nothing(index_elements=["gift_id", "shard"])
+    )
+    _initialized_gifts.add(gift.id)
+
+
+async def claim_gift_slot(db: AsyncSession, gift: VirtualGift) -> int:
+    """
+    Count one send of `gift` inside the caller's transaction; returns the shard.
+
+    Unlimited gifts bump a random shard. Limited gifts take the first shard
+    with capacity left that no concurrent transaction holds (FOR UPDATE
+    SKIP LOCKED), so senders never queue on one row and the total can
+    never exceed max_quantity. Raises GiftUnavailable.
+    """
+    await _ensure_gift_shards(db, gift)
+    start = random.randrange(GIFT_COUNTER_SHARDS)
+
+    if not gift.max_quantity:
+        bump = (
+            update(GiftSendCounter)
+            .where(GiftSendCounter.gift_id == gift.id, GiftSendCounter.shard == start)
+            .values(sent=GiftSendCounter.sent + 1)
+        )
+        if not (await db.execute(bump)).rowcount:
+            # Shard rows were rolled back after we cached them as created
+            _initialized_gifts.discard(gift.id)
+            await _ensure_gift_shards(db, gift)
+            await db.execute(bump)
+        return start
+
+    free_shard = (
+        select(GiftSendCounter.shard)
+        .where(
+            GiftSendCounter.gift_id == gift.id,
+            GiftSendCounter.sent < GiftSendCounter.capacity,
+        )
+        .order_by((GiftSendCounter.shard + GIFT_COUNTER_SHARDS - start) % GIFT_COUNTER_SHARDS)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    claim = (
+        update(GiftSendCounter)
+        .where(
+            GiftSendCounter.gift_id == gift.id,
+            GiftSendCounter.shard == free_shard,
+            GiftSendCounter.sent < GiftSendCounter.capacity,
+        )
+        .values(sent=GiftSendCounter.sent + 1)
+        .returning(GiftSendCounter.shard)
+    )
+    for _ in range(GIFT_CLAIM_ATTEMPTS):
+        shard = (await db.execute(claim)).scalar_one_or_none()
+        if shard is not None:
+            return shard
+        remaining = await db.scalar(
+            select(func.sum(GiftSendCounter.capacity - GiftSendCounter.sent))
+            .where(GiftSendCounter.gift_id == gift.id)
+        )
+        if remaining is None:
+            _initialized_gifts.discard(gift.id)
+            await _ensure_gift_shards(db, gift)
+            continue
+        if remaining <= 0:
+            raise GiftUnavailable("sold_out")
+    raise GiftUnavailable("busy")
+
+
+async def rebalance_gift_shards(db: AsyncSession, gift: VirtualGift):
+    """Re-split capacity after max_quantity was changed by an admin."""
+    result = await db.execute(
+        select(GiftSendCounter)
+        .where(GiftSendCounter.gift_id == gift.id)
+        .order_by(GiftSendCounter.shard)
+        .with_for_update()
+    )
+    shards = result.scalars().all()
+    if not shards:
+        return
+    for shard, capacity in zip(shards, _split_capacity(gift, [s.sent for s in shards])):
+        shard.capacity = capacity
+
+
+async def rollup_gift_counters(db: AsyncSession) -> int:
+    """Roll shard totals up into VirtualGift.times_sent (for cron)."""
+    totals = (
+        select(GiftSendCounter.gift_id, func.sum(GiftSendCounter.sent).label("total"))
+        .group_by(GiftSendCounter.gift_id)
+        .subquery()
+    )
+    result = await db.execute(
+        update(VirtualGift)
+        .where(VirtualGift.id == totals.c.gift_id, VirtualGift.times_sent != totals.c.total)
+        .values(times_sent=totals.c.total)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount or 0
+
+
 async def deliver_gift(
     db: AsyncSession,
     sender_id: UUID,
@@ -21,14 +163,20 @@ async def deliver_gift(
     is_anonymous: bool,
     price_paid: float,
     currency: str = "XTR",
-    payment_transaction_id: UUID | None = None
-) -> GiftTransaction:
+    payment_transaction_id: UUID | None = None,
+    commit: bool = True,
+) -> tuple[GiftTransaction, Callable[[], Awaitable[None]]]:
     """
     Deliver a gift to the receiver:
-    1. Credit bonus to receiver
-    2. Create GiftTransaction
-    3. Update Gift Stats
-    4. Send Notifications (WS, Push, Chat)
+    1. Count the send (sharded gift counter)
+    2. Credit bonus to receiver (star ledger)
+    3. Create GiftTransaction
+    4. Create the gift chat message (if the pair has an active match)
+
+    With commit=False everything is only flushed, so the caller's
+    transaction (the payment event worker) owns the commit. Notifications
+    (WS, Push) are not sent here: the returned coroutine function must be
+    awaited once the transaction has committed.
     """
     
     # 1. Fetch Gift
@@ -41,12 +189,18 @@ async def deliver_gift(
     if not receiver:
         raise ValueError("Receiver not found")
 
-    # 2. Credit receiver with 10% bonus
+    # 2. Count the send (sharded; enforces max_quantity)
+    await claim_gift_slot(db, gift)
+
+    # 3. Credit receiver with 10% bonus
     receiver_bonus = int(price_paid * 0.1)
     if receiver_bonus > 0:
-        receiver.stars_balance = (receiver.stars_balance or 0) + receiver_bonus
+        await star_ledger.credit(
+            db, receiver_id, receiver_bonus, "gift_bonus",
+            reference_id=payment_transaction_id, metadata={"gift_id": str(gift_id)}
+        )
 
-    # 3. Create Gift Transaction
+    # 4. Create Gift Transaction
     transaction = GiftTransaction(
         sender_id=sender_id,
         receiver_id=receiver_id,
@@ -60,49 +214,7 @@ async def deliver_gift(
     )
     db.add(transaction)
 
-    # 4. Update Gift Stats
-    gift.times_sent += 1
-    
-    # Commit to generate IDs
-    await db.commit()
-    await db.refresh(transaction)
-
-    # 5. Send WebSocket Notification
-    notification = {
-        "type": "gift_received",
-        "transaction_id": str(transaction.id),
-        "gift_id": str(gift.id),
-        "gift_name": gift.name,
-        "gift_image": gift.image_url,
-        "sender_id": str(sender_id) if not is_anonymous else None,
-        "sender_name": sender.name if sender and not is_anonymous else "Anonymous",
-        "sender_photo": sender.photos[0] if sender and sender.photos and not is_anonymous else None,
-        "message": message,
-        "bonus_received": receiver_bonus,
-        "timestamp": transaction.created_at.isoformat()
-    }
-    
-    is_receiver_online = await manager.is_online_async(str(receiver_id))
-    if is_receiver_online:
-        await manager.send_personal(str(receiver_id), notification)
-
-    # 6. Send Push Notification (if offline or always?)
-    if not is_receiver_online:
-        try:
-            sender_display = "Someone" if is_anonymous else (sender.name if sender else "A user")
-            bonus_text = f" (+{receiver_bonus} ⭐)" if receiver_bonus > 0 else ""
-            await send_push_notification(
-                db=db,
-                user_id=str(receiver_id),
-                title=f"🎁 {sender_display} sent you a gift!",
-                body=f"You received a {gift.name}{bonus_text}",
-                url="/gifts",
-                tag=f"gift_{transaction.id}"
-            )
-        except Exception as e:
-            logger.error(f"Failed to send push notification: {e}")
-
-    # 7. Create Chat Message (History)
+    # 5. Create Chat Message (History)
     match_stmt = select(Match).where(
         and_(
             Match.is_active == True,
@@ -114,6 +226,7 @@ async def deliver_gift(
     )
     match = (await db.execute(match_stmt)).scalar_one_or_none()
 
+    gift_message = None
     if match:
         gift_message = Message(
             match_id=match.id,
@@ -124,10 +237,35 @@ async def deliver_gift(
             photo_url=gift.image_url,
         )
         db.add(gift_message)
-        await db.commit()
-        await db.refresh(gift_message)
 
-        # Send via WS as chat message
+    # Flush to generate IDs and timestamps
+    await db.flush()
+
+    # Payloads are built now: ORM attributes expire on commit
+    notification = {
+        "type": "gift_received",
+        "transaction_id": str(transaction.id),
+        "gift_id": str(gift.id),
+        "gift_name": gift.name,
+        "gift_image": gift.image_url,
+        "sender_id": str(sender_id) if not is_anonymous else None,
+        "sender_name": sender.name if sender and not is_anonymous else "Anonymous",
+        "sender_photo": sender.photos[0] if sender and sender.photos and not is_anonymous else None,
+        "message": message,
+        "bonus_received": receiver_bonus,
+        "timestamp": transaction.created_at.isoformat()
+    }
+    sender_display = "Someone" if is_anonymous else (sender.name if sender else "A user")
+    bonus_text = f" (+{receiver_bonus} ⭐)" if receiver_bonus > 0 else ""
+    push = {
+        "user_id": str(receiver_id),
+        "title": f"🎁 {sender_display} sent you a gift!",
+        "body": f"You received a {gift.name}{bonus_text}",
+        "url": "/gifts",
+        "tag": f"gift_{transaction.id}",
+    }
+    gift_chat_message = None
+    if gift_message is not None:
         gift_chat_message = {
             "type": "gift",
             "message_id": str(gift_message.id),
@@ -141,9 +279,6 @@ async def deliver_gift(
             "timestamp": gift_message.created_at.isoformat(),
             "is_anonymous": is_anonymous
         }
-        await manager.send_personal(str(receiver_id), gift_chat_message)
-
-    # 8. Notify Sender of Success (for UI update)
     success_notification = {
         "type": "gift_sent_success",
         "transaction_id": str(transaction.id),
@@ -152,6 +287,25 @@ async def deliver_gift(
         "receiver_name": receiver.name if receiver else "User",
         "timestamp": transaction.created_at.isoformat()
     }
-    await manager.send_personal(str(sender_id), success_notification)
 
-    return transaction
+    async def notify():
+        # WebSocket if online, push otherwise
+        if await manager.is_online_async(str(receiver_id)):
+            await manager.send_personal(str(receiver_id), notification)
+        else:
+            try:
+                async with async_session_maker() as push_db:
+                    await send_push_notification(db=push_db, **push)
+            except Exception as e:
+                logger.error(f"Failed to send push notification: {e}")
+
+        if gift_chat_message is not None:
+            await manager.send_personal(str(receiver_id), gift_chat_message)
+
+        # Notify Sender of Success (for UI update)
+        await manager.send_personal(str(sender_id), success_notification)
+
+    if commit:
+        await db.commit()
+
+    return transaction, notify
@@ -3,16 +3,13 @@ import uuid
 import random
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.models.moderation import ModerationLog
+from backend.services.text_safety import text_safety
 
 class ModerationService:
     """
     Service for content moderation (text and images).
+    Banned words live in the shared text safety engine ("banned" category).
     """
-    
-    BANNED_WORDS = {
-        "badword", "abuse", "scam", "spam", 
-        "мат", "плохоеслово" 
-    }
 
     @classmethod
     def check_text(cls, text: Optional[str]) -> bool:
@@ -22,12 +19,7 @@ class ModerationService:
         """
         if not text:
             return True
-            
-        lower_text = text.lower()
-        for word in cls.BANNED_WORDS:
-            if word in lower_text:
-                return False
-        return True
+        return "banned" not in text_safety.categories(text)
 
     @classmethod
     def sanitize_text(cls, text: Optional[str]) -> str:
@@ -36,14 +28,7 @@ class ModerationService:
         """
         if not text:
             return ""
-            
-        sanitized = text
-        lower_text = text.lower()
-        for word in cls.BANNED_WORDS:
-            if word in lower_text:
-                sanitized = sanitized.replace(word, "*" * len(word))
-                
-        return sanitized
+        return text_safety.mask(text, ["banned"])
 
     @classmethod
     async def check_image(cls, image_url: str, simulation_mode: bool = False) -> tuple[bool, float, str]:
@@ -3,11 +3,12 @@ from decimal import Decimal
 from typing import Dict, Any, Optional
 import uuid
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.models.user import User
 from backend.models.monetization import SubscriptionPlan, UserSubscription, RevenueTransaction
+from backend.services import star_ledger
 
 async def get_or_create_default_plans(db: AsyncSession):
     """Ensure default subscription plans exist in DB."""
@@ -46,24 +47,14 @@ async def buy_subscription_with_stars(db: AsyncSession, user_id: uuid.UUID, tier
             )
             if not plan: return {"success": False, "error": "plan_not_found"}
             
-            # Get User with FOR UPDATE to prevent race conditions on balance
-            result = await db.execute(
-                select(User).where(User.id == user_id).with_for_update()
+            # Conditional atomic debit (UPDATE ... WHERE stars_balance >= price RETURNING)
+            new_balance = await star_ledger.debit(
+                db, user_id, plan.price, "subscription",
+                metadata={"plan_tier": tier}
+            )
+            await db.execute(
+                update(User).where(User.id == user_id).values(subscription_tier=tier)
             )
-            user = result.scalar_one_or_none()
-            if not user: return {"success": False, "error": "user_not_found"}
-                
-            # Check Balance
-            balance = user.stars_balance or Decimal("0")
-            if balance < plan.price:
-                return {
-                    "success": False, "error": "insufficient_balance", 
-                    "required": int(plan.price), "available": int(balance)
-                }
-            
-            # ATOMIC UPDATES
-            user.stars_balance = balance - plan.price
-            user.subscription_tier = tier
             
             now = datetime.utcnow()
             expires_at = now + timedelta(days=plan.duration_days)
@@ -86,8 +77,15 @@ async def buy_subscription_with_stars(db: AsyncSession, user_id: uuid.UUID, tier
             
             return {
                 "success": True, "plan": plan.name, "tier": tier,
-                "expires_at": expires_at.isoformat(), "new_balance": float(user.stars_balance)
+                "expires_at": expires_at.isoformat(), "new_balance": float(new_balance)
             }
+    except star_ledger.InsufficientStars as e:
+        return {
+            "success": False, "error": "insufficient_balance",
+            "required": int(e.required), "available": int(e.available)
+        }
+    except ValueError:
+        return {"success": False, "error": "user_not_found"}
     except Exception as e:
         # DB level rollback happens automatically with 'async with db.begin()'
         return {"success": False, "error": f"transaction_failed: {str(e)}"}
@@ -4,62 +4,211 @@ NSFW Detection Service
 Detects NSFW content in images using local ML model.
 Uses Falconsai/nsfw_image_detection from HuggingFace (runs locally, no API costs).
 Falls back to rule-based detection if model unavailable.
+
+Inference runs in NSFWWorker: the model is warmed up at startup and
+concurrent requests are classified in micro-batches.
 """
 
 import asyncio
+import hashlib
 import logging
 import io
-from typing import Dict, Any, Tuple, Optional
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Optional
 
 logger = logging.getLogger(__name__)
 
-# Lazy-loaded model to avoid startup delay
-_model = None
-_processor = None
-_model_loading = False
-_model_load_attempted = False
+MODEL_NAME = "Falconsai/nsfw_image_detection"
+MODEL_INPUT_SIZE = 224          # ViT принимает 224x224 — меньше не декодируем зря
 
+BATCH_SIZE = 16
+BATCH_WAIT = 0.02               # сек: сколько ждать добора батча
+QUEUE_SIZE = 256
+CACHE_SIZE = 2048
 
-async def _load_model():
-    """Lazy load the NSFW detection model."""
-    global _model, _processor, _model_loading, _model_load_attempted
-    
-    if _model is not None or _model_load_attempted:
-        return
-    
-    if _model_loading:
-        # Wait for another coroutine to finish loading
-        while _model_loading:
-            await asyncio.sleep(0.1)
-        return
-    
-    _model_loading = True
-    _model_load_attempted = True
-    
-    try:
+
+def prepare_image(image: Any):
+    """Decode (if needed) and shrink an image to the classifier input size."""
+    from PIL import Image
+
+    if isinstance(image, bytes):
+        image = Image.open(io.BytesIO(image))
+        image.draft("RGB", (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))   # JPEG: декодируем сразу в малом масштабе
+    image = image.convert("RGB")
+    image.thumbnail((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+    return image
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _load_pipeline():
+    from transformers import pipeline
+    # Model: Falconsai/nsfw_image_detection (~100MB)
+    return pipeline("image-classification", model=MODEL_NAME, device=-1)  # CPU only (use 0 for GPU)
+
+
+class FakeNSFWModel:
+    """
+    Tiny stand-in for the transformers pipeline (tests, CPU-only setups).
+    Scores an image by its mean red channel; records batch sizes.
+    """
+
+    def __init__(self):
+        self.batches: List[int] = []
+
+    def __call__(self, images, batch_size: int = 1):
+        self.batches.append(len(images))
+        results = []
+        for image in images:
+            red = image.getchannel("R")
+            score = sum(red.getdata()) / (255 * red.width * red.height)
+            results.append([{"label": "nsfw", "score": score}, {"label": "normal", "score": 1 - score}])
+        return results
+
+
+class NSFWWorker:
+    """
+    Single image-classification worker per process.
+
+    - The model is loaded once and warmed up at startup (start()), not on
+      the first upload; callers wait on an Event instead of polling.
+    - Requests go through a bounded queue and are run in micro-batches of up
+      to BATCH_SIZE images or BATCH_WAIT seconds, one to_thread per batch.
+    - Results are cached by content hash; identical in-flight images share
+      one slot in the batch.
+    """
+
+    def __init__(self, model_factory=_load_pipeline, batch_size: int = BATCH_SIZE,
+                 max_wait: float = BATCH_WAIT, queue_size: int = QUEUE_SIZE, cache_size: int = CACHE_SIZE):
+        self.model_factory = model_factory
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.cache_size = cache_size
+        self.model = None
+        self._ready = asyncio.Event()
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._starting: Optional[asyncio.Task] = None
+        self._cache: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def start(self) -> bool:
+        """Load and warm up the model, then start the batching loop. Idempotent."""
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start())
+        return await asyncio.shield(self._starting)
+
+    async def _start(self) -> bool:
         def _load_sync():
-            global _model, _processor
+            model = self.model_factory()
+            # Прогрев: первый прогон аллоцирует буферы и компилирует графы
+            from PIL import Image
+            model([Image.new("RGB", (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))], batch_size=1)
+            return model
+
+        try:
+            self.model = await asyncio.to_thread(_load_sync)
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._runner = asyncio.create_task(self._run())
+            logger.info("NSFW detection model loaded and warmed up")
+        except ImportError:
+            logger.warning("transformers not installed. NSFW detection will use rule-based fallback.")
+        except Exception as e:
+            logger.warning(f"Failed to load NSFW model: {e}. Using rule-based fallback.")
+        finally:
+            self._ready.set()
+        return self.model is not None
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            self._runner = None
+
+    @property
+    def available(self) -> bool:
+        return self._runner is not None
+
+    async def classify(self, image: Any, key: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        Label scores for one image (bytes or PIL image).
+        None when no model is available (caller falls back).
+        """
+        if not self._ready.is_set():
+            await self.start()
+        if not self.available:
+            return None
+
+        if key is None and isinstance(image, bytes):
+            key = content_key(image)
+        if key is not None:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            if key in self._inflight:
+                return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._inflight[key] = future
+        try:
+            await self._queue.put((image, future))     # очередь ограничена: при перегрузке ждём
+            scores = await future
+        finally:
+            if key is not None:
+                self._inflight.pop(key, None)
+        if key is not None:
+            self._cache[key] = scores
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    async def _next_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
             try:
-                from transformers import pipeline
-                # Use a lightweight NSFW classifier
-                # Model: Falconsai/nsfw_image_detection (~100MB)
-                _model = pipeline(
-                    "image-classification",
-                    model="Falconsai/nsfw_image_detection",
-                    device=-1  # CPU only (use 0 for GPU)
-                )
-                logger.info("NSFW detection model loaded successfully")
-                return True
-            except ImportError:
-                logger.warning("transformers not installed. NSFW detection will use rule-based fallback.")
-                return False
-            except Exception as e:
-                logger.warning(f"Failed to load NSFW model: {e}. Using rule-based fallback.")
-                return False
-        
-        await asyncio.to_thread(_load_sync)
-    finally:
-        _model_loading = False
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _infer(self, images: List[Any]) -> List[Dict[str, float]]:
+        prepared = [prepare_image(image) for image in images]
+        results = self.model(prepared, batch_size=len(prepared))
+        return [{r["label"].lower(): r["score"] for r in result} for result in results]
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            scores = await asyncio.to_thread(self._infer, [image for image, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Одна битая картинка не должна ронять соседей: повторяем по одной
+                logger.warning(f"NSFW batch of {len(batch)} failed ({e}), retrying one by one")
+                for item in batch:
+                    await self._run_batch([item])
+                return
+            logger.error(f"NSFW inference failed: {e}")
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, scores):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self):
+        while True:
+            await self._run_batch(await self._next_batch())
+
+
+nsfw_worker = NSFWWorker()
 
 
 class NSFWDetectionService:
@@ -72,19 +221,6 @@ class NSFWDetectionService:
     # NSFW score threshold (0.0 - 1.0)
     NSFW_THRESHOLD = 0.7
     
-    # Bad words for text toxicity detection
-    TOXIC_WORDS = {
-        "hate", "kill", "spam", "nazi", "porn", "xxx", 
-        "fuck", "shit", "bitch", "whore", "slut",
-        "nigger", "faggot", "retard"
-    }
-    
-    TOXIC_PATTERNS = [
-        r"(?i)kill\s+(yourself|urself|u)",
-        r"(?i)go\s+die",
-        r"(?i)kys\b",
-    ]
-    
     async def analyze_image(self, image_input: Any) -> Tuple[float, str, Dict[str, float]]:
         """
         Analyze an image for NSFW content.
@@ -98,47 +234,48 @@ class NSFWDetectionService:
             - label: "safe", "nsfw", "porn", etc.
             - detailed_scores: dict with category scores
         """
-        await _load_model()
-        
-        if _model is None:
+        if not await nsfw_worker.start():
             # Fallback to rule-based detection
             return self._rule_based_image_check(image_input)
-        
+
         try:
-            result = await asyncio.to_thread(self._analyze_image_sync, image_input)
-            return result
+            image = image_input
+            if isinstance(image_input, str) or hasattr(image_input, 'read'):
+                image = await asyncio.to_thread(self._load_image_sync, image_input)
+            scores = await nsfw_worker.classify(image)
         except Exception as e:
             logger.error(f"NSFW analysis error: {e}")
+            scores = None
+
+        if scores is None:
             return self._rule_based_image_check(image_input)
-    
-    def _analyze_image_sync(self, image_input: Any) -> Tuple[float, str, Dict[str, float]]:
-        """Synchronous image analysis."""
+        return self._label(scores)
+
+    async def analyze_prepared(self, image: Any, key: str) -> Tuple[float, str, Dict[str, float]]:
+        """
+        Analyze an image already decoded and resized by the upload pipeline
+        (see storage._process_image_sync). key is the hash of the original bytes.
+        """
+        try:
+            scores = await nsfw_worker.classify(image, key=key)
+        except Exception as e:
+            logger.error(f"NSFW analysis error: {e}")
+            scores = None
+        if scores is None:
+            return self._rule_based_image_check(image)
+        return self._label(scores)
+
+    def _load_image_sync(self, image_input: Any):
+        """Load a URL, file path or file-like object (blocking I/O)."""
+        if isinstance(image_input, str) and image_input.startswith(('http://', 'https://')):
+            import requests
+            response = requests.get(image_input, timeout=10)
+            return response.content
         from PIL import Image
-        
-        # Convert input to PIL Image if needed
-        if isinstance(image_input, bytes):
-            image = Image.open(io.BytesIO(image_input))
-        elif isinstance(image_input, str):
-            if image_input.startswith(('http://', 'https://')):
-                import requests
-                response = requests.get(image_input, timeout=10)
-                image = Image.open(io.BytesIO(response.content))
-            else:
-                image = Image.open(image_input)
-        elif hasattr(image_input, 'read'):
-            image = Image.open(image_input)
-        else:
-            image = image_input  # Assume PIL Image
-        
-        # Run model
-        results = _model(image)
-        
-        # Parse results
-        scores = {r['label'].lower(): r['score'] for r in results}
-        
-        # Determine primary label and score
+        return prepare_image(Image.open(image_input))
+
+    def _label(self, scores: Dict[str, float]) -> Tuple[float, str, Dict[str, float]]:
         nsfw_score = scores.get('nsfw', 0.0)
-        safe_score = scores.get('normal', scores.get('safe', 0.0))
         
         if nsfw_score > self.NSFW_THRESHOLD:
             label = "nsfw"
@@ -174,19 +311,15 @@ class NSFWDetectionService:
         Analyze text for toxicity.
         Returns: (is_toxic, category)
         """
-        import re
-        
-        text_lower = text.lower()
-        
-        # Check toxic words
-        for word in self.TOXIC_WORDS:
-            if word in text_lower:
-                return True, "toxicity"
-        
-        # Check toxic patterns
-        for pattern in self.TOXIC_PATTERNS:
-            if re.search(pattern, text):
-                return True, "harassment"
+        from backend.services.text_safety import text_safety
+
+        await text_safety.maybe_reload()
+        categories = text_safety.categories(text)
+
+        if "toxicity" in categories:
+            return True, "toxicity"
+        if "harassment" in categories:
+            return True, "harassment"
         
         # Check for excessive caps (shouting)
         if len(text) > 10:
@@ -194,8 +327,8 @@ class NSFWDetectionService:
             if caps_ratio > 0.7:
                 return True, "spam"
         
-        # Check for repeated characters (spam)
-        if re.search(r'(.)\1{5,}', text):
+        # Repeated characters (spam)
+        if "repeated_chars" in categories:
             return True, "spam"
         
         return False, "safe"
@@ -13,6 +13,7 @@ Cursor Pagination Service
 
 import base64
 import json
+import logging
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple
 from pydantic import BaseModel
@@ -20,6 +21,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import desc, asc, exists
 from backend import models
+from backend.services.profile_cards import get_profile_cards
+
+logger = logging.getLogger(__name__)
 
 # ============================================================================
 # SCHEMAS
@@ -109,7 +113,7 @@ async def get_profiles_paginated(
         select(UserPhoto.id).where(UserPhoto.user_id == models.User.id)
     )
 
-    query = select(models.User).where(
+    query = select(models.User.id, models.User.created_at).where(
         models.User.id != u_id,
         models.User.is_complete == True,
         has_photos,
@@ -150,51 +154,21 @@ async def get_profiles_paginated(
     # Берём limit + 1 чтобы определить, есть ли следующая страница
     query = query.limit(limit + 1)
     
-    # FIX: Explicit loading to prevent async issues
-    from sqlalchemy.orm import selectinload
-    query = query.options(
-        selectinload(models.User.photos_rel),
-        selectinload(models.User.interests_rel)
-    )
-
     try:
         result = await db.execute(query)
-        profiles = result.scalars().all()
+        profiles = result.all()
     except Exception as e:
-        print(f"❌ Error in get_profiles_paginated: {e}")
-        import traceback
-        traceback.print_exc()
-        raise e
+        logger.error(f"Error in get_profiles_paginated: {e}")
+        raise
     
     # Определяем наличие следующей страницы
     has_more = len(profiles) > limit
     if has_more:
         profiles = profiles[:limit]  # Убираем лишний элемент
     
-    # Batch check online status via Redis MGET (вместо N отдельных запросов)
-    from backend.services.chat.state import state_manager
-    profile_ids = [str(p.id) for p in profiles]
-    online_map = await state_manager.is_users_online_batch(profile_ids)
-    
-    # Формируем ответ
-    items = []
-    for profile in profiles:
-        is_online = online_map.get(str(profile.id), False)
-        items.append({
-            "id": str(profile.id),
-            "name": profile.name,
-            "age": profile.age,
-            "gender": profile.gender,
-            "bio": profile.bio,
-            "photos": profile.photos or [],
-            "interests": profile.interests or [],
-            "height": getattr(profile, 'height', None),
-            "is_verified": getattr(profile, 'is_verified', False),
-            "is_vip": profile.is_vip,
-            "is_online": is_online,
-            "last_seen": profile.last_seen.isoformat() if getattr(profile, 'last_seen', None) else None,
-            "created_at": str(profile.created_at)
-        })
+    # Карточки + presence батчем (Redis MGET, один запрос на промахи)
+    cards = await get_profile_cards(db, [p.id for p in profiles], with_presence=True)
+    items = [cards[str(p.id)] for p in profiles if str(p.id) in cards]
     
     # Генерируем курсор для следующей страницы
     next_cursor = None
@@ -234,6 +208,9 @@ async def get_matches_paginated(
     
     query = query.order_by(desc(models.Match.created_at), desc(models.Match.id))
     query = query.limit(limit + 1)
+    # Пользователи не нужны — карточки берём из profile_cards
+    from sqlalchemy.orm import noload
+    query = query.options(noload(models.Match.user1), noload(models.Match.user2))
     
     result = await db.execute(query)
     matches = result.scalars().all()
@@ -242,46 +219,21 @@ async def get_matches_paginated(
     if has_more:
         matches = matches[:limit]
     
-    # FIX: Batch fetch all partner profiles in ONE query (N+1 -> 2 queries)
-    partner_ids = set()
-    for match in matches:
-        other_id = match.user2_id if str(match.user1_id) == user_id else match.user1_id
-        partner_ids.add(other_id)
-    
-    # Single query to fetch all partners
-    profiles_map = {}
-    if partner_ids:
-        from sqlalchemy import select as sa_select
-        profiles_result = await db.execute(
-            sa_select(models.User).where(models.User.id.in_(partner_ids))
-        )
-        for p in profiles_result.scalars().all():
-            profiles_map[p.id] = p
-    
-    # Batch check online status via Redis MGET
-    from backend.services.chat.state import state_manager
-    partner_id_list = [str(pid) for pid in partner_ids]
-    online_map = await state_manager.is_users_online_batch(partner_id_list)
+    # Карточки партнёров батчем
+    partner_ids = [
+        match.user2_id if str(match.user1_id) == user_id else match.user1_id
+        for match in matches
+    ]
+    cards = await get_profile_cards(db, partner_ids, with_presence=True)
     
     items = []
-    for match in matches:
-        other_id = match.user2_id if str(match.user1_id) == user_id else match.user1_id
-        profile = profiles_map.get(other_id)
-        
-        if profile:
-            is_online = online_map.get(str(profile.id), False)
+    for match, other_id in zip(matches, partner_ids):
+        card = cards.get(str(other_id))
+        if card:
             items.append({
                 "id": str(match.id),
                 "created_at": str(match.created_at),
-                "user": {
-                    "id": str(profile.id),
-                    "name": profile.name,
-                    "age": profile.age,
-                    "photos": profile.photos or [],
-                    "is_verified": getattr(profile, 'is_verified', False),
-                    "is_online": is_online,
-                    "last_seen": profile.last_seen.isoformat() if getattr(profile, 'last_seen', None) else None
-                }
+                "user": card,
             })
     
     next_cursor = None
@@ -0,0 +1,280 @@
+"""
+Payment Events
+==============
+Journal + worker for payment provider events (Stripe webhooks, Telegram
+Stars successful_payment).
+
+- record(): the webhook verifies the event and inserts the raw payload into
+  payment_events with a unique (provider, event_id); a provider retry hits
+  ON CONFLICT DO NOTHING. The webhook answers right after this commit.
+- The worker claims pending events with UPDATE ... WHERE id IN (SELECT ...
+  FOR UPDATE SKIP LOCKED) RETURNING, so two workers never take the same
+  event, and applies each one in its own session: the status flips to
+  "processed" in the same transaction as the handler's effects. A crash
+  before commit leaves the event "processing"; it is reclaimed after
+  LEASE and re-applied from scratch (the rolled back effects never
+  happened). Failures are retried with backoff up to MAX_ATTEMPTS.
+- Side effects outside the database (bot replies, WebSocket pushes,
+  profile card refresh) are deferred until after the commit.
+- replay(): put failed (or, with force, processed) events back in the queue.
+
+Handlers register with @payment_handler(provider, event_type) next to the
+code that owns the business logic (api/stripe_webhook.py,
+telegram_bot/handlers/payment.py).
+"""
+
+import asyncio
+import importlib
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.session import async_session_maker
+from backend.models.monetization import PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+CONCURRENCY = 4
+POLL_INTERVAL = 5.0             # сек: события, записанные другими воркерами
+LEASE = timedelta(minutes=5)    # "processing" дольше — воркер умер, забираем заново
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 30              # сек * 2^attempt
+
+HANDLER_MODULES = (
+    "backend.api.stripe_webhook",
+    "backend.telegram_bot.handlers.payment",
+)
+
+
+@dataclass
+class EventContext:
+    db: AsyncSession
+    event: PaymentEvent
+    result: Optional[str] = None
+    _after_commit: List[Tuple[Callable[..., Awaitable[Any]], tuple, dict]] = field(default_factory=list)
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self.event.payload
+
+    def defer(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """Run fn after the event's transaction committed (bot replies, WS pushes)."""
+        self._after_commit.append((fn, args, kwargs))
+
+    async def run_deferred(self):
+        for fn, args, kwargs in self._after_commit:
+            try:
+                await fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Payment event post-commit action {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+Handler = Callable[[EventContext], Awaitable[None]]
+_handlers: Dict[Tuple[str, str], Handler] = {}
+
+
+def payment_handler(provider: str, event_type: str):
+    def register(fn: Handler) -> Handler:
+        _handlers[(provider, event_type)] = fn
+        return fn
+    return register
+
+
+def _load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+# --- journal ---------------------------------------------------------------
+
+async def record(db: AsyncSession, provider: str, event_id: str, event_type: str, payload: Dict[str, Any]) -> bool:
+    """Persist a verified raw event. Returns False for a duplicate (provider retry)."""
+    stmt = (
+        pg_insert(PaymentEvent)
+        .values(
+            id=uuid.uuid4(),
+            provider=provider,
+            event_id=str(event_id),
+            event_type=event_type,
+            payload=payload,
+            status="pending",
+            attempts=0,
+            received_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["provider", "event_id"])
+        .returning(PaymentEvent.id)
+    )
+    created = (await db.execute(stmt)).scalar_one_or_none() is not None
+    await db.commit()
+    if created:
+        payment_worker.wake()
+    else:
+        logger.info(f"Duplicate payment event {provider}:{event_id} ignored")
+    return created
+
+
+async def claim(db: AsyncSession, limit: int = BATCH_SIZE) -> List[uuid.UUID]:
+    """Atomically take up to `limit` due events for this worker."""
+    now = datetime.utcnow()
+    due = (
+        select(PaymentEvent.id)
+        .where(or_(
+            PaymentEvent.status == "pending",
+            and_(PaymentEvent.status == "processing", PaymentEvent.locked_at < now - LEASE),
+            and_(
+                PaymentEvent.status == "failed",
+                PaymentEvent.attempts < MAX_ATTEMPTS,
+                PaymentEvent.next_attempt_at <= now,
+            ),
+        ))
+        .order_by(PaymentEvent.received_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(PaymentEvent)
+        .where(PaymentEvent.id.in_(due.scalar_subquery()))
+        .values(status="processing", locked_at=now, attempts=PaymentEvent.attempts + 1)
+        .returning(PaymentEvent.id)
+        .execution_options(synchronize_session=False)
+    )
+    ids = list(result.scalars().all())
+    await db.commit()
+    return ids
+
+
+async def apply(event_id: uuid.UUID, session_factory=async_session_maker) -> str:
+    """Apply one claimed event. Returns its new status."""
+    async with session_factory() as db:
+        event = await db.get(PaymentEvent, event_id)
+        if event is None or event.status != "processing":
+            return event.status if event else "missing"
+        handler = _handlers.get((event.provider, event.event_type))
+        ctx = EventContext(db, event)
+        name, attempts = f"{event.provider}:{event.event_id}", event.attempts
+
+        # Статус — в той же транзакции, что и эффекты обработчика
+        event.status = "processed"
+        event.processed_at = datetime.utcnow()
+        event.error = None
+        try:
+            if handler is None:
+                ctx.result = "ignored"
+            else:
+                await handler(ctx)
+            event.result = ctx.result or "ok"
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Payment event {name} failed (attempt {attempts}): {e}")
+            await db.execute(
+                update(PaymentEvent)
+                .where(PaymentEvent.id == event_id)
+                .values(
+                    status="failed",
+                    error=str(e)[:2000],
+                    locked_at=None,
+                    next_attempt_at=datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF * 2 ** (attempts - 1)),
+                )
+            )
+            await db.commit()
+            return "failed"
+
+    await ctx.run_deferred()
+    return "processed"
+
+
+async def replay(
+    db: AsyncSession,
+    event_ids: Optional[Iterable[uuid.UUID]] = None,
+    status: str = "failed",
+    since: Optional[datetime] = None,
+    force: bool = False,
+) -> int:
+    """
+    Re-queue events. By default only failed ones; processed events need
+    force=True (handlers are idempotent on the provider's payment id, but
+    replaying them is still an explicit decision).
+    """
+    statuses = {"failed"} | ({"processed"} if force else set())
+    if status not in statuses:
+        raise ValueError(f"Cannot replay events with status {status!r} (force={force})")
+    conditions = [PaymentEvent.status == status]
+    if event_ids is not None:
+        conditions.append(PaymentEvent.id.in_(list(event_ids)))
+    if since:
+        conditions.append(PaymentEvent.received_at >= since)
+    result = await db.execute(
+        update(PaymentEvent)
+        .where(*conditions)
+        .values(status="pending", attempts=0, error=None, next_attempt_at=None, locked_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount:
+        payment_worker.wake()
+    return result.rowcount or 0
+
+
+# --- worker ------------------------------------------------------------------
+
+class PaymentEventWorker:
+    def __init__(self, session_factory=async_session_maker, concurrency: int = CONCURRENCY):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_once(self) -> int:
+        """Claim and apply one batch. Returns how many events were taken."""
+        async with self.session_factory() as db:
+            ids = await claim(db)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(event_id):
+            async with semaphore:
+                return await apply(event_id, self.session_factory)
+
+        await asyncio.gather(*(bounded(event_id) for event_id in ids))
+        return len(ids)
+
+    async def _run(self):
+        _load_handlers()
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_once() >= BATCH_SIZE:
+                    continue            # очередь не пуста — сразу следующая пачка
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment event worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+payment_worker = PaymentEventWorker()
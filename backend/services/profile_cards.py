@@ -0,0 +1,316 @@
+# Profile Cards - снапшоты профилей в Redis и пакетная гидрация карточек
+#
+# Ключи (бинарный клиент, значения — msgpack; без msgpack — компактный JSON):
+#   profile:snap:{id}   снапшот профиля: карточка + приватные поля + "v"
+#   profile:ver:{id}    счётчик версий профиля (INCR при каждом изменении)
+#
+# Чтение: один MGET по снапшотам и версиям. Снапшот с v меньше текущей
+# версии устарел (запись в процессе или сорвалась) и считается промахом.
+# Промахи — один SELECT по users с фото/интересами в подзапросах, затем
+# запись обратно.
+#
+# Запись (write-through после commit): INCR версии -> чтение из БД ->
+# SET только если версия не устарела (Lua), поэтому более старая запись
+# не может затереть более новую.
+#
+# В снапшоте всегда полный профиль, проекция ("thumb" / "full" /
+# "snapshot") делается при выдаче.
+
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.core.redis import redis_manager
+from backend.models.user import User, UserPhoto, UserInterest
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+SNAPSHOT_KEY = "profile:snap:{}"
+VERSION_KEY = "profile:ver:{}"
+SNAPSHOT_TTL = 24 * 3600       # write-through держит снапшот свежим
+VERSION_TTL = 30 * 24 * 3600   # дольше снапшота, иначе версия "откатится"
+WARM_CHUNK = 500
+WARM_ACTIVE_DAYS = 7
+
+THUMB_FIELDS = ("id", "name", "age", "photo", "is_verified")
+FULL_FIELDS = (
+    "id", "name", "age", "gender", "bio", "photo", "photos", "interests",
+    "height", "smoking", "drinking", "education", "looking_for", "children",
+    "is_verified", "is_vip", "city", "last_seen", "created_at",
+)
+# Поля только для внутренних чтений (в списки не попадают)
+PRIVATE_FIELDS = ("is_active", "subscription_tier", "latitude", "longitude", "v")
+VIEWS = {
+    "thumb": THUMB_FIELDS,
+    "full": FULL_FIELDS,
+    "snapshot": FULL_FIELDS + PRIVATE_FIELDS,
+}
+
+# SET снапшота, только если за время чтения из БД не появилась более новая версия
+_SET_IF_CURRENT = """
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+if tonumber(ARGV[1]) < current then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def _iso(dt) -> Optional[str]:
+    return dt.isoformat() if dt else None
+
+
+def _enum(value):
+    return value.value if hasattr(value, "value") else value
+
+
+def pack(snapshot: Dict[str, Any]) -> bytes:
+    if msgpack:
+        return msgpack.packb(snapshot, use_bin_type=True)
+    return json.dumps(snapshot, separators=(",", ":")).encode()
+
+
+def unpack(raw: bytes) -> Dict[str, Any]:
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    return msgpack.unpackb(raw, raw=False)
+
+
+def _card_from_row(row) -> Dict[str, Any]:
+    photos = [url for url in (row.photos or []) if url]
+    return {
+        "id": str(row.id),
+        "name": row.name,
+        "age": row.age,
+        "gender": _enum(row.gender),
+        "bio": row.bio,
+        "photo": photos[0] if photos else None,
+        "photos": photos,
+        "interests": [tag for tag in (row.interests or []) if tag],
+        "height": row.height,
+        "smoking": row.smoking,
+        "drinking": row.drinking,
+        "education": row.education,
+        "looking_for": row.looking_for,
+        "children": row.children,
+        "is_verified": bool(row.is_verified),
+        "is_vip": bool(row.is_vip),
+        "city": row.city,
+        "last_seen": _iso(row.last_seen),
+        "created_at": _iso(row.created_at),
+        "is_active": bool(row.is_active),
+        "subscription_tier": _enum(row.subscription_tier),
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+    }
+
+
+def project(card: Dict[str, Any], view: str = "full") -> Dict[str, Any]:
+    """Оставить в карточке только поля проекции."""
+    return {field: card.get(field) for field in VIEWS[view]}
+
+
+async def load_cards(db: AsyncSession, ids: List[uuid.UUID]) -> Dict[str, Dict[str, Any]]:
+    """Полные снапшоты (без версии) из БД одним запросом."""
+    if not ids:
+        return {}
+    photos = (
+        select(func.array_agg(aggregate_order_by(UserPhoto.url, UserPhoto.created_at)))
+        .where(UserPhoto.user_id == User.id)
+        .scalar_subquery()
+    )
+    interests = (
+        select(func.array_agg(UserInterest.tag))
+        .where(UserInterest.user_id == User.id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            User.id, User.name, User.age, User.gender, User.bio,
+            User.height, User.smoking, User.drinking, User.education,
+            User.looking_for, User.children, User.is_verified, User.is_vip,
+            User.city, User.last_seen, User.created_at,
+            User.is_active, User.subscription_tier, User.latitude, User.longitude,
+            photos.label("photos"), interests.label("interests"),
+        ).where(User.id.in_(ids))
+    )
+    return {str(row.id): _card_from_row(row) for row in result.all()}
+
+
+async def _store(r, snapshots: Dict[str, Dict[str, Any]], versions: Dict[str, int]):
+    """Записать снапшоты, пропуская те, что устарели за время чтения."""
+    script = r.register_script(_SET_IF_CURRENT)
+    async with r.pipeline(transaction=False) as pipe:
+        for uid, snapshot in snapshots.items():
+            version = versions.get(uid, 0)
+            snapshot["v"] = version
+            await script(
+                keys=[SNAPSHOT_KEY.format(uid), VERSION_KEY.format(uid)],
+                args=[version, pack(snapshot), SNAPSHOT_TTL],
+                client=pipe,
+            )
+        await pipe.execute()
+
+
+async def get_profile_cards(
+    db: AsyncSession,
+    user_ids: Iterable[Any],
+    view: str = "full",
+    with_presence: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Карточки пользователей {user_id: card}. Отсутствующие пользователи
+    в результат не попадают, порядок выдачи определяет вызывающий код.
+
+    with_presence — добавить is_online / свежий last_seen из presence.
+    """
+    ids = list(dict.fromkeys(str(uid) for uid in user_ids))
+    if not ids:
+        return {}
+
+    cards: Dict[str, Dict[str, Any]] = {}
+    versions: Dict[str, int] = {}
+    r = await redis_manager.get_binary_redis()
+    if r:
+        try:
+            raw = await r.mget(
+                [SNAPSHOT_KEY.format(uid) for uid in ids] + [VERSION_KEY.format(uid) for uid in ids]
+            )
+            for uid, snap, ver in zip(ids, raw[:len(ids)], raw[len(ids):]):
+                versions[uid] = int(ver or 0)
+                if snap:
+                    snapshot = unpack(snap)
+                    if snapshot.get("v", 0) >= versions[uid]:
+                        cards[uid] = snapshot
+        except Exception as e:
+            logger.warning(f"Profile snapshot read error: {e}")
+
+    missing = [uuid.UUID(uid) for uid in ids if uid not in cards]
+    if missing:
+        loaded = await load_cards(db, missing)
+        cards.update(loaded)
+        if r and loaded:
+            try:
+                await _store(r, loaded, versions)
+            except Exception as e:
+                logger.warning(f"Profile snapshot write error: {e}")
+
+    result = {uid: project(card, view) for uid, card in cards.items()}
+
+    if with_presence and result:
+        from backend.services.chat.state import state_manager
+        presence_map = await state_manager.get_presence_batch(list(result))
+        for uid, card in result.items():
+            presence = presence_map.get(uid, {})
+            card["is_online"] = presence.get("is_online", False)
+            # Redis presence свежее users.last_seen (пишется пакетно)
+            card["last_seen"] = presence.get("last_seen") or cards[uid].get("last_seen")
+
+    return result
+
+
+async def get_profile_snapshot(db: AsyncSession, user_id: Any) -> Optional[Dict[str, Any]]:
+    """Полный снапшот одного профиля (включая приватные поля)."""
+    return (await get_profile_cards(db, [user_id], view="snapshot")).get(str(user_id))
+
+
+async def refresh_profile_cards(db: AsyncSession, user_ids: Iterable[Any]):
+    """
+    Write-through после изменения профиля. Вызывать ПОСЛЕ commit:
+    версия поднимается до чтения из БД, поэтому параллельная запись
+    со старыми данными будет отброшена.
+    """
+    ids = list(dict.fromkeys(str(uid) for uid in user_ids))
+    if not ids:
+        return
+    r = await redis_manager.get_binary_redis()
+    if not r:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for uid in ids:
+                pipe.incr(VERSION_KEY.format(uid))
+                pipe.expire(VERSION_KEY.format(uid), VERSION_TTL)
+            results = await pipe.execute()
+        versions = dict(zip(ids, results[::2]))
+        loaded = await load_cards(db, [uuid.UUID(uid) for uid in ids])
+        await _store(r, loaded, versions)
+        # Удалённые пользователи: снапшота быть не должно
+        gone = [SNAPSHOT_KEY.format(uid) for uid in ids if uid not in loaded]
+        if gone:
+            await r.delete(*gone)
+    except Exception as e:
+        logger.warning(f"Profile snapshot refresh error: {e}")
+
+
+async def invalidate_profile_cards(user_ids: Iterable[Any]):
+    """Сбросить снапшоты (например, при удалении аккаунта)."""
+    ids = [str(uid) for uid in user_ids]
+    if not ids:
+        return
+    r = await redis_manager.get_binary_redis()
+    if not r:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.delete(*[SNAPSHOT_KEY.format(uid) for uid in ids])
+            for uid in ids:
+                pipe.incr(VERSION_KEY.format(uid))
+                pipe.expire(VERSION_KEY.format(uid), VERSION_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Profile snapshot invalidate error: {e}")
+
+
+async def warm_profile_snapshots(session_factory=None, active_days: int = WARM_ACTIVE_DAYS) -> int:
+    """
+    Прогрев снапшотов недавно активных пользователей (keyset по id).
+    Версии читаются до загрузки из БД — свежая write-through запись
+    прогревом не затирается.
+    """
+    r = await redis_manager.get_binary_redis()
+    if not r:
+        return 0
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+
+    since = datetime.utcnow() - timedelta(days=active_days)
+    warmed = 0
+    last_id = None
+    while True:
+        async with session_factory() as db:
+            stmt = (
+                select(User.id)
+                .where(User.is_active == True, User.last_seen >= since)
+                .order_by(User.id)
+                .limit(WARM_CHUNK)
+            )
+            if last_id is not None:
+                stmt = stmt.where(User.id > last_id)
+            ids = [row[0] for row in (await db.execute(stmt)).all()]
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            raw = await r.mget([VERSION_KEY.format(uid) for uid in ids])
+            versions = {str(uid): int(v or 0) for uid, v in zip(ids, raw)}
+            loaded = await load_cards(db, ids)
+        await _store(r, loaded, versions)
+        warmed += len(loaded)
+        if len(ids) < WARM_CHUNK:
+            break
+
+    logger.info(f"Profile snapshots warmed: {warmed}")
+    return warmed
@@ -1,193 +1,442 @@
+# Reporting - админские отчёты (CSV/XLSX) в отдельном процессе
+#
+# POST /admin/advanced/reports/generate создаёт ReportJob, фоновая задача
+# отдаёт его в ProcessPoolExecutor (spawn): дочерний процесс поднимает свой
+# event loop и engine, читает строки серверным курсором (db.stream +
+# yield_per) и пишет их пачками в CSV или XLSX (openpyxl write_only), так
+# что память не растёт с размером таблицы, а event loop API-процесса не
+# занят ни запросом, ни сериализацией.
+#
+# Статус и rows_written — в report_jobs; готовый файл отдаётся через
+# GET /admin/advanced/reports/jobs/{id}/download и удаляется через
+# settings.REPORT_TTL_HOURS (cleanup_expired_reports).
+#
+# Зависшие задания: пока файл собирается, heartbeat_at обновляется раз в
+# HEARTBEAT_SECONDS; очистка закрывает "running" только без отметки дольше
+# STALE_HEARTBEAT_MINUTES, а "completed" ставится лишь пока задание "running".
 
+import asyncio
+import csv
+import json
+import logging
+import multiprocessing
 import os
 import uuid
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update, or_, and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text
-from tempfile import NamedTemporaryFile
 
-# Pandas is optional (too heavy for Vercel 250MB limit)
+from backend.config.settings import settings
+from backend.models.advanced import CustomReport, ReportJob
+
+# openpyxl is optional (too heavy for Vercel 250MB limit) — без него только CSV
 try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
+    import openpyxl
 except ImportError:
-    pd = None
-    PANDAS_AVAILABLE = False
-
-from backend.database import AsyncSessionLocal
-from backend.models.advanced import CustomReport, AIUsageLog
-from backend.models import User
-from backend.crud import advanced as advanced_crud
-
-async def generate_report_task(report_id: uuid.UUID):
-    """
-    Background task to generate a report file.
-    """
-    if not PANDAS_AVAILABLE:
-        print("Pandas not available - report generation disabled on serverless")
-        return
-        
-    async with AsyncSessionLocal() as db:
-        report = await db.get(CustomReport, report_id)
-        if not report:
-            print(f"Report {report_id} not found.")
-            return
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+REPORT_BATCH = 2000           # строк за один проход курсора
+PROGRESS_EVERY = 20000        # rows_written обновляется не чаще
+STALE_JOB_MINUTES = 60        # "pending" дольше — фоновая задача потерялась (рестарт)
+HEARTBEAT_SECONDS = 60        # как часто работающее задание отмечается в БД
+STALE_HEARTBEAT_MINUTES = 10  # "running" без отметки дольше — процесс умер
+FORMATS = ("csv", "xlsx")
+ACTIVE_STATUSES = ("pending", "running")
+
+
+@dataclass
+class ReportSpec:
+    title: str
+    columns: List[str]
+    query: Callable[[datetime], Any]
+    row: Callable[[Any], List[Any]] = list
+
+
+def _rate(part, total) -> float:
+    return round(part / total * 100, 2) if total else 0.0
+
+
+def _specs() -> Dict[str, ReportSpec]:
+    from backend.models.user import User
+    from backend.models.monetization import RevenueTransaction, GiftTransaction
+    from backend.models.marketing import MarketingCampaign
+    from backend.models.advanced import AIUsageLog
+
+    def campaign_row(r) -> List[Any]:
+        stats = r.stats or {}
+        sent, opened, clicked, converted = (int(stats.get(k) or 0) for k in ("sent", "opened", "clicked", "converted"))
+        return [
+            r.name, r.type, r.status, r.target_segment, sent, opened, clicked, converted, r.created_at,
+            _rate(opened, sent), _rate(clicked, sent), _rate(converted, sent),
+        ]
+
+    return {
+        "user_analytics": ReportSpec(
+            "Users",
+            ["Created At", "Email", "Name", "Gender", "VIP", "Complete", "Status"],
+            lambda since: select(
+                User.created_at, User.email, User.name, User.gender, User.is_vip, User.is_complete, User.status,
+            ).where(User.created_at >= since).order_by(User.created_at.desc()),
+        ),
+        "financial": ReportSpec(
+            "Revenue",
+            ["Date", "Amount", "Currency", "Type", "Status", "Provider"],
+            lambda since: select(
+                RevenueTransaction.created_at, RevenueTransaction.amount, RevenueTransaction.currency,
+                RevenueTransaction.transaction_type, RevenueTransaction.status, RevenueTransaction.payment_gateway,
+            ).where(RevenueTransaction.created_at >= since).order_by(RevenueTransaction.created_at.desc()),
+        ),
+        "marketing": ReportSpec(
+            "Campaigns",
+            [
+                "Campaign", "Type", "Status", "Segment", "Sent", "Opens", "Clicks", "Conversions", "Created",
+                "Open Rate %", "Click Rate %", "Conversion Rate %",
+            ],
+            lambda since: select(
+                MarketingCampaign.name, MarketingCampaign.type, MarketingCampaign.status,
+                MarketingCampaign.target_segment, MarketingCampaign.stats, MarketingCampaign.created_at,
+            ).where(MarketingCampaign.created_at >= since).order_by(MarketingCampaign.created_at.desc()),
+            campaign_row,
+        ),
+        "ai_usage": ReportSpec(
+            "AI Usage",
+            ["Timestamp", "Feature", "Model", "Tokens", "Cost"],
+            lambda since: select(
+                AIUsageLog.timestamp, AIUsageLog.feature, AIUsageLog.model, AIUsageLog.tokens_used, AIUsageLog.cost,
+            ).order_by(AIUsageLog.timestamp.desc()),
+        ),
+        "gifts": ReportSpec(
+            "Gifts",
+            ["Date", "Sender", "Recipient", "Gift ID", "Price", "Currency", "Status"],
+            lambda since: select(
+                GiftTransaction.created_at, GiftTransaction.sender_id, GiftTransaction.receiver_id,
+                GiftTransaction.gift_id, GiftTransaction.price_paid, GiftTransaction.currency, GiftTransaction.status,
+            ).where(GiftTransaction.created_at >= since).order_by(GiftTransaction.created_at.desc()),
+        ),
+    }
+
+
+def report_types() -> List[str]:
+    return list(_specs())
+
+
+def available_formats() -> List[str]:
+    return [f for f in FORMATS if f != "xlsx" or openpyxl is not None]
+
+
+def _period_start(config: Dict[str, Any]) -> datetime:
+    period = (config or {}).get("period", "30d")
+    days = int(period[:-1]) if period.endswith("d") and period[:-1].isdigit() else 30
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+class CsvReportWriter:
+    def __init__(self, path: str, columns: List[str], title: str = ""):
+        # utf-8-sig: Excel открывает кириллицу без танцев с импортом
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(columns)
+
+    def write_rows(self, rows: List[List[Any]]):
+        self._csv.writerows([[_cell(v) for v in row] for row in rows])
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxReportWriter:
+    """openpyxl write-only workbook: rows go straight to a temp XML stream, not into memory."""
+
+    def __init__(self, path: str, columns: List[str], title: str = "Report"):
+        if openpyxl is None:
+            raise RuntimeError("openpyxl is not installed, XLSX reports are unavailable")
+        self.path = path
+        self._book = openpyxl.Workbook(write_only=True)
+        self._sheet = self._book.create_sheet(title[:31] or "Report")
+        self._sheet.append(columns)
+
+    def write_rows(self, rows: List[List[Any]]):
+        for row in rows:
+            self._sheet.append([_cell(v) for v in row])
+
+    def close(self):
+        self._book.save(self.path)
+
+
+def open_writer(fmt: str, path: str, columns: List[str], title: str = "Report"):
+    if fmt == "csv":
+        return CsvReportWriter(path, columns, title)
+    if fmt == "xlsx":
+        return XlsxReportWriter(path, columns, title)
+    raise ValueError(f"Unknown report format: {fmt}")
+
+
+def report_path(job_id: uuid.UUID, fmt: str) -> str:
+    return os.path.join(settings.REPORT_DIR, f"{job_id}.{fmt}")
+
+
+def _remove(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+async def write_report(db: AsyncSession, spec: ReportSpec, since: datetime, writer, on_progress=None) -> int:
+    """Стрим строк отчёта в writer. on_progress(rows) — раз в PROGRESS_EVERY строк."""
+    rows = 0
+    reported = 0
+    result = await db.stream(spec.query(since).execution_options(yield_per=REPORT_BATCH))
+    async for partition in result.partitions(REPORT_BATCH):
+        writer.write_rows([spec.row(r) for r in partition])
+        rows += len(partition)
+        if on_progress and rows - reported >= PROGRESS_EVERY:
+            reported = rows
+            await on_progress(rows)
+    return rows
+
+
+async def _update_job(session_factory, job_id: uuid.UUID, only_if_status: Optional[str] = None, **values) -> bool:
+    """Update the job; with only_if_status the update applies only if the status still matches."""
+    query = update(ReportJob).where(ReportJob.id == job_id)
+    if only_if_status:
+        query = query.where(ReportJob.status == only_if_status)
+    async with session_factory() as db:
+        result = await db.execute(query.values(**values))
+        await db.commit()
+    return result.rowcount != 0
 
+
+async def _heartbeat(session_factory, job_id: uuid.UUID):
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
         try:
-            # Update status to processing
-            report.status = "processing" # Assuming we add this field or reuse configuration
-            # In our model we don't have status, let's use configuration['status'] for now to avoid migration loop
-            # Or better, let's just do the work and update configuration['download_url']
-            
-            # Logic to fetch data
-            df = await _fetch_data_for_report(db, report)
-            
-            # Save to file
-            filename = f"report_{report.report_type}_{datetime.utcnow().strftime('%Y%m%d%H%M')}.xlsx"
-            file_path = os.path.join("static", "reports", filename)
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Use pandas to writing Excel
-            # Note: writing to static folder in a real app might need S3, but for local it's fine.
-            # We need to run this in a threadpool probably because pandas is blocking
-            # but for simplicity/MVP in async task, straightforward call is "okay" if small data
-            df.to_excel(file_path, index=False)
-            
-            # Update Report Record
-            # Since we don't have a 'status' column in CustomReport model explicitly in the provided code snippet,
-            # we will store metadata in 'configuration' or 'download_url' if we added it?
-            # The previous code had "download_url" in the API response but not in the model?
-            # Wait, the frontend exptects "download_url". The model 'CustomReport' definition I saw earlier:
-            # configuration: Mapped[Dict[str, Any]] 
-            # It didn't have download_url column. I should have added it?
-            # Let's save it in configuration for now.
-            
-            new_config = dict(report.configuration)
-            new_config["download_url"] = f"/static/reports/{filename}"
-            new_config["status"] = "completed"
-            
-            report.configuration = new_config
-            report.last_run_at = datetime.utcnow()
-            
-            db.add(report)
-            await db.commit()
-            
+            await _update_job(session_factory, job_id, only_if_status="running", heartbeat_at=datetime.utcnow())
         except Exception as e:
-            print(f"Error generating report: {e}")
-            new_config = dict(report.configuration)
-            new_config["status"] = "failed"
-            new_config["error"] = str(e)
+            logger.warning(f"Report {job_id} heartbeat failed: {e}")
+
+
+async def _generate(job_id: uuid.UUID, report_type: str, config: Dict[str, Any], path: str, fmt: str) -> int:
+    # Импорт здесь: в дочернем процессе engine создаётся заново, со своим loop
+    from backend.db.session import async_session_maker
+
+    spec = _specs().get(report_type)
+    if spec is None:
+        raise ValueError(f"Unknown report type: {report_type}")
+
+    async def on_progress(rows: int):
+        await _update_job(async_session_maker, job_id, rows_written=rows)
+
+    writer = open_writer(fmt, path, spec.columns, spec.title)
+    try:
+        async with async_session_maker() as db:
+            rows = await write_report(db, spec, _period_start(config), writer, on_progress)
+    finally:
+        writer.close()
+    return rows
+
+
+def run_report_process(job_id: str, report_type: str, config: Dict[str, Any], path: str, fmt: str) -> int:
+    """Entry point inside the worker process. Returns the number of rows written."""
+    return asyncio.run(_generate(uuid.UUID(job_id), report_type, config, path, fmt))
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: дочерний процесс не наследует loop и соединения родителя
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.REPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run_in_pool(*args) -> int:
+    global _executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_executor(), run_report_process, *args)
+    except BrokenProcessPool:
+        # Процесс убит (OOM и т.п.) — следующий отчёт получит свежий пул
+        _executor = None
+        raise
+
+
+# ============================================================================
+# JOBS
+# ============================================================================
+
+async def request_report(
+    db: AsyncSession,
+    report: CustomReport,
+    fmt: str = "xlsx",
+    requested_by: Optional[uuid.UUID] = None,
+) -> ReportJob:
+    """Создать задание на отчёт. Raises ValueError для неизвестного типа/формата."""
+    if report.report_type not in _specs():
+        raise ValueError(f"Unknown report type: {report.report_type}")
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported report format: {fmt}")
+
+    job = ReportJob(
+        id=uuid.uuid4(),
+        report_id=report.id,
+        report_type=report.report_type,
+        format=fmt,
+        status="pending",
+        requested_by=requested_by,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def latest_jobs(db: AsyncSession, report_id: uuid.UUID, limit: int = 10) -> List[ReportJob]:
+    result = await db.execute(
+        select(ReportJob).where(ReportJob.report_id == report_id).order_by(ReportJob.created_at.desc()).limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def run_report_job(job_id: uuid.UUID, session_factory=None):
+    """Фоновая задача: собрать файл в пуле процессов и обновить статус задания."""
+    if session_factory is None:
+        from backend.database import async_session as session_factory
+
+    async with session_factory() as db:
+        job = await db.get(ReportJob, job_id)
+        if not job or job.status != "pending":
+            return
+        report = await db.get(CustomReport, job.report_id)
+        config = dict(report.configuration or {}) if report else {}
+        report_id, report_type, fmt = job.report_id, job.report_type, job.format
+
+    path = report_path(job_id, fmt)
+    now = datetime.utcnow()
+    await _update_job(session_factory, job_id, status="running", started_at=now, heartbeat_at=now)
+    heartbeat = asyncio.create_task(_heartbeat(session_factory, job_id))
+
+    try:
+        await asyncio.to_thread(os.makedirs, settings.REPORT_DIR, exist_ok=True)
+        rows = await _run_in_pool(str(job_id), report_type, config, path, fmt)
+
+        now = datetime.utcnow()
+        completed = await _update_job(
+            session_factory, job_id, only_if_status="running",
+            status="completed", rows_written=rows, file_path=path,
+            size_bytes=await asyncio.to_thread(os.path.getsize, path),
+            completed_at=now,
+            expires_at=now + timedelta(hours=settings.REPORT_TTL_HOURS),
+        )
+        if completed:
+            status, error = "completed", None
+            logger.info(f"Report {job_id} ({report_type}.{fmt}) completed: {rows} rows")
+        else:
+            # Задание уже закрыто очисткой — файл никому не достанется
+            logger.warning(f"Report {job_id} finished after it was closed, discarding the file")
+            await asyncio.to_thread(_remove, path)
+            status, error = "failed", "Report timed out"
+    except Exception as e:
+        logger.error(f"Report {job_id} failed: {e}")
+        await asyncio.to_thread(_remove, path)
+        await _update_job(
+            session_factory, job_id, only_if_status="running",
+            status="failed", error=str(e)[:500], completed_at=datetime.utcnow(),
+        )
+        status, error = "failed", str(e)[:500]
+    finally:
+        heartbeat.cancel()
+
+    # Фронтенд читает статус последнего запуска из configuration отчёта
+    async with session_factory() as db:
+        report = await db.get(CustomReport, report_id)
+        if report:
+            new_config = dict(report.configuration or {})
+            new_config.update({
+                "status": status,
+                "job_id": str(job_id),
+                "download_url": f"/admin/advanced/reports/jobs/{job_id}/download" if status == "completed" else None,
+                "error": error,
+            })
             report.configuration = new_config
-            db.add(report)
+            report.last_run_at = datetime.utcnow()
             await db.commit()
 
-async def _fetch_data_for_report(db: AsyncSession, report: CustomReport):
-    if not PANDAS_AVAILABLE:
-        return None
-    
-    from backend.models.monetization import RevenueTransaction, GiftTransaction
-    from backend.models.marketing import MarketingCampaign
-    from datetime import timedelta
-        
-    report_type = report.report_type
-    config = report.configuration or {}
-    period = config.get("period", "30d")
-    
-    # Calculate date range
-    days = int(period.replace("d", "")) if period.endswith("d") else 30
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    if report_type == "user_analytics":
-        # Users by date with stats
-        stmt = select(
-            User.created_at, 
-            User.email, 
-            User.name, 
-            User.gender,
-            User.is_vip,
-            User.is_complete,
-            User.status
-        ).where(User.created_at >= start_date).order_by(User.created_at.desc())
-        result = await db.execute(stmt)
-        data = result.all()
-        return pd.DataFrame(data, columns=["Created At", "Email", "Name", "Gender", "VIP", "Complete", "Status"])
-        
-    elif report_type == "financial":
-        # Real financial data from RevenueTransaction
-        stmt = select(
-            RevenueTransaction.created_at,
-            RevenueTransaction.amount,
-            RevenueTransaction.currency,
-            RevenueTransaction.transaction_type,
-            RevenueTransaction.status,
-            RevenueTransaction.payment_provider
-        ).where(RevenueTransaction.created_at >= start_date).order_by(RevenueTransaction.created_at.desc())
-        result = await db.execute(stmt)
-        data = result.all()
-        
-        if data:
-            df = pd.DataFrame(data, columns=["Date", "Amount", "Currency", "Type", "Status", "Provider"])
-            # Add summary row
-            total = df[df["Status"] == "completed"]["Amount"].sum() if "completed" in df["Status"].values else 0
-            return df
-        else:
-            # Return empty dataframe with correct columns
-            return pd.DataFrame(columns=["Date", "Amount", "Currency", "Type", "Status", "Provider"])
-        
-    elif report_type == "marketing":
-        # Real marketing campaign data
-        stmt = select(
-            MarketingCampaign.name,
-            MarketingCampaign.campaign_type,
-            MarketingCampaign.status,
-            MarketingCampaign.target_segment,
-            MarketingCampaign.sent_count,
-            MarketingCampaign.open_count,
-            MarketingCampaign.click_count,
-            MarketingCampaign.conversion_count,
-            MarketingCampaign.created_at
-        ).where(MarketingCampaign.created_at >= start_date).order_by(MarketingCampaign.created_at.desc())
-        result = await db.execute(stmt)
-        data = result.all()
-        
-        if data:
-            df = pd.DataFrame(data, columns=[
-                "Campaign", "Type", "Status", "Segment", 
-                "Sent", "Opens", "Clicks", "Conversions", "Created"
-            ])
-            # Calculate rates
-            df["Open Rate %"] = (df["Opens"] / df["Sent"] * 100).fillna(0).round(2)
-            df["Click Rate %"] = (df["Clicks"] / df["Sent"] * 100).fillna(0).round(2)
-            df["Conversion Rate %"] = (df["Conversions"] / df["Sent"] * 100).fillna(0).round(2)
-            return df
-        else:
-            return pd.DataFrame(columns=["Campaign", "Type", "Status", "Segment", "Sent", "Opens", "Clicks", "Conversions", "Created"])
-        
-    elif report_type == "ai_usage":
-        stmt = select(AIUsageLog.timestamp, AIUsageLog.feature, AIUsageLog.model, AIUsageLog.tokens_used, AIUsageLog.cost)
-        result = await db.execute(stmt)
-        data = result.all()
-        return pd.DataFrame(data, columns=["Timestamp", "Feature", "Model", "Tokens", "Cost"])
-    
-    elif report_type == "gifts":
-        # Gift transactions report
-        stmt = select(
-            GiftTransaction.created_at,
-            GiftTransaction.sender_id,
-            GiftTransaction.recipient_id,
-            GiftTransaction.gift_id,
-            GiftTransaction.stars_amount,
-            GiftTransaction.status
-        ).where(GiftTransaction.created_at >= start_date).order_by(GiftTransaction.created_at.desc())
-        result = await db.execute(stmt)
-        data = result.all()
-        
-        if data:
-            return pd.DataFrame(data, columns=["Date", "Sender", "Recipient", "Gift ID", "Stars", "Status"])
-        else:
-            return pd.DataFrame(columns=["Date", "Sender", "Recipient", "Gift ID", "Stars", "Status"])
 
-    else:
-        return pd.DataFrame([{"Error": f"Unknown report type: {report_type}"}])
+async def cleanup_expired_reports(db: AsyncSession) -> Dict[str, int]:
+    """Удалить просроченные файлы отчётов и закрыть зависшие задания."""
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(ReportJob)
+        .where(ReportJob.status == "completed", ReportJob.expires_at < now)
+        .values(status="expired", file_path=None)
+        .returning(ReportJob.id, ReportJob.format)
+        .execution_options(synchronize_session=False)
+    )
+    expired = result.all()
+
+    stale = await db.execute(
+        update(ReportJob)
+        .where(or_(
+            and_(
+                ReportJob.status == "pending",
+                ReportJob.created_at < now - timedelta(minutes=STALE_JOB_MINUTES),
+            ),
+            and_(
+                ReportJob.status == "running",
+                func.coalesce(ReportJob.heartbeat_at, ReportJob.started_at)
+                < now - timedelta(minutes=STALE_HEARTBEAT_MINUTES),
+            ),
+        ))
+        .values(status="failed", error="Report timed out", completed_at=now)
+        .returning(ReportJob.id, ReportJob.format)
+        .execution_options(synchronize_session=False)
+    )
+    failed = stale.all()
+    await db.commit()
+
+    for job_id, fmt in list(expired) + list(failed):
+        try:
+            await asyncio.to_thread(_remove, report_path(job_id, fmt))
+        except OSError as e:
+            logger.warning(f"Could not remove report {job_id}: {e}")
+
+    return {"expired": len(expired), "failed": len(failed)}
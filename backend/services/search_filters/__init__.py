@@ -18,7 +18,6 @@ from backend.services.search_filters.schemas import (
 from backend.services.search_filters.helpers import (
     haversine_distance,
     interests_match,
-    profile_to_dict,
     get_all_filter_options,
 )
 from backend.services.search_filters.filters import (
@@ -37,7 +36,6 @@ __all__ = [
     "INTEREST_SUGGESTIONS",
     "haversine_distance",
     "interests_match",
-    "profile_to_dict",
     "get_all_filter_options",
     "get_filtered_profiles",
 ]
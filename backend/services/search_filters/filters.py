@@ -19,8 +19,8 @@ from backend.services.search_filters.schemas import SearchFilters
 from backend.services.search_filters.helpers import (
     haversine_distance,
     interests_match,
-    profile_to_dict,
 )
+from backend.services.profile_cards import get_profile_cards
 
 logger = logging.getLogger(__name__)
 
@@ -62,8 +62,8 @@ async def get_filtered_profiles(
     if not current_user:
         return {"profiles": [], "total": 0, "error": "User not found"}
     
-    # Начинаем запрос
-    query = select(models.User).where(
+    # Начинаем запрос: только id и координаты, карточки — profile_cards
+    query = select(models.User.id, models.User.latitude, models.User.longitude).where(
         models.User.id != u_id,
         models.User.is_complete == True,
         models.User.is_active == True
@@ -170,7 +170,7 @@ async def get_filtered_profiles(
     )
 
     result = await db.execute(query.offset(skip).limit(limit * 2))
-    profiles_raw = result.scalars().all()
+    profiles_raw = result.all()
     
     # ========================================
     # ПОСТ-ФИЛЬТРАЦИЯ (геолокация, интересы)
@@ -183,8 +183,12 @@ async def get_filtered_profiles(
     profile_ids = [str(p.id) for p in profiles_raw]
     shadowbanned_ids = await get_shadowbanned_ids_batch(profile_ids)
     
+    # Карточки одним батчем (Redis MGET + один запрос на промахи)
+    cards = await get_profile_cards(db, [pid for pid in profile_ids if pid not in shadowbanned_ids])
+    
     for profile in profiles_raw:
-        if str(profile.id) in shadowbanned_ids:
+        profile_dict = cards.get(str(profile.id))
+        if profile_dict is None:
             continue
 
         if filters.distance_km and current_user.latitude and current_user.longitude:
@@ -195,19 +199,16 @@ async def get_filtered_profiles(
                 )
                 if dist > filters.distance_km:
                     continue
-                profile_dict = profile_to_dict(profile)
                 profile_dict["distance_km"] = round(dist, 1)
             else:
-                profile_dict = profile_to_dict(profile)
                 profile_dict["distance_km"] = None
         else:
-            profile_dict = profile_to_dict(profile)
             profile_dict["distance_km"] = None
         
         if filters.interests:
-            if not interests_match(profile.interests, filters.interests):
+            if not interests_match(profile_dict["interests"], filters.interests):
                 continue
-            user_set = set(i.lower() for i in (profile.interests or []))
+            user_set = set(i.lower() for i in (profile_dict["interests"] or []))
             filter_set = set(i.lower() for i in filters.interests)
             profile_dict["matching_interests"] = list(user_set & filter_set)
         
@@ -1,13 +1,12 @@
 """
 Search Filters - Helpers
 ========================
-Утилитарные функции: haversine, interests_match, profile_to_dict, get_all_filter_options.
+Утилитарные функции: haversine, interests_match, get_all_filter_options.
 """
 
 from typing import List, Dict, Any
 from math import radians, cos, sin, asin, sqrt
 
-from backend import models
 from backend.services.search_filters.schemas import (
     GENDER_OPTIONS, SMOKING_OPTIONS, DRINKING_OPTIONS,
     EDUCATION_OPTIONS, LOOKING_FOR_OPTIONS, CHILDREN_OPTIONS,
@@ -44,27 +43,6 @@ def interests_match(user_interests: List[str], filter_interests: List[str]) -> b
     return bool(user_set & filter_set)
 
 
-def profile_to_dict(profile: models.User) -> Dict[str, Any]:
-    """Конвертация профиля в словарь"""
-    return {
-        "id": str(profile.id),
-        "name": profile.name,
-        "age": profile.age,
-        "gender": profile.gender,
-        "bio": profile.bio,
-        "photos": profile.photos or [],
-        "interests": profile.interests or [],
-        "height": getattr(profile, 'height', None),
-        "smoking": getattr(profile, 'smoking', None),
-        "drinking": getattr(profile, 'drinking', None),
-        "education": getattr(profile, 'education', None),
-        "looking_for": getattr(profile, 'looking_for', None),
-        "children": getattr(profile, 'children', None),
-        "is_verified": getattr(profile, 'is_verified', False),
-        "is_vip": profile.is_vip
-    }
-
-
 def get_all_filter_options() -> Dict[str, Any]:
     """Получить все опции фильтров для UI"""
     return {
@@ -1,56 +1,213 @@
 """
 Anti-Spam
 =========
-Redis-backed spam detector — частота, дубликаты, контент-фильтры.
+Redis-backed spam detector — частота, почти-дубликаты, кампании, контент-фильтры.
+
+Почти-дубликаты: у каждого сообщения MinHash-подпись (32 значения) по
+символьным триграммам нормализованного текста. Замена одного символа
+меняет лишь несколько триграмм, подписи почти совпадают. Индекс — banded
+LSH: 8 полос по 4 значения, по полосе на ZSET-бакет; кандидат считается
+почти-дубликатом, если совпал минимум в MIN_BAND_MATCHES полосах
+(~Jaccard >= 0.8), так что сравнение идёт только внутри своих бакетов.
+
+Один pipeline на сообщение: счётчик частоты + запись в бакеты + чтение
+кандидатов. Без Redis индекс живёт в памяти процесса.
+
+Кампания — когда почти одинаковое сообщение за окно отправили
+CAMPAIGN_MIN_ACCOUNTS разных аккаунтов в CAMPAIGN_MIN_CONVERSATIONS разных
+диалогов. Сообщение при этом не блокируется (популярное длинное приветствие
+тоже может совпасть): оно помечается, а участники получают сигнал в
+FraudDetectionService (spam:campaign_hits:{user}, не чаще раза за окно,
+затухает за CAMPAIGN_HITS_TTL) и помечаются на пересчёт.
 """
 
 import hashlib
 import logging
-from typing import Dict, Any
+import struct
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from typing import Dict, Any, Iterable, List, Tuple
 
 from backend.core.redis import redis_manager
+from backend.services.text_safety import text_safety, normalize
 
 logger = logging.getLogger(__name__)
 
+BANDS = 8
+ROWS = 4                        # значений подписи на полосу
+MIN_BAND_MATCHES = 3
+SHINGLE = 3
+
+WINDOW = 3600                   # сек: окно дубликатов и кампаний
+BUCKET_CAP = 200                # последних отпечатков в бакете
+CAMPAIGN_MIN_ACCOUNTS = 10
+CAMPAIGN_MIN_CONVERSATIONS = 10  # рассылка идёт по многим диалогам, а не в один чат
+CAMPAIGN_MIN_LENGTH = 30        # короткие "привет, как дела" шлют все — не кампания
+CAMPAIGN_HITS_TTL = 7 * 86400   # сек: сигнал кампании затухает через неделю
+
+FREQ_KEY = "spam_freq:{}"
+BUCKET_KEY = "spam:lsh:{}:{}"
+CAMPAIGN_HITS_KEY = "spam:campaign_hits:{}"  # ZSET окно -> время: попадания в кампании (user_id)
+RESCORE_KEY = "fraud:rescore"                # SET user_id — пересчитать fraud score
+
+_SALTS = (b"spam-minhash-a", b"spam-minhash-b")
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature (BANDS * ROWS values) over character shingles of the normalized text."""
+    normalized = " ".join(normalize(text).split())
+    if len(normalized) < SHINGLE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE] for i in range(len(normalized) - SHINGLE + 1)}
+    # Один blake2b на шингл даёт 16 независимых 32-битных хэшей; два "соли" — 32
+    rows = [
+        struct.unpack("<16I", hashlib.blake2b(s.encode(), digest_size=64, salt=salt).digest())
+        for s in shingles for salt in _SALTS
+    ]
+    per_salt = len(_SALTS)
+    return [min(column) for i in range(per_salt) for column in zip(*rows[i::per_salt])]
+
+
+def bands(signature: List[int]) -> List[str]:
+    return [
+        hashlib.blake2b(struct.pack(f"<{ROWS}I", *signature[i * ROWS:(i + 1) * ROWS]), digest_size=8).hexdigest()
+        for i in range(BANDS)
+    ]
+
+
+class _MemoryIndex:
+    """Fallback LSH index for a single process (no Redis)."""
+
+    def __init__(self):
+        self.buckets: Dict[str, deque] = defaultdict(lambda: deque(maxlen=BUCKET_CAP))
+
+    def add_and_query(self, keys: Iterable[str], member: str, now: float) -> List[List[str]]:
+        result = []
+        for key in keys:
+            bucket = self.buckets[key]
+            while bucket and bucket[0][0] < now - WINDOW:
+                bucket.popleft()
+            bucket.append((now, member))
+            result.append([m for _, m in bucket])
+        return result
+
 
 class SpamDetector:
     """Redis-backed Spam Detector."""
-    
+
+    def __init__(self):
+        self._memory = _MemoryIndex()
+
+    def _near_duplicates(self, user_id: str, members: Iterable[str]) -> Tuple[int, set, set]:
+        """(own near-duplicates, distinct senders incl. self, distinct conversations)."""
+        own = 0
+        senders, conversations = set(), set()
+        for member, matches in Counter(members).items():
+            if matches < MIN_BAND_MATCHES:
+                continue
+            sender, conversation, _ = member.split(":", 2)
+            senders.add(sender)
+            conversations.add(conversation)
+            if sender == user_id:
+                own += 1
+        return own, senders, conversations
+
+    async def _index(self, user_id: str, conversation_id: str, signature: List[int]) -> Tuple[int, List[str]]:
+        """One round trip: frequency counter + LSH buckets write/read. Returns (sent this minute, candidates)."""
+        now = time.time()
+        member = f"{user_id}:{conversation_id}:{uuid.uuid4().hex[:12]}"
+        keys = [BUCKET_KEY.format(i, value) for i, value in enumerate(bands(signature))]
+
+        r = await redis_manager.get_redis()
+        if not r:
+            buckets = self._memory.add_and_query(keys, member, now)
+            return 0, [m for bucket in buckets for m in bucket]
+
+        freq_key = FREQ_KEY.format(user_id)
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.set(freq_key, 0, ex=60, nx=True)
+                pipe.incr(freq_key)
+                for key in keys:
+                    pipe.zadd(key, {member: now})
+                    pipe.zremrangebyscore(key, 0, now - WINDOW)
+                    pipe.zremrangebyrank(key, 0, -(BUCKET_CAP + 1))
+                    pipe.zrange(key, 0, -1)
+                    pipe.expire(key, WINDOW)
+                results = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Spam index error: {e}")
+            return 0, []
+        candidates = [m for i in range(len(keys)) for m in results[2 + i * 5 + 3]]
+        return results[1], candidates
+
+    async def _report_campaign(self, senders: Iterable[str]):
+        """Feed campaign participants into fraud scoring (one hit per sender per WINDOW)."""
+        r = await redis_manager.get_redis()
+        if not r:
+            return
+        senders = list(senders)
+        now = time.time()
+        window = str(int(now // WINDOW))
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for sender in senders:
+                    key = CAMPAIGN_HITS_KEY.format(sender)
+                    pipe.zadd(key, {window: now}, nx=True)
+                    pipe.zremrangebyscore(key, 0, now - CAMPAIGN_HITS_TTL)
+                    pipe.expire(key, CAMPAIGN_HITS_TTL)
+                pipe.sadd(RESCORE_KEY, *senders)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Spam campaign report failed: {e}")
+
     async def check_message(
-        self, 
-        user_id: str, 
+        self,
+        user_id: str,
         message: str,
         max_per_minute: int = 10,
-        max_duplicates: int = 3
+        max_duplicates: int = 3,
+        conversation_id: Any = None,
     ) -> Dict[str, Any]:
-        """Check message for spam using Redis."""
+        """
+        Check message for spam using Redis.
+
+        is_spam=True means the message should be rejected. A campaign match is
+        only a flag (reason="spam_campaign", is_spam=False): the sender is fed
+        into fraud scoring, the message still goes through.
+        """
+        user_id = str(user_id)
+        signature = minhash(message)
+        sent, candidates = await self._index(user_id, str(conversation_id or "-"), signature)
+
         # 1. Check Frequency
-        is_allowed = await redis_manager.rate_limit(f"spam_freq:{user_id}", limit=max_per_minute, period=60)
-        
-        if not is_allowed:
+        if sent > max_per_minute:
             return {
                 "is_spam": True,
                 "reason": "too_many_messages",
                 "action": "rate_limit",
                 "message": "Слишком много сообщений. Подождите минуту."
             }
-        
-        # 2. Check Duplicates in Redis
-        message_hash = hashlib.md5(message.lower().strip().encode()).hexdigest()
-        dup_key = f"spam_hash:{user_id}:{message_hash}"
-        
-        count = await redis_manager.client.incr(dup_key)
-        if count == 1:
-            await redis_manager.client.expire(dup_key, 3600)
-            
-        if count > max_duplicates:
+
+        # 2. Near-duplicates: свои и чужие (кампания)
+        own, senders, conversations = self._near_duplicates(user_id, candidates)
+        if own > max_duplicates:
             return {
                 "is_spam": True,
                 "reason": "duplicate_message",
                 "action": "block",
                 "message": "Не отправляйте одинаковые сообщения."
             }
-        
+        campaign = (
+            len(message) >= CAMPAIGN_MIN_LENGTH
+            and len(senders) >= CAMPAIGN_MIN_ACCOUNTS
+            and len(conversations) >= CAMPAIGN_MIN_CONVERSATIONS
+        )
+        if campaign:
+            await self._report_campaign(senders)
+
         # 3. Content Checks (Static)
         if len(message) > 5000:
             return {
@@ -59,21 +216,19 @@ class SpamDetector:
                 "action": "reject",
                 "message": "Сообщение слишком длинное."
             }
-        
-        spam_patterns = [
-            "заработок", "быстрые деньги", "казино", "ставки",
-            "инвестиции", "криптовалют", "пассивный доход"
-        ]
-        message_lower = message.lower()
-        for pattern in spam_patterns:
-            if pattern in message_lower:
-                return {
-                    "is_spam": True,
-                    "reason": "spam_content",
-                    "action": "flag",
-                    "message": "Сообщение похоже на спам."
-                }
-        
+
+        # Словарь "spam" общего движка (подхватывает правки админки без рестарта)
+        await text_safety.maybe_reload()
+        if "spam" in text_safety.categories(message):
+            return {
+                "is_spam": True,
+                "reason": "spam_content",
+                "action": "flag",
+                "message": "Сообщение похоже на спам."
+            }
+
+        if campaign:
+            return {"is_spam": False, "reason": "spam_campaign", "action": "flag"}
         return {"is_spam": False, "reason": None, "action": None}
 
 
@@ -4,7 +4,8 @@ from backend.services.social.profile_views import (
     record_profile_view,
     get_who_viewed_me,
     get_view_count,
-    get_view_stats
+    get_view_stats,
+    flush_profile_views
 )
 
 from backend.services.social.prompts import (
@@ -35,7 +36,8 @@ from backend.services.social.spotlight import (
     get_spotlight_stats,
     add_to_spotlight_by_admin,
     add_to_spotlight_by_algorithm,
-    cleanup_expired_spotlight
+    cleanup_expired_spotlight,
+    flush_spotlight_impressions
 )
 
 from backend.services.social.compatibility import (
@@ -67,6 +69,7 @@ __all__ = [
     "get_who_viewed_me",
     "get_view_count",
     "get_view_stats",
+    "flush_profile_views",
     # Prompts
     "get_available_prompts",
     "get_prompt_by_id",
@@ -92,6 +95,7 @@ __all__ = [
     "add_to_spotlight_by_admin",
     "add_to_spotlight_by_algorithm",
     "cleanup_expired_spotlight",
+    "flush_spotlight_impressions",
     # Compatibility
     "calculate_compatibility",
     "invalidate_compatibility_cache",
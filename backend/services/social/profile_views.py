@@ -1,15 +1,33 @@
 # Profile Views Service - кто смотрел профиль
+#
+# Ключи Redis:
+#   pview:seen:{viewer}:{viewed}   SET NX, TTL 24ч — дедупликация просмотров пары
+#   pview:viewers:{viewed}         ZSET viewer_id -> ts последнего просмотра (не больше MAX_VIEWS_HISTORY)
+#   pview:sources:{viewed}         HASH viewer_id -> source последнего просмотра
+#   pview:unique:{viewed}          HyperLogLog всех зрителей — total без ограничения истории
+#   pview:ready:{viewed}           флаг "ZSET дозагружен из БД" (TTL = VIEWERS_TTL)
+#   pview:buffer                   LIST JSON новых просмотров, ожидающих записи в БД
+#
+# Открытие профиля = один pipeline в Redis, без транзакции в БД.
+# Новые (не повторные за сутки) просмотры пишутся в profile_views пачками
+# (flush_profile_views, раз в минуту). Список "кто смотрел" читается из ZSET
+# и гидрируется батчем через profile_cards. История ограничена MAX_VIEWS_HISTORY,
+# total — нет (PFCOUNT). Без Redis — прежний путь через БД.
 
+import json
 import uuid
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Iterable
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, insert
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 
+from backend.core.redis import redis_manager
 from backend.models.social import ProfileView
-from backend.models.user import User
+from backend.services.profile_cards import get_profile_cards
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +35,25 @@ logger = logging.getLogger(__name__)
 VIEW_COOLDOWN_HOURS = 24  # Один просмотр от пользователя в сутки
 MAX_VIEWS_HISTORY = 100   # Максимум записей в истории
 
+SEEN_KEY = "pview:seen:{}:{}"
+VIEWERS_KEY = "pview:viewers:{}"
+SOURCES_KEY = "pview:sources:{}"
+UNIQUE_KEY = "pview:unique:{}"
+READY_KEY = "pview:ready:{}"
+BUFFER_KEY = "pview:buffer"
+
+VIEWERS_TTL = 30 * 24 * 3600   # список зрителей живёт 30 дней без просмотров
+FLUSH_CHUNK = 1000
+
+
+def _ts(dt: datetime) -> float:
+    """Naive UTC datetime (как в моделях) -> unix ts."""
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _from_ts(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
+
 
 async def record_profile_view(
     db: AsyncSession,
@@ -39,6 +76,59 @@ async def record_profile_view(
     if viewer_id == viewed_id:
         return {"recorded": False, "message": "Self view ignored"}
     
+    r = await redis_manager.get_redis()
+    if r:
+        try:
+            return await _record_in_redis(r, viewer_id, viewed_id, source)
+        except Exception as e:
+            logger.warning(f"Profile view redis error, falling back to DB: {e}")
+    return await _record_in_db(db, viewer_id, viewed_id, source)
+
+
+async def _record_in_redis(r, viewer_id: uuid.UUID, viewed_id: uuid.UUID, source: str) -> Dict[str, Any]:
+    now = time.time()
+    viewer, viewed = str(viewer_id), str(viewed_id)
+    viewers_key, sources_key = VIEWERS_KEY.format(viewed), SOURCES_KEY.format(viewed)
+    unique_key = UNIQUE_KEY.format(viewed)
+
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.set(SEEN_KEY.format(viewer, viewed), 1, nx=True, ex=VIEW_COOLDOWN_HOURS * 3600)
+        pipe.zadd(viewers_key, {viewer: now})
+        pipe.hset(sources_key, viewer, source)
+        pipe.pfadd(unique_key, viewer)
+        pipe.expire(viewers_key, VIEWERS_TTL)
+        pipe.expire(sources_key, VIEWERS_TTL)
+        pipe.expire(unique_key, VIEWERS_TTL)
+        pipe.zcard(viewers_key)
+        results = await pipe.execute()
+    is_new, size = results[0], results[-1]
+
+    if size > MAX_VIEWS_HISTORY:
+        await _trim(r, viewed, size)
+
+    if not is_new:
+        return {"recorded": False, "message": "View updated (cooldown)"}
+
+    await r.rpush(BUFFER_KEY, json.dumps({
+        "viewer_id": viewer, "viewed_id": viewed, "source": source, "ts": now,
+    }))
+    logger.debug(f"Profile view recorded: {viewer_id} -> {viewed_id} ({source})")
+    return {"recorded": True, "message": "View recorded"}
+
+
+async def _trim(r, viewed: str, size: int):
+    """Оставить MAX_VIEWS_HISTORY последних зрителей."""
+    dropped = await r.zpopmin(VIEWERS_KEY.format(viewed), size - MAX_VIEWS_HISTORY)
+    if dropped:
+        await r.hdel(SOURCES_KEY.format(viewed), *[member for member, _ in dropped])
+
+
+async def _record_in_db(
+    db: AsyncSession,
+    viewer_id: uuid.UUID,
+    viewed_id: uuid.UUID,
+    source: str
+) -> Dict[str, Any]:
     # Проверяем cooldown - был ли просмотр от этого пользователя за последние 24 часа
     cooldown_time = datetime.utcnow() - timedelta(hours=VIEW_COOLDOWN_HOURS)
     
@@ -72,6 +162,143 @@ async def record_profile_view(
     return {"recorded": True, "message": "View recorded"}
 
 
+async def flush_profile_views(db: AsyncSession) -> int:
+    """
+    Записать накопленные просмотры в profile_views одним INSERT на пачку.
+    Буфер атомарно переименовывается, новые просмотры копятся в новом буфере.
+    """
+    r = await redis_manager.get_redis()
+    if not r:
+        return 0
+    batch_key = f"{BUFFER_KEY}:{uuid.uuid4().hex}"
+    try:
+        await r.rename(BUFFER_KEY, batch_key)
+    except Exception:
+        return 0  # нечего писать
+    raw = await r.lrange(batch_key, 0, -1)
+    rows = []
+    for item in raw:
+        view = json.loads(item)
+        rows.append({
+            "id": uuid.uuid4(),
+            "viewer_id": uuid.UUID(view["viewer_id"]),
+            "viewed_id": uuid.UUID(view["viewed_id"]),
+            "source": view["source"],
+            "created_at": _from_ts(view["ts"]),
+        })
+    try:
+        for i in range(0, len(rows), FLUSH_CHUNK):
+            await db.execute(insert(ProfileView), rows[i:i + FLUSH_CHUNK])
+        await db.commit()
+        await r.delete(batch_key)
+    except Exception as e:
+        logger.error(f"Profile views flush failed: {e}")
+        await db.rollback()
+        # Вернуть просмотры в буфер
+        if raw:
+            await r.rpush(BUFFER_KEY, *raw)
+        await r.delete(batch_key)
+        return 0
+    return len(rows)
+
+
+# ----------------------------------------------------------------------
+# Кто смотрел
+# ----------------------------------------------------------------------
+
+async def _load_viewers_from_db(db: AsyncSession, user_id: uuid.UUID) -> List[Dict[str, Any]]:
+    """Последние MAX_VIEWS_HISTORY зрителей: время и источник последнего просмотра."""
+    last_viewed = func.max(ProfileView.created_at)
+    result = await db.execute(
+        select(
+            ProfileView.viewer_id,
+            func.array_agg(
+                aggregate_order_by(ProfileView.source, ProfileView.created_at.desc())
+            )[1].label("source"),
+            last_viewed.label("last_viewed_at"),
+        )
+        .where(ProfileView.viewed_id == user_id)
+        .group_by(ProfileView.viewer_id)
+        .order_by(last_viewed.desc())
+        .limit(MAX_VIEWS_HISTORY)
+    )
+    return [
+        {"viewer_id": str(row.viewer_id), "source": row.source, "viewed_at": row.last_viewed_at}
+        for row in result.all()
+    ]
+
+
+async def _seed_unique_viewers(r, db: AsyncSession, user_id: uuid.UUID):
+    """Всех зрителей из БД — в HyperLogLog (PFADD идемпотентен, пачками по FLUSH_CHUNK)."""
+    unique_key = UNIQUE_KEY.format(user_id)
+    result = await db.stream(
+        select(ProfileView.viewer_id)
+        .where(ProfileView.viewed_id == user_id)
+        .distinct()
+        .execution_options(yield_per=FLUSH_CHUNK)
+    )
+    async for partition in result.partitions(FLUSH_CHUNK):
+        await r.pfadd(unique_key, *[str(row[0]) for row in partition])
+    await r.expire(unique_key, VIEWERS_TTL)
+
+
+async def _ensure_viewers(r, db: AsyncSession, user_id: uuid.UUID):
+    """
+    Дозагрузить ZSET и счётчик зрителей из БД (холодный старт / вытеснение).
+    ZADD GT — более свежие просмотры, уже лежащие в Redis, не перезаписываются.
+    """
+    user = str(user_id)
+    if await r.exists(READY_KEY.format(user)):
+        return
+    await _seed_unique_viewers(r, db, user_id)
+    rows = await _load_viewers_from_db(db, user_id)
+    viewers_key, sources_key = VIEWERS_KEY.format(user), SOURCES_KEY.format(user)
+    async with r.pipeline(transaction=False) as pipe:
+        if rows:
+            pipe.zadd(viewers_key, {row["viewer_id"]: _ts(row["viewed_at"]) for row in rows}, gt=True)
+            # Источник — только для зрителей, которых ещё нет в Redis
+            for row in rows:
+                pipe.hsetnx(sources_key, row["viewer_id"], row["source"])
+            pipe.expire(viewers_key, VIEWERS_TTL)
+            pipe.expire(sources_key, VIEWERS_TTL)
+        pipe.set(READY_KEY.format(user), 1, ex=VIEWERS_TTL)
+        pipe.zcard(viewers_key)
+        size = (await pipe.execute())[-1]
+    if size > MAX_VIEWS_HISTORY:
+        await _trim(r, user, size)
+
+
+async def _page_from_redis(r, db: AsyncSession, user_id: uuid.UUID, limit: int, offset: int):
+    await _ensure_viewers(r, db, user_id)
+    user = str(user_id)
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.pfcount(UNIQUE_KEY.format(user))
+        pipe.zcard(VIEWERS_KEY.format(user))
+        pipe.zrevrange(VIEWERS_KEY.format(user), offset, offset + limit - 1, withscores=True)
+        unique, history, members = await pipe.execute()
+    # PFCOUNT приблизителен (~0.8%), но не меньше точной истории
+    total = max(unique, history)
+    sources = await r.hmget(SOURCES_KEY.format(user), [m for m, _ in members]) if members else []
+    page = [
+        {"viewer_id": member, "source": source or "discover", "viewed_at": _from_ts(score)}
+        for (member, score), source in zip(members, sources)
+    ]
+    return total, page
+
+
+async def _page_from_db(db: AsyncSession, user_id: uuid.UUID, limit: int, offset: int):
+    # Считаем общее количество уникальных просмотров
+    total_stmt = select(func.count(func.distinct(ProfileView.viewer_id))).where(
+        ProfileView.viewed_id == user_id
+    )
+    result = await db.execute(total_stmt)
+    total = result.scalar() or 0
+    if total == 0 or offset >= min(total, MAX_VIEWS_HISTORY):
+        return total, []
+    rows = await _load_viewers_from_db(db, user_id)
+    return total, rows[offset:offset + limit]
+
+
 async def get_who_viewed_me(
     db: AsyncSession,
     user_id: uuid.UUID,
@@ -81,6 +308,7 @@ async def get_who_viewed_me(
 ) -> Dict[str, Any]:
     """
     Получить список тех, кто смотрел профиль.
+    В списке — последние MAX_VIEWS_HISTORY зрителей, total — все уникальные.
     
     Args:
         user_id: Чей профиль
@@ -96,12 +324,15 @@ async def get_who_viewed_me(
             "blur_photos": bool
         }
     """
-    # Считаем общее количество уникальных просмотров
-    total_stmt = select(func.count(func.distinct(ProfileView.viewer_id))).where(
-        ProfileView.viewed_id == user_id
-    )
-    result = await db.execute(total_stmt)
-    total = result.scalar() or 0
+    page = None
+    r = await redis_manager.get_redis()
+    if r:
+        try:
+            total, page = await _page_from_redis(r, db, user_id, limit, offset)
+        except Exception as e:
+            logger.warning(f"Profile viewers redis error, falling back to DB: {e}")
+    if page is None:
+        total, page = await _page_from_db(db, user_id, limit, offset)
     
     if total == 0:
         return {
@@ -111,55 +342,38 @@ async def get_who_viewed_me(
             "blur_photos": not is_vip
         }
     
-    # Получаем просмотры с информацией о пользователях
-    # Группируем по viewer_id, берём последний просмотр
-    views_stmt = (
-        select(
-            ProfileView.viewer_id,
-            ProfileView.source,
-            func.max(ProfileView.created_at).label("last_viewed_at")
-        )
-        .where(ProfileView.viewed_id == user_id)
-        .group_by(ProfileView.viewer_id, ProfileView.source)
-        .order_by(func.max(ProfileView.created_at).desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    result = await db.execute(views_stmt)
-    views = result.all()
+    # Карточки зрителей батчем (общий кэш profile_cards); online — только для VIP
+    profiles = await get_profile_cards(db, [view["viewer_id"] for view in page], with_presence=is_vip)
     
     viewers = []
-    for view in views:
-        viewer_id = view.viewer_id
-        
-        # Получаем данные пользователя
-        viewer = await db.get(User, viewer_id)
+    for view in page:
+        viewer = profiles.get(view["viewer_id"])
         if not viewer:
             continue
         
         viewer_data = {
-            "id": str(viewer_id),
-            "viewed_at": view.last_viewed_at.isoformat() if view.last_viewed_at else None,
-            "source": view.source
+            "id": view["viewer_id"],
+            "viewed_at": view["viewed_at"].isoformat() if view["viewed_at"] else None,
+            "source": view["source"]
         }
         
         if is_vip:
             # VIP видит полную информацию
             viewer_data.update({
-                "name": viewer.name,
-                "age": _calculate_age(viewer.birthdate),
-                "photo_url": viewer.photo_url,
-                "is_verified": viewer.is_verified,
-                "is_online": _is_online(viewer.last_active),
-                "city": viewer.city
+                "name": viewer["name"],
+                "age": viewer["age"],
+                "photo_url": viewer["photo"],
+                "is_verified": viewer["is_verified"],
+                "is_online": viewer["is_online"],
+                "city": viewer["city"]
             })
         else:
             # Бесплатные пользователи видят размытые данные
             viewer_data.update({
-                "name": _blur_name(viewer.name),
-                "age": _calculate_age(viewer.birthdate),
-                "photo_url": viewer.photo_url,  # Фронтенд размоет
-                "is_verified": viewer.is_verified,
+                "name": _blur_name(viewer["name"]),
+                "age": viewer["age"],
+                "photo_url": viewer["photo"],  # Фронтенд размоет
+                "is_verified": viewer["is_verified"],
                 "is_online": None,
                 "city": None,
                 "blurred": True
@@ -242,24 +456,6 @@ async def get_view_stats(
     }
 
 
-def _calculate_age(birthdate: Optional[datetime]) -> Optional[int]:
-    """Вычислить возраст по дате рождения."""
-    if not birthdate:
-        return None
-    today = datetime.utcnow()
-    age = today.year - birthdate.year
-    if (today.month, today.day) < (birthdate.month, birthdate.day):
-        age -= 1
-    return age
-
-
-def _is_online(last_active: Optional[datetime]) -> bool:
-    """Проверить, онлайн ли пользователь (активен в последние 5 минут)."""
-    if not last_active:
-        return False
-    return (datetime.utcnow() - last_active).total_seconds() < 300
-
-
 def _blur_name(name: Optional[str]) -> str:
     """Размыть имя для бесплатных пользователей."""
     if not name:
@@ -2,17 +2,19 @@
 
 import uuid
 import logging
-import random
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from decimal import Decimal
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, update, func
 
 from backend.models.social import SpotlightEntry, ProfileView
 from backend.models.user import User
 from backend.models.interaction import Swipe
+from backend.services.social.spotlight_pool import spotlight_pool, weighted_sample
+from backend.services.profile_cards import get_profile_cards
+from backend.services import star_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -32,9 +34,10 @@ async def get_spotlight_profiles(
     Получить профили из Spotlight для показа.
     
     Логика:
-    1. Активные записи SpotlightEntry (не истёкшие)
-    2. Исключаем себя и уже просвайпанных
-    3. Сортируем по priority + рандомизация
+    1. Активные записи из пула (spotlight_pool, без запроса к БД)
+    2. Взвешенная случайная выборка по priority
+    3. Исключаем себя и уже просвайпанных (только среди кандидатов)
+    4. Карточки батчем (profile_cards), показы — в буфер Redis
     
     Returns:
         {
@@ -44,50 +47,69 @@ async def get_spotlight_profiles(
         }
     """
     now = datetime.utcnow()
+    viewer = str(user_id)
     
-    # Получаем ID пользователей, которых уже свайпнули
-    swiped_stmt = select(Swipe.to_user_id).where(Swipe.from_user_id == user_id)
-    result = await db.execute(swiped_stmt)
-    swiped_ids = {row[0] for row in result.all()}
-    swiped_ids.add(user_id)  # Исключаем себя
-    
-    # Получаем активные spotlight записи
-    spotlight_stmt = (
-        select(SpotlightEntry)
-        .where(
-            SpotlightEntry.is_active == True,
-            SpotlightEntry.expires_at > now,
-            SpotlightEntry.user_id.notin_(swiped_ids)
-        )
-        .order_by(SpotlightEntry.priority.desc(), func.random())
-        .limit(limit)
-    )
-    result = await db.execute(spotlight_stmt)
-    entries = result.scalars().all()
+    # Одна запись на пользователя — с наибольшим приоритетом
+    best: Dict[str, Dict[str, Any]] = {}
+    for item in await spotlight_pool.active(db):
+        if item["user_id"] == viewer:
+            continue
+        current = best.get(item["user_id"])
+        if not current or item["priority"] > current["priority"]:
+            best[item["user_id"]] = item
+    order = weighted_sample(list(best.values()))
     
     profiles = []
-    for entry in entries:
-        user = await db.get(User, entry.user_id)
-        if not user or not user.is_active:
-            continue
+    shown: List[str] = []
+    batch = max(limit * 2, SPOTLIGHT_MAX_PROFILES)
+    for start in range(0, len(order), batch):
+        candidates = order[start:start + batch]
+        candidate_ids = [uuid.UUID(i["user_id"]) for i in candidates]
         
-        # Увеличиваем impressions
-        entry.impressions += 1
+        # Активные и ещё не просвайпанные — один запрос по id кандидатов
+        swiped = select(Swipe.to_user_id).where(
+            Swipe.from_user_id == user_id,
+            Swipe.to_user_id.in_(candidate_ids)
+        )
+        result = await db.execute(
+            select(User.id).where(
+                User.id.in_(candidate_ids),
+                User.is_active == True,
+                User.id.not_in(swiped)
+            )
+        )
+        eligible = {str(row[0]) for row in result.all()}
         
-        profiles.append({
-            "id": str(user.id),
-            "name": user.name,
-            "age": _calculate_age(user.birthdate),
-            "photo_url": user.photo_url,
-            "photos": user.photos or [],
-            "city": user.city,
-            "bio": user.bio,
-            "is_verified": user.is_verified,
-            "spotlight_source": entry.source,
-            "spotlight_priority": entry.priority
-        })
-    
-    await db.commit()
+        fresh = [i for i in candidates if i["user_id"] in eligible]
+        if not fresh:
+            continue
+        cards = await get_profile_cards(db, [i["user_id"] for i in fresh])
+        
+        for item in fresh:
+            card = cards.get(item["user_id"])
+            if not card:
+                continue
+            shown.append(item["entry_id"])
+            profiles.append({
+                "id": card["id"],
+                "name": card["name"],
+                "age": card["age"],
+                "photo_url": card["photo"],
+                "photos": card["photos"],
+                "city": card["city"],
+                "bio": card["bio"],
+                "is_verified": card["is_verified"],
+                "spotlight_entry_id": item["entry_id"],
+                "spotlight_source": item["source"],
+                "spotlight_priority": item["priority"]
+            })
+            if len(profiles) >= limit:
+                break
+        if len(profiles) >= limit:
+            break
+    
+    # Показы: HINCRBY в Redis, в БД — пакетно (flush_spotlight_impressions)
+    await spotlight_pool.record_impressions(db, shown)
     
     # Время следующего обновления
     refresh_at = now + timedelta(hours=SPOTLIGHT_REFRESH_HOURS)
@@ -138,17 +160,19 @@ async def join_spotlight(
     if not user:
         return {"success": False, "message": "Пользователь не найден"}
     
-    # Проверяем и списываем звёзды
+    # Проверяем и списываем звёзды (условный UPDATE ... WHERE stars_balance >= cost)
     cost = SPOTLIGHT_COST_STARS * duration_hours
+    new_balance = None
     if use_stars:
-        if (user.stars_balance or 0) < cost:
+        try:
+            new_balance = await star_ledger.debit(db, user_id, cost, "spotlight")
+        except star_ledger.InsufficientStars as e:
             return {
                 "success": False,
                 "message": f"Недостаточно звёзд. Нужно {cost} ⭐",
                 "cost": cost,
-                "balance": float(user.stars_balance or 0)
+                "balance": float(e.available or 0)
             }
-        user.stars_balance = (user.stars_balance or Decimal(0)) - Decimal(cost)
     
     # Создаём запись в Spotlight
     expires_at = now + timedelta(hours=duration_hours)
@@ -163,6 +187,7 @@ async def join_spotlight(
     db.add(entry)
     await db.commit()
     await db.refresh(entry)
+    await spotlight_pool.add(entry)
     
     logger.info(f"User {user_id} joined spotlight for {duration_hours}h (cost: {cost} stars)")
     
@@ -174,7 +199,7 @@ async def join_spotlight(
             "duration_hours": duration_hours
         },
         "cost": cost if use_stars else 0,
-        "new_balance": float(user.stars_balance) if use_stars else None,
+        "new_balance": float(new_balance) if use_stars else None,
         "message": f"Ты в Spotlight на {duration_hours} ч!"
     }
 
@@ -226,11 +251,17 @@ async def get_spotlight_stats(
     total_impressions = row[0] or 0
     total_clicks = row[1] or 0
     
+    # Показы из буфера Redis, ещё не записанные в БД
+    pending = 0
+    if active:
+        pending = (await spotlight_pool.pending_impressions([str(active.id)])).get(str(active.id), 0)
+        total_impressions += pending
+    
     return {
         "is_active": active is not None,
         "current_entry": {
             "expires_at": active.expires_at.isoformat(),
-            "impressions": active.impressions,
+            "impressions": active.impressions + pending,
             "clicks": active.clicks,
             "remaining_hours": (active.expires_at - now).total_seconds() / 3600
         } if active else None,
@@ -262,6 +293,7 @@ async def add_to_spotlight_by_admin(
     )
     db.add(entry)
     await db.commit()
+    await spotlight_pool.add(entry)
     
     logger.info(f"Admin added user {user_id} to spotlight for {duration_hours}h")
     
@@ -291,6 +323,7 @@ async def add_to_spotlight_by_algorithm(
     )
     db.add(entry)
     await db.commit()
+    await spotlight_pool.add(entry)
     
     logger.info(f"Algorithm added user {user_id} to spotlight: {reason}")
     
@@ -303,31 +336,30 @@ async def cleanup_expired_spotlight(db: AsyncSession) -> int:
     """
     now = datetime.utcnow()
     
-    stmt = select(SpotlightEntry).where(
-        SpotlightEntry.expires_at < now,
-        SpotlightEntry.is_active == True
+    stmt = (
+        update(SpotlightEntry)
+        .where(
+            SpotlightEntry.expires_at < now,
+            SpotlightEntry.is_active == True
+        )
+        .values(is_active=False)
+        .returning(SpotlightEntry.id)
+        .execution_options(synchronize_session=False)
     )
     result = await db.execute(stmt)
-    expired = result.scalars().all()
-    
-    count = 0
-    for entry in expired:
-        entry.is_active = False
-        count += 1
+    expired_ids = [row[0] for row in result.all()]
     
+    count = len(expired_ids)
     if count > 0:
         await db.commit()
+        await spotlight_pool.remove(expired_ids)
         logger.info(f"Deactivated {count} expired spotlight entries")
     
     return count
 
 
-def _calculate_age(birthdate: Optional[datetime]) -> Optional[int]:
-    """Вычислить возраст."""
-    if not birthdate:
-        return None
-    today = datetime.utcnow()
-    age = today.year - birthdate.year
-    if (today.month, today.day) < (birthdate.month, birthdate.day):
-        age -= 1
-    return age
+async def flush_spotlight_impressions(db: AsyncSession) -> int:
+    """
+    Записать буферизованные показы в БД (для cron).
+    """
+    return await spotlight_pool.flush_impressions(db)
@@ -0,0 +1,239 @@
+# Spotlight Pool - пул активных записей Spotlight для быстрой выдачи
+#
+# Ключи Redis:
+#   spotlight:pool              HASH entry_id -> JSON {user_id, priority, source, expires_ts}
+#   spotlight:pool:ready        флаг "пул загружен" (TTL = полная пересборка из БД)
+#   spotlight:impressions       HASH entry_id -> показы, ещё не записанные в БД
+#
+# Пул небольшой (платные и админские записи), поэтому каждый процесс держит
+# его копию в памяти и перечитывает не чаще раза в LOCAL_TTL секунд
+# (один HGETALL). Выборка — взвешенная случайная без повторов
+# (Efraimidis–Spirakis: ключ = U^(1/w), top-k), без ORDER BY random() в SQL.
+# Показы считаются HINCRBY и пишутся в БД пакетно (flush_impressions).
+# Без Redis пул читается прямо из БД, показы пишутся одним UPDATE.
+
+import heapq
+import json
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Iterable, Optional
+
+from sqlalchemy import select, update, Integer, Uuid, column, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.core.redis import redis_manager
+from backend.models.social import SpotlightEntry
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY = "spotlight:pool"
+READY_KEY = "spotlight:pool:ready"
+IMPRESSIONS_KEY = "spotlight:impressions"
+
+LOCAL_TTL = 10              # сек, локальная копия пула
+POOL_REBUILD_TTL = 3600     # сек, полная пересборка пула из БД
+FLUSH_CHUNK = 1000
+
+
+def _ts(dt: datetime) -> float:
+    """Naive UTC datetime (как в моделях) -> unix ts."""
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _pool_item(entry) -> Dict[str, Any]:
+    return {
+        "entry_id": str(entry.id),
+        "user_id": str(entry.user_id),
+        "priority": entry.priority or 0,
+        "source": entry.source,
+        "expires_ts": _ts(entry.expires_at),
+    }
+
+
+def weighted_sample(items: List[Dict[str, Any]], k: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Взвешенная случайная перестановка без повторов (вес = priority, минимум 1).
+    k задан — только первые k элементов (heap, O(n log k)).
+    """
+    keyed = [
+        (random.random() ** (1.0 / max(item["priority"], 1)), i)
+        for i, item in enumerate(items)
+    ]
+    if k is None:
+        keyed.sort(reverse=True)
+    else:
+        keyed = heapq.nlargest(k, keyed)
+    return [items[i] for _, i in keyed]
+
+
+class SpotlightPool:
+    """Пул активных записей Spotlight (локальная копия + Redis)."""
+
+    def __init__(self):
+        self._items: List[Dict[str, Any]] = []
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    async def _load_from_db(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        result = await db.execute(
+            select(
+                SpotlightEntry.id,
+                SpotlightEntry.user_id,
+                SpotlightEntry.priority,
+                SpotlightEntry.source,
+                SpotlightEntry.expires_at,
+            ).where(
+                SpotlightEntry.is_active == True,
+                SpotlightEntry.expires_at > datetime.utcnow(),
+            )
+        )
+        return [_pool_item(row) for row in result.all()]
+
+    async def _load(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        r = await redis_manager.get_redis()
+        if not r:
+            return await self._load_from_db(db)
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.exists(READY_KEY)
+                pipe.hgetall(POOL_KEY)
+                ready, raw = await pipe.execute()
+            if ready:
+                return [json.loads(v) for v in raw.values()]
+        except Exception as e:
+            logger.warning(f"Spotlight pool read error: {e}")
+            return await self._load_from_db(db)
+
+        # Холодный старт или плановая пересборка
+        items = await self._load_from_db(db)
+        try:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.delete(POOL_KEY)
+                if items:
+                    pipe.hset(POOL_KEY, mapping={i["entry_id"]: json.dumps(i) for i in items})
+                pipe.set(READY_KEY, 1, ex=POOL_REBUILD_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Spotlight pool rebuild error: {e}")
+        return items
+
+    async def active(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        """Активные (не истёкшие) записи пула."""
+        if time.monotonic() - self._loaded_at > LOCAL_TTL:
+            self._items = await self._load(db)
+            self._loaded_at = time.monotonic()
+        now = time.time()
+        return [i for i in self._items if i["expires_ts"] > now]
+
+    async def add(self, entry: SpotlightEntry):
+        """Write-through при вступлении в Spotlight."""
+        item = _pool_item(entry)
+        self._items = [i for i in self._items if i["entry_id"] != item["entry_id"]] + [item]
+        r = await redis_manager.get_redis()
+        if not r:
+            return
+        try:
+            # Пул ещё не собран — соберётся из БД при первом чтении
+            if await r.exists(READY_KEY):
+                await r.hset(POOL_KEY, item["entry_id"], json.dumps(item))
+        except Exception as e:
+            logger.warning(f"Spotlight pool add error: {e}")
+
+    async def remove(self, entry_ids: Iterable[uuid.UUID]):
+        """Убрать истёкшие/деактивированные записи."""
+        ids = {str(eid) for eid in entry_ids}
+        if not ids:
+            return
+        self._items = [i for i in self._items if i["entry_id"] not in ids]
+        r = await redis_manager.get_redis()
+        if not r:
+            return
+        try:
+            await r.hdel(POOL_KEY, *ids)
+        except Exception as e:
+            logger.warning(f"Spotlight pool remove error: {e}")
+
+    # ------------------------------------------------------------------
+    # Показы
+    # ------------------------------------------------------------------
+
+    async def record_impressions(self, db: AsyncSession, entry_ids: List[str]):
+        if not entry_ids:
+            return
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                async with r.pipeline(transaction=False) as pipe:
+                    for eid in entry_ids:
+                        pipe.hincrby(IMPRESSIONS_KEY, eid, 1)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Spotlight impressions buffer error: {e}")
+        # Без Redis — один атомарный UPDATE на всю выдачу
+        await db.execute(
+            update(SpotlightEntry)
+            .where(SpotlightEntry.id.in_([uuid.UUID(eid) for eid in entry_ids]))
+            .values(impressions=SpotlightEntry.impressions + 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def pending_impressions(self, entry_ids: List[str]) -> Dict[str, int]:
+        """Показы, ещё не записанные в БД (для точной статистики)."""
+        r = await redis_manager.get_redis()
+        if not r or not entry_ids:
+            return {}
+        try:
+            counts = await r.hmget(IMPRESSIONS_KEY, entry_ids)
+        except Exception as e:
+            logger.warning(f"Spotlight impressions read error: {e}")
+            return {}
+        return {eid: int(c) for eid, c in zip(entry_ids, counts) if c}
+
+    async def flush_impressions(self, db: AsyncSession) -> int:
+        """
+        Записать накопленные показы в spotlight_entries.impressions.
+        Буфер атомарно переименовывается, поэтому показы, пришедшие во время
+        записи, попадают в новый буфер и не теряются.
+        """
+        r = await redis_manager.get_redis()
+        if not r:
+            return 0
+        batch_key = f"{IMPRESSIONS_KEY}:{uuid.uuid4().hex}"
+        try:
+            await r.rename(IMPRESSIONS_KEY, batch_key)
+        except Exception:
+            return 0  # нечего писать
+        counts = await r.hgetall(batch_key)
+        rows = [(uuid.UUID(eid), int(n)) for eid, n in counts.items() if int(n) > 0]
+        try:
+            for i in range(0, len(rows), FLUSH_CHUNK):
+                v = values(column("id", Uuid), column("n", Integer), name="v").data(rows[i:i + FLUSH_CHUNK])
+                await db.execute(
+                    update(SpotlightEntry)
+                    .where(SpotlightEntry.id == v.c.id)
+                    .values(impressions=SpotlightEntry.impressions + v.c.n)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+            await r.delete(batch_key)
+        except Exception as e:
+            logger.error(f"Spotlight impressions flush failed: {e}")
+            await db.rollback()
+            # Вернуть дельты в буфер
+            async with r.pipeline(transaction=False) as pipe:
+                for eid, n in counts.items():
+                    pipe.hincrby(IMPRESSIONS_KEY, eid, int(n))
+                pipe.delete(batch_key)
+                await pipe.execute()
+            return 0
+        return sum(n for _, n in rows)
+
+
+spotlight_pool = SpotlightPool()
@@ -8,9 +8,10 @@ from typing import Optional, Dict, Any, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, or_, delete
 
+from backend.core.redis import redis_manager
 from backend.models.social import Story, StoryView, StoryReaction
 from backend.models.interaction import Match
-from backend.models.user import User
+from backend.services.social import story_tray
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +77,7 @@ async def create_story(
     db.add(story)
     await db.commit()
     await db.refresh(story)
+    await story_tray.add_story(story)
     
     logger.info(f"User {user_id} created story {story.id}")
     
@@ -111,10 +113,18 @@ async def get_stories_feed(
             "has_unseen": bool
         }
     """
+    # Быстрый путь: предрасчитанный tray в Redis
+    try:
+        tray = await story_tray.build_tray(db, user_id, limit)
+        if tray is not None:
+            return tray
+    except Exception as e:
+        logger.warning(f"Story tray failed, falling back to DB: {e}")
+    
     now = datetime.utcnow()
     
     # Получаем ID всех матчей пользователя
-    matches_stmt = select(Match).where(
+    matches_stmt = select(Match.user1_id, Match.user2_id).where(
         or_(
             Match.user1_id == user_id,
             Match.user2_id == user_id
@@ -122,22 +132,15 @@ async def get_stories_feed(
         Match.is_active == True
     )
     result = await db.execute(matches_stmt)
-    matches = result.scalars().all()
     
     # Собираем ID матчей
     match_user_ids = set()
-    for match in matches:
-        if match.user1_id == user_id:
-            match_user_ids.add(match.user2_id)
-        else:
-            match_user_ids.add(match.user1_id)
+    for user1_id, user2_id in result.all():
+        match_user_ids.add(user2_id if user1_id == user_id else user1_id)
     
     # Добавляем свои истории
     match_user_ids.add(user_id)
     
-    if not match_user_ids:
-        return []
-    
     # Получаем активные истории от матчей
     stories_stmt = (
         select(Story)
@@ -150,9 +153,14 @@ async def get_stories_feed(
     )
     result = await db.execute(stories_stmt)
     stories = result.scalars().all()
+    if not stories:
+        return []
     
-    # Получаем просмотренные истории текущим пользователем
-    viewed_stmt = select(StoryView.story_id).where(StoryView.viewer_id == user_id)
+    # Просмотры только среди активных историй (а не вся история просмотров)
+    viewed_stmt = select(StoryView.story_id).where(
+        StoryView.viewer_id == user_id,
+        StoryView.story_id.in_([s.id for s in stories])
+    )
     result = await db.execute(viewed_stmt)
     viewed_story_ids = {row[0] for row in result.all()}
     
@@ -163,20 +171,22 @@ async def get_stories_feed(
             users_stories[story.user_id] = []
         users_stories[story.user_id].append(story)
     
+    # Авторы одним запросом (вместо db.get на каждого)
+    profiles = await story_tray.hydrate_authors(db, [str(a) for a in users_stories])
+    
     # Формируем результат
     feed = []
     for story_user_id, user_stories in users_stories.items():
-        # Получаем данные пользователя
-        user = await db.get(User, story_user_id)
-        if not user:
+        profile = profiles.get(str(story_user_id))
+        if not profile:
             continue
         
         has_unseen = any(s.id not in viewed_story_ids for s in user_stories)
         
         feed.append({
             "user_id": str(story_user_id),
-            "user_name": user.name or "Аноним",
-            "user_photo": user.photo_url,
+            "user_name": profile["name"] or "Аноним",
+            "user_photo": profile["photo"],
             "is_me": story_user_id == user_id,
             "has_unseen": has_unseen,
             "stories": [
@@ -197,7 +207,7 @@ async def get_stories_feed(
     # Сортируем: непросмотренные первыми, свои в начале
     feed.sort(key=lambda x: (not x["is_me"], not x["has_unseen"], x["stories"][0]["created_at"] if x["stories"] else ""))
     
-    return feed
+    return feed[:limit]
 
 
 async def view_story(
@@ -211,6 +221,31 @@ async def view_story(
     Returns:
         {"success": bool, "view_count": int}
     """
+    # Быстрый путь: карточка и бит просмотра в Redis, счётчик и строка
+    # story_views буферизуются (flush_view_counts), БД в запросе не трогаем
+    r = await redis_manager.get_redis()
+    if r:
+        try:
+            card = await story_tray.get_cached_card(r, story_id)
+            if card is None:
+                # Карточки нет (история удалена, истекла или выпала из кэша)
+                story = await db.get(Story, story_id)
+                if story and story.is_active and story.expires_at >= datetime.utcnow():
+                    card = await story_tray.get_card(r, db, story)
+            if card is not None:
+                if datetime.fromisoformat(card["expires_at"]) < datetime.utcnow():
+                    return {"success": False, "message": "История истекла"}
+                if card["user_id"] == str(viewer_id):
+                    count = await story_tray.get_view_count(r, card["id"])
+                    return {"success": True, "view_count": count or 0, "is_own": True}
+                view_count = await story_tray.record_view(r, str(viewer_id), card)
+                if view_count is None:
+                    count = await story_tray.get_view_count(r, card["id"])
+                    return {"success": True, "view_count": count or 0, "already_viewed": True}
+                return {"success": True, "view_count": view_count}
+        except Exception as e:
+            logger.warning(f"Story view fast path failed: {e}")
+
     story = await db.get(Story, story_id)
     
     if not story:
@@ -345,14 +380,17 @@ async def get_story_viewers(
     result = await db.execute(reactions_stmt)
     reactions = {r.user_id: r.emoji for r in result.scalars().all()}
     
+    # Зрители одним запросом (вместо db.get на каждого)
+    profiles = await story_tray.hydrate_authors(db, {str(v.viewer_id) for v in views})
+    
     viewers = []
     for view in views:
-        user = await db.get(User, view.viewer_id)
-        if user:
+        profile = profiles.get(str(view.viewer_id))
+        if profile:
             viewers.append({
                 "id": str(view.viewer_id),
-                "name": user.name,
-                "photo_url": user.photo_url,
+                "name": profile["name"],
+                "photo_url": profile["photo"],
                 "viewed_at": view.viewed_at.isoformat() if view.viewed_at else None,
                 "reaction": reactions.get(view.viewer_id)
             })
@@ -386,6 +424,7 @@ async def delete_story(
     # Удаляем историю
     await db.delete(story)
     await db.commit()
+    await story_tray.remove_story(story_id, user_id)
     
     logger.info(f"User {user_id} deleted story {story_id}")
     
@@ -416,6 +455,7 @@ async def cleanup_expired_stories(db: AsyncSession) -> int:
     
     if count > 0:
         await db.commit()
+        await story_tray.forget_stories(s.id for s in expired_stories)
         logger.info(f"Deactivated {count} expired stories")
     
     return count
@@ -0,0 +1,446 @@
+# Story Tray - предрасчитанная лента историй в Redis
+#
+# Ключи:
+#   stories:author:{user_id}        ZSET story_id -> expires_ts (EXPIREAT = последняя история)
+#   stories:data:{story_id}         JSON карточки истории (EXPIREAT = expires_at)
+#   stories:seq:{day}               счётчик -> номер бита истории в пределах дня
+#   stories:seq_of:{day}            HASH story_id -> номер бита (переживает переиндексацию)
+#   stories:seen:{viewer}:{day}     BITSET просмотренных историй за день (TTL 48ч)
+#   stories:view_count              HASH story_id -> счётчик просмотров
+#   stories:view_count:dirty        SET story_id, ожидающих записи в БД
+#   stories:views:pending           LIST первых просмотров [story_id, viewer_id, ts] для story_views
+#
+# Лента = партнёры из кэша presence + один ZRANGEBYSCORE на автора (pipeline),
+# один MGET карточек, BITFIELD по дням и одна пакетная загрузка авторов.
+
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Iterable, Optional, Set
+
+from sqlalchemy import select, insert, exists, DateTime, Integer, Uuid, column, update, values, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.core.redis import redis_manager
+from backend.models.social import Story, StoryView
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+AUTHOR_KEY = "stories:author:{}"
+DATA_KEY = "stories:data:{}"
+SEQ_KEY = "stories:seq:{}"
+SEQ_OF_KEY = "stories:seq_of:{}"
+SEEN_KEY = "stories:seen:{}:{}"
+VIEW_COUNT_KEY = "stories:view_count"
+VIEW_DIRTY_KEY = "stories:view_count:dirty"
+VIEW_LOG_KEY = "stories:views:pending"
+
+EMPTY_MARKER = "-"          # автор без активных историй (кэшируется тоже)
+EMPTY_MARKER_TTL = 3600
+SEEN_TTL = 48 * 3600
+FLUSH_CHUNK = 1000
+
+
+def _ts(dt: datetime) -> float:
+    """Naive UTC datetime (как в моделях) -> unix ts."""
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _day(dt: datetime) -> str:
+    return dt.strftime("%Y%m%d")
+
+
+def _story_card(story: Story, seq: int) -> Dict[str, Any]:
+    return {
+        "id": str(story.id),
+        "user_id": str(story.user_id),
+        "media_url": story.media_url,
+        "media_type": story.media_type,
+        "caption": story.caption,
+        "expires_at": story.expires_at.isoformat(),
+        "created_at": story.created_at.isoformat(),
+        "day": _day(story.created_at),
+        "seq": seq,
+    }
+
+
+# ----------------------------------------------------------------------
+# Индекс историй
+# ----------------------------------------------------------------------
+
+async def index_stories(r, stories: Iterable[Story], empty_authors: Iterable[str] = ()) -> Dict[str, Dict[str, Any]]:
+    """Положить истории в Redis. Возвращает {story_id: card}."""
+    stories = list(stories)
+    cards: Dict[str, Dict[str, Any]] = {}
+
+    # Номера битов: история, уже получившая бит, сохраняет его, иначе
+    # просмотревшие увидели бы её снова непросмотренной
+    by_day: Dict[str, List[Story]] = {}
+    for s in stories:
+        by_day.setdefault(_day(s.created_at), []).append(s)
+    days = list(by_day)
+    seqs: Dict[str, int] = {}
+    if days:
+        async with r.pipeline(transaction=False) as pipe:
+            for day in days:
+                pipe.hmget(SEQ_OF_KEY.format(day), [str(s.id) for s in by_day[day]])
+            known = await pipe.execute()
+        for day, values in zip(days, known):
+            for s, seq in zip(by_day[day], values):
+                if seq is not None:
+                    seqs[str(s.id)] = int(seq)
+
+    # Новым — один INCRBY на день вместо INCR на историю; HSETNX + повторное
+    # чтение, чтобы при гонке двух индексаций все взяли один номер
+    fresh = {day: [s for s in day_stories if str(s.id) not in seqs] for day, day_stories in by_day.items()}
+    fresh = {day: day_stories for day, day_stories in fresh.items() if day_stories}
+    if fresh:
+        async with r.pipeline(transaction=False) as pipe:
+            for day, day_stories in fresh.items():
+                pipe.incrby(SEQ_KEY.format(day), len(day_stories))
+                pipe.expire(SEQ_KEY.format(day), SEEN_TTL)
+            seq_ends = (await pipe.execute())[::2]
+        async with r.pipeline(transaction=False) as pipe:
+            for (day, day_stories), end in zip(fresh.items(), seq_ends):
+                start = end - len(day_stories)
+                for offset, s in enumerate(day_stories):
+                    pipe.hsetnx(SEQ_OF_KEY.format(day), str(s.id), start + offset)
+                pipe.expire(SEQ_OF_KEY.format(day), SEEN_TTL)
+            for day, day_stories in fresh.items():
+                pipe.hmget(SEQ_OF_KEY.format(day), [str(s.id) for s in day_stories])
+            final = (await pipe.execute())[-len(fresh):]
+        for day_stories, values in zip(fresh.values(), final):
+            for s, seq in zip(day_stories, values):
+                seqs[str(s.id)] = int(seq)
+
+    for s in stories:
+        cards[str(s.id)] = _story_card(s, seqs[str(s.id)])
+
+    async with r.pipeline(transaction=False) as pipe:
+        expiry_by_author: Dict[str, float] = {}
+        for s in stories:
+            sid, author = str(s.id), str(s.user_id)
+            exp = _ts(s.expires_at)
+            pipe.zadd(AUTHOR_KEY.format(author), {sid: exp})
+            pipe.zrem(AUTHOR_KEY.format(author), EMPTY_MARKER)
+            pipe.set(DATA_KEY.format(sid), json.dumps(cards[sid]), exat=int(exp) + 1)
+            pipe.hsetnx(VIEW_COUNT_KEY, sid, s.view_count or 0)
+            expiry_by_author[author] = max(exp, expiry_by_author.get(author, 0))
+        for author, exp in expiry_by_author.items():
+            pipe.expireat(AUTHOR_KEY.format(author), int(exp) + 1)
+        for author in empty_authors:
+            pipe.zadd(AUTHOR_KEY.format(author), {EMPTY_MARKER: float("inf")})
+            pipe.expire(AUTHOR_KEY.format(author), EMPTY_MARKER_TTL)
+        await pipe.execute()
+    return cards
+
+
+async def add_story(story: Story):
+    """Write-through при создании истории."""
+    r = await redis_manager.get_redis()
+    if not r:
+        return
+    try:
+        # Индексируем только если автор уже в кэше, иначе загрузится при чтении
+        if await r.exists(AUTHOR_KEY.format(str(story.user_id))):
+            await index_stories(r, [story])
+    except Exception as e:
+        logger.warning(f"Story tray add error: {e}")
+
+
+async def remove_story(story_id: uuid.UUID, author_id: uuid.UUID):
+    r = await redis_manager.get_redis()
+    if not r:
+        return
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.zrem(AUTHOR_KEY.format(str(author_id)), str(story_id))
+            pipe.delete(DATA_KEY.format(str(story_id)))
+            pipe.hdel(VIEW_COUNT_KEY, str(story_id))
+            pipe.srem(VIEW_DIRTY_KEY, str(story_id))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Story tray remove error: {e}")
+
+
+async def forget_stories(story_ids: Iterable[uuid.UUID]):
+    """Убрать счётчики истёкших историй (вызывается из cleanup)."""
+    ids = [str(sid) for sid in story_ids]
+    r = await redis_manager.get_redis()
+    if not r or not ids:
+        return
+    try:
+        await r.hdel(VIEW_COUNT_KEY, *ids)
+    except Exception as e:
+        logger.warning(f"Story tray forget error: {e}")
+
+
+async def _load_active(db: AsyncSession, author_ids: List[str], now: datetime) -> List[Story]:
+    if not author_ids:
+        return []
+    result = await db.execute(
+        select(Story).where(
+            Story.user_id.in_([uuid.UUID(a) for a in author_ids]),
+            Story.is_active == True,
+            Story.expires_at > now,
+        )
+    )
+    return list(result.scalars().all())
+
+
+# ----------------------------------------------------------------------
+# Просмотры
+# ----------------------------------------------------------------------
+
+async def get_cached_card(r, story_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    raw = await r.get(DATA_KEY.format(str(story_id)))
+    return json.loads(raw) if raw else None
+
+
+async def get_card(r, db: AsyncSession, story: Story) -> Dict[str, Any]:
+    card = await get_cached_card(r, story.id)
+    if card:
+        return card
+    return (await index_stories(r, [story]))[str(story.id)]
+
+
+async def get_view_count(r, story_id: str) -> Optional[int]:
+    count = await r.hget(VIEW_COUNT_KEY, story_id)
+    return int(count) if count is not None else None
+
+
+async def record_view(r, viewer_id: str, card: Dict[str, Any]) -> Optional[int]:
+    """
+    SETBIT просмотра. Первый просмотр увеличивает буферизованный счётчик и
+    ставит строку story_views в очередь; возвращает новый view_count.
+    None — зритель уже смотрел эту историю.
+    """
+    seen_key = SEEN_KEY.format(viewer_id, card["day"])
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.setbit(seen_key, card["seq"], 1)
+        pipe.expire(seen_key, SEEN_TTL)
+        was_seen = (await pipe.execute())[0]
+    if was_seen:
+        return None
+    view = json.dumps([card["id"], viewer_id, datetime.utcnow().isoformat()])
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.hincrby(VIEW_COUNT_KEY, card["id"], 1)
+        pipe.sadd(VIEW_DIRTY_KEY, card["id"])
+        pipe.rpush(VIEW_LOG_KEY, view)
+        results = await pipe.execute()
+    return int(results[0])
+
+
+async def _insert_views(db: AsyncSession, raw_views: List[str]) -> int:
+    """Строки story_views из очереди; уже записанные и осиротевшие пропускаются."""
+    rows = []
+    for raw in raw_views:
+        story_id, viewer_id, viewed_at = json.loads(raw)
+        rows.append((uuid.uuid4(), uuid.UUID(story_id), uuid.UUID(viewer_id), datetime.fromisoformat(viewed_at)))
+    for i in range(0, len(rows), FLUSH_CHUNK):
+        v = values(
+            column("id", Uuid), column("story_id", Uuid), column("viewer_id", Uuid), column("viewed_at", DateTime),
+            name="sv",
+        ).data(rows[i:i + FLUSH_CHUNK])
+        await db.execute(
+            insert(StoryView).from_select(
+                ["id", "story_id", "viewer_id", "viewed_at"],
+                select(v.c.id, v.c.story_id, v.c.viewer_id, v.c.viewed_at).where(
+                    exists().where(Story.id == v.c.story_id),
+                    exists().where(User.id == v.c.viewer_id),
+                    ~exists().where(StoryView.story_id == v.c.story_id, StoryView.viewer_id == v.c.viewer_id),
+                ),
+            )
+        )
+    return len(rows)
+
+
+async def flush_view_counts(db: AsyncSession) -> int:
+    """
+    Записать накопленные счётчики просмотров в stories.view_count и
+    первые просмотры в story_views одной транзакцией.
+    Счётчики пишем абсолютными значениями (GREATEST), а просмотры с
+    проверкой NOT EXISTS, поэтому повтор после сбоя безопасен.
+    """
+    r = await redis_manager.get_redis()
+    if not r:
+        return 0
+    batch = uuid.uuid4().hex
+    dirty_key, log_key = f"{VIEW_DIRTY_KEY}:{batch}", f"{VIEW_LOG_KEY}:{batch}"
+    story_ids: List[str] = []
+    raw_views: List[str] = []
+    try:
+        await r.rename(VIEW_DIRTY_KEY, dirty_key)
+        story_ids = list(await r.smembers(dirty_key))
+    except Exception:
+        pass  # счётчики не менялись
+    try:
+        await r.rename(VIEW_LOG_KEY, log_key)
+        raw_views = await r.lrange(log_key, 0, -1)
+    except Exception:
+        pass  # новых просмотров нет
+    if not story_ids and not raw_views:
+        return 0
+
+    counts = await r.hmget(VIEW_COUNT_KEY, story_ids) if story_ids else []
+    rows = [
+        (uuid.UUID(sid), int(c))
+        for sid, c in zip(story_ids, counts) if c is not None
+    ]
+    try:
+        await _insert_views(db, raw_views)
+        for i in range(0, len(rows), FLUSH_CHUNK):
+            v = values(column("id", Uuid), column("n", Integer), name="v").data(rows[i:i + FLUSH_CHUNK])
+            await db.execute(
+                update(Story)
+                .where(Story.id == v.c.id)
+                .values(view_count=func.greatest(Story.view_count, v.c.n))
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+    except Exception as e:
+        logger.error(f"Story view flush failed: {e}")
+        await db.rollback()
+        # Вернуть id и просмотры обратно в очередь
+        if story_ids:
+            await r.sadd(VIEW_DIRTY_KEY, *story_ids)
+        if raw_views:
+            await r.rpush(VIEW_LOG_KEY, *raw_views)
+        return 0
+    finally:
+        await r.delete(dirty_key, log_key)
+    return len(rows)
+
+
+# ----------------------------------------------------------------------
+# Лента
+# ----------------------------------------------------------------------
+
+async def hydrate_authors(db: AsyncSession, author_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Имя + первое фото для всех авторов (общий кэш карточек profile_cards)."""
+    from backend.services.profile_cards import get_profile_cards
+
+    cards = await get_profile_cards(db, author_ids, view="thumb")
+    return {uid: {"name": card["name"], "photo": card["photo"]} for uid, card in cards.items()}
+
+
+async def build_tray(
+    db: AsyncSession,
+    viewer_id: uuid.UUID,
+    limit: int = 50,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Лента историй из Redis. None — Redis недоступен (вызывающий делает fallback на БД).
+    """
+    r = await redis_manager.get_redis()
+    if not r:
+        return None
+
+    from backend.services.chat.presence import get_partner_ids_batch
+
+    viewer = str(viewer_id)
+    now_dt = datetime.utcnow()
+    now = _ts(now_dt)
+
+    partners = (await get_partner_ids_batch([viewer])).get(viewer, set())
+    authors = [viewer] + sorted(partners)
+
+    # 1. Активные истории авторов (один pipeline)
+    async with r.pipeline(transaction=False) as pipe:
+        for a in authors:
+            pipe.zrangebyscore(AUTHOR_KEY.format(a), now, "+inf")
+        ranges = await pipe.execute()
+
+    story_ids_by_author: Dict[str, List[str]] = {}
+    misses: List[str] = []
+    for a, members in zip(authors, ranges):
+        if not members:
+            misses.append(a)
+            continue
+        ids = [m for m in members if m != EMPTY_MARKER]
+        if ids:
+            story_ids_by_author[a] = ids
+
+    cards: Dict[str, Dict[str, Any]] = {}
+    if misses:
+        loaded = await _load_active(db, misses, now_dt)
+        with_stories: Set[str] = {str(s.user_id) for s in loaded}
+        cards.update(await index_stories(r, loaded, [a for a in misses if a not in with_stories]))
+        for card in cards.values():
+            story_ids_by_author.setdefault(card["user_id"], []).append(card["id"])
+
+    # 2. Карточки (один MGET) + счётчики (один HMGET)
+    cached_ids = [sid for ids in story_ids_by_author.values() for sid in ids if sid not in cards]
+    if cached_ids:
+        raw = await r.mget([DATA_KEY.format(sid) for sid in cached_ids])
+        lost = []
+        for sid, data in zip(cached_ids, raw):
+            if data:
+                cards[sid] = json.loads(data)
+            else:
+                lost.append(uuid.UUID(sid))
+        if lost:
+            result = await db.execute(select(Story).where(Story.id.in_(lost), Story.is_active == True))
+            cards.update(await index_stories(r, result.scalars().all()))
+
+    all_ids = [sid for ids in story_ids_by_author.values() for sid in ids if sid in cards]
+    if not all_ids:
+        return []
+    view_counts = dict(zip(all_ids, await r.hmget(VIEW_COUNT_KEY, all_ids)))
+
+    # 3. Просмотрено ли: BITFIELD GET по каждому дню (истории живут ≤ 2 дней)
+    by_day: Dict[str, List[str]] = {}
+    for sid in all_ids:
+        by_day.setdefault(cards[sid]["day"], []).append(sid)
+    seen: Set[str] = set()
+    async with r.pipeline(transaction=False) as pipe:
+        for day, ids in by_day.items():
+            bf = pipe.bitfield(SEEN_KEY.format(viewer, day))
+            for sid in ids:
+                bf.get("u1", cards[sid]["seq"])
+            bf.execute()
+        bit_results = await pipe.execute()
+    for (day, ids), bits in zip(by_day.items(), bit_results):
+        seen.update(sid for sid, bit in zip(ids, bits) if bit)
+
+    # 4. Авторы одним запросом
+    author_ids = [a for a in authors if story_ids_by_author.get(a)]
+    profiles = await hydrate_authors(db, author_ids)
+
+    feed = []
+    for a in author_ids:
+        profile = profiles.get(a)
+        if not profile:
+            continue
+        user_cards = sorted(
+            (cards[sid] for sid in story_ids_by_author[a] if sid in cards),
+            key=lambda c: c["created_at"],
+        )
+        if not user_cards:
+            continue
+        stories = [
+            {
+                "id": c["id"],
+                "media_url": c["media_url"],
+                "media_type": c["media_type"],
+                "caption": c["caption"],
+                "view_count": int(view_counts.get(c["id"]) or 0),
+                "is_viewed": c["id"] in seen,
+                "expires_at": c["expires_at"],
+                "created_at": c["created_at"],
+            }
+            for c in user_cards
+        ]
+        feed.append({
+            "user_id": a,
+            "user_name": profile["name"] or "Аноним",
+            "user_photo": profile["photo"],
+            "is_me": a == viewer,
+            "has_unseen": any(not s["is_viewed"] for s in stories),
+            "stories": stories,
+        })
+
+    feed.sort(key=lambda x: (not x["is_me"], not x["has_unseen"], x["stories"][0]["created_at"]))
+    return feed[:limit]
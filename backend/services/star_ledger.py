@@ -0,0 +1,157 @@
+"""
+Star Ledger
+===========
+All changes to users.stars_balance go through this module.
+
+- debit: conditional atomic ``UPDATE users SET stars_balance = stars_balance - :amount
+  WHERE id = :id AND stars_balance >= :amount RETURNING stars_balance``.
+  No SELECT ... FOR UPDATE: the row lock lasts from the UPDATE to the
+  caller's commit, and an insufficient balance simply matches no row.
+- credit: ``UPDATE ... SET stars_balance = stars_balance + :amount RETURNING``.
+- every change appends a StarLedgerEntry with the resulting balance
+  (append-only history + per-user balance snapshot in users.stars_balance).
+
+Functions never commit — they join the caller's transaction.
+"""
+
+import logging
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+from backend.models.monetization import StarLedgerEntry
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+Amount = Union[Decimal, int, float, str]
+
+
+class InsufficientStars(Exception):
+    """Balance is lower than the amount to debit."""
+
+    def __init__(self, required: Decimal, available: Decimal):
+        self.required = required
+        self.available = available
+        super().__init__(f"Insufficient balance: required {required}, available {available}")
+
+
+def _to_decimal(amount: Amount) -> Decimal:
+    return amount if isinstance(amount, Decimal) else Decimal(str(amount))
+
+
+def _sync_loaded_user(db: AsyncSession, user_id: uuid.UUID, balance: Decimal):
+    """Keep an already-loaded User in this session in step without dirtying it."""
+    try:
+        user = db.sync_session.identity_map.get(identity_key(User, user_id))
+    except Exception:
+        return
+    if isinstance(user, User):
+        set_committed_value(user, "stars_balance", balance)
+
+
+async def _append(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    delta: Decimal,
+    balance_after: Decimal,
+    reason: str,
+    reference_id: Optional[Any],
+    metadata: Optional[Dict[str, Any]],
+):
+    await db.execute(
+        insert(StarLedgerEntry).values(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            delta=delta,
+            balance_after=balance_after,
+            reason=reason,
+            reference_id=str(reference_id) if reference_id is not None else None,
+            custom_metadata=metadata,
+        )
+    )
+    _sync_loaded_user(db, user_id, balance_after)
+
+
+async def get_balance(db: AsyncSession, user_id: uuid.UUID) -> Optional[Decimal]:
+    return await db.scalar(select(User.stars_balance).where(User.id == user_id))
+
+
+async def debit(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    amount: Amount,
+    reason: str,
+    reference_id: Optional[Any] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Decimal:
+    """
+    Atomically take `amount` stars. Returns the new balance.
+    Raises InsufficientStars, or ValueError if the user does not exist.
+    """
+    amount = _to_decimal(amount)
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id, User.stars_balance >= amount)
+        .values(stars_balance=User.stars_balance - amount)
+        .returning(User.stars_balance)
+        .execution_options(synchronize_session=False)
+    )
+    balance = result.scalar_one_or_none()
+    if balance is None:
+        available = await get_balance(db, user_id)
+        if available is None:
+            raise ValueError("User not found")
+        raise InsufficientStars(amount, available)
+    await _append(db, user_id, -amount, balance, reason, reference_id, metadata)
+    return balance
+
+
+async def credit(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    amount: Amount,
+    reason: str,
+    reference_id: Optional[Any] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Decimal:
+    """Atomically add `amount` stars. Returns the new balance."""
+    amount = _to_decimal(amount)
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(stars_balance=User.stars_balance + amount)
+        .returning(User.stars_balance)
+        .execution_options(synchronize_session=False)
+    )
+    balance = result.scalar_one_or_none()
+    if balance is None:
+        raise ValueError("User not found")
+    await _append(db, user_id, amount, balance, reason, reference_id, metadata)
+    return balance
+
+
+async def apply(
+    db: AsyncSession,
+    changes: Iterable[Tuple[uuid.UUID, Amount, str]],
+    reference_id: Optional[Any] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Dict[uuid.UUID, Decimal]:
+    """
+    Apply several (user_id, delta, reason) changes in one transaction,
+    e.g. sender debit + receiver bonus. Rows are touched in user-id order,
+    so two users gifting each other at once cannot deadlock.
+    """
+    balances: Dict[uuid.UUID, Decimal] = {}
+    for user_id, delta, reason in sorted(changes, key=lambda c: str(c[0])):
+        delta = _to_decimal(delta)
+        if delta < 0:
+            balances[user_id] = await debit(db, user_id, -delta, reason, reference_id, metadata)
+        elif delta > 0:
+            balances[user_id] = await credit(db, user_id, delta, reason, reference_id, metadata)
+    return balances
@@ -10,6 +10,8 @@ from typing import Optional
 from fastapi import UploadFile, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.config.settings import settings
+
 logger = logging.getLogger(__name__)
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
@@ -22,6 +24,16 @@ def _process_image_sync(content: bytes) -> tuple[bytes, str]:
     Валидация, удаление EXIF, конвертация в WebP.
     Returns (processed_bytes, content_type).
     """
+    processed, content_type, _ = _process_upload_sync(content, with_preview=False)
+    return processed, content_type
+
+
+def _process_upload_sync(content: bytes, with_preview: bool = True):
+    """
+    То же, что _process_image_sync, плюс уменьшенная копия для NSFW-классификатора
+    из уже декодированного изображения (без повторного декодирования байтов).
+    Returns (processed_bytes, content_type, preview | None).
+    """
     from PIL import Image, ImageOps
     import io
 
@@ -51,15 +63,22 @@ def _process_image_sync(content: bytes) -> tuple[bytes, str]:
     clean.save(buf, format="WEBP", quality=85, optimize=True)
     buf.seek(0)
 
-    return buf.getvalue(), "image/webp"
+    preview = None
+    if with_preview:
+        from backend.services.nsfw_detection import prepare_image
+        preview = prepare_image(clean)
+
+    return buf.getvalue(), "image/webp", preview
 
 
-async def _process_image(content: bytes) -> tuple[bytes, str]:
+async def _process_image(content: bytes, with_preview: bool = False):
     """
     Async-обёртка: запускает тяжёлую обработку Pillow в отдельном потоке,
     чтобы не блокировать event loop.
     """
     try:
+        if with_preview:
+            return await asyncio.to_thread(_process_upload_sync, content)
         return await asyncio.to_thread(_process_image_sync, content)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -77,11 +96,13 @@ class StorageService:
         db: AsyncSession,
         category: str = "uploads",
         content_bytes: bytes = None,
+        nsfw_check: bool = False,
     ) -> str:
         """
         Process and save photo to PostgreSQL.
         Returns URL path: /api/photos/{blob_id}
         Если content_bytes передан — пропускаем повторное чтение файла.
+        nsfw_check — прогнать через локальный NSFW-классификатор до сохранения.
         """
         from backend.models.user import PhotoBlob
 
@@ -104,7 +125,17 @@ class StorageService:
             raise HTTPException(status_code=400, detail="Empty file")
 
         # 3. Process image (validate, strip EXIF, optimize, convert to WebP)
-        processed_data, content_type = await _process_image(content)
+        if nsfw_check:
+            from backend.services.nsfw_detection import nsfw_service, content_key
+
+            processed_data, content_type, preview = await _process_image(content, with_preview=True)
+            # Классификатор получает уже декодированное превью, батчится с другими загрузками
+            score, label, _ = await nsfw_service.analyze_prepared(preview, key=content_key(content))
+            if score >= nsfw_service.NSFW_THRESHOLD:
+                logger.info(f"Upload rejected by NSFW classifier ({label}, {score:.2f})")
+                raise HTTPException(status_code=400, detail="Image failed moderation policy")
+        else:
+            processed_data, content_type = await _process_image(content)
 
         # 4. Save to PostgreSQL
         blob = PhotoBlob(
@@ -165,7 +196,11 @@ class StorageService:
     # --- Convenience methods matching old API ---
 
     async def save_user_photo(self, file: UploadFile, db: AsyncSession, content_bytes: bytes = None) -> str:
-        return await self.save_photo(file, db, category="uploads", content_bytes=content_bytes)
+        # Решение о модерации принимает ModerationService; блок на загрузке — только по флагу
+        return await self.save_photo(
+            file, db, category="uploads", content_bytes=content_bytes,
+            nsfw_check=settings.NSFW_BLOCK_UPLOADS,
+        )
 
     async def save_verification_photo(self, file: UploadFile, db: AsyncSession) -> str:
         return await self.save_photo(file, db, category="verifications")
@@ -14,6 +14,7 @@ import uuid as uuid_module
 
 from backend import models
 from backend.core.redis import redis_manager
+from backend.services import star_ledger
 
 # Лимиты свайпов
 DAILY_SWIPE_LIMIT = 50
@@ -162,77 +163,57 @@ async def record_swipe(db: AsyncSession, user_id: str, is_super: bool = False) -
     await save_user_swipe_data(user_id, data)
     return await get_swipe_status(db, user_id)
 
-async def buy_swipes_with_stars(db: AsyncSession, user_id: str) -> Dict[str, Any]:
-    # SELECT ... FOR UPDATE — блокировка строки для предотвращения race condition
+async def _debit_stars(db: AsyncSession, user_id: str, amount: Decimal, reason: str) -> Dict[str, Any]:
+    """Условное атомарное списание (UPDATE ... WHERE stars_balance >= amount) + запись в ledger."""
     uid = uuid_module.UUID(user_id) if isinstance(user_id, str) else user_id
-    result = await db.execute(
-        select(models.User).where(models.User.id == uid).with_for_update()
-    )
-    user = result.scalar_one_or_none()
-    if not user: return {"success": False, "error": "User not found"}
-    
-    balance = user.stars_balance or Decimal("0")
-    if balance < STARS_PER_SWIPE_PACK:
-        return {"success": False, "error": "insufficient_balance"}
+    try:
+        balance = await star_ledger.debit(db, uid, amount, reason)
+    except star_ledger.InsufficientStars as e:
+        await db.rollback()
+        return {"success": False, "error": "insufficient_balance", "required": int(e.required), "available": float(e.available)}
+    except ValueError:
+        await db.rollback()
+        return {"success": False, "error": "User not found"}
+    # Коммит до записи в Redis: бонус выдаётся только за реально списанные звёзды
+    await db.commit()
+    return {"success": True, "new_balance": balance}
+
+async def buy_swipes_with_stars(db: AsyncSession, user_id: str) -> Dict[str, Any]:
+    debit = await _debit_stars(db, user_id, Decimal(STARS_PER_SWIPE_PACK), "swipes")
+    if not debit["success"]:
+        return debit
     
-    # ATOMIC TRANSACTION
-    async with db.begin_nested():
-        user.stars_balance = balance - Decimal(STARS_PER_SWIPE_PACK)
-        data = await get_user_swipe_data(str(user.id))
-        data["bonus_swipes"] = data.get("bonus_swipes", 0) + SWIPES_PER_PACK
-        await save_user_swipe_data(str(user.id), data)
+    data = await get_user_swipe_data(str(user_id))
+    data["bonus_swipes"] = data.get("bonus_swipes", 0) + SWIPES_PER_PACK
+    await save_user_swipe_data(str(user_id), data)
     
-    await db.commit()
-    return {"success": True, "new_balance": float(user.stars_balance)}
+    return {"success": True, "new_balance": float(debit["new_balance"])}
 
 async def buy_superlike_with_stars(db: AsyncSession, user_id: str) -> Dict[str, Any]:
     """Buy 1 superlike with stars"""
-    # SELECT ... FOR UPDATE — блокировка строки для предотвращения race condition
-    uid = uuid_module.UUID(user_id) if isinstance(user_id, str) else user_id
-    result = await db.execute(
-        select(models.User).where(models.User.id == uid).with_for_update()
-    )
-    user = result.scalar_one_or_none()
-    if not user: 
-        return {"success": False, "error": "User not found"}
+    debit = await _debit_stars(db, user_id, Decimal(STARS_PER_SUPERLIKE), "superlike")
+    if not debit["success"]:
+        return debit
     
-    balance = user.stars_balance or Decimal("0")
-    if balance < STARS_PER_SUPERLIKE:
-        return {"success": False, "error": "insufficient_balance", "required": STARS_PER_SUPERLIKE, "available": float(balance)}
+    data = await get_user_swipe_data(str(user_id))
+    data["bonus_superlikes"] = data.get("bonus_superlikes", 0) + 1
+    await save_user_swipe_data(str(user_id), data)
     
-    # ATOMIC TRANSACTION
-    async with db.begin_nested():
-        user.stars_balance = balance - Decimal(STARS_PER_SUPERLIKE)
-        data = await get_user_swipe_data(str(user.id))
-        data["bonus_superlikes"] = data.get("bonus_superlikes", 0) + 1
-        await save_user_swipe_data(str(user.id), data)
-    
-    await db.commit()
-    return {"success": True, "purchased": 1, "cost": STARS_PER_SUPERLIKE, "new_balance": float(user.stars_balance)}
+    return {"success": True, "purchased": 1, "cost": STARS_PER_SUPERLIKE, "new_balance": float(debit["new_balance"])}
 
 async def activate_boost_with_stars(db: AsyncSession, user_id: str, duration_hours: int = 1) -> Dict[str, Any]:
-    # SELECT ... FOR UPDATE — блокировка строки для предотвращения race condition
-    uid = uuid_module.UUID(user_id) if isinstance(user_id, str) else user_id
-    result = await db.execute(
-        select(models.User).where(models.User.id == uid).with_for_update()
-    )
-    user = result.scalar_one_or_none()
-    if not user: return {"success": False, "error": "User not found"}
-    
     cost = Decimal(STARS_PER_BOOST * duration_hours)
-    if (user.stars_balance or 0) < cost:
-        return {"success": False, "error": "insufficient_balance"}
-        
-    async with db.begin_nested():
-        user.stars_balance = (user.stars_balance or 0) - cost
-        now = datetime.utcnow()
-        boost_until = now + timedelta(hours=duration_hours)
-        data = await get_user_swipe_data(str(user.id))
-        data["boost_until"] = boost_until.isoformat()
-        await save_user_swipe_data(str(user.id), data)
-        
-    await db.commit()
-    return {"success": True, "boost_until": boost_until.isoformat(), "new_balance": float(user.stars_balance)}
+    debit = await _debit_stars(db, user_id, cost, "boost")
+    if not debit["success"]:
+        return debit
+    
+    now = datetime.utcnow()
+    boost_until = now + timedelta(hours=duration_hours)
+    data = await get_user_swipe_data(str(user_id))
+    data["boost_until"] = boost_until.isoformat()
+    await save_user_swipe_data(str(user_id), data)
+    
+    return {"success": True, "boost_until": boost_until.isoformat(), "new_balance": float(debit["new_balance"])}
 
 async def is_user_boosted(user_id: str) -> bool:
     """
@@ -1,16 +1,17 @@
 """
 Telegram Bot API notifications for offline users.
 Sends messages via bot when user is not connected to WebSocket.
+Delivery goes through the rate-limited telegram_sender queue.
 """
 
 import logging
-import aiohttp
 from typing import Optional
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.config.settings import settings
+from backend.services.telegram_sender import telegram_sender
 
 logger = logging.getLogger(__name__)
 
@@ -21,34 +22,20 @@ async def send_telegram_notification(
     chat_id: str,
     text: str,
     reply_markup: Optional[dict] = None,
+    wait: bool = False,
 ) -> bool:
-    """Send a message to a Telegram user via Bot API."""
-    token = settings.TELEGRAM_BOT_TOKEN
-    if not token:
+    """
+    Queue a message to a Telegram user via Bot API.
+    Returns True once queued (wait=False) or once Telegram accepted it (wait=True).
+    Queued notifications to the same chat with the same button are merged.
+    """
+    if not settings.TELEGRAM_BOT_TOKEN:
         logger.warning("TELEGRAM_BOT_TOKEN not configured, skipping TG notification")
         return False
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML",
-    }
-    if reply_markup:
-        payload["reply_markup"] = reply_markup
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(url, json=payload) as resp:
-                if resp.status == 200:
-                    return True
-                else:
-                    body = await resp.text()
-                    logger.error(f"TG notify failed ({resp.status}): {body}")
-                    return False
-        except Exception as e:
-            logger.error(f"TG notify error: {e}")
-            return False
+    return await telegram_sender.send_message(
+        chat_id, text, reply_markup=reply_markup, coalesce=True, wait=wait
+    )
 
 
 async def notify_user_new_message(
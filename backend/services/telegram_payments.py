@@ -210,22 +210,8 @@ async def send_message(
     Returns:
         True if sent successfully
     """
-    api_base = get_api_base()
-    if not api_base:
-        return False
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{api_base}/sendMessage",
-                json={
-                    "chat_id": chat_id,
-                    "text": text,
-                    "parse_mode": parse_mode
-                },
-                timeout=10.0
-            )
-            return response.json().get("ok", False)
-    except Exception as e:
-        logger.error(f"Send message error: {e}")
+    from backend.services.telegram_sender import telegram_sender
+
+    if not get_api_base():
         return False
+    return await telegram_sender.send_message(chat_id, text, parse_mode=parse_mode)
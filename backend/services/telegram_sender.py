@@ -0,0 +1,290 @@
+"""
+Outbound Telegram Bot API sends.
+
+Every message to Telegram goes through one scheduler that respects the Bot
+API limits (about 30 messages/s overall, 1 message/s per chat, 20/min per
+group) instead of firing one HTTP call per notification:
+
+- TelegramRateLimiter: a global token bucket (shared across workers through
+  a per-second Redis counter when Redis is configured) plus per-chat
+  spacing. A 429 response pauses the chat for `retry_after`.
+- TelegramSender: a queue per chat drained by one task per active chat over
+  a shared HTTP session. Queued notifications with the same keyboard are
+  coalesced into one message ("batching"), so a burst of chat messages to
+  an offline user becomes one Telegram message, not a 429.
+- RateLimitMiddleware: the same limiter for aiogram's own Bot calls
+  (handler replies), so bot replies and notifications share one budget.
+
+TELEGRAM_API_URL can point to a fake Bot API server in tests.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+import aiohttp
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from backend.config.settings import settings
+from backend.core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30                # сообщений в секунду на бота
+CHAT_INTERVAL = 1.0             # сек между сообщениями в один чат
+GROUP_INTERVAL = 3.0            # группы: 20 сообщений в минуту
+MAX_RETRIES = 5
+MAX_CHAT_QUEUE = 100
+MAX_TEXT = 4096
+SHARED_WINDOW_KEY = "telegram:send:{}"
+
+
+class TelegramRateLimiter:
+    """Global token bucket + per-chat spacing for Bot API calls."""
+
+    def __init__(self, rate: int = GLOBAL_RATE, chat_interval: float = CHAT_INTERVAL, shared: bool = True):
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.shared = shared
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._next_chat: Dict[str, float] = {}
+
+    def _interval(self, chat_id: str) -> float:
+        return GROUP_INTERVAL if chat_id.startswith("-") else self.chat_interval
+
+    async def _shared_slot(self) -> bool:
+        """Per-second counter in Redis so all workers together stay under the global rate."""
+        if not self.shared:
+            return True
+        r = await redis_manager.get_redis()
+        if not r:
+            return True
+        key = SHARED_WINDOW_KEY.format(int(time.time()))
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, 2)
+                used, _ = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Telegram shared rate window unavailable: {e}")
+            return True
+        return used <= self.rate
+
+    async def _global(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Lock держит очередь FIFO: спит только тот, кто первый в очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                    continue
+                if not await self._shared_slot():
+                    await asyncio.sleep(1 - time.time() % 1)
+                    continue
+                self._tokens -= 1
+                return
+
+    async def acquire(self, chat_id: Optional[Any] = None):
+        """Wait until a message to chat_id may be sent."""
+        if chat_id is not None:
+            chat_id = str(chat_id)
+            wait = self._next_chat.get(chat_id, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self._global()
+        if chat_id is not None:
+            self._next_chat[chat_id] = time.monotonic() + self._interval(chat_id)
+            if len(self._next_chat) > 50000:
+                now = time.monotonic()
+                self._next_chat = {k: v for k, v in self._next_chat.items() if v > now}
+
+    def pause(self, chat_id: Optional[Any], retry_after: float):
+        """Telegram answered 429: hold the chat (and spend the global burst)."""
+        if chat_id is not None:
+            self._next_chat[str(chat_id)] = time.monotonic() + retry_after
+        self._tokens = 0
+
+
+@dataclass
+class _Outgoing:
+    method: str
+    payload: Dict[str, Any]
+    coalesce: bool = False
+    futures: List[asyncio.Future] = field(default_factory=list)
+    attempts: int = 0
+
+    def merge_key(self):
+        if not self.coalesce or self.method != "sendMessage":
+            return None
+        return self.payload.get("parse_mode"), json.dumps(self.payload.get("reply_markup"), sort_keys=True)
+
+
+class TelegramSender:
+    def __init__(self, limiter: Optional[TelegramRateLimiter] = None, api_url: Optional[str] = None, token: Optional[str] = None):
+        self.limiter = limiter or TelegramRateLimiter()
+        self._api_url = api_url
+        self._token = token
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._queues: Dict[str, Deque[_Outgoing]] = {}
+        self._drains: Dict[str, asyncio.Task] = {}
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token or settings.TELEGRAM_BOT_TOKEN
+
+    @property
+    def api_url(self) -> str:
+        return (self._api_url or settings.TELEGRAM_API_URL).rstrip("/")
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    # --- public API ------------------------------------------------------
+
+    async def send_message(
+        self,
+        chat_id: Any,
+        text: str,
+        reply_markup: Optional[dict] = None,
+        parse_mode: Optional[str] = "HTML",
+        coalesce: bool = False,
+        wait: bool = True,
+    ) -> bool:
+        """
+        Queue a sendMessage. With wait=True returns whether Telegram accepted it;
+        with wait=False returns True once queued.
+        coalesce=True lets it merge with other queued notifications to the same chat.
+        """
+        payload: Dict[str, Any] = {"chat_id": chat_id, "text": text}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        return await self.call("sendMessage", payload, coalesce=coalesce, wait=wait)
+
+    async def call(self, method: str, payload: Dict[str, Any], coalesce: bool = False, wait: bool = True) -> bool:
+        if not self.token:
+            logger.warning("TELEGRAM_BOT_TOKEN not configured, skipping Telegram send")
+            return False
+        chat_id = str(payload["chat_id"])
+        queue = self._queues.setdefault(chat_id, deque())
+        if len(queue) >= MAX_CHAT_QUEUE:
+            logger.warning(f"Telegram queue for chat {chat_id} is full, dropping {method}")
+            return False
+        future = asyncio.get_running_loop().create_future()
+        queue.append(_Outgoing(method, payload, coalesce, [future]))
+        if chat_id not in self._drains:
+            self._drains[chat_id] = asyncio.create_task(self._drain(chat_id))
+        return await future if wait else True
+
+    async def broadcast(self, chat_ids: Iterable[Any], text: str, reply_markup: Optional[dict] = None) -> int:
+        """Queue the same message to many chats; the limiter spreads them out. Returns how many were queued."""
+        queued = 0
+        for chat_id in chat_ids:
+            if await self.send_message(chat_id, text, reply_markup=reply_markup, wait=False):
+                queued += 1
+        return queued
+
+    async def close(self):
+        for task in list(self._drains.values()):
+            task.cancel()
+        self._drains.clear()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # --- sending ---------------------------------------------------------
+
+    def _next(self, queue: Deque[_Outgoing]) -> _Outgoing:
+        item = queue.popleft()
+        key = item.merge_key()
+        if key is None:
+            return item
+        # Склеиваем подряд идущие уведомления с той же клавиатурой в одно сообщение
+        while queue and queue[0].merge_key() == key and not queue[0].attempts:
+            text = f"{item.payload['text']}\n\n{queue[0].payload['text']}"
+            if len(text) > MAX_TEXT:
+                break
+            nxt = queue.popleft()
+            item.payload = {**item.payload, "text": text}
+            item.futures.extend(nxt.futures)
+        return item
+
+    async def _drain(self, chat_id: str):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                item = self._next(queue)
+                await self.limiter.acquire(chat_id)
+                ok, retry_after = await self._post(item)
+                if retry_after is not None and item.attempts < MAX_RETRIES:
+                    item.attempts += 1
+                    self.limiter.pause(chat_id, retry_after)
+                    queue.appendleft(item)
+                    continue
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(ok)
+        finally:
+            # Незавершённые (отмена при shutdown) не оставляем висеть
+            for item in queue:
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(False)
+            self._queues.pop(chat_id, None)
+            self._drains.pop(chat_id, None)
+
+    async def _post(self, item: _Outgoing):
+        """One Bot API call. Returns (ok, retry_after or None)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        url = f"{self.api_url}/bot{self.token}/{item.method}"
+        try:
+            async with self._session.post(url, json=item.payload) as resp:
+                body = await resp.json(content_type=None)
+        except Exception as e:
+            logger.error(f"Telegram {item.method} error: {e}")
+            return False, (1.0 if item.attempts < 2 else None)
+        if body.get("ok"):
+            return True, None
+        if body.get("error_code") == 429:
+            retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+            logger.warning(f"Telegram flood control for chat {item.payload.get('chat_id')}: retry after {retry_after}s")
+            return False, float(retry_after)
+        logger.error(f"Telegram {item.method} failed ({body.get('error_code')}): {body.get('description')}")
+        return False, None
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """aiogram session middleware: handler replies wait for the shared limiter and retry on 429."""
+
+    def __init__(self, limiter: TelegramRateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)     # getMe, answerCallbackQuery и т.п.
+        for attempt in range(MAX_RETRIES):
+            await self.limiter.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                self.limiter.pause(chat_id, e.retry_after)
+
+
+telegram_limiter = TelegramRateLimiter()
+telegram_sender = TelegramSender(telegram_limiter)
@@ -0,0 +1,223 @@
+"""
+Telegram update queue.
+
+The webhook only validates and enqueues; handlers run in worker tasks, so
+Telegram gets its 200 immediately and does not redeliver slow updates.
+
+- Redis: stream telegram:updates with consumer group "bot". One reader per
+  process does the blocking XREADGROUP (and XAUTOCLAIM of entries left
+  pending by a crashed process after CLAIM_IDLE_MS) on the dedicated
+  blocking Redis pool and hands entries to the workers through a small
+  bounded queue; workers handle and ack them over the shared pool with
+  short commands only.
+- Idempotency on update_id: telegram:update:{id} is set NX on enqueue
+  ("queued") and flipped to "done" after handling, so Telegram retries and
+  reclaimed entries are never handled twice.
+- Without Redis: a bounded asyncio.Queue and an in-process LRU of seen ids.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from backend.core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "telegram:updates"
+GROUP = "bot"
+SEEN_KEY = "telegram:update:{}"
+SEEN_TTL = 24 * 3600            # Telegram хранит и повторяет апдейты до суток
+STREAM_MAXLEN = 10000
+WORKERS = 4
+READ_COUNT = 10
+BLOCK_MS = 1000
+CLAIM_IDLE_MS = 60000
+CLAIM_INTERVAL = 30.0           # сек между XAUTOCLAIM
+LOCAL_QUEUE_SIZE = 1000
+LOCAL_SEEN_SIZE = 10000
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+async def feed_to_dispatcher(update_data: Dict[str, Any]):
+    """Default handler: pass the update to the aiogram dispatcher."""
+    from aiogram.types import Update
+    from backend.api.bot_webhook import get_bot_and_dp
+
+    bot, dp = get_bot_and_dp()
+    await dp.feed_update(bot, Update(**update_data))
+
+
+class TelegramUpdateQueue:
+    def __init__(self, handler: Handler = feed_to_dispatcher, workers: int = WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._local: Optional[asyncio.Queue] = None
+        self._seen: "OrderedDict[int, str]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+        self._group_ready = False
+        # Записи, прочитанные читателем и ещё не обработанные (их не переclaimим у себя)
+        self._dispatch: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        self._in_flight: set = set()
+        self._claimed_at = 0.0
+
+    # --- webhook side ----------------------------------------------------
+
+    async def enqueue(self, update: Dict[str, Any]) -> bool:
+        """Queue an update. False if this update_id was already queued (Telegram retry)."""
+        update_id = update.get("update_id")
+        r = await redis_manager.get_redis()
+        if r:
+            try:
+                if update_id is not None and not await r.set(SEEN_KEY.format(update_id), "queued", nx=True, ex=SEEN_TTL):
+                    return False
+                await r.xadd(STREAM_KEY, {"update": json.dumps(update)}, maxlen=STREAM_MAXLEN, approximate=True)
+                return True
+            except Exception as e:
+                logger.warning(f"Telegram update enqueue via Redis failed, using local queue: {e}")
+
+        if update_id is not None:
+            if update_id in self._seen:
+                return False
+            self._mark_local(update_id, "queued")
+        if self._local is None:
+            self._local = asyncio.Queue(maxsize=LOCAL_QUEUE_SIZE)
+        self._local.put_nowait(update)      # QueueFull -> вебхук ответит ошибкой, Telegram повторит
+        return True
+
+    def _mark_local(self, update_id: int, state: str):
+        self._seen[update_id] = state
+        self._seen.move_to_end(update_id)
+        while len(self._seen) > LOCAL_SEEN_SIZE:
+            self._seen.popitem(last=False)
+
+    # --- workers ---------------------------------------------------------
+
+    async def _handle(self, update: Dict[str, Any]):
+        try:
+            await self.handler(update)
+        except Exception as e:
+            # Не перекладываем в очередь: обработчик бота не должен зацикливаться на одном апдейте
+            logger.error(f"Telegram update {update.get('update_id')} failed: {e}")
+
+    async def _ensure_group(self, r):
+        if self._group_ready:
+            return
+        try:
+            await r.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def _process_entries(self, r, entries) -> int:
+        """Handle stream entries once each, then ack them in one call."""
+        ids = []
+        for entry_id, fields in entries:
+            ids.append(entry_id)
+            if not fields:      # запись уже вытеснена MAXLEN
+                continue
+            update = json.loads(fields["update"])
+            key = SEEN_KEY.format(update.get("update_id"))
+            if await r.get(key) == "done":
+                continue
+            await self._handle(update)
+            await r.set(key, "done", ex=SEEN_TTL)
+        if ids:
+            await r.xack(STREAM_KEY, GROUP, *ids)
+        return len(ids)
+
+    async def read_batch(self, r, consumer: str) -> list:
+        """Reclaim stale entries (every CLAIM_INTERVAL), then block-read new ones."""
+        await self._ensure_group(r)
+        entries = []
+        now = asyncio.get_running_loop().time()
+        if now - self._claimed_at >= CLAIM_INTERVAL:
+            self._claimed_at = now
+            claimed = await r.xautoclaim(STREAM_KEY, GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=READ_COUNT)
+            entries += [entry for entry in claimed[1] if entry[0] not in self._in_flight]
+        response = await r.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=READ_COUNT, block=BLOCK_MS)
+        for _, stream_entries in response or []:
+            entries += stream_entries
+        return entries
+
+    async def process_local(self, timeout: float = 1.0) -> int:
+        if self._local is None:
+            self._local = asyncio.Queue(maxsize=LOCAL_QUEUE_SIZE)
+        try:
+            if timeout <= 0:
+                update = self._local.get_nowait()
+            else:
+                update = await asyncio.wait_for(self._local.get(), timeout)
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return 0
+        update_id = update.get("update_id")
+        if update_id is None or self._seen.get(update_id) != "done":
+            await self._handle(update)
+            if update_id is not None:
+                self._mark_local(update_id, "done")
+        return 1
+
+    async def _reader(self):
+        while True:
+            try:
+                r = await redis_manager.get_blocking_redis()
+                if not r:
+                    return          # без Redis воркеры читают локальную очередь
+                for entry in await self.read_batch(r, self.consumer):
+                    self._in_flight.add(entry[0])
+                    await self._dispatch.put(entry)     # очередь мала: читатель ждёт воркеров
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Telegram update reader error: {e}")
+                self._group_ready = False
+                await asyncio.sleep(1)
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                r = await redis_manager.get_redis()
+                if not r:
+                    await self.process_local(timeout=1.0)
+                    continue
+                try:
+                    entry = await asyncio.wait_for(self._dispatch.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    entry = None
+                if entry is not None:
+                    try:
+                        await self._process_entries(r, [entry])
+                    finally:
+                        self._in_flight.discard(entry[0])
+                # Локальная очередь: если XADD не прошёл
+                if self._local and not self._local.empty():
+                    await self.process_local(timeout=0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Telegram update worker {index} error: {e}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._in_flight.clear()
+        self._tasks = [asyncio.create_task(self._reader())]
+        self._tasks += [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Telegram update workers started (1 reader, {self.workers} workers)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+update_queue = TelegramUpdateQueue()
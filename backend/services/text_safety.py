@@ -0,0 +1,271 @@
+"""
+Text Safety Engine
+==================
+One matcher for every word list: spam phrases, banned words, toxic words.
+
+- All dictionaries compile into one Aho-Corasick automaton (pyahocorasick;
+  without it, one combined regex alternation), so a message is scanned
+  once regardless of how many lists or words there are.
+- Phrase rules (harassment, repeated characters) and very short words
+  ("xxx") are one precompiled regex with a named group per rule.
+- Text and dictionary words go through the same normalization: lowercase,
+  leetspeak digits, repeated letters collapsed ("K1LLLL" and "kill" both
+  become "kil"). Cyrillic/Latin homoglyphs are folded only inside words that
+  mix both scripts ("кaзинo" -> "казино"), so plain Russian or English words
+  are never rewritten into the other alphabet.
+- Dictionary words match whole words only ("kill" does not hit "kilos");
+  a trailing "*" makes a word a stem ("криптовалют*" hits "криптовалюту").
+- Dictionaries can be edited by admins: they live in Redis and every
+  process picks up a new version within RELOAD_INTERVAL, no restart needed.
+"""
+
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.core.redis import redis_manager
+
+try:
+    import ahocorasick
+except ImportError:  # optional dependency
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+DICTIONARIES_KEY = "text_safety:dictionaries"   # HASH category -> JSON list
+VERSION_KEY = "text_safety:version"
+RELOAD_INTERVAL = 15.0                          # сек между проверками версии
+
+DEFAULT_DICTIONARIES: Dict[str, List[str]] = {
+    "spam": [
+        "заработок", "быстрые деньги", "казино", "ставки",
+        "инвестиции", "криптовалют*", "пассивный доход",
+    ],
+    "banned": [
+        "badword", "abuse", "scam", "spam",
+        "мат", "плохоеслово",
+    ],
+    "toxicity": [
+        "hate", "kill", "spam", "nazi", "porn*", "xxx",
+        "fuck*", "shit", "bitch", "whore", "slut",
+        "nigger", "faggot", "retard",
+    ],
+}
+
+# Правила-фразы: один регэксп по тексту после lower + leet/homoglyph (без схлопывания повторов)
+PATTERNS: List[Tuple[str, str]] = [
+    ("harassment", r"\bki+l+\s+(?:yourself|urself|u)\b"),
+    ("harassment", r"\bgo+\s+die\b"),
+    ("harassment", r"\bky+s\b"),
+    ("repeated_chars", r"(?P<ch>.)(?P=ch){5,}"),
+]
+
+# Цифры/символы вместо букв (только внутри слов, где есть буквы) и кириллица,
+# похожая на латиницу (только в словах, смешивающих алфавиты: приводим к
+# алфавиту большинства букв слова — словари нормализуются так же)
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s", "!": "i"})
+_HOMOGLYPHS = {
+    "а": "a", "в": "b", "е": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s",
+}
+_TO_LATIN = str.maketrans(_HOMOGLYPHS)
+_TO_CYRILLIC = str.maketrans({latin: cyr for cyr, latin in _HOMOGLYPHS.items() if cyr in "авекмнорстух"})
+_TOKEN = re.compile(r"[\w@$!]+")
+_TRAILING_SYMBOLS = re.compile(r"[@$!]*$")
+_REPEATS = re.compile(r"(.)\1+", re.DOTALL)
+_RUNS = re.compile(r"(.)\1*", re.DOTALL)
+
+# Слова короче этого после схлопывания ("xxx" -> "x") уходят в регэксп целым словом
+MIN_SUBSTRING_LEN = 3
+
+
+def _fold_token(match) -> str:
+    token = match.group(0)
+    # "kill!" — восклицательный знак в конце это пунктуация, а не "i"
+    cut = _TRAILING_SYMBOLS.search(token).start()
+    word, tail = token[:cut], token[cut:]
+    if not any(c.isalpha() for c in word):
+        return token            # числа ("2024") не трогаем
+    word = word.translate(_LEET)
+    latin = sum("a" <= c <= "z" for c in word)
+    cyrillic = sum("\u0400" <= c <= "\u04ff" for c in word)
+    if latin and cyrillic:
+        word = word.translate(_TO_LATIN if latin >= cyrillic else _TO_CYRILLIC)
+    return word + tail
+
+
+def _translate(text: str) -> str:
+    # lower() посимвольно, чтобы длина и позиции совпадали с исходным текстом
+    lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text).replace("ё", "е")
+    return _TOKEN.sub(_fold_token, lowered)
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def normalize(text: str) -> str:
+    return _REPEATS.sub(r"\1", _translate(text))
+
+
+def _short_word_pattern(word: str) -> str:
+    # "xxx" -> \bx{3,}\b: повторы допускаем, но не короче словарного слова
+    runs = "".join(f"{re.escape(run.group(1))}{{{len(run.group(0))},}}" for run in _RUNS.finditer(word))
+    return rf"\b{runs}\b"
+
+
+def _normalize_with_spans(text: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """normalize() plus, for every output char, its (start, end) in text."""
+    chars, spans = [], []
+    for run in _RUNS.finditer(_translate(text)):
+        chars.append(run.group(1))
+        spans.append(run.span())
+    return "".join(chars), spans
+
+
+@dataclass(frozen=True)
+class Hit:
+    category: str
+    term: str
+    start: int      # словари: позиции в схлопнутом тексте, правила — в исходном
+    end: int
+
+
+class TextSafetyEngine:
+    def __init__(self, dictionaries: Optional[Dict[str, Iterable[str]]] = None):
+        self.version: Optional[str] = None
+        self._checked_at = 0.0
+        self.compile(dictionaries or DEFAULT_DICTIONARIES)
+
+    def compile(self, dictionaries: Dict[str, Iterable[str]]):
+        """Build the matchers from {category: words}. Swapped in atomically."""
+        # term -> {(category, is_stem)}
+        terms: Dict[str, set] = {}
+        short: Dict[str, set] = {}
+        for category, words in dictionaries.items():
+            for word in words:
+                word = word.strip()
+                stem = word.endswith("*")
+                word = _translate(word.rstrip("*").strip())
+                term = _REPEATS.sub(r"\1", word)
+                if len(term) >= MIN_SUBSTRING_LEN:
+                    terms.setdefault(term, set()).add((category, stem))
+                elif term:
+                    short.setdefault(word, set()).add(category)
+        terms = {term: tuple(sorted(entries)) for term, entries in terms.items()}
+
+        if ahocorasick:
+            automaton = ahocorasick.Automaton()
+            for term, entries in terms.items():
+                automaton.add_word(term, (term, entries))
+            if terms:
+                automaton.make_automaton()
+            matcher = automaton
+        else:
+            # Длинные первыми: при пересечении берём более специфичное слово;
+            # граница слова слева — в регэкспе, справа — в _dictionary_hits
+            alternation = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+            matcher = re.compile(f"(?<!\\w)(?=({alternation}))") if terms else None
+
+        rules = [((category,), pattern) for category, pattern in PATTERNS]
+        rules += [(tuple(sorted(categories)), _short_word_pattern(word)) for word, categories in short.items()]
+        patterns = re.compile("|".join(f"(?P<r{i}>{pattern})" for i, (_, pattern) in enumerate(rules)))
+
+        self._terms, self._matcher = terms, matcher
+        self._rules, self._patterns = [categories for categories, _ in rules], patterns
+
+    def _dictionary_hits(self, normalized: str) -> List[Hit]:
+        if not self._terms or self._matcher is None:
+            return []
+        if ahocorasick:
+            found = ((end - len(term) + 1, term, entries) for end, (term, entries) in self._matcher.iter(normalized))
+        else:
+            found = ((m.start(1), m.group(1), self._terms[m.group(1)]) for m in self._matcher.finditer(normalized))
+        hits = []
+        for start, term, entries in found:
+            end = start + len(term)
+            if start > 0 and _is_word_char(normalized[start - 1]):
+                continue
+            whole = end == len(normalized) or not _is_word_char(normalized[end])
+            hits.extend(Hit(category, term, start, end) for category, stem in entries if stem or whole)
+        return hits
+
+    def _pattern_hits(self, translated: str) -> List[Hit]:
+        return [
+            Hit(category, match.group(0), match.start(), match.end())
+            for match in self._patterns.finditer(translated)
+            for category in self._rules[int(match.lastgroup[1:])]
+        ]
+
+    def scan(self, text: str) -> List[Hit]:
+        """All dictionary and phrase-rule hits for text: one automaton pass, one regex pass."""
+        if not text:
+            return []
+        translated = _translate(text)
+        return self._dictionary_hits(_REPEATS.sub(r"\1", translated)) + self._pattern_hits(translated)
+
+    def categories(self, text: str) -> set:
+        return {hit.category for hit in self.scan(text)}
+
+    def mask(self, text: str, categories: Iterable[str]) -> str:
+        """Replace hits of the given categories with asterisks."""
+        if not text:
+            return text
+        categories = set(categories)
+        normalized, spans = _normalize_with_spans(text)
+        masked = list(text)
+        for hit in self._dictionary_hits(normalized):
+            if hit.category in categories:
+                masked[spans[hit.start][0]:spans[hit.end - 1][1]] = "*" * (spans[hit.end - 1][1] - spans[hit.start][0])
+        if len(text) == len(text.lower()):
+            for hit in self._pattern_hits(_translate(text)):
+                if hit.category in categories:
+                    masked[hit.start:hit.end] = "*" * (hit.end - hit.start)
+        return "".join(masked)
+
+    # --- admin-managed dictionaries ---------------------------------------
+
+    async def maybe_reload(self, force: bool = False):
+        """Recompile when the dictionaries version in Redis changed (at most every RELOAD_INTERVAL)."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        r = await redis_manager.get_redis()
+        if not r:
+            return
+        try:
+            version = await r.get(VERSION_KEY)
+            if version == self.version and not force:
+                return
+            stored = await r.hgetall(DICTIONARIES_KEY)
+        except Exception as e:
+            logger.warning(f"Text safety reload failed: {e}")
+            return
+        dictionaries = {**DEFAULT_DICTIONARIES, **{k: json.loads(v) for k, v in stored.items()}}
+        self.compile(dictionaries)
+        self.version = version
+        logger.info(f"Text safety dictionaries reloaded (version {version}, {len(self._terms)} terms)")
+
+    async def get_dictionaries(self) -> Dict[str, List[str]]:
+        r = await redis_manager.get_redis()
+        stored = await r.hgetall(DICTIONARIES_KEY) if r else {}
+        return {**DEFAULT_DICTIONARIES, **{k: json.loads(v) for k, v in stored.items()}}
+
+    async def set_dictionary(self, category: str, words: List[str]):
+        """Replace one category's words; other processes pick it up on their next reload check."""
+        r = await redis_manager.get_redis()
+        if not r:
+            raise RuntimeError("Redis is not configured")
+        words = sorted({w.strip().lower() for w in words if w.strip()})
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hset(DICTIONARIES_KEY, category, json.dumps(words, ensure_ascii=False))
+            pipe.incr(VERSION_KEY)
+            await pipe.execute()
+        await self.maybe_reload(force=True)
+
+
+text_safety = TextSafetyEngine()
@@ -12,6 +12,7 @@ from enum import Enum
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from backend.models.user import User
+from backend.services.profile_cards import refresh_profile_cards
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +66,8 @@ async def request_account_deletion(
     if user:
         user.is_active = False
         await db.commit()
+        # is_active лежит в снапшоте карточки: деактивированный не должен отдаваться
+        await refresh_profile_cards(db, [user.id])
     
     logger.info(f"Account deletion requested for user {user_id}")
     
@@ -93,6 +96,7 @@ async def cancel_account_deletion(db: AsyncSession, user_id: str) -> Dict[str, A
     if user:
         user.is_active = True
         await db.commit()
+        await refresh_profile_cards(db, [user.id])
     
     logger.info(f"Account deletion cancelled for user {user_id}")
     
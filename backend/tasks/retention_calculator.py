@@ -299,14 +299,24 @@ async def scheduled_backup_job():
     logger.info("Running scheduled backup...")
     
     try:
+        from backend.config.settings import settings
+
         result = await backup_service.create_backup(
             backup_type=BackupType.FULL,
             compress=True,
-            upload_to_s3=True
+            upload_to_s3=True,
+            include_blobs=True,
         )
         
         if result.success:
-            logger.info(f"Scheduled backup completed: {result.file_path}")
+            logger.info(
+                f"Scheduled backup completed: {result.file_path} "
+                f"({result.file_size} bytes, {result.duration_seconds:.0f}s, blobs: {result.blobs})"
+            )
+            if settings.BACKUP_VERIFY:
+                verification = await backup_service.verify_backup(result.key)
+                if not verification["ok"]:
+                    logger.error(f"Scheduled backup verification failed: {verification['error']}")
         else:
             logger.error(f"Scheduled backup failed: {result.error}")
             
@@ -327,24 +337,247 @@ async def scheduled_backup_cleanup_job():
         logger.error(f"Backup cleanup failed: {e}")
 
 
+async def scheduled_daily_picks_generation_job():
+    """Job function to precompute today's daily picks for all active users"""
+    from backend.services.ai.daily_picks import generate_all_daily_picks
+
+    try:
+        await generate_all_daily_picks()
+    except Exception as e:
+        logger.error(f"Daily picks generation failed: {e}")
+
+
 async def scheduled_daily_picks_notification():
     """Job function to notify users about new daily picks"""
     logger.info("Running scheduled daily picks notification...")
     
+    from backend.core.redis import redis_manager
     from backend.database import async_session
     from backend.models.user import User
-    from backend.services.notification import send_daily_picks_notification
+    from backend.services.ai.daily_picks import PICKS_KEY
+    from backend.services.push_notifications import send_push_to_users
+    
+    r = await redis_manager.get_redis()
+    day = date.today().isoformat()
     
     async with async_session() as db:
         # Get all active users
         result = await db.execute(select(User.id).where(User.is_active == True))
-        user_ids = [str(r[0]) for r in result.all()]
+        user_ids = [row[0] for row in result.all()]
         
-        for user_id in user_ids:
+        # Уведомляем пачками и только тех, у кого подборка уже готова
+        for i in range(0, len(user_ids), 500):
+            chunk = user_ids[i:i + 500]
             try:
-                await send_daily_picks_notification(db, user_id)
+                if r:
+                    picks = await r.mget([PICKS_KEY.format(uid, day) for uid in chunk])
+                    chunk = [uid for uid, p in zip(chunk, picks) if p and p != "[]"]
+                await send_push_to_users(
+                    db=db,
+                    user_ids=chunk,
+                    title="🌟 Новая подборка готова!",
+                    body="Мы подобрали для вас 5 идеальных совпадений",
+                    data={"route": "/discover"}
+                )
             except Exception as e:
-                logger.error(f"Failed to send daily picks notification to {user_id}: {e}")
+                logger.error(f"Failed to send daily picks notifications ({len(chunk)} users): {e}")
+
+
+async def scheduled_presence_prune_job():
+    """Job function to drop week-old entries from the presence sorted set"""
+    from backend.services.chat.presence import presence_service
+
+    try:
+        removed = await presence_service.prune()
+        logger.info(f"Presence prune completed: {removed} entries removed")
+    except Exception as e:
+        logger.error(f"Presence prune failed: {e}")
+
+
+async def scheduled_last_seen_flush_job():
+    """Job function to bulk-write buffered last_seen timestamps to users"""
+    from backend.services.chat.last_seen import last_seen_flusher
+
+    try:
+        await last_seen_flusher.flush()
+    except Exception as e:
+        logger.error(f"last_seen flush job failed: {e}")
+
+
+async def scheduled_story_maintenance_job():
+    """Job function to flush buffered story view counts and expire stories"""
+    from backend.database import async_session
+    from backend.services.social.stories import cleanup_expired_stories
+    from backend.services.social.story_tray import flush_view_counts
+
+    try:
+        async with async_session() as db:
+            flushed = await flush_view_counts(db)
+            expired = await cleanup_expired_stories(db)
+        logger.info(f"Story maintenance: {flushed} view counts flushed, {expired} expired")
+    except Exception as e:
+        logger.error(f"Story maintenance job failed: {e}")
+
+
+async def scheduled_spotlight_maintenance_job():
+    """Job function to flush buffered spotlight impressions and expire entries"""
+    from backend.database import async_session
+    from backend.services.social.spotlight import (
+        cleanup_expired_spotlight,
+        flush_spotlight_impressions,
+    )
+
+    try:
+        async with async_session() as db:
+            flushed = await flush_spotlight_impressions(db)
+            expired = await cleanup_expired_spotlight(db)
+        if flushed or expired:
+            logger.info(f"Spotlight maintenance: {flushed} impressions flushed, {expired} expired")
+    except Exception as e:
+        logger.error(f"Spotlight maintenance job failed: {e}")
+
+
+async def scheduled_profile_view_flush_job():
+    """Job function to write buffered profile views to the database"""
+    from backend.database import async_session
+    from backend.services.social.profile_views import flush_profile_views
+
+    try:
+        async with async_session() as db:
+            await flush_profile_views(db)
+    except Exception as e:
+        logger.error(f"Profile view flush job failed: {e}")
+
+
+async def scheduled_gift_counter_rollup_job():
+    """Job function to roll sharded gift counters up into times_sent"""
+    from backend.database import async_session
+    from backend.services.gifts import rollup_gift_counters
+
+    try:
+        async with async_session() as db:
+            await rollup_gift_counters(db)
+    except Exception as e:
+        logger.error(f"Gift counter rollup job failed: {e}")
+
+
+async def scheduled_profile_snapshot_warmup_job():
+    """Job function to pre-build Redis profile snapshots for active users"""
+    from backend.services.profile_cards import warm_profile_snapshots
+
+    try:
+        await warm_profile_snapshots()
+    except Exception as e:
+        logger.error(f"Profile snapshot warm-up job failed: {e}")
+
+
+async def scheduled_ai_usage_flush_job():
+    """Job function to write buffered AI token/cost accounting to the database"""
+    from backend.database import async_session
+    from backend.services.ai import ai_service
+
+    try:
+        async with async_session() as db:
+            await ai_service.flush_usage(db)
+    except Exception as e:
+        logger.error(f"AI usage flush job failed: {e}")
+
+
+async def scheduled_client_logs_flush_job():
+    """Job function to persist buffered client logs grouped by signature"""
+    from backend.database import async_session
+    from backend.services.client_logs import client_log_collector
+
+    try:
+        async with async_session() as db:
+            await client_log_collector.flush(db)
+    except Exception as e:
+        logger.error(f"Client logs flush job failed: {e}")
+
+
+async def scheduled_client_logs_cleanup_job():
+    """Job function to delete client log signatures past retention"""
+    from backend.database import async_session
+    from backend.services.client_logs import client_log_collector
+
+    try:
+        async with async_session() as db:
+            deleted = await client_log_collector.cleanup(db)
+        if deleted:
+            logger.info(f"Client logs cleanup: {deleted} signatures deleted")
+    except Exception as e:
+        logger.error(f"Client logs cleanup job failed: {e}")
+
+
+async def scheduled_stalled_prompts_job():
+    """Job function to pre-generate conversation prompts for chats that went quiet"""
+    from backend.services.ai.conversation_starters import refresh_stalled_prompts
+
+    try:
+        await refresh_stalled_prompts()
+    except Exception as e:
+        logger.error(f"Stalled conversation prompts job failed: {e}")
+
+
+async def scheduled_data_export_cleanup_job():
+    """Job function to delete expired GDPR export archives"""
+    from backend.database import async_session
+    from backend.services.data_export import cleanup_expired_exports
+
+    try:
+        async with async_session() as db:
+            stats = await cleanup_expired_exports(db)
+        if stats["expired"] or stats["failed"]:
+            logger.info(f"Data export cleanup: {stats}")
+    except Exception as e:
+        logger.error(f"Data export cleanup job failed: {e}")
+
+
+async def scheduled_report_cleanup_job():
+    """Job function to delete expired admin report files"""
+    from backend.database import async_session
+    from backend.services.reporting import cleanup_expired_reports
+
+    try:
+        async with async_session() as db:
+            stats = await cleanup_expired_reports(db)
+        if stats["expired"] or stats["failed"]:
+            logger.info(f"Report cleanup: {stats}")
+    except Exception as e:
+        logger.error(f"Report cleanup job failed: {e}")
+
+
+async def scheduled_broadcast_job():
+    """Job function to deliver queued admin broadcasts and resume interrupted ones"""
+    from backend.services.broadcasts import run_pending_broadcasts
+
+    try:
+        await run_pending_broadcasts()
+    except Exception as e:
+        logger.error(f"Broadcast job failed: {e}")
+
+
+async def scheduled_fraud_rescore_job():
+    """Job function to rescore users whose fraud signals changed"""
+    from backend.database import async_session
+    from backend.services.fraud_detection import fraud_service
+
+    try:
+        async with async_session() as db:
+            result = await fraud_service.rescore_changed(db)
+        logger.info(f"Fraud incremental rescore: {result['processed']} users, {result['errors']} errors")
+    except Exception as e:
+        logger.error(f"Fraud rescore job failed: {e}")
+
+
+async def scheduled_fraud_full_recalc_job():
+    """Job function to rescore the whole user base"""
+    from backend.services.fraud_detection import fraud_service
+
+    try:
+        await fraud_service.recalculate_all()
+    except Exception as e:
+        logger.error(f"Fraud full recalculation job failed: {e}")
 
 
 def setup_scheduled_jobs():
@@ -387,6 +620,15 @@ def setup_scheduled_jobs():
             replace_existing=True
         )
         
+        # Daily Picks: precomputed at 8:00 AM UTC, before the notification
+        scheduler.add_job(
+            scheduled_daily_picks_generation_job,
+            CronTrigger(hour=8, minute=0),
+            id='daily_picks_generation',
+            name='Daily Picks Generation',
+            replace_existing=True
+        )
+        
         # Daily Picks Notification: Daily at 9:00 AM UTC
         scheduler.add_job(
             scheduled_daily_picks_notification,
@@ -396,6 +638,147 @@ def setup_scheduled_jobs():
             replace_existing=True
         )
         
+        # Presence prune: Hourly
+        scheduler.add_job(
+            scheduled_presence_prune_job,
+            CronTrigger(minute=15),
+            id='presence_prune',
+            name='Hourly Presence Prune',
+            replace_existing=True
+        )
+        
+        # last_seen write coalescing: every minute
+        from apscheduler.triggers.interval import IntervalTrigger
+        scheduler.add_job(
+            scheduled_last_seen_flush_job,
+            IntervalTrigger(seconds=60),
+            id='last_seen_flush',
+            name='last_seen Bulk Flush',
+            replace_existing=True
+        )
+        
+        # Story view counts + expiry: every 5 minutes
+        scheduler.add_job(
+            scheduled_story_maintenance_job,
+            IntervalTrigger(minutes=5),
+            id='story_maintenance',
+            name='Story View Count Flush',
+            replace_existing=True
+        )
+        
+        # Spotlight impressions + expiry: every minute
+        scheduler.add_job(
+            scheduled_spotlight_maintenance_job,
+            IntervalTrigger(minutes=1),
+            id='spotlight_maintenance',
+            name='Spotlight Impressions Flush',
+            replace_existing=True
+        )
+        
+        # Buffered profile views -> profile_views: every minute
+        scheduler.add_job(
+            scheduled_profile_view_flush_job,
+            IntervalTrigger(minutes=1),
+            id='profile_view_flush',
+            name='Profile View Flush',
+            replace_existing=True
+        )
+        
+        # Gift counters -> virtual_gifts.times_sent: every minute
+        scheduler.add_job(
+            scheduled_gift_counter_rollup_job,
+            IntervalTrigger(minutes=1),
+            id='gift_counter_rollup',
+            name='Gift Counter Rollup',
+            replace_existing=True
+        )
+        
+        # AI usage accounting -> ai_usage_logs: every minute
+        scheduler.add_job(
+            scheduled_ai_usage_flush_job,
+            IntervalTrigger(minutes=1),
+            id='ai_usage_flush',
+            name='AI Usage Flush',
+            replace_existing=True
+        )
+        
+        # Client logs: flush every minute, retention daily at 3:45 AM UTC
+        scheduler.add_job(
+            scheduled_client_logs_flush_job,
+            IntervalTrigger(minutes=1),
+            id='client_logs_flush',
+            name='Client Logs Flush',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            scheduled_client_logs_cleanup_job,
+            CronTrigger(hour=3, minute=45),
+            id='client_logs_cleanup',
+            name='Client Logs Cleanup',
+            replace_existing=True
+        )
+        
+        # Conversation prompts for stalled chats: every 30 minutes
+        scheduler.add_job(
+            scheduled_stalled_prompts_job,
+            IntervalTrigger(minutes=30),
+            id='conversation_prompts_refresh',
+            name='Conversation Prompts Refresh',
+            replace_existing=True
+        )
+        
+        # GDPR export archives: hourly cleanup
+        scheduler.add_job(
+            scheduled_data_export_cleanup_job,
+            IntervalTrigger(hours=1),
+            id='data_export_cleanup',
+            name='Data Export Cleanup',
+            replace_existing=True
+        )
+        
+        # Admin report files: hourly cleanup
+        scheduler.add_job(
+            scheduled_report_cleanup_job,
+            IntervalTrigger(hours=1),
+            id='report_cleanup',
+            name='Report Cleanup',
+            replace_existing=True
+        )
+        
+        # Admin broadcasts: queued ones are picked up every minute
+        scheduler.add_job(
+            scheduled_broadcast_job,
+            IntervalTrigger(minutes=1),
+            id='broadcast_delivery',
+            name='Broadcast Delivery',
+            replace_existing=True
+        )
+        
+        # Profile snapshots in Redis: daily warm-up at 5:15 AM UTC
+        scheduler.add_job(
+            scheduled_profile_snapshot_warmup_job,
+            CronTrigger(hour=5, minute=15),
+            id='profile_snapshot_warmup',
+            name='Profile Snapshot Warm-up',
+            replace_existing=True
+        )
+        
+        # Fraud scores: incremental every 15 minutes, full pass daily at 4:30 AM UTC
+        scheduler.add_job(
+            scheduled_fraud_rescore_job,
+            IntervalTrigger(minutes=15),
+            id='fraud_rescore',
+            name='Fraud Incremental Rescore',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            scheduled_fraud_full_recalc_job,
+            CronTrigger(hour=4, minute=30),
+            id='fraud_full_recalc',
+            name='Fraud Full Recalculation',
+            replace_existing=True
+        )
+        
         logger.info("Scheduled jobs configured successfully")
         return True
         
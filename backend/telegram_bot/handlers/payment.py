@@ -14,7 +14,12 @@ from backend.models.user import User
 from backend.telegram_bot import texts
 from backend.services.gifts import deliver_gift
 from backend.services.monetization import buy_subscription_with_stars
+from backend.services.profile_cards import refresh_profile_cards
+from backend.services import star_ledger
 from backend.services.chat import manager
+from backend.services import payment_events
+from backend.services.payment_events import EventContext, payment_handler
+from backend.services.telegram_sender import telegram_sender
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -80,131 +85,176 @@ async def handle_pre_checkout(pre_checkout_query: types.PreCheckoutQuery):
 @router.message(F.successful_payment)
 async def handle_successful_payment(message: types.Message):
     """
-    Handle successful payment - update user balance and transaction status.
-    Called after Telegram has processed the payment.
+    Handle successful payment: journal it and return.
+    Balance and transaction updates are applied by the payment event worker
+    (apply_successful_payment), so Telegram retries cannot credit twice.
     """
     payment = message.successful_payment
-    payload = payment.invoice_payload  # Our transaction_id
     telegram_payment_id = payment.telegram_payment_charge_id
     telegram_user_id = message.from_user.id
-    amount = payment.total_amount  # Amount in Stars (XTR)
     
     logger.info(f"Successful payment received from user {telegram_user_id}")
     
     try:
-        transaction_id = UUID(payload)
-        
         async with async_session_maker() as db:
-            # 0. Idempotency Check (Charge ID)
-            stmt = select(RevenueTransaction).where(RevenueTransaction.gateway_transaction_id == telegram_payment_id)
-            existing_tx = (await db.execute(stmt)).scalars().first()
-            
-            if existing_tx:
-                logger.warning(f"Payment already processed (charge_id={telegram_payment_id})")
-                await message.answer(texts.TRANSACTION_EXISTS)
-                return
-
-            # 1. Find pending transaction
-            transaction = await db.get(RevenueTransaction, transaction_id)
-            
-            if not transaction:
-                logger.error(f"Payment processing: Transaction not found: {payload}")
-                await message.answer(texts.PAYMENT_ERROR)
-                return
-            
-            if transaction.status == "completed":
-                # Still send confirmation to user logic could go here
-                return
-            
-            # 2. Update transaction status
-            transaction.status = "completed"
-            transaction.gateway_transaction_id = telegram_payment_id
-            transaction.telegram_charge_id = telegram_payment_id
-            transaction.completed_at = datetime.utcnow()
-            transaction.custom_metadata = {
-                **(transaction.custom_metadata or {}),
-                "telegram_user_id": str(telegram_user_id),
-                "telegram_charge_id": telegram_payment_id
-            }
-            
-            # 3. Update user balance
-            user = await db.get(User, transaction.user_id)
-            if not user:
-                logger.error(f"User not found for transaction: {transaction.user_id}")
-                return
-
-            # Security Check
-            if user.telegram_id and str(user.telegram_id) != str(telegram_user_id):
-                logger.critical(f"SECURITY ALERT: Telegram ID mismatch for tx {transaction.id}")
-                await message.answer(texts.SECURITY_ERROR)
-                return
-
-            # Process specific payment types
-            await process_payment_type(db, user, transaction, amount, message)
-            
-            await db.commit()
-            
-            # Notify frontend
-            await notify_frontend(transaction.user_id, user.stars_balance)
-
-            # Send confirmation
-            await message.answer(
-                texts.PAYMENT_SUCCESS.format(amount=amount, balance=user.stars_balance),
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
+            created = await payment_events.record(db, "telegram", telegram_payment_id, "successful_payment", {
+                "invoice_payload": payment.invoice_payload,  # Our transaction_id
+                "telegram_payment_charge_id": telegram_payment_id,
+                "telegram_user_id": telegram_user_id,
+                "chat_id": message.chat.id,
+                "total_amount": payment.total_amount,  # Amount in Stars (XTR)
+                "currency": payment.currency,
+            })
+        if not created:
+            logger.warning(f"Payment already processed (charge_id={telegram_payment_id})")
+            await message.answer(texts.TRANSACTION_EXISTS)
     except Exception as e:
-        logger.error(f"Payment processing error: {e}")
+        logger.error(f"Payment journal error: {e}")
         await message.answer(texts.PAYMENT_ERROR)
 
 
-async def process_payment_type(db, user, transaction, amount, message):
+@payment_handler("telegram", "successful_payment")
+async def apply_successful_payment(ctx: EventContext):
+    """Update transaction status and user balance for a journaled Stars payment."""
+    db, data = ctx.db, ctx.data
+    telegram_payment_id = data["telegram_payment_charge_id"]
+    telegram_user_id = data["telegram_user_id"]
+    amount = data["total_amount"]
+
+    def reply(text, parse_mode=None):
+        ctx.defer(telegram_sender.send_message, data["chat_id"], text, parse_mode=parse_mode)
+
+    try:
+        transaction_id = UUID(data["invoice_payload"])
+    except ValueError:
+        logger.error("Payment processing: invalid invoice payload")
+        reply(texts.PAYMENT_ERROR)
+        ctx.result = "invalid_payload"
+        return
+
+    # 0. Idempotency Check (Charge ID)
+    stmt = select(RevenueTransaction).where(RevenueTransaction.gateway_transaction_id == telegram_payment_id)
+    existing_tx = (await db.execute(stmt)).scalars().first()
+    
+    if existing_tx:
+        logger.warning(f"Payment already processed (charge_id={telegram_payment_id})")
+        reply(texts.TRANSACTION_EXISTS)
+        ctx.result = "duplicate_charge"
+        return
+
+    # 1. Find pending transaction
+    transaction = await db.get(RevenueTransaction, transaction_id)
+    
+    if not transaction:
+        logger.error(f"Payment processing: Transaction not found: {transaction_id}")
+        reply(texts.PAYMENT_ERROR)
+        ctx.result = "transaction_not_found"
+        return
+    
+    if transaction.status == "completed":
+        ctx.result = "already_completed"
+        return
+    
+    # 2. Check the user before touching anything
+    user = await db.get(User, transaction.user_id)
+    if not user:
+        logger.error(f"User not found for transaction: {transaction.user_id}")
+        ctx.result = "user_not_found"
+        return
+
+    # Security Check
+    if user.telegram_id and str(user.telegram_id) != str(telegram_user_id):
+        logger.critical(f"SECURITY ALERT: Telegram ID mismatch for tx {transaction.id}")
+        reply(texts.SECURITY_ERROR)
+        ctx.result = "telegram_id_mismatch"
+        return
+
+    # 3. Update transaction status
+    transaction.status = "completed"
+    transaction.gateway_transaction_id = telegram_payment_id
+    transaction.telegram_charge_id = telegram_payment_id
+    transaction.completed_at = datetime.utcnow()
+    transaction.custom_metadata = {
+        **(transaction.custom_metadata or {}),
+        "telegram_user_id": str(telegram_user_id),
+        "telegram_charge_id": telegram_payment_id
+    }
+
+    # 4. Process specific payment types (balance, gift, subscription)
+    await process_payment_type(db, user, transaction, amount, reply, ctx.defer)
+    ctx.result = transaction.transaction_type
+
+    if transaction.transaction_type == "subscription":
+        ctx.defer(_refresh_cards, user.id)
+    
+    # Notify frontend
+    ctx.defer(notify_frontend, transaction.user_id, user.stars_balance)
+
+    # Send confirmation
+    reply(
+        texts.PAYMENT_SUCCESS.format(amount=amount, balance=user.stars_balance),
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+async def _refresh_cards(user_id):
+    async with async_session_maker() as db:
+        await refresh_profile_cards(db, [user_id])
+
+
+async def process_payment_type(db, user, transaction, amount, reply, defer):
     """Delegate payment processing based on type"""
     tx_type = transaction.transaction_type
     
     if tx_type == "gift_purchase":
-        await process_gift_purchase(db, user, transaction, amount, message)
+        await process_gift_purchase(db, user, transaction, amount, reply, defer)
     elif tx_type == "subscription":
-        await process_subscription_purchase(db, user, transaction, amount, message)
+        await process_subscription_purchase(db, user, transaction, amount, reply)
     else:
         # Default Top Up
-        user.stars_balance = (user.stars_balance or Decimal("0")) + Decimal(str(amount))
+        await star_ledger.credit(db, user.id, amount, "top_up", reference_id=transaction.id)
 
-async def process_gift_purchase(db, user, transaction, amount, message):
+async def process_gift_purchase(db, user, transaction, amount, reply, defer):
     meta = transaction.custom_metadata or {}
     try:
-        await deliver_gift(
-            db=db,
-            sender_id=user.id,
-            receiver_id=uuid.UUID(meta.get("receiver_id")),
-            gift_id=uuid.UUID(meta.get("gift_id")),
-            message=meta.get("message"),
-            is_anonymous=meta.get("is_anonymous", False),
-            price_paid=float(amount),
-            payment_transaction_id=transaction.id
-        )
-        await message.answer(texts.GIFT_SENT)
+        # Savepoint: a failed delivery leaves nothing behind, so the refund
+        # below can never be committed next to a delivered gift
+        async with db.begin_nested():
+            _, notify = await deliver_gift(
+                db=db,
+                sender_id=user.id,
+                receiver_id=uuid.UUID(meta.get("receiver_id")),
+                gift_id=uuid.UUID(meta.get("gift_id")),
+                message=meta.get("message"),
+                is_anonymous=meta.get("is_anonymous", False),
+                price_paid=float(amount),
+                payment_transaction_id=transaction.id,
+                commit=False,
+            )
     except Exception as e:
         logger.error(f"Gift delivery failed: {e}")
         # Fallback: Add to balance
-        user.stars_balance = (user.stars_balance or Decimal("0")) + Decimal(str(amount))
-        await message.answer("⚠️ Payment successful but gift delivery failed. Stars added to balance.")
+        await star_ledger.credit(db, user.id, amount, "refund", reference_id=transaction.id,
+                                 metadata={"gift_delivery_failed": str(e)})
+        reply("⚠️ Payment successful but gift delivery failed. Stars added to balance.")
+        return
+    defer(notify)
+    reply(texts.GIFT_SENT)
 
-async def process_subscription_purchase(db, user, transaction, amount, message):
+async def process_subscription_purchase(db, user, transaction, amount, reply):
     # 1. Зачисляем Stars на баланс
-    user.stars_balance = (user.stars_balance or Decimal("0")) + Decimal(str(amount))
+    await star_ledger.credit(db, user.id, amount, "top_up", reference_id=transaction.id)
     
-    # 2. Flush чтобы buy_subscription_with_stars увидел обновлённый баланс
-    await db.flush()
+    # 2. Зачисление уже в БД (UPDATE ... RETURNING) — buy_subscription_with_stars его видит
     
     # 3. Активируем подписку (списание из баланса внутри функции)
     tier = transaction.custom_metadata.get("plan_tier")
     if tier:
         res = await buy_subscription_with_stars(db, user.id, tier)
         if res.get("success"):
-             await message.answer(f"✅ Subscription activated: {res.get('plan')}")
+             reply(f"✅ Subscription activated: {res.get('plan')}")
         else:
-             await message.answer(f"💰 Balance topped up. Auto-activation failed: {res.get('error')}")
+             reply(f"💰 Balance topped up. Auto-activation failed: {res.get('error')}")
 
 async def notify_frontend(user_id, new_balance):
     try:
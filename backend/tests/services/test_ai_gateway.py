@@ -0,0 +1,75 @@
+"""Tests for the AI gateway: cache, single-flight, limits, usage accounting."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from backend.services.ai import gateway
+from backend.services.ai.gateway import AIGateway, SimulationProvider
+
+
+@pytest.fixture(autouse=True)
+def no_redis():
+    with patch.object(gateway.redis_manager, "get_redis", AsyncMock(return_value=None)), \
+         patch.object(gateway.redis_manager, "get_json", AsyncMock(return_value=None)), \
+         patch.object(gateway.redis_manager, "set_json", AsyncMock()):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_prompts_make_one_call():
+    provider = SimulationProvider(delay=0.05)
+    ai = AIGateway(provider)
+
+    results = await asyncio.gather(*(ai.complete("same prompt", feature="icebreaker") for _ in range(5)))
+
+    assert provider.calls == 1
+    assert {text for text, _ in results} == {"same prompt"}
+    assert sum(1 for _, usage in results if not usage["cached"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_and_ttl_zero_bypass():
+    provider = SimulationProvider(delay=0)
+    ai = AIGateway(provider)
+
+    await ai.complete("hello", feature="question")
+    text, usage = await ai.complete("hello", feature="question")
+    assert provider.calls == 1 and usage["cached"] is True and text == "hello"
+
+    await ai.complete("hello", feature="question", ttl=0)
+    assert provider.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_failure_is_shared_and_not_cached():
+    provider = SimulationProvider(delay=0)
+    provider._complete = AsyncMock(side_effect=RuntimeError("upstream down"))
+    ai = AIGateway(provider)
+
+    with pytest.raises(RuntimeError):
+        await ai.complete("p", feature="bio")
+    assert ai._inflight == {} and ai._local == {}
+
+
+@pytest.mark.asyncio
+async def test_timeout_applies_per_provider():
+    ai = AIGateway(SimulationProvider(delay=1, timeout=0.01))
+    with pytest.raises(asyncio.TimeoutError):
+        await ai.complete("slow", feature="bio")
+
+
+@pytest.mark.asyncio
+async def test_usage_is_buffered_and_flushed_in_one_insert():
+    ai = AIGateway(SimulationProvider(delay=0))
+    await ai.complete("a", feature="bio", user_id="u1")
+    await ai.complete("b", feature="bio", user_id="u1")
+    await ai.complete("a", feature="bio", user_id="u1")   # cache hit: not billed
+    db = AsyncMock()
+
+    assert await ai.flush_usage(db) == 2
+
+    db.execute.assert_awaited_once()
+    rows = db.execute.await_args.args[1]
+    assert [row["user_id"] for row in rows] == ["u1", "u1"]
+    db.commit.assert_awaited_once()
+    assert await ai.flush_usage(db) == 0
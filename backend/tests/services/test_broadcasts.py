@@ -0,0 +1,100 @@
+"""Tests for the persisted, chunked admin broadcast."""
+import uuid
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import broadcasts
+from backend.services.telegram_sender import telegram_sender
+
+
+def _factory(broadcast, chunks):
+    """Session factory: db.get returns the broadcast, each recipients query the next chunk."""
+    queries = []
+
+    async def execute(stmt):
+        queries.append(stmt)
+        result = MagicMock()
+        result.all.return_value = chunks.pop(0) if chunks else []
+        return result
+
+    db = AsyncMock()
+    db.get = AsyncMock(return_value=broadcast)
+    db.execute = AsyncMock(side_effect=execute)
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    return factory, queries
+
+
+def _broadcast(cursor=None, channels=("telegram",)):
+    return SimpleNamespace(id=uuid.uuid4(), title="<News>", message="Hi", channels=list(channels), cursor=cursor)
+
+
+def _rows(n):
+    return sorted(((uuid.uuid4(), str(1000 + i)) for i in range(n)), key=lambda r: r[0])
+
+
+@pytest.mark.asyncio
+async def test_broadcast_is_sent_in_chunks_and_checkpointed():
+    chunks = [_rows(3), _rows(2)]
+    last_ids = [chunks[0][-1][0], chunks[1][-1][0]]
+    broadcast = _broadcast()
+    factory, _ = _factory(broadcast, chunks)
+    updates = []
+    send = AsyncMock(side_effect=[True, False, True, True, True])
+
+    with patch.object(broadcasts, "_claim", AsyncMock(return_value=datetime(2026, 1, 1))), \
+         patch.object(broadcasts, "_update", AsyncMock(side_effect=lambda f, b, owner, **v: updates.append(v) or True)), \
+         patch.object(telegram_sender, "send_message", send):
+        await broadcasts.run_broadcast(broadcast.id, session_factory=factory)
+
+    assert send.await_count == 5
+    assert send.await_args.args[1] == "<b>&lt;News&gt;</b>\nHi"
+    assert [u.get("cursor") for u in updates[:2]] == last_ids
+    assert updates[-1]["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_restarted_broadcast_resumes_after_cursor():
+    cursor = uuid.uuid4()
+    broadcast = _broadcast(cursor=cursor)
+    factory, queries = _factory(broadcast, [])
+
+    with patch.object(broadcasts, "_claim", AsyncMock(return_value=datetime(2026, 1, 1))), \
+         patch.object(broadcasts, "_update", AsyncMock(return_value=True)):
+        await broadcasts.run_broadcast(broadcast.id, session_factory=factory)
+
+    sql = queries[0].compile()
+    assert "users.id >" in str(sql) and cursor in sql.params.values()
+    assert sql.params["param_1"] == broadcasts.BROADCAST_CHUNK
+
+
+@pytest.mark.asyncio
+async def test_worker_stops_when_broadcast_was_taken_over():
+    broadcast = _broadcast()
+    factory, _ = _factory(broadcast, [_rows(2), _rows(2)])
+    send = AsyncMock(return_value=True)
+
+    with patch.object(broadcasts, "_claim", AsyncMock(return_value=datetime(2026, 1, 1))), \
+         patch.object(broadcasts, "_update", AsyncMock(return_value=False)) as update, \
+         patch.object(telegram_sender, "send_message", send):
+        await broadcasts.run_broadcast(broadcast.id, session_factory=factory)
+
+    assert send.await_count == 2
+    update.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_claimed_broadcast_is_not_run_twice():
+    factory, queries = _factory(_broadcast(), [])
+    with patch.object(broadcasts, "_claim", AsyncMock(return_value=None)):
+        await broadcasts.run_broadcast(uuid.uuid4(), session_factory=factory)
+    assert queries == []
+
+
+def test_stale_running_broadcast_is_claimable():
+    sql = str(broadcasts._claimable(datetime.utcnow()).compile())
+    assert "broadcasts.status = :status_1" in sql
+    assert "coalesce(broadcasts.heartbeat_at, broadcasts.started_at) <" in sql
@@ -0,0 +1,147 @@
+"""Tests for client log ingestion: rate limit, sampling, signatures, batched persistence."""
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import client_logs as cl
+from backend.services.client_logs import ClientLogCollector, signature
+
+
+def _entries(n, level="error", message="TypeError: x is undefined"):
+    return [{"level": level, "message": message, "url": "https://app/profile?id=1"} for _ in range(n)]
+
+
+@pytest.fixture
+def no_redis():
+    with patch.object(cl.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        yield
+
+
+def test_signature_ignores_ids_numbers_and_query():
+    a = signature("ERROR", "Failed to load user 123e4567-e89b-12d3-a456-426614174000 (status 404)", "https://app/chat/1?x=1")
+    b = signature("ERROR", "Failed to load user 9f1c2d3e-0000-4000-8000-000000000000 (status 500)", "https://app/chat/1?x=2")
+    assert a == b
+    assert a != signature("WARN", "Failed to load user 1 (status 404)", "https://app/chat/1")
+    assert a != signature("ERROR", "Failed to load user 1 (status 404)", "https://app/feed")
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_drops_entries_over_the_window(no_redis):
+    collector = ClientLogCollector()
+    with patch.object(cl, "RATE_LIMIT", 60):
+        assert await collector.ingest(_entries(50), ip="1.1.1.1") == 50
+        assert await collector.ingest(_entries(50), ip="1.1.1.1") == 10
+        assert await collector.ingest(_entries(5), ip="1.1.1.1") == 0
+        assert await collector.ingest(_entries(5), ip="2.2.2.2") == 5    # separate source
+
+
+@pytest.mark.asyncio
+async def test_info_is_sampled_errors_are_kept(no_redis):
+    collector = ClientLogCollector(sample_rate=0)
+    entries = _entries(3, level="log") + _entries(2, level="warn") + _entries(1)
+    assert await collector.ingest(entries, ip="1.1.1.1") == 3
+
+    logs, total = await collector.recent(limit=2)
+    assert total == 3 and [rec["level"] for rec in logs] == ["WARN", "ERROR"]
+    assert (await collector.recent(level="error"))[1] == 1
+
+
+@pytest.mark.asyncio
+async def test_one_summary_log_line_per_request(no_redis):
+    collector = ClientLogCollector()
+    with patch.object(cl, "logger") as logger:
+        await collector.ingest(_entries(20), ip="1.1.1.1")
+    logger.warning.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_redis_buffer_is_one_pipeline():
+    collector = ClientLogCollector()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=[[True, 3], [None] * 5])
+    r = MagicMock()
+    r.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    r.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch.object(cl.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        assert await collector.ingest(_entries(3), ip="1.1.1.1", user_id="u1") == 3
+
+    pipe.incrby.assert_called_once_with(cl.RATE_KEY.format("u1"), 3)
+    assert pipe.xadd.call_count == 3
+    assert pipe.xadd.call_args.kwargs == {"maxlen": cl.STREAM_MAXLEN, "approximate": True}
+    pushed = pipe.rpush.call_args.args
+    assert pushed[0] == cl.PENDING_KEY and json.loads(pushed[1])["user_id"] == "u1"
+
+
+@pytest.mark.asyncio
+async def test_flush_upserts_one_row_per_signature(no_redis):
+    collector = ClientLogCollector()
+    await collector.ingest(_entries(4) + _entries(2, message="Network error 502"), ip="1.1.1.1")
+    db = MagicMock()
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+
+    assert await collector.flush(db) == 6
+    params = db.execute.call_args.args[0].compile().params
+    counts = sorted(value for key, value in params.items() if key.startswith("count"))
+    assert counts == [2, 4]
+    db.commit.assert_awaited_once()
+    assert await collector.flush(db) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_entries(no_redis):
+    collector = ClientLogCollector()
+    await collector.ingest(_entries(2), ip="1.1.1.1")
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=RuntimeError("db down"))
+    db.rollback = AsyncMock()
+
+    assert await collector.flush(db) == 0
+    assert len(collector._pending) == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_levels_are_dropped_and_ip_is_clipped(no_redis):
+    collector = ClientLogCollector()
+    entries = _entries(1, level="verbose-debug-trace") + _entries(1)
+    assert await collector.ingest(entries, ip="1" * 200) == 1
+
+    logs, _ = await collector.recent()
+    assert logs[0]["level"] == "ERROR" and len(logs[0]["ip"]) == 64
+
+
+@pytest.mark.asyncio
+async def test_flush_splits_upsert_into_chunks(no_redis):
+    collector = ClientLogCollector()
+    for i in range(5):
+        await collector.ingest(_entries(1, message=f"Error in {chr(97 + i)}"), ip="1.1.1.1")
+    db = MagicMock()
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+
+    with patch.object(cl, "FLUSH_CHUNK", 2):
+        assert await collector.flush(db) == 5
+    assert db.execute.await_count == 3
+    db.commit.assert_awaited_once()
+
+
+def test_client_ip_uses_trusted_proxy_hop():
+    from types import SimpleNamespace
+    from backend.api.client_logs import _client_ip
+
+    def request(xff=None):
+        return SimpleNamespace(client=SimpleNamespace(host="10.0.0.1"), headers={"x-forwarded-for": xff} if xff else {})
+
+    assert _client_ip(request("6.6.6.6, 203.0.113.7")) == "203.0.113.7"   # spoofed first hop ignored
+    assert _client_ip(request()) == "10.0.0.1"
+
+
+def test_reading_and_clearing_the_buffer_requires_admin():
+    from backend import auth
+    from backend.api.client_logs import router
+
+    for route in router.routes:
+        if route.path.startswith("/api/client-logs") and not route.methods & {"POST"}:
+            deps = [d.call for d in route.dependant.dependencies]
+            assert auth.get_current_admin in deps, f"{route.methods} {route.path}"
@@ -0,0 +1,125 @@
+"""Tests for the co-like recommendation index."""
+import math
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.ai import co_like
+from backend.services.ai.co_like import LikeGraph, CO_KEY, DEGREE_KEY, LIKED_KEY
+
+
+def _redis(pipeline_results=None, lrange=None, hmget=None):
+    r = AsyncMock()
+    r.lrange = AsyncMock(return_value=lrange or [])
+    r.hmget = AsyncMock(side_effect=lambda key, fields: [hmget.get(f) for f in fields])
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=pipeline_results or [])
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    r.pipeline = MagicMock(return_value=ctx)
+    return r, pipe
+
+
+def test_co_likes_is_row_of_transpose_product():
+    a, b, c, u1, u2, u3 = (uuid.uuid4() for _ in range(6))
+    graph = LikeGraph()
+    for liker, liked in [(u1, a), (u1, b), (u2, a), (u2, b), (u3, a), (u3, c)]:
+        graph.add(liker, liked)
+
+    row = {graph.ids[j]: n for j, n in graph.co_likes(graph.index[a])}
+
+    assert row == {b: 2, c: 1}
+    assert graph.popular(1) == [a]
+
+
+def test_rows_are_capped_to_most_recent(monkeypatch):
+    monkeypatch.setattr(co_like, "MAX_LIKES_PER_USER", 2)
+    me = uuid.uuid4()
+    graph = LikeGraph()
+    liked = [uuid.uuid4() for _ in range(3)]
+    for target in liked:
+        graph.add(me, target)
+    assert [graph.ids[i] for i in graph.likes[graph.index[me]]] == liked[:2]
+
+
+@pytest.mark.asyncio
+async def test_capped_column_leaves_no_empty_like_list(monkeypatch):
+    monkeypatch.setattr(co_like, "MAX_LIKERS_PER_ITEM", 1)
+    star, first, late = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    graph = LikeGraph()
+    graph.add(first, star)
+    graph.add(late, star)       # column is full: the edge is dropped
+    assert graph.index[late] not in graph.likes
+
+    r, pipe = _redis()
+    with patch.object(co_like.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        await co_like.store_graph(graph)
+    assert all(c.args[1:] for c in pipe.rpush.call_args_list)
+    assert [c.args[0] for c in pipe.rpush.call_args_list] == [LIKED_KEY.format(first)]
+
+
+@pytest.mark.asyncio
+async def test_graph_build_and_counting_run_in_worker_thread():
+    a, b, u1, u2 = (uuid.uuid4() for _ in range(4))
+    result = MagicMock()
+
+    async def partitions(size):
+        yield [(u1, a), (u1, b), (u2, a), (u2, b)]
+
+    result.partitions = partitions
+    db = AsyncMock()
+    db.stream = AsyncMock(return_value=result)
+    offloaded = []
+    real_to_thread = co_like.asyncio.to_thread
+
+    async def to_thread(fn, *args):
+        offloaded.append(fn.__name__)
+        return await real_to_thread(fn, *args)
+
+    r, pipe = _redis()
+    with patch.object(co_like.asyncio, "to_thread", to_thread), \
+         patch.object(co_like.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        graph = await co_like.build_like_graph(db)
+        assert await co_like.store_graph(graph) == 2
+
+    assert offloaded == ["add_many", "co_like_rows"]
+    zadds = {c.args[0]: c.args[1] for c in pipe.zadd.call_args_list}
+    assert zadds[CO_KEY.format(a)] == {str(b): 2}
+    pipe.hset.assert_any_call(DEGREE_KEY, str(a), 2)
+
+
+@pytest.mark.asyncio
+async def test_recommend_batch_cosine_over_likers():
+    r, _ = _redis(
+        pipeline_results=[[("b", 2.0), ("c", 1.0), ("seen", 3.0)]],
+        hmget={"a": "4", "b": "2", "c": "1", "seen": "1"},
+    )
+
+    with patch.object(co_like.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        recs = await co_like.recommend_batch({"me": ["a"]}, k=5, exclude={"me": {"seen"}})
+
+    assert [uid for uid, _ in recs["me"]] == ["b", "c"]
+    assert recs["me"][0][1] == pytest.approx(2 / math.sqrt(4 * 2))
+
+
+@pytest.mark.asyncio
+async def test_record_like_links_new_like_with_recent_ones():
+    me, new, old = "me", "new", "old"
+    r, pipe = _redis(lrange=[old, new])
+
+    with patch.object(co_like.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        await co_like.record_like(me, new)
+
+    incr = [c.args for c in pipe.zincrby.call_args_list]
+    assert incr == [(CO_KEY.format(new), 1, old), (CO_KEY.format(old), 1, new)]
+    pipe.hincrby.assert_called_once_with(DEGREE_KEY, new, 1)
+    pipe.lpush.assert_called_once_with(LIKED_KEY.format(me), new)
+    pipe.zremrangebyrank.assert_any_call(CO_KEY.format(new), 0, -(co_like.MAX_NEIGHBOURS + 1))
+
+
+@pytest.mark.asyncio
+async def test_recommend_without_redis_is_empty():
+    with patch.object(co_like.redis_manager, "get_redis", AsyncMock(return_value=None)), \
+         patch.object(co_like, "recent_likes", AsyncMock(return_value=["a"])):
+        assert await co_like.recommend(uuid.uuid4()) == []
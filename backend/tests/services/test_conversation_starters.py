@@ -0,0 +1,139 @@
+"""Tests for pre-generated icebreakers and conversation prompts."""
+import uuid
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.ai import conversation_starters as cs
+from backend.services.ai.conversation_starters import ICEBREAKERS_KEY, PROMPTS_KEY
+
+
+def _redis(pipeline_results=None):
+    r = AsyncMock()
+    r.set = AsyncMock(return_value=True)
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=pipeline_results or [])
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    r.pipeline = MagicMock(return_value=ctx)
+    return r, pipe
+
+
+def _session_factory(db):
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=db)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=ctx)
+
+
+@pytest.mark.asyncio
+async def test_serves_head_of_inventory_without_refill():
+    r, pipe = _redis([["a", "b", "c"], 9])
+
+    with patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch.object(cs, "_spawn") as spawn:
+        assert await cs.get_icebreakers("m1") == ["a", "b", "c"]
+
+    pipe.ltrim.assert_not_called()
+    spawn.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_refresh_drops_served_batch_and_refills_when_low():
+    r, pipe = _redis([True, ["d", "e", "f"], 3])
+
+    with patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch.object(cs, "_spawn") as spawn:
+        assert await cs.get_icebreakers("m1", refresh=True) == ["d", "e", "f"]
+
+    pipe.ltrim.assert_called_once_with(ICEBREAKERS_KEY.format("m1"), cs.SERVE_COUNT, -1)
+    spawn.assert_called_once()
+    spawn.call_args.args[0].close()
+
+
+@pytest.mark.asyncio
+async def test_empty_inventory_is_a_miss():
+    r, _ = _redis([[], 0])
+
+    with patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch.object(cs, "_spawn") as spawn:
+        assert await cs.get_icebreakers("m1") is None
+    spawn.call_args.args[0].close()
+
+
+@pytest.mark.asyncio
+async def test_prepare_stores_generated_inventory():
+    match = SimpleNamespace(id=uuid.uuid4(), user1_id=uuid.uuid4(), user2_id=uuid.uuid4())
+    db = AsyncMock()
+    db.get = AsyncMock(return_value=match)
+    cards = {
+        str(match.user1_id): {"name": "A", "age": 25, "interests": ["music"], "bio": ""},
+        str(match.user2_id): {"name": "B", "age": 27, "interests": ["music"], "bio": ""},
+    }
+    suggestions = [f"icebreaker {i}" for i in range(cs.INVENTORY_SIZE)]
+    ai = SimpleNamespace(generate_content=AsyncMock(return_value=(suggestions, {})))
+    r, pipe = _redis()
+
+    with patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch("backend.services.profile_cards.get_profile_cards", AsyncMock(return_value=cards)), \
+         patch("backend.services.ai.ai_service", ai):
+        stored = await cs.prepare_icebreakers(match.id, session_factory=_session_factory(db))
+
+    assert stored == cs.INVENTORY_SIZE
+    assert ai.generate_content.await_args.kwargs["cache"] is False
+    key = ICEBREAKERS_KEY.format(match.id)
+    pipe.rpush.assert_called_once_with(key, *suggestions)
+    pipe.expire.assert_called_once_with(key, cs.INVENTORY_TTL)
+    r.delete.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_prepare_skips_when_generation_in_progress():
+    r, pipe = _redis()
+    r.set = AsyncMock(return_value=None)
+
+    with patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        assert await cs.prepare_icebreakers("m1", session_factory=MagicMock()) == 0
+    pipe.rpush.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stalled_prompts_skip_chats_with_prompts():
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[("m1",), ("m2",)])))
+    r = AsyncMock()
+    r.mget = AsyncMock(return_value=['["existing"]', None])
+    ai = SimpleNamespace(generate_conversation_prompts=AsyncMock(return_value=["p1", "p2", "p3"]))
+    set_json = AsyncMock()
+
+    with patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch.object(cs.redis_manager, "set_json", set_json), \
+         patch("backend.services.ai.ai_service", ai):
+        generated = await cs.refresh_stalled_prompts(session_factory=_session_factory(db))
+
+    assert generated == 1
+    ai.generate_conversation_prompts.assert_awaited_once()
+    assert ai.generate_conversation_prompts.await_args.args[0] == "m2"
+    set_json.assert_awaited_once_with(PROMPTS_KEY.format("m2"), ["p1", "p2", "p3"], expire=cs.PROMPTS_TTL)
+
+
+@pytest.mark.asyncio
+async def test_stalled_prompts_page_past_prompted_chats():
+    pages = [[("m1",), ("m2",)], [("m3",)]]
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[MagicMock(all=MagicMock(return_value=p)) for p in pages])
+    r = AsyncMock()
+    r.mget = AsyncMock(side_effect=[['["a"]', '["b"]'], [None]])
+    ai = SimpleNamespace(generate_conversation_prompts=AsyncMock(return_value=["p1"]))
+
+    with patch.object(cs, "STALLED_BATCH", 2), \
+         patch.object(cs.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch.object(cs.redis_manager, "set_json", AsyncMock()), \
+         patch("backend.services.ai.ai_service", ai):
+        assert await cs.refresh_stalled_prompts(session_factory=_session_factory(db)) == 1
+
+    assert ai.generate_conversation_prompts.await_args.args[0] == "m3"
+    first, second = (str(call.args[0]) for call in db.execute.await_args_list)
+    assert "WHERE messages.created_at >=" in first
+    assert "messages.match_id >" in second
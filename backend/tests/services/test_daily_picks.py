@@ -0,0 +1,94 @@
+"""Tests for the offline daily picks batch."""
+import json
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.ai import daily_picks
+from backend.services.ai.daily_picks import LikeGraph, rank_picks, PICKS_KEY
+
+
+def _card(user_id, gender="female", interests=("music",), is_active=True):
+    return {
+        "id": str(user_id), "name": "Anna", "age": 25, "gender": gender, "photos": [],
+        "interests": list(interests), "height": None, "smoking": None, "drinking": None,
+        "education": None, "looking_for": None, "is_active": is_active,
+    }
+
+
+def test_rank_picks_skips_seen_inactive_and_falls_back_to_popular():
+    me, seen, inactive, good, popular_man = (uuid.uuid4() for _ in range(5))
+    cards = {
+        str(me): _card(me, gender="male"),
+        str(seen): _card(seen),
+        str(inactive): _card(inactive, is_active=False),
+        str(good): _card(good),
+        str(popular_man): _card(popular_man, gender="male"),
+    }
+
+    candidates = [(str(seen), 3.0), (str(inactive), 2.0), (str(good), 1.0)]
+    picks = rank_picks(cards[str(me)], candidates, [], cards, {str(seen)})
+    assert [p["id"] for p in picks] == [str(good)]
+    assert picks[0]["common_interests"] == ["music"]
+
+    fallback = rank_picks(cards[str(me)], [], [popular_man, good], cards, set())
+    assert [p["id"] for p in fallback] == [str(good)]
+
+
+@pytest.mark.asyncio
+async def test_chunk_writes_picks_to_serving_key():
+    me, twin, liked, target = (uuid.uuid4() for _ in range(4))
+    graph = LikeGraph()
+    graph.add(me, liked)
+    graph.add(twin, liked)
+    graph.add(twin, target)
+
+    swiped = MagicMock()
+    swiped.all.return_value = [(me, liked)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=swiped)
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    cards = {str(u): _card(u) for u in (me, twin, liked, target)}
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    r = MagicMock()
+    r.pipeline = MagicMock(return_value=ctx)
+
+    recommended = {str(me): [(str(target), 0.5), (str(liked), 0.4)]}
+
+    with patch("backend.services.profile_cards.get_profile_cards", AsyncMock(return_value=cards)), \
+         patch.object(daily_picks, "recommend_batch", AsyncMock(return_value=recommended)) as rec, \
+         patch.object(daily_picks.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        done = await daily_picks._build_chunk(factory, graph, [], [me], "2026-10-18")
+
+    assert done == [me]
+    assert rec.await_args.args[0] == {str(me): [str(liked)]}   # row of the like matrix
+    db.execute.assert_awaited_once()   # one query for already-swiped pairs
+    key, payload = pipe.set.call_args.args
+    assert key == PICKS_KEY.format(me, "2026-10-18")
+    assert [p["id"] for p in json.loads(payload)] == [str(target)]
+
+
+@pytest.mark.asyncio
+async def test_batch_continues_when_index_rebuild_fails():
+    me = uuid.uuid4()
+    users = MagicMock()
+    users.all.return_value = [(me,)]
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=users)
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch.object(daily_picks.redis_manager, "get_redis", AsyncMock(return_value=MagicMock())), \
+         patch.object(daily_picks, "build_like_graph", AsyncMock(return_value=LikeGraph())), \
+         patch.object(daily_picks, "store_graph", AsyncMock(side_effect=RuntimeError("redis down"))), \
+         patch.object(daily_picks, "_build_chunk", AsyncMock(return_value=[me])) as chunk:
+        assert await daily_picks.generate_all_daily_picks(factory) == [me]
+    chunk.assert_awaited_once()
@@ -0,0 +1,220 @@
+"""Tests for the streaming GDPR data export."""
+import gzip
+import io
+import json
+import os
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import data_export
+from backend.services.backup.targets import FilesystemTarget, S3Target
+from backend.services.data_export import ExportRateLimited, EXPORT_BATCH
+
+
+class _Row(dict):
+    def _asdict(self):
+        return dict(self)
+
+
+class _Stream:
+    def __init__(self, rows):
+        self.rows = rows
+        self.partition_sizes = []
+
+    async def partitions(self, size):
+        for i in range(0, len(self.rows), size):
+            self.partition_sizes.append(size)
+            yield self.rows[i:i + size]
+
+
+def _profile():
+    return SimpleNamespace(
+        id=uuid.uuid4(), name="Anna", email=None, phone=None, telegram_id="1", bio="hi",
+        interests=[], photos=["/p.jpg"], gender="female", age=25, latitude=None, longitude=None,
+        created_at=datetime.utcnow(), status="active", role="user", subscription_tier="free",
+    )
+
+
+def _export_db(swipes):
+    streams = {}
+
+    async def stream(stmt):
+        sql = str(stmt)
+        rows = swipes if "FROM swipes" in sql else []
+        streams[sql] = _Stream(rows)
+        assert stmt.get_execution_options()["yield_per"] == EXPORT_BATCH
+        return streams[sql]
+
+    db = AsyncMock()
+    db.stream = AsyncMock(side_effect=stream)
+    profile_result = MagicMock()
+    profile_result.all.return_value = [(_profile(),)]
+    db.execute = AsyncMock(return_value=profile_result)
+    return db
+
+
+def _read(buffer):
+    return [json.loads(line) for line in gzip.decompress(buffer.getvalue()).splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_write_export_streams_sections_as_ndjson():
+    swipes = [_Row(target_id=uuid.uuid4(), action="like", created_at=datetime.utcnow())
+              for _ in range(EXPORT_BATCH + 5)]
+    db = _export_db(swipes)
+    progress = []
+    buffer = io.BytesIO()
+
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as gz:
+        rows = await data_export.write_export(
+            db, uuid.uuid4(), gz, AsyncMock(side_effect=lambda *a: progress.append(a[0])),
+        )
+
+    lines = _read(buffer)
+    assert rows == len(swipes) + 1
+    assert lines[0]["type"] == "export"
+    assert lines[-1]["type"] == "summary"
+    assert lines[-1]["data"]["counts"]["swipes"] == len(swipes)
+    assert sum(1 for l in lines if l["type"] == "swipes") == len(swipes)
+    assert lines[1]["type"] == "profile" and lines[1]["data"]["name"] == "Anna"
+    assert progress[0] == "profile" and "preferences" in progress
+    db.execute.assert_awaited_once()   # only the profile row is not streamed
+
+
+@pytest.mark.asyncio
+async def test_request_export_rejects_active_job():
+    db = AsyncMock()
+    active = SimpleNamespace(id=uuid.uuid4(), status="running", created_at=datetime.utcnow())
+
+    with patch.object(data_export, "latest_job", AsyncMock(return_value=active)):
+        with pytest.raises(ExportRateLimited) as exc:
+            await data_export.request_export(db, uuid.uuid4())
+
+    assert exc.value.job is active
+    db.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_request_export_cooldown_and_retry_after_failure():
+    db = AsyncMock()
+    db.add = MagicMock()
+    recent = SimpleNamespace(id=uuid.uuid4(), status="completed",
+                             created_at=datetime.utcnow() - timedelta(hours=1))
+
+    with patch.object(data_export, "latest_job", AsyncMock(return_value=recent)):
+        with pytest.raises(ExportRateLimited) as exc:
+            await data_export.request_export(db, uuid.uuid4())
+    assert 22 * 3600 < exc.value.retry_after <= 23 * 3600 + 1
+
+    recent.status = "failed"
+    with patch.object(data_export, "latest_job", AsyncMock(return_value=recent)):
+        job = await data_export.request_export(db, uuid.uuid4())
+    assert job.status == "pending"
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_run_export_job_writes_archive(tmp_path):
+    job_id, user_id = uuid.uuid4(), uuid.uuid4()
+    job = SimpleNamespace(id=job_id, user_id=user_id, status="pending")
+    updates = []
+
+    async def write(db, uid, gz, on_section):
+        gz.write(b'{"type": "export"}\n')
+        await on_section("profile", 1, 2, 1)
+        return 1
+
+    db = AsyncMock()
+    db.get = AsyncMock(return_value=job)
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    store = FilesystemTarget(tmp_path)
+    with patch.object(data_export, "archive_store", AsyncMock(return_value=store)), \
+         patch.object(data_export, "write_export", write), \
+         patch.object(data_export, "_update_job", AsyncMock(side_effect=lambda f, j, **v: updates.append(v) or True)):
+        await data_export.run_export_job(job_id, session_factory=factory)
+
+    assert [u.get("status") for u in updates] == ["running", None, "completed"]
+    assert updates[-1]["only_if_status"] == "running"
+    final = updates[-1]
+    assert final["progress"] == 100 and final["size_bytes"] > 0 and len(final["checksum"]) == 64
+    # the store key is saved, not a local path; the staging file is gone
+    assert final["file_path"] == data_export.archive_key(job_id)
+    assert gzip.decompress(await store.get_bytes(final["file_path"])) == b'{"type": "export"}\n'
+    assert not os.path.exists(data_export._staging_path(job_id))
+
+
+@pytest.mark.asyncio
+async def test_export_closed_while_running_discards_archive(tmp_path):
+    job_id = uuid.uuid4()
+    db = AsyncMock()
+    db.get = AsyncMock(return_value=SimpleNamespace(id=job_id, user_id=uuid.uuid4(), status="pending"))
+    factory = MagicMock()
+    factory.return_value.__aenter__ = AsyncMock(return_value=db)
+    factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    async def write(db, uid, gz, on_section):
+        gz.write(b"x")
+        return 1
+
+    # the cleanup marked the job failed meanwhile: the conditional "completed" update matches nothing
+    update = AsyncMock(side_effect=lambda f, j, only_if_status=None, **v: v.get("status") != "completed")
+    with patch.object(data_export, "archive_store", AsyncMock(return_value=FilesystemTarget(tmp_path))), \
+         patch.object(data_export, "write_export", write), \
+         patch.object(data_export, "_update_job", update):
+        await data_export.run_export_job(job_id, session_factory=factory)
+
+    assert list((tmp_path / data_export.ARCHIVE_PREFIX).iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_download_url_is_signed_by_object_storage():
+    client = MagicMock()
+    client.generate_presigned_url.return_value = "https://bucket.s3/exports/x?X-Amz-Signature=s"
+    job = SimpleNamespace(file_path="exports/x.ndjson.gz", created_at=datetime(2026, 1, 2))
+
+    with patch.object(data_export, "archive_store", AsyncMock(return_value=S3Target(client, "exports-bucket"))):
+        url = await data_export.download_url(job)
+
+    assert url.startswith("https://")
+    kwargs = client.generate_presigned_url.call_args.kwargs
+    assert kwargs["Params"]["Bucket"] == "exports-bucket" and kwargs["Params"]["Key"] == job.file_path
+    assert "mambax-export-20260102.ndjson.gz" in kwargs["Params"]["ResponseContentDisposition"]
+    assert kwargs["ExpiresIn"] == data_export.settings.DATA_EXPORT_URL_TTL_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_cleanup_judges_running_jobs_by_heartbeat():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    db.commit = AsyncMock()
+
+    assert await data_export.cleanup_expired_exports(db) == {"expired": 0, "failed": 0}
+    stale_sql = str(db.execute.await_args_list[1].args[0].compile())
+    assert "coalesce(data_export_jobs.heartbeat_at, data_export_jobs.started_at)" in stale_sql
+    assert "data_export_jobs.created_at <" in stale_sql        # only for jobs still pending
+
+
+@pytest.mark.asyncio
+async def test_cleanup_deletes_archives_from_the_store():
+    expired, failed = uuid.uuid4(), uuid.uuid4()
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[
+        MagicMock(all=MagicMock(return_value=[(expired,)])),
+        MagicMock(all=MagicMock(return_value=[(failed,)])),
+    ])
+    db.commit = AsyncMock()
+    store = MagicMock()
+    store.delete = AsyncMock()
+
+    with patch.object(data_export, "archive_store", AsyncMock(return_value=store)):
+        assert await data_export.cleanup_expired_exports(db) == {"expired": 1, "failed": 1}
+
+    assert [c.args[0] for c in store.delete.await_args_list] == [
+        data_export.archive_key(expired), data_export.archive_key(failed),
+    ]
@@ -0,0 +1,86 @@
+"""Tests for the feature flag snapshot engine."""
+import hashlib
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import features
+from backend.services.features import CompiledFlag, FeatureService
+
+
+def _flag(key, enabled=False, rollout=0, whitelist=None):
+    return SimpleNamespace(key=key, is_enabled=enabled, rollout_percentage=rollout, whitelist_users=whitelist or [])
+
+
+def _session_maker(flags):
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=flags)))))
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=session)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=ctx), session
+
+
+@pytest.fixture(autouse=True)
+def reset_snapshot():
+    FeatureService._snapshot = None
+    FeatureService._reload_lock = None
+    yield
+    FeatureService._snapshot = None
+    FeatureService._reload_lock = None
+
+
+def test_rollout_bucket_matches_full_sha256():
+    flag = CompiledFlag.compile(_flag("new-chat", rollout=50))
+    for user in ("u1", "u2", "u3", "u4", "u5", "u6"):
+        expected = int(hashlib.sha256(f"new-chat:{user}".encode()).hexdigest(), 16) % 100 < 50
+        assert flag.evaluate(user) is expected
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_loaded_once_and_whitelist_is_a_set():
+    maker, session = _session_maker([_flag("beta", whitelist=["u1"]), _flag("kill-switch", enabled=True)])
+    with patch.object(features, "async_session_maker", maker):
+        assert await FeatureService.is_enabled("beta", "u1") is True
+        assert await FeatureService.is_enabled("beta", "u2") is False
+        assert await FeatureService.is_enabled("kill-switch") is True
+        assert await FeatureService.is_enabled("missing", default=True) is True
+
+    assert session.execute.await_count == 1
+    assert FeatureService._snapshot.flags["beta"].whitelist == frozenset({"u1"})
+
+
+@pytest.mark.asyncio
+async def test_context_memoizes_and_counts_exposure_once():
+    maker, _ = _session_maker([_flag("exp", rollout=100)])
+    exposures = MagicMock()
+    with patch.object(features, "async_session_maker", maker), \
+         patch.object(features, "FEATURE_EXPOSURES", exposures):
+        ctx = await FeatureService.context("u1")
+        assert ctx.is_enabled("exp") and ctx.is_enabled("exp")
+
+    exposures.labels.assert_called_once_with(flag="exp", enabled="true")
+
+
+@pytest.mark.asyncio
+async def test_notify_changed_reloads_and_publishes():
+    maker, _ = _session_maker([_flag("exp", enabled=True)])
+    with patch.object(features, "async_session_maker", maker), \
+         patch.object(features.redis_manager, "publish", AsyncMock()) as publish:
+        FeatureService._snapshot = features.FlagSnapshot({}, 0.0)
+        await FeatureService.notify_changed("exp")
+
+    assert FeatureService._snapshot.flags["exp"].enabled is True
+    publish.assert_awaited_once_with(features.CHANNEL, {"key": "exp"})
+
+
+@pytest.mark.asyncio
+async def test_failed_reload_keeps_previous_flags():
+    maker, session = _session_maker([])
+    session.execute.side_effect = RuntimeError("db down")
+    stale = features.FlagSnapshot({"exp": CompiledFlag.compile(_flag("exp", enabled=True))}, -1e9)
+    FeatureService._snapshot = stale
+    with patch.object(features, "async_session_maker", maker):
+        assert await FeatureService.is_enabled("exp") is True
+        assert await FeatureService.is_enabled("exp") is True
+    assert session.execute.await_count == 1
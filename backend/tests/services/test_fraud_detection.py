@@ -0,0 +1,146 @@
+"""Tests for set-based fraud scoring."""
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from backend.services.fraud_detection import FraudDetectionService, SCORE_CHUNK
+
+
+def _result(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    return result
+
+
+def _user_row(user_id, **overrides):
+    row = {
+        "id": user_id, "bio": "x" * 30, "age": 25, "city": "Moscow", "location": None,
+        "gender": "female", "is_verified": True, "email": "a@example.com",
+        "updated_at": datetime.utcnow(), "photo_count": 3,
+    }
+    row.update(overrides)
+    mock = MagicMock()
+    mock.id = user_id
+    mock._asdict.return_value = row
+    return mock
+
+
+@pytest.fixture
+def service():
+    return FraudDetectionService()
+
+
+def test_score_signals_clean_and_risky(service):
+    now = datetime.utcnow()
+    clean = {
+        "bio": "x" * 30, "age": 25, "city": "Moscow", "gender": "male", "is_verified": True,
+        "email": "a@example.com", "updated_at": now, "photo_count": 4,
+    }
+    assert service.score_signals(clean, now)[:2] == (0, "low")
+
+    risky = {
+        "email": "bot@mailinator.com", "updated_at": now - timedelta(days=40),
+        "photo_count": 0, "recent_messages": 150, "reports_against": 5,
+    }
+    score, level, factors = service.score_signals(risky, now)
+    assert score == 100
+    assert level == "critical"
+    assert factors["mass_messaging"] == 15
+    assert factors["many_reports"] == 25
+
+
+def test_spam_campaign_hits_raise_activity_penalty(service):
+    now = datetime.utcnow()
+    signals = {
+        "bio": "x" * 30, "age": 25, "city": "Moscow", "gender": "male", "is_verified": True,
+        "email": "a@example.com", "updated_at": now, "photo_count": 4, "spam_campaign_hits": 2,
+    }
+    score, _, factors = service.score_signals(signals, now)
+    assert factors["spam_campaign"] == 15
+    assert score == 15
+
+
+@pytest.mark.asyncio
+async def test_score_chunk_aggregates_then_single_upsert(service):
+    a, b = uuid.uuid4(), uuid.uuid4()
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[
+        _result([_user_row(a), _user_row(b, photo_count=0)]),
+        _result([(a, 120)]),           # messages in last 24h
+        _result([(b, 3)]),             # reports
+        MagicMock(),                   # upsert
+    ])
+
+    assert await service._score_chunk(db, [a, b]) == 2
+
+    assert db.execute.await_count == 4
+    upsert = db.execute.await_args_list[-1].args[0]
+    sql = str(upsert.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (user_id) DO UPDATE" in sql
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_score_users_chunks_and_isolates_failures(service):
+    db = AsyncMock()
+    service._score_chunk = AsyncMock(side_effect=[SCORE_CHUNK, Exception("db down")])
+
+    stats = await service.score_users(db, [uuid.uuid4() for _ in range(SCORE_CHUNK + 5)])
+
+    assert stats == {"processed": SCORE_CHUNK, "errors": 5}
+    db.rollback.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_analyze_user_not_found(service):
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=_result([]))
+
+    with pytest.raises(ValueError):
+        await service.analyze_user(db, uuid.uuid4())
+
+
+@pytest.mark.asyncio
+async def test_rescore_changed_only_scores_changed_users(service):
+    changed = uuid.uuid4()
+    db = AsyncMock()
+    db.scalar = AsyncMock(return_value=datetime.utcnow() - timedelta(minutes=15))
+    db.execute = AsyncMock(side_effect=[
+        _result([(changed,)]), _result([]), _result([(changed,)]), _result([]),
+    ])
+    service._score_chunk = AsyncMock(return_value=1)
+
+    stats = await service.rescore_changed(db)
+
+    assert stats["total_queued"] == 1
+    service._score_chunk.assert_awaited_once_with(db, [changed])
+
+
+@pytest.mark.asyncio
+async def test_recalculate_all_pages_by_keyset(service):
+    ids = [uuid.uuid4() for _ in range(SCORE_CHUNK + 1)]
+    pager = AsyncMock()
+    pager.execute = AsyncMock(side_effect=[
+        _result([(i,) for i in ids[:SCORE_CHUNK]]),
+        _result([(ids[-1],)]),
+        _result([]),
+    ])
+    sessions = [pager]
+
+    class Factory:
+        def __call__(self):
+            db = sessions.pop(0) if sessions else AsyncMock()
+            ctx = MagicMock()
+            ctx.__aenter__ = AsyncMock(return_value=db)
+            ctx.__aexit__ = AsyncMock(return_value=False)
+            return ctx
+
+    service.score_users = AsyncMock(side_effect=lambda db, chunk: {"processed": len(chunk), "errors": 0})
+
+    stats = await service.recalculate_all(session_factory=Factory(), concurrency=2)
+
+    assert stats == {"processed": SCORE_CHUNK + 1, "errors": 0, "total_queued": SCORE_CHUNK + 1}
+    assert service.score_users.await_count == 2
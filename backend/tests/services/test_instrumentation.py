@@ -0,0 +1,176 @@
+"""Tests for the HTTP / SQL / Redis / event loop instrumentation layer."""
+import logging
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from backend.core import instrumentation
+from backend.core.instrumentation import (
+    LoopLagMonitor, MetricsMiddleware, bounded_label, fingerprint, histogram_summary,
+    instrument_engine, instrument_redis, record_query, request_id_var, top_queries,
+)
+from backend.metrics import EVENT_LOOP_LAG_MAX, HTTP_REQUEST_DURATION, REDIS_COMMAND_DURATION
+
+
+@pytest.fixture(autouse=True)
+def _reset_state(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_label_values", {})
+    monkeypatch.setattr(instrumentation, "_query_stats", {})
+    monkeypatch.setattr(instrumentation, "_slow_logged_at", {})
+
+
+def _sample(histogram, suffix, **labels):
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.name.endswith(suffix) and all(sample.labels.get(k) == v for k, v in labels.items()):
+                return sample.value
+    return 0
+
+
+def test_fingerprint_normalizes_literals_and_params():
+    a = fingerprint("SELECT * FROM users WHERE id = 5 AND name = 'bob' AND x IN (1, 2, 3)")
+    b = fingerprint("SELECT  *  FROM users WHERE id = 77 AND name = 'o''neil' AND x IN (4)")
+    c = fingerprint("SELECT * FROM users WHERE id = $1 AND name = $2 AND x IN ($3, $4)")
+
+    assert a == b == c
+    assert a[1] == "SELECT"
+    assert a[2] == "SELECT * FROM users WHERE id = ? AND name = ? AND x IN (...)"
+    assert fingerprint("SELECT created_at::date FROM t")[2] == "SELECT created_at::date FROM t"
+    assert fingerprint("INSERT INTO t (a) VALUES ($1), ($2), ($3)")[2] == "INSERT INTO t (a) VALUES (?), ..."
+
+
+def test_bounded_label_collapses_overflow():
+    assert [bounded_label("t", v, limit=2) for v in ("a", "b", "c", "a")] == ["a", "b", "other", "a"]
+
+
+def test_fingerprint_registry_is_capped(monkeypatch):
+    monkeypatch.setattr(instrumentation, "MAX_FINGERPRINTS", 2)
+    for table in ("a", "b", "c", "d"):
+        record_query(f"SELECT 1 FROM {table}", 0.001)
+
+    rows = {r["fingerprint"]: r for r in top_queries()}
+    assert len(rows) == 3 and rows["other"]["count"] == 2
+
+
+def test_middleware_labels_route_template_and_echoes_request_id():
+    app = FastAPI()
+    seen = {}
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        seen["request_id"] = request_id_var.get()
+        seen["route"] = instrumentation.current_route()
+        return {"id": item_id}
+
+    async def passthrough(request, call_next):
+        return await call_next(request)
+
+    app.add_middleware(BaseHTTPMiddleware, dispatch=passthrough)
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+
+    before = _sample(HTTP_REQUEST_DURATION, "_count", route="/items/{item_id}", status="2xx")
+    response = client.get("/items/42", headers={"X-Request-ID": "req-123"})
+
+    assert response.headers["x-request-id"] == "req-123"
+    assert seen == {"request_id": "req-123", "route": "/items/{item_id}"}
+    assert _sample(HTTP_REQUEST_DURATION, "_count", route="/items/{item_id}", status="2xx") == before + 1
+
+    assert len(client.get("/missing").headers["x-request-id"]) == 16
+    assert _sample(HTTP_REQUEST_DURATION, "_count", route="unmatched", status="4xx") >= 1
+
+
+def test_slow_query_logged_once_with_request_id(monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation.settings, "SLOW_QUERY_MS", 100)
+    token = request_id_var.set("req-slow")
+    try:
+        with caplog.at_level(logging.WARNING, logger=instrumentation.__name__):
+            record_query("SELECT * FROM matches WHERE user_id = 1", 0.25)
+            record_query("SELECT * FROM matches WHERE user_id = 2", 0.30)
+            record_query("SELECT * FROM matches WHERE user_id = 3", 0.01)
+    finally:
+        request_id_var.reset(token)
+
+    slow = [r.getMessage() for r in caplog.records if "Slow query" in r.getMessage()]
+    assert len(slow) == 1 and "request_id=req-slow" in slow[0]
+    assert top_queries()[0]["count"] == 3
+
+
+def test_engine_hooks_record_statements_and_errors():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    instrument_engine(engine)   # idempotent
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM no_such_table"))
+
+    rows = {r["sql"]: r for r in top_queries()}
+    assert rows["SELECT ?"]["count"] == 2
+    assert rows["SELECT * FROM no_such_table"]["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_instrument_redis_times_commands_and_pipelines():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[1, 2])
+    client = MagicMock()
+    client.execute_command = AsyncMock(return_value="OK")
+    client.pipeline = MagicMock(return_value=pipe)
+    client._instrumented = False
+
+    instrument_redis(client)
+    assert instrument_redis(client) is client
+    before = _sample(REDIS_COMMAND_DURATION, "_count", command="SET")
+
+    assert await client.execute_command("SET", "k", "v") == "OK"
+    assert await client.pipeline().execute() == [1, 2]
+
+    assert _sample(REDIS_COMMAND_DURATION, "_count", command="SET") == before + 1
+    assert _sample(REDIS_COMMAND_DURATION, "_count", command="PIPELINE") >= 1
+    assert any(r["command"] == "SET" for r in histogram_summary(REDIS_COMMAND_DURATION))
+
+
+def test_loop_lag_window_max_resets(monkeypatch):
+    monkeypatch.setattr(instrumentation, "LOOP_LAG_WINDOW", 10.0)
+    monitor = LoopLagMonitor()
+    monitor.record(0.2, now=100.0)
+    monitor.record(0.05, now=105.0)
+    assert monitor.window_max == 0.2 and EVENT_LOOP_LAG_MAX._value.get() == 0.2
+
+    monitor.record(0.01, now=111.0)
+    assert monitor.window_max == 0.01 and monitor.last_lag == 0.01
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_requires_token_or_admin(monkeypatch):
+    from fastapi import HTTPException
+    from backend.api import system
+
+    def request(authorization=None):
+        return MagicMock(headers={"authorization": authorization} if authorization else {})
+
+    monkeypatch.setattr(system.settings, "METRICS_TOKEN", None)
+    with pytest.raises(HTTPException) as exc:
+        await system.require_metrics_access(request(), db=AsyncMock())
+    assert exc.value.status_code == 401
+
+    user = MagicMock(role="user")
+    monkeypatch.setattr(system, "get_current_user_from_token", AsyncMock(return_value=user))
+    with pytest.raises(HTTPException) as exc:
+        await system.require_metrics_access(request("Bearer jwt"), db=AsyncMock())
+    assert exc.value.status_code == 403
+    user.role = "admin"
+    assert await system.require_metrics_access(request("Bearer jwt"), db=AsyncMock()) is None
+
+    monkeypatch.setattr(system.settings, "METRICS_TOKEN", "scrape")
+    assert await system.require_metrics_access(request("Bearer scrape"), db=AsyncMock()) is None
+    with pytest.raises(HTTPException) as exc:
+        await system.require_metrics_access(request("Bearer jwt"), db=AsyncMock())
+    assert exc.value.status_code == 401
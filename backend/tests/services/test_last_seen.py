@@ -0,0 +1,71 @@
+"""Tests for last_seen write coalescing."""
+import time
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.chat.last_seen import LastSeenFlusher, FLUSH_CHUNK
+
+
+@pytest.fixture
+def no_redis():
+    with patch(
+        "backend.services.chat.last_seen.redis_manager.get_redis",
+        new=AsyncMock(return_value=None),
+    ):
+        yield
+
+
+@pytest.fixture
+def mock_db():
+    db = AsyncMock()
+    result = MagicMock()
+    result.rowcount = 2
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_flush_single_bulk_update(no_redis, mock_db):
+    """Many disconnects collapse into one UPDATE ... FROM (VALUES ...) and one commit."""
+    flusher = LastSeenFlusher()
+    a, b = str(uuid.uuid4()), str(uuid.uuid4())
+    now = time.time()
+    await flusher.record(a, now - 10)
+    await flusher.record(a, now)          # newest wins
+    await flusher.record(b, now)
+
+    updated = await flusher.flush(db=mock_db)
+
+    assert updated == 2
+    mock_db.execute.assert_awaited_once()
+    sql = str(mock_db.execute.await_args.args[0])
+    assert "VALUES" in sql
+    mock_db.commit.assert_awaited_once()
+    # Buffer drained
+    assert await flusher.flush(db=mock_db) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_chunks_large_batches(no_redis, mock_db):
+    flusher = LastSeenFlusher()
+    for _ in range(FLUSH_CHUNK + 1):
+        await flusher.record(str(uuid.uuid4()))
+
+    await flusher.flush(db=mock_db)
+
+    assert mock_db.execute.await_count == 2
+    mock_db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_flush_failure_restores_buffer(no_redis, mock_db):
+    """Entries survive a failed flush and are retried next time."""
+    flusher = LastSeenFlusher()
+    uid = str(uuid.uuid4())
+    await flusher.record(uid)
+    mock_db.execute = AsyncMock(side_effect=Exception("db down"))
+
+    assert await flusher.flush(db=mock_db) == 0
+    mock_db.rollback.assert_awaited_once()
+    assert uid in flusher._local
@@ -0,0 +1,148 @@
+"""Tests for the batched NSFW classification worker."""
+import asyncio
+import io
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from PIL import Image
+
+from backend.services import nsfw_detection
+from backend.services.nsfw_detection import FakeNSFWModel, NSFWWorker, NSFWDetectionService, MODEL_INPUT_SIZE
+
+
+def _png(color, size=(64, 64)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _worker(model, **kwargs):
+    return NSFWWorker(model_factory=lambda: model, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    model = FakeNSFWModel()
+    worker = _worker(model, batch_size=8, max_wait=0.05)
+    await worker.start()
+
+    images = [_png((i * 40, 0, 0)) for i in range(5)]
+    scores = await asyncio.gather(*(worker.classify(img) for img in images))
+    await worker.stop()
+
+    assert model.batches == [1, 5]      # warm-up + one batch
+    assert scores[0]["nsfw"] == 0 and scores[4]["nsfw"] == pytest.approx(160 / 255)
+
+
+@pytest.mark.asyncio
+async def test_batch_is_capped_by_size():
+    model = FakeNSFWModel()
+    worker = _worker(model, batch_size=2, max_wait=0.05)
+    await worker.start()
+
+    await asyncio.gather(*(worker.classify(_png((i, 0, 0))) for i in range(5)))
+    await worker.stop()
+
+    assert model.batches[1:] == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_identical_content_is_classified_once():
+    model = FakeNSFWModel()
+    worker = _worker(model, max_wait=0.01)
+    await worker.start()
+    image = _png((255, 0, 0))
+
+    first, second = await asyncio.gather(worker.classify(image), worker.classify(image))
+    third = await worker.classify(image)
+    await worker.stop()
+
+    assert first == second == third
+    assert sum(model.batches[1:]) == 1
+
+
+@pytest.mark.asyncio
+async def test_without_model_service_uses_rule_based_fallback():
+    def missing():
+        raise ImportError("transformers")
+
+    worker = NSFWWorker(model_factory=missing)
+    with patch.object(nsfw_detection, "nsfw_worker", worker):
+        service = NSFWDetectionService()
+        score, label, _ = await service.analyze_image("https://cdn/x/nsfw.jpg")
+        assert (score, label) == (0.9, "nsfw")
+        assert (await service.analyze_image(_png((0, 0, 0))))[1] == "safe"
+    assert worker.available is False
+
+
+@pytest.mark.asyncio
+async def test_prepared_upload_preview_is_labelled():
+    from backend.services.storage import _process_upload_sync
+
+    content = _png((255, 0, 0), size=(1000, 600))
+    processed, content_type, preview = _process_upload_sync(content)
+    assert content_type == "image/webp" and max(preview.size) == MODEL_INPUT_SIZE
+
+    worker = _worker(FakeNSFWModel(), max_wait=0)
+    with patch.object(nsfw_detection, "nsfw_worker", worker):
+        score, label, _ = await NSFWDetectionService().analyze_prepared(preview, key="k")
+    await worker.stop()
+    assert label == "nsfw" and score > 0.9
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("block", [False, True])
+async def test_profile_upload_is_blocked_only_behind_the_setting(block):
+    from fastapi import HTTPException
+    from backend.services import storage
+
+    upload = MagicMock(content_type="image/png", filename="me.png")
+    db = MagicMock()
+    db.flush = AsyncMock()
+    analyze = AsyncMock(return_value=(0.95, "nsfw", {}))
+
+    with patch.object(storage.settings, "NSFW_BLOCK_UPLOADS", block), \
+         patch.object(nsfw_detection.nsfw_service, "analyze_prepared", analyze):
+        if block:
+            with pytest.raises(HTTPException) as exc:
+                await storage.storage_service.save_user_photo(upload, db, content_bytes=_png((255, 0, 0)))
+            assert exc.value.status_code == 400
+        else:
+            url = await storage.storage_service.save_user_photo(upload, db, content_bytes=_png((255, 0, 0)))
+            assert url.startswith("/api/photos/")
+
+    assert analyze.await_count == int(block)
+    assert db.add.called is not block
+
+
+@pytest.mark.asyncio
+async def test_one_broken_image_does_not_fail_its_batch():
+    model = FakeNSFWModel()
+    worker = _worker(model, batch_size=8, max_wait=0.05)
+    await worker.start()
+
+    results = await asyncio.gather(
+        worker.classify(_png((200, 0, 0))), worker.classify(b"not an image"), worker.classify(_png((0, 0, 0))),
+        return_exceptions=True,
+    )
+    await worker.stop()
+
+    assert results[0]["nsfw"] > 0.7 and results[2]["nsfw"] == 0
+    assert isinstance(results[1], Exception)
+
+
+@pytest.mark.asyncio
+async def test_prepared_analysis_falls_back_when_inference_fails():
+    class BrokenModel(FakeNSFWModel):
+        def __call__(self, images, batch_size=1):
+            if self.batches:
+                raise RuntimeError("CUDA out of memory")
+            return super().__call__(images, batch_size)     # warm-up succeeds
+
+    worker = _worker(BrokenModel(), max_wait=0)
+    with patch.object(nsfw_detection, "nsfw_worker", worker):
+        previews = [Image.new("RGB", (8, 8), (i, 0, 0)) for i in range(3)]
+        results = await asyncio.gather(*(
+            NSFWDetectionService().analyze_prepared(p, key=f"k{i}") for i, p in enumerate(previews)
+        ))
+    await worker.stop()
+    assert [label for _, label, _ in results] == ["safe"] * 3
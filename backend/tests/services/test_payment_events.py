@@ -0,0 +1,209 @@
+"""Tests for the payment event journal and worker."""
+import json
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import payment_events as pe
+from backend.services.payment_events import EventContext
+
+
+def _event(provider="test", event_type="paid", status="processing", payload=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(), provider=provider, event_id="evt_1", event_type=event_type,
+        payload=payload or {}, status=status, attempts=1, result=None, error=None, processed_at=None,
+    )
+
+
+def _factory(db):
+    @asynccontextmanager
+    async def session():
+        yield db
+    return session
+
+
+def _db(event):
+    db = MagicMock()
+    db.get = AsyncMock(return_value=event)
+    db.commit = AsyncMock()
+    db.rollback = AsyncMock()
+    db.execute = AsyncMock()
+    return db
+
+
+@pytest.fixture
+def handlers():
+    saved = dict(pe._handlers)
+    yield pe._handlers
+    pe._handlers.clear()
+    pe._handlers.update(saved)
+
+
+@pytest.mark.asyncio
+async def test_apply_marks_processed_in_handler_transaction_then_runs_deferred(handlers):
+    event = _event()
+    db = _db(event)
+    order = []
+    db.commit.side_effect = lambda: order.append("commit")
+
+    async def notify(text):
+        order.append(f"notify:{text}")
+
+    @pe.payment_handler("test", "paid")
+    async def handler(ctx: EventContext):
+        assert ctx.event.status == "processed"      # set before the handler's effects
+        ctx.defer(notify, "thanks")
+        ctx.result = "credited"
+
+    assert await pe.apply(event.id, _factory(db)) == "processed"
+    assert order == ["commit", "notify:thanks"]
+    assert event.result == "credited"
+
+
+@pytest.mark.asyncio
+async def test_failed_handler_rolls_back_and_schedules_retry(handlers):
+    event = _event()
+    db = _db(event)
+    notify = AsyncMock()
+
+    @pe.payment_handler("test", "paid")
+    async def handler(ctx):
+        ctx.defer(notify)
+        raise RuntimeError("db timeout")
+
+    assert await pe.apply(event.id, _factory(db)) == "failed"
+    db.rollback.assert_awaited_once()
+    values = db.execute.call_args.args[0].compile().params
+    assert values["status"] == "failed" and "db timeout" in values["error"]
+    notify.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_event_taken_by_someone_else_is_skipped(handlers):
+    event = _event(status="processed")
+    db = _db(event)
+    handler = pe.payment_handler("test", "paid")(AsyncMock())
+
+    assert await pe.apply(event.id, _factory(db)) == "processed"
+    handler.assert_not_awaited()
+    db.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_unknown_event_type_is_journaled_as_ignored(handlers):
+    event = _event(event_type="invoice.created")
+    db = _db(event)
+    assert await pe.apply(event.id, _factory(db)) == "processed"
+    assert event.result == "ignored"
+
+
+@pytest.mark.asyncio
+async def test_duplicate_record_does_not_wake_worker():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(scalar_one_or_none=MagicMock(return_value=None)))
+    db.commit = AsyncMock()
+    with patch.object(pe.payment_worker, "wake") as wake:
+        assert await pe.record(db, "stripe", "evt_1", "checkout.session.completed", {}) is False
+    wake.assert_not_called()
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_replay_of_processed_events_requires_force():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(rowcount=2))
+    db.commit = AsyncMock()
+    with pytest.raises(ValueError):
+        await pe.replay(db, status="processed")
+    with patch.object(pe.payment_worker, "wake"):
+        assert await pe.replay(db, status="processed", force=True) == 2
+
+
+@pytest.mark.asyncio
+async def test_stripe_webhook_only_journals():
+    from backend.api import stripe_webhook
+
+    body = json.dumps({"id": "evt_9", "type": "checkout.session.completed", "data": {"object": {}}}).encode()
+    request = MagicMock()
+    request.body = AsyncMock(return_value=body)
+    record = AsyncMock(return_value=True)
+
+    with patch.object(stripe_webhook.settings, "STRIPE_WEBHOOK_SECRET", "whsec"), \
+            patch.object(stripe_webhook.stripe.Webhook, "construct_event", return_value=json.loads(body)), \
+            patch.object(stripe_webhook.payment_events, "record", record), \
+            patch.object(stripe_webhook, "handle_checkout_completed") as handle:
+        assert await stripe_webhook.stripe_webhook(request, "sig", db=MagicMock()) == {"status": "success"}
+
+    record.assert_awaited_once()
+    assert record.call_args.args[1:4] == ("stripe", "evt_9", "checkout.session.completed")
+    handle.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stars_payment_security_mismatch_changes_nothing():
+    from backend.telegram_bot.handlers import payment
+
+    tx = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), status="pending", transaction_type="top_up")
+    user = SimpleNamespace(id=tx.user_id, telegram_id="111", stars_balance=0)
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(scalars=MagicMock(return_value=MagicMock(first=MagicMock(return_value=None)))))
+    db.get = AsyncMock(side_effect=[tx, user])
+    ctx = EventContext(db, _event(payload={
+        "invoice_payload": str(tx.id), "telegram_payment_charge_id": "ch_1",
+        "telegram_user_id": 222, "chat_id": 222, "total_amount": 50,
+    }))
+
+    with patch.object(payment.star_ledger, "credit", AsyncMock()) as credit:
+        await payment.apply_successful_payment(ctx)
+
+    assert ctx.result == "telegram_id_mismatch"
+    assert tx.status == "pending"
+    credit.assert_not_awaited()
+    assert len(ctx._after_commit) == 1     # the security warning reply only
+
+
+def _gift_purchase_db():
+    db = MagicMock()
+    db.begin_nested = MagicMock(return_value=MagicMock(
+        __aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False)
+    ))
+    return db
+
+
+def _gift_transaction():
+    return SimpleNamespace(id=uuid.uuid4(), custom_metadata={
+        "receiver_id": str(uuid.uuid4()), "gift_id": str(uuid.uuid4()),
+    })
+
+
+@pytest.mark.asyncio
+async def test_gift_purchase_defers_notifications_and_leaves_commit_to_worker():
+    from backend.telegram_bot.handlers import payment
+
+    db, user, deferred = _gift_purchase_db(), SimpleNamespace(id=uuid.uuid4()), []
+    notify = AsyncMock()
+    with patch.object(payment, "deliver_gift", AsyncMock(return_value=(MagicMock(), notify))) as deliver, \
+            patch.object(payment.star_ledger, "credit", AsyncMock()) as credit:
+        await payment.process_gift_purchase(db, user, _gift_transaction(), 100, MagicMock(), deferred.append)
+
+    assert deliver.call_args.kwargs["commit"] is False
+    assert deferred == [notify]
+    notify.assert_not_awaited()
+    credit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failed_gift_delivery_is_rolled_back_to_savepoint_before_refund():
+    from backend.telegram_bot.handlers import payment
+
+    db, user, deferred = _gift_purchase_db(), SimpleNamespace(id=uuid.uuid4()), []
+    with patch.object(payment, "deliver_gift", AsyncMock(side_effect=ValueError("Gift not found"))), \
+            patch.object(payment.star_ledger, "credit", AsyncMock()) as credit:
+        await payment.process_gift_purchase(db, user, _gift_transaction(), 100, MagicMock(), deferred.append)
+
+    exc_type = db.begin_nested.return_value.__aexit__.call_args.args[0]
+    assert exc_type is ValueError               # savepoint saw the error and rolled back
+    assert credit.call_args.args[3] == "refund"
+    assert deferred == []
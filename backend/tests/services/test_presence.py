@@ -0,0 +1,118 @@
+"""Tests for chat presence service."""
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.chat.presence import (
+    PresenceService,
+    PRESENCE_KEY,
+    PRESENCE_TTL,
+    HEARTBEAT_MIN_INTERVAL,
+)
+
+
+@pytest.fixture
+def mock_redis():
+    r = AsyncMock()
+    # pipeline commands are buffered synchronously; only execute() is awaited
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    r.pipeline = MagicMock(return_value=MagicMock(
+        __aenter__=AsyncMock(return_value=pipe), __aexit__=AsyncMock(return_value=False),
+    ))
+    with patch(
+        "backend.services.chat.presence.redis_manager.get_redis",
+        new=AsyncMock(return_value=r),
+    ):
+        yield r
+
+
+@pytest.mark.asyncio
+async def test_presence_batch_single_zmscore(mock_redis):
+    """Online, stale and offline users resolved from one ZMSCORE."""
+    now = time.time()
+    mock_redis.zmscore.return_value = [now, now - PRESENCE_TTL - 10, -now, None]
+    service = PresenceService()
+
+    result = await service.get_presence_batch(["a", "b", "c", "d"])
+
+    mock_redis.zmscore.assert_awaited_once_with(PRESENCE_KEY, ["a", "b", "c", "d"])
+    assert result["a"]["is_online"] is True
+    assert result["b"]["is_online"] is False
+    assert result["b"]["last_seen"] is not None
+    assert result["c"]["is_online"] is False
+    assert result["c"]["last_seen"] is not None
+    assert result["d"] == {"is_online": False, "last_seen": None}
+
+
+@pytest.mark.asyncio
+async def test_presence_without_redis():
+    """Without Redis everyone is offline, nothing raises."""
+    with patch(
+        "backend.services.chat.presence.redis_manager.get_redis",
+        new=AsyncMock(return_value=None),
+    ):
+        service = PresenceService()
+        assert await service.is_online("a") is False
+        assert await service.get_last_seen("a") is None
+
+
+@pytest.mark.asyncio
+async def test_heartbeats_batched_and_throttled(mock_redis):
+    """Heartbeats are buffered into one ZADD and throttled per user."""
+    service = PresenceService()
+    service.heartbeat("a")
+    service.heartbeat("b")
+    await service.flush()
+
+    mock_redis.zadd.assert_awaited_once()
+    key, mapping = mock_redis.zadd.await_args.args
+    assert key == PRESENCE_KEY
+    assert set(mapping) == {"a", "b"}
+
+    # Second ping inside HEARTBEAT_MIN_INTERVAL is not rewritten
+    mock_redis.zadd.reset_mock()
+    service.heartbeat("a")
+    await service.flush()
+    mock_redis.zadd.assert_not_awaited()
+    assert HEARTBEAT_MIN_INTERVAL > 0
+
+
+@pytest.mark.asyncio
+async def test_fan_out_batched_and_debounced(mock_redis):
+    """Events are delivered to local partners with one partner lookup; flaps coalesce."""
+    sent = []
+
+    async def sender(user_id, message):
+        sent.append((user_id, message))
+
+    service = PresenceService()
+    service.bind(sender, lambda uid: uid in {"p1", "p2"})
+
+    lookup = AsyncMock(return_value={"u1": {"p1", "x"}, "u2": {"p2"}})
+    with patch("backend.services.chat.presence.get_partner_ids_batch", lookup):
+        await service.set_online("u1")
+        await service.set_online("u2")
+        await service.flush()
+
+        lookup.assert_awaited_once()
+        assert sorted(u for u, _ in sent) == ["p1", "p2"]
+        assert all(m["is_online"] for _, m in sent)
+
+        # Disconnect + reconnect in the same window -> no event
+        sent.clear()
+        lookup.reset_mock()
+        await service.set_offline("u1")
+        await service.set_online("u1")
+        await service.flush()
+        lookup.assert_not_awaited()
+        assert sent == []
+
+        # A second offline event for a user already reported offline is not re-sent
+        await service.set_offline("u2")
+        await service.flush()
+        assert [m["is_online"] for _, m in sent] == [False]
+        sent.clear()
+        await service.set_offline("u2")
+        await service.flush()
+        assert sent == []
@@ -0,0 +1,198 @@
+"""Tests for versioned profile snapshots and batched card hydration."""
+import uuid
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from backend.services import profile_cards
+from backend.services.profile_cards import (
+    get_profile_cards, refresh_profile_cards, invalidate_profile_cards, project, pack, unpack,
+    THUMB_FIELDS, SNAPSHOT_KEY, VERSION_KEY, SNAPSHOT_TTL,
+)
+
+
+def _row(user_id, **overrides):
+    row = dict(
+        id=user_id, name="Anna", age=25, gender="female", bio="hi", height=170,
+        smoking=None, drinking=None, education=None, looking_for=None, children=None,
+        is_verified=True, is_vip=False, city="Moscow", last_seen=None,
+        created_at=datetime(2026, 1, 1), photos=["a.jpg", "b.jpg"], interests=["music"],
+        is_active=True, subscription_tier="free", latitude=55.7, longitude=37.6,
+    )
+    row.update(overrides)
+    return SimpleNamespace(**row)
+
+
+def _db(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+def _redis(mget=None, pipeline_results=None):
+    r = AsyncMock()
+    r.mget = AsyncMock(return_value=mget or [])
+    script = AsyncMock()
+    r.register_script = MagicMock(return_value=script)
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=pipeline_results or [])
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    r.pipeline = MagicMock(return_value=ctx)
+    return r, pipe, script
+
+
+def _stored(script):
+    """{user_id: (version, snapshot)} из вызовов CAS-скрипта."""
+    stored = {}
+    for call in script.await_args_list:
+        snap_key, _ = call.kwargs["keys"]
+        version, payload, ttl = call.kwargs["args"]
+        assert ttl == SNAPSHOT_TTL
+        stored[snap_key.split(":")[-1]] = (version, unpack(payload))
+    return stored
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_a_miss_and_reloaded():
+    fresh, stale, missing = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    snapshots = [
+        pack({"id": str(fresh), "name": "Cached", "photo": None, "v": 3}),
+        pack({"id": str(stale), "name": "Old", "photo": None, "v": 1}),
+        None,
+    ]
+    r, _, script = _redis(mget=snapshots + [b"3", b"2", None])
+    db = _db([_row(stale, name="New"), _row(missing)])
+
+    with patch.object(profile_cards.redis_manager, "get_binary_redis", AsyncMock(return_value=r)):
+        cards = await get_profile_cards(db, [fresh, stale, missing, fresh], view="thumb")
+
+    assert cards[str(fresh)]["name"] == "Cached"
+    assert cards[str(stale)]["name"] == "New"
+    assert cards[str(missing)] == {"id": str(missing), "name": "Anna", "age": 25, "photo": "a.jpg", "is_verified": True}
+    r.mget.assert_awaited_once_with(
+        [SNAPSHOT_KEY.format(u) for u in (fresh, stale, missing)]
+        + [VERSION_KEY.format(u) for u in (fresh, stale, missing)]
+    )
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "array_agg(user_photos.url ORDER BY user_photos.created_at)" in sql
+    stored = _stored(script)
+    assert stored[str(stale)][0] == 2 and stored[str(stale)][1]["v"] == 2
+    assert stored[str(missing)][0] == 0
+    assert stored[str(missing)][1]["latitude"] == 55.7   # приватные поля — в снапшоте
+
+
+@pytest.mark.asyncio
+async def test_refresh_bumps_version_before_loading():
+    user_id = uuid.uuid4()
+    r, pipe, script = _redis(pipeline_results=[5, True])
+    db = _db([_row(user_id, is_verified=False)])
+
+    with patch.object(profile_cards.redis_manager, "get_binary_redis", AsyncMock(return_value=r)):
+        await refresh_profile_cards(db, [user_id])
+
+    pipe.incr.assert_called_once_with(VERSION_KEY.format(user_id))
+    version, snapshot = _stored(script)[str(user_id)]
+    assert version == 5 and snapshot["is_verified"] is False
+    r.delete.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_refresh_drops_snapshot_of_deleted_user():
+    user_id = uuid.uuid4()
+    r, _, script = _redis(pipeline_results=[2, True])
+
+    with patch.object(profile_cards.redis_manager, "get_binary_redis", AsyncMock(return_value=r)):
+        await refresh_profile_cards(_db([]), [user_id])
+
+    r.delete.assert_awaited_once_with(SNAPSHOT_KEY.format(user_id))
+
+
+@pytest.mark.asyncio
+async def test_without_redis_reads_db_and_adds_presence():
+    user_id = uuid.uuid4()
+    db = _db([_row(user_id, photos=None, interests=None)])
+    presence = {str(user_id): {"is_online": True, "last_seen": "2026-01-02T00:00:00"}}
+
+    with patch.object(profile_cards.redis_manager, "get_binary_redis", AsyncMock(return_value=None)), \
+         patch("backend.services.chat.state.state_manager.get_presence_batch", AsyncMock(return_value=presence)):
+        cards = await get_profile_cards(db, [user_id], with_presence=True)
+
+    card = cards[str(user_id)]
+    assert card["photos"] == [] and card["photo"] is None and card["interests"] == []
+    assert card["is_online"] is True
+    assert card["last_seen"] == "2026-01-02T00:00:00"
+    assert "latitude" not in card
+
+
+@pytest.mark.asyncio
+async def test_empty_ids_skip_everything():
+    db = AsyncMock()
+    assert await get_profile_cards(db, []) == {}
+    db.execute.assert_not_called()
+
+
+def test_project_thumb_fields_only():
+    card = {"id": "1", "name": "A", "age": 20, "photo": "p", "is_verified": False, "bio": "x"}
+    assert tuple(project(card, "thumb")) == THUMB_FIELDS
+
+
+@pytest.mark.asyncio
+async def test_invalidate_deletes_and_bumps_version():
+    r, pipe, _ = _redis()
+    user_id = uuid.uuid4()
+    with patch.object(profile_cards.redis_manager, "get_binary_redis", AsyncMock(return_value=r)):
+        await invalidate_profile_cards([user_id])
+    pipe.delete.assert_called_once_with(SNAPSHOT_KEY.format(user_id))
+    pipe.incr.assert_called_once_with(VERSION_KEY.format(user_id))
+
+
+@pytest.mark.asyncio
+async def test_account_deactivation_refreshes_snapshot():
+    from backend.services.ux_features import account
+
+    user = SimpleNamespace(id=uuid.uuid4(), is_active=True)
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(scalars=MagicMock(return_value=MagicMock(first=MagicMock(return_value=user)))))
+    db.commit = AsyncMock()
+
+    with patch.object(account, "refresh_profile_cards", AsyncMock()) as refresh:
+        await account.request_account_deletion(db, str(user.id), account.AccountDeletionReason.NOT_USING)
+        assert user.is_active is False
+        refresh.assert_awaited_once_with(db, [user.id])
+
+        await account.cancel_account_deletion(db, str(user.id))
+        assert user.is_active is True and refresh.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_ban_and_location_update_refresh_snapshot():
+    from backend.api import safety
+    from backend.api.discovery import profiles
+    from backend.core.redis import redis_manager
+
+    report = SimpleNamespace(reported_id=uuid.uuid4(), status="pending")
+    db = MagicMock()
+    db.get = AsyncMock(return_value=report)
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+    with patch.object(safety, "refresh_profile_cards", AsyncMock()) as refresh, \
+            patch.object(redis_manager, "blacklist_user_tokens", AsyncMock()):
+        await safety.resolve_moderation_item(uuid.uuid4(), safety.ModerationAction.BAN_USER, db=db, current_admin=None)
+    refresh.assert_awaited_once_with(db, [report.reported_id])
+
+    user = SimpleNamespace(id=uuid.uuid4(), latitude=None, longitude=None, name="Anna", age=25)
+    with patch.object(profiles, "refresh_profile_cards", AsyncMock()) as refresh, \
+            patch.object(redis_manager, "rate_limit", AsyncMock(return_value=True)), \
+            patch.object(profiles.crud, "get_user_profile", AsyncMock(return_value=user)), \
+            patch.object(profiles.geo_service, "update_location", AsyncMock()):
+        await profiles.update_location({"lat": 55.7, "lon": 37.6}, current_user=str(user.id), db=db)
+    assert user.latitude == 55.7
+    refresh.assert_awaited_once_with(db, [user.id])
@@ -2,14 +2,18 @@
 import pytest
 import uuid
 from datetime import datetime, timedelta
-from unittest.mock import AsyncMock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
+from backend.services.social import profile_views
 from backend.services.social.profile_views import (
     record_profile_view,
     get_who_viewed_me,
     get_view_count,
     get_view_stats,
-    VIEW_COOLDOWN_HOURS
+    flush_profile_views,
+    VIEW_COOLDOWN_HOURS,
+    BUFFER_KEY,
 )
 
 
@@ -18,6 +22,24 @@ def mock_db():
     return AsyncMock()
 
 
+@pytest.fixture(autouse=True)
+def no_redis():
+    with patch.object(profile_views.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        yield
+
+
+def _redis(pipeline_results):
+    """Redis mock: pipeline() returns the given results per execute()."""
+    r = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=pipeline_results)
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    r.pipeline = MagicMock(return_value=ctx)
+    return r
+
+
 @pytest.fixture
 def viewer_id():
     return uuid.uuid4()
@@ -87,43 +109,77 @@ async def test_get_who_viewed_me_empty(mock_db, viewed_id):
 
 @pytest.mark.asyncio
 async def test_get_who_viewed_me_vip_full_data(mock_db, viewed_id, viewer_id):
-    """VIP user should see full viewer data."""
+    """VIP user should see full viewer data, hydrated in one batch."""
     # Total count
     count_mock = MagicMock()
     count_mock.scalar.return_value = 1
     
     # Views data
-    view_data = MagicMock()
-    view_data.viewer_id = viewer_id
-    view_data.source = "discover"
-    view_data.last_viewed_at = datetime.utcnow()
-    
     views_mock = MagicMock()
-    views_mock.all.return_value = [view_data]
+    views_mock.all.return_value = [
+        SimpleNamespace(viewer_id=viewer_id, source="discover", last_viewed_at=datetime.utcnow())
+    ]
     
-    # Viewer user
-    viewer_user = MagicMock()
-    viewer_user.name = "John Doe"
-    viewer_user.photo_url = "https://example.com/photo.jpg"
-    viewer_user.is_verified = True
-    viewer_user.birthdate = datetime(1990, 1, 1)
-    viewer_user.last_active = datetime.utcnow()
-    viewer_user.city = "Moscow"
+    # Viewer cards
+    cards = {str(viewer_id): {
+        "id": str(viewer_id), "name": "John Doe", "age": 34, "photo": "https://example.com/photo.jpg",
+        "is_verified": True, "is_online": True, "city": "Moscow",
+    }}
     
-    call_count = [0]
-    async def mock_execute(stmt):
-        call_count[0] += 1
-        if call_count[0] == 1:
-            return count_mock
-        return views_mock
+    mock_db.execute = AsyncMock(side_effect=[count_mock, views_mock])
     
-    mock_db.execute = mock_execute
-    mock_db.get = AsyncMock(return_value=viewer_user)
-    
-    result = await get_who_viewed_me(mock_db, viewed_id, limit=20, is_vip=True)
+    with patch.object(profile_views, "get_profile_cards", AsyncMock(return_value=cards)) as get_cards:
+        result = await get_who_viewed_me(mock_db, viewed_id, limit=20, is_vip=True)
     
     assert result["is_premium_feature"] == False
     assert result["blur_photos"] == False
+    assert result["viewers"][0]["name"] == "John Doe"
+    assert result["viewers"][0]["photo_url"] == "https://example.com/photo.jpg"
+    assert result["viewers"][0]["is_online"] == True
+    get_cards.assert_awaited_once_with(mock_db, [str(viewer_id)], with_presence=True)
+    mock_db.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_record_profile_view_redis_buffers_without_db(mock_db, viewer_id, viewed_id):
+    """First view in 24h goes to the Redis buffer; no DB transaction."""
+    r = _redis([[True, 1, 1, 1, True, True, True, 1]])
+    
+    with patch.object(profile_views.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        result = await record_profile_view(mock_db, viewer_id, viewed_id, "search")
+    
+    assert result["recorded"] == True
+    r.rpush.assert_awaited_once()
+    assert r.rpush.await_args.args[0] == BUFFER_KEY
+    mock_db.execute.assert_not_called()
+    mock_db.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_record_profile_view_redis_repeat_not_buffered(mock_db, viewer_id, viewed_id):
+    """Repeat view within cooldown only bumps the viewers list."""
+    r = _redis([[None, 0, 0, 0, True, True, True, 1]])
+    
+    with patch.object(profile_views.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        result = await record_profile_view(mock_db, viewer_id, viewed_id, "search")
+    
+    assert result["recorded"] == False
+    r.rpush.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_flush_profile_views_restores_buffer_on_failure(mock_db, viewer_id, viewed_id):
+    """Failed flush puts the views back into the buffer."""
+    raw = ['{"viewer_id": "%s", "viewed_id": "%s", "source": "discover", "ts": 1700000000}' % (viewer_id, viewed_id)]
+    r = AsyncMock()
+    r.lrange = AsyncMock(return_value=raw)
+    mock_db.execute = AsyncMock(side_effect=Exception("db down"))
+    
+    with patch.object(profile_views.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        assert await flush_profile_views(mock_db) == 0
+    
+    mock_db.rollback.assert_awaited_once()
+    r.rpush.assert_awaited_once_with(BUFFER_KEY, *raw)
 
 
 @pytest.mark.asyncio
@@ -140,6 +196,43 @@ async def test_get_who_viewed_me_free_blurred(mock_db, viewed_id):
     assert result["blur_photos"] == True
 
 
+@pytest.mark.asyncio
+async def test_total_counts_viewers_beyond_history(mock_db, viewed_id, monkeypatch):
+    """History is capped, total keeps counting every unique viewer."""
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(profile_views, "MAX_VIEWS_HISTORY", 2)
+    r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    await r.set(profile_views.READY_KEY.format(viewed_id), 1)
+    viewers = [uuid.uuid4() for _ in range(3)]
+    cards = {str(v): {"id": str(v), "name": "Ann", "age": 30, "photo": None,
+                      "is_verified": False, "is_online": None, "city": None} for v in viewers}
+
+    with patch.object(profile_views.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+         patch.object(profile_views, "get_profile_cards", AsyncMock(return_value=cards)):
+        for v in viewers + viewers[:1]:
+            await record_profile_view(mock_db, v, viewed_id)
+        result = await get_who_viewed_me(mock_db, viewed_id, limit=20)
+
+    assert result["total"] == 3
+    assert len(result["viewers"]) == 2
+    mock_db.execute.assert_not_called()
+    await r.aclose()
+
+
+@pytest.mark.asyncio
+async def test_get_who_viewed_me_db_total_is_not_capped(mock_db, viewed_id):
+    """Without Redis the total is the full distinct viewer count, the page is past the history."""
+    count_mock = MagicMock()
+    count_mock.scalar.return_value = 250
+    mock_db.execute = AsyncMock(return_value=count_mock)
+
+    result = await get_who_viewed_me(mock_db, viewed_id, limit=20, offset=profile_views.MAX_VIEWS_HISTORY)
+
+    assert result["total"] == 250
+    assert result["viewers"] == []
+    mock_db.execute.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_get_view_count(mock_db, viewed_id):
     """Should return view count for period."""
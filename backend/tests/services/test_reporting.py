@@ -0,0 +1,205 @@
+"""Tests for streaming admin report generation."""
+import csv
+import uuid
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.models.user import Gender
+from backend.services import reporting
+from backend.services.reporting import CsvReportWriter, ReportSpec
+
+
+class FakeStreamResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def partitions(self, size):
+        for i in range(0, len(self.rows), size):
+            yield self.rows[i:i + size]
+
+
+def _factory(db):
+    @asynccontextmanager
+    async def session():
+        yield db
+    return session
+
+
+def test_csv_writer_serializes_cells(tmp_path):
+    path = tmp_path / "r.csv"
+    writer = CsvReportWriter(str(path), ["A", "B", "C", "D"])
+    writer.write_rows([[Gender.FEMALE, uuid.UUID(int=1), Decimal("9.50"), {"segment": "vip"}]])
+    writer.close()
+
+    with open(path, encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["A", "B", "C", "D"], [Gender.FEMALE.value, str(uuid.UUID(int=1)), "9.5", '{"segment": "vip"}']]
+
+
+@pytest.mark.skipif(reporting.openpyxl is None, reason="openpyxl not installed")
+def test_xlsx_writer_round_trip(tmp_path):
+    path = tmp_path / "r.xlsx"
+    writer = reporting.open_writer("xlsx", str(path), ["A", "B"], "Users")
+    writer.write_rows([[1, "x"], [2, "y"]])
+    writer.close()
+    sheet = reporting.openpyxl.load_workbook(path).active
+    assert [[c.value for c in row] for row in sheet.iter_rows()] == [["A", "B"], [1, "x"], [2, "y"]]
+
+
+@pytest.mark.asyncio
+async def test_write_report_streams_in_batches(monkeypatch):
+    monkeypatch.setattr(reporting, "REPORT_BATCH", 2)
+    monkeypatch.setattr(reporting, "PROGRESS_EVERY", 2)
+    db = MagicMock()
+    db.stream = AsyncMock(return_value=FakeStreamResult([(i,) for i in range(5)]))
+    writer = MagicMock()
+    progress = AsyncMock()
+    spec = ReportSpec("T", ["N"], lambda since: reporting.select(reporting.ReportJob.id))
+
+    assert await reporting.write_report(db, spec, datetime.utcnow(), writer, progress) == 5
+
+    assert [len(c.args[0]) for c in writer.write_rows.call_args_list] == [2, 2, 1]
+    assert [c.args[0] for c in progress.await_args_list] == [2, 4]
+    assert db.stream.call_args.args[0].get_execution_options()["yield_per"] == 2
+
+
+def test_every_report_query_compiles_and_matches_columns():
+    for name, spec in reporting._specs().items():
+        query = spec.query(datetime.utcnow())
+        assert len(query.selected_columns) <= len(spec.columns), name
+        str(query.compile())
+
+
+def test_campaign_rates_come_from_stats():
+    spec = reporting._specs()["marketing"]
+    row = SimpleNamespace(
+        name="Spring", type="email", status="completed", target_segment={}, created_at=None,
+        stats={"sent": 200, "opened": 50, "clicked": 10, "converted": 2},
+    )
+    assert spec.row(row)[-3:] == [25.0, 5.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_run_report_job_completes_and_updates_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(reporting.settings, "REPORT_DIR", str(tmp_path))
+    job = SimpleNamespace(id=uuid.uuid4(), report_id=uuid.uuid4(), report_type="gifts", format="csv", status="pending")
+    report = SimpleNamespace(configuration={"period": "7d"}, last_run_at=None)
+    db = MagicMock()
+    db.get = AsyncMock(side_effect=lambda model, _id: job if model is reporting.ReportJob else report)
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+
+    async def fake_pool(job_id, report_type, config, path, fmt):
+        assert (report_type, config["period"], fmt) == ("gifts", "7d", "csv")
+        open(path, "w").write("x")
+        return 3
+
+    with patch.object(reporting, "_run_in_pool", fake_pool):
+        await reporting.run_report_job(job.id, _factory(db))
+
+    final = db.execute.await_args_list[-1].args[0].compile().params
+    assert final["status"] == "completed" and final["rows_written"] == 3
+    assert report.configuration["status"] == "completed"
+    assert report.configuration["download_url"].endswith(f"/reports/jobs/{job.id}/download")
+
+
+@pytest.mark.asyncio
+async def test_failed_report_removes_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(reporting.settings, "REPORT_DIR", str(tmp_path))
+    job = SimpleNamespace(id=uuid.uuid4(), report_id=uuid.uuid4(), report_type="gifts", format="csv", status="pending")
+    db = MagicMock()
+    db.get = AsyncMock(side_effect=lambda model, _id: job if model is reporting.ReportJob else None)
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+
+    async def crash(job_id, report_type, config, path, fmt):
+        open(path, "w").write("partial")
+        raise RuntimeError("worker died")
+
+    with patch.object(reporting, "_run_in_pool", crash):
+        await reporting.run_report_job(job.id, _factory(db))
+
+    final = db.execute.await_args_list[-1].args[0].compile().params
+    assert final["status"] == "failed" and "worker died" in final["error"]
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_replaced(monkeypatch):
+    broken = MagicMock()
+    monkeypatch.setattr(reporting, "_executor", broken)
+
+    async def raise_broken(*args):
+        raise reporting.BrokenProcessPool("killed")
+
+    loop = MagicMock(run_in_executor=MagicMock(return_value=raise_broken()))
+    with patch.object(reporting.asyncio, "get_running_loop", return_value=loop):
+        with pytest.raises(reporting.BrokenProcessPool):
+            await reporting._run_in_pool("id", "gifts", {}, "/tmp/x", "csv")
+    assert reporting._executor is None
+
+
+@pytest.mark.asyncio
+async def test_request_report_rejects_unknown_type():
+    db = MagicMock()
+    db.commit = AsyncMock()
+    with pytest.raises(ValueError):
+        await reporting.request_report(db, SimpleNamespace(id=uuid.uuid4(), report_type="nope"), "csv")
+    db.add.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_cleanup_removes_expired_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(reporting.settings, "REPORT_DIR", str(tmp_path))
+    expired_id = uuid.uuid4()
+    (tmp_path / f"{expired_id}.xlsx").write_text("old")
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[
+        MagicMock(all=MagicMock(return_value=[(expired_id, "xlsx")])),
+        MagicMock(all=MagicMock(return_value=[])),
+    ])
+    db.commit = AsyncMock()
+
+    assert await reporting.cleanup_expired_reports(db) == {"expired": 1, "failed": 0}
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_report_closed_while_running_is_not_completed(tmp_path, monkeypatch):
+    monkeypatch.setattr(reporting.settings, "REPORT_DIR", str(tmp_path))
+    job = SimpleNamespace(id=uuid.uuid4(), report_id=uuid.uuid4(), report_type="gifts", format="csv", status="pending")
+    report = SimpleNamespace(configuration={}, last_run_at=None)
+    db = MagicMock()
+    db.get = AsyncMock(side_effect=lambda model, _id: job if model is reporting.ReportJob else report)
+    # the cleanup failed the job meanwhile: the conditional "completed" update matches no row
+    db.execute = AsyncMock(side_effect=lambda query: MagicMock(
+        rowcount=0 if query.compile().params.get("status") == "completed" else 1,
+    ))
+    db.commit = AsyncMock()
+
+    async def fake_pool(job_id, report_type, config, path, fmt):
+        open(path, "w").write("x")
+        return 1
+
+    with patch.object(reporting, "_run_in_pool", fake_pool):
+        await reporting.run_report_job(job.id, _factory(db))
+
+    assert list(tmp_path.iterdir()) == []
+    assert report.configuration["status"] == "failed" and report.configuration["download_url"] is None
+    completed = db.execute.await_args_list[-1].args[0]
+    assert "report_jobs.status = " in str(completed.compile())
+
+
+@pytest.mark.asyncio
+async def test_cleanup_judges_running_reports_by_heartbeat():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    db.commit = AsyncMock()
+
+    await reporting.cleanup_expired_reports(db)
+    stale_sql = str(db.execute.await_args_list[1].args[0].compile())
+    assert "coalesce(report_jobs.heartbeat_at, report_jobs.started_at)" in stale_sql
@@ -0,0 +1,76 @@
+"""Tests for near-duplicate and campaign spam detection."""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services.security import spam
+from backend.services.security.spam import SpamDetector, minhash, bands, MIN_BAND_MATCHES
+
+TEMPLATE = "Hey, check out my profile on superdate dot com, I have more pics there"
+
+
+def _band_matches(a: str, b: str) -> int:
+    return sum(x == y for x, y in zip(bands(minhash(a)), bands(minhash(b))))
+
+
+def test_one_character_variants_share_bands():
+    assert _band_matches(TEMPLATE, TEMPLATE.replace("pics", "pix")) >= MIN_BAND_MATCHES
+    assert _band_matches(TEMPLATE, "I love hiking and coffee, what about you?") == 0
+
+
+@pytest.fixture
+def no_redis():
+    with patch.object(spam.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_campaign_across_accounts_is_flagged_not_blocked(no_redis):
+    detector = SpamDetector()
+    results = [
+        await detector.check_message(f"user{i}", TEMPLATE.replace("pics", f"pic{i}"), conversation_id=f"m{i}")
+        for i in range(spam.CAMPAIGN_MIN_ACCOUNTS)
+    ]
+    assert [r["reason"] for r in results[:-1]] == [None] * (spam.CAMPAIGN_MIN_ACCOUNTS - 1)
+    assert results[-1]["reason"] == "spam_campaign"
+    assert results[-1]["is_spam"] is False       # flagged for fraud scoring, still delivered
+
+
+@pytest.mark.asyncio
+async def test_popular_message_in_few_conversations_is_not_a_campaign(no_redis):
+    detector = SpamDetector()
+    for i in range(spam.CAMPAIGN_MIN_ACCOUNTS + 5):
+        # many people saying the same long thing, but inside a couple of group-like chats
+        result = await detector.check_message(f"user{i}", TEMPLATE, conversation_id=f"m{i % 2}")
+    assert result["reason"] is None
+
+
+@pytest.mark.asyncio
+async def test_campaign_hits_expire_and_count_once_per_window():
+    r = MagicMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    r.pipeline = MagicMock(return_value=MagicMock(
+        __aenter__=AsyncMock(return_value=pipe), __aexit__=AsyncMock(return_value=False),
+    ))
+    with patch.object(spam.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        await SpamDetector()._report_campaign(["u1"])
+
+    key = spam.CAMPAIGN_HITS_KEY.format("u1")
+    assert pipe.zadd.call_args.args[0] == key and pipe.zadd.call_args.kwargs == {"nx": True}
+    pipe.expire.assert_called_once_with(key, spam.CAMPAIGN_HITS_TTL)
+    pipe.hincrby.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_own_near_duplicates_are_blocked(no_redis):
+    detector = SpamDetector()
+    results = [await detector.check_message("u1", "same text again and again" + "!" * i) for i in range(4)]
+    assert [r["reason"] for r in results] == [None, None, None, "duplicate_message"]
+
+
+@pytest.mark.asyncio
+async def test_short_greetings_are_not_a_campaign(no_redis):
+    detector = SpamDetector()
+    for i in range(10):
+        result = await detector.check_message(f"user{i}", "Привет! Как дела?")
+    assert result["is_spam"] is False
@@ -3,7 +3,8 @@ import pytest
 import uuid
 from datetime import datetime, timedelta
 from decimal import Decimal
-from unittest.mock import AsyncMock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from backend.services.social.spotlight import (
     get_spotlight_profiles,
@@ -12,6 +13,19 @@ from backend.services.social.spotlight import (
     SPOTLIGHT_COST_STARS,
     SPOTLIGHT_DURATION_HOURS
 )
+from backend.services.social.spotlight_pool import spotlight_pool, weighted_sample
+from backend.services.star_ledger import InsufficientStars
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    spotlight_pool.invalidate()
+    with patch(
+        "backend.services.social.spotlight_pool.redis_manager.get_redis",
+        new=AsyncMock(return_value=None),
+    ):
+        yield
+    spotlight_pool.invalidate()
 
 
 @pytest.fixture
@@ -69,7 +83,13 @@ async def test_join_spotlight_success(mock_db, user_id):
     mock_db.commit = AsyncMock()
     mock_db.refresh = AsyncMock()
     
-    result = await join_spotlight(mock_db, user_id, duration_hours=1)
+    with patch(
+        "backend.services.social.spotlight.star_ledger.debit",
+        new=AsyncMock(return_value=Decimal("100")),
+    ) as debit:
+        result = await join_spotlight(mock_db, user_id, duration_hours=1)
+    
+    debit.assert_awaited_once()
     
     assert result["success"] == True
     assert "entry" in result
@@ -89,7 +109,11 @@ async def test_join_spotlight_insufficient_stars(mock_db, user_id):
     mock_user.stars_balance = Decimal("10")  # Less than SPOTLIGHT_COST_STARS
     mock_db.get = AsyncMock(return_value=mock_user)
     
-    result = await join_spotlight(mock_db, user_id, duration_hours=1)
+    with patch(
+        "backend.services.social.spotlight.star_ledger.debit",
+        new=AsyncMock(side_effect=InsufficientStars(Decimal(SPOTLIGHT_COST_STARS), Decimal("10"))),
+    ):
+        result = await join_spotlight(mock_db, user_id, duration_hours=1)
     
     assert result["success"] == False
     assert "Недостаточно" in result["message"]
@@ -189,6 +213,51 @@ async def test_get_spotlight_stats_with_active(mock_db, user_id):
     assert result["current_entry"]["impressions"] == 50
 
 
+@pytest.mark.asyncio
+async def test_get_spotlight_profiles_batches_and_skips_swiped(mock_db, user_id):
+    """Pool + one eligibility query + batched cards + one impressions UPDATE."""
+    now = datetime.utcnow()
+    fresh_user, swiped_user = uuid.uuid4(), uuid.uuid4()
+    entries = [
+        SimpleNamespace(id=uuid.uuid4(), user_id=u, priority=10, source="boost",
+                        expires_at=now + timedelta(hours=1))
+        for u in (fresh_user, swiped_user, user_id)
+    ]
+
+    pool_mock = MagicMock()
+    pool_mock.all.return_value = entries
+    eligible_mock = MagicMock()
+    eligible_mock.all.return_value = [(fresh_user,)]
+    cards = {str(fresh_user): {
+        "id": str(fresh_user), "name": "Anna", "age": 25, "photo": "p.jpg", "photos": ["p.jpg"],
+        "city": None, "bio": None, "is_verified": True,
+    }}
+    mock_db.execute = AsyncMock(side_effect=[pool_mock, eligible_mock, MagicMock()])
+
+    with patch(
+        "backend.services.social.spotlight.get_profile_cards",
+        new=AsyncMock(return_value=cards),
+    ) as get_cards:
+        result = await get_spotlight_profiles(mock_db, user_id, limit=10)
+
+    assert [p["id"] for p in result["profiles"]] == [str(fresh_user)]
+    assert result["profiles"][0]["photo_url"] == "p.jpg"
+    assert set(get_cards.await_args.args[1]) == {str(fresh_user)}
+    eligible_sql = str(mock_db.execute.await_args_list[1].args[0])
+    assert "swipes" in eligible_sql and "users.is_active" in eligible_sql
+    assert mock_db.execute.await_count == 3
+    assert "UPDATE spotlight_entries" in str(mock_db.execute.await_args_list[-1].args[0])
+    mock_db.commit.assert_awaited_once()
+
+
+def test_weighted_sample_is_permutation_and_prefers_priority():
+    items = [{"entry_id": str(i), "priority": p} for i, p in enumerate([1, 50])]
+    firsts = [weighted_sample(items, k=1)[0]["entry_id"] for _ in range(500)]
+
+    assert sorted(i["entry_id"] for i in weighted_sample(items)) == ["0", "1"]
+    assert firsts.count("1") > 400
+
+
 def test_spotlight_cost_stars():
     """SPOTLIGHT_COST_STARS should be 100."""
     assert SPOTLIGHT_COST_STARS == 100
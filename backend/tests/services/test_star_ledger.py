@@ -0,0 +1,104 @@
+"""Tests for the star ledger and sharded gift counters."""
+import uuid
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from backend.services import star_ledger
+from backend.services.gifts import (
+    claim_gift_slot, _split_capacity, GiftUnavailable, GIFT_COUNTER_SHARDS, _initialized_gifts,
+)
+
+
+def _returning(value):
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = value
+    result.rowcount = 1
+    return result
+
+
+def _sql(call):
+    return str(call.args[0].compile(dialect=postgresql.dialect()))
+
+
+@pytest.fixture
+def mock_db():
+    db = AsyncMock()
+    db.sync_session = MagicMock()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_debit_is_conditional_update_plus_ledger_row(mock_db):
+    mock_db.execute = AsyncMock(side_effect=[_returning(Decimal("90")), MagicMock()])
+
+    balance = await star_ledger.debit(mock_db, uuid.uuid4(), 10, "swipes")
+
+    assert balance == Decimal("90")
+    update_sql, insert_sql = (_sql(c) for c in mock_db.execute.await_args_list)
+    assert "users.stars_balance >=" in update_sql and "RETURNING" in update_sql
+    assert "FOR UPDATE" not in update_sql
+    assert insert_sql.startswith("INSERT INTO star_ledger")
+
+
+@pytest.mark.asyncio
+async def test_debit_insufficient_writes_nothing(mock_db):
+    mock_db.execute = AsyncMock(return_value=_returning(None))
+    mock_db.scalar = AsyncMock(return_value=Decimal("3"))
+
+    with pytest.raises(star_ledger.InsufficientStars) as exc:
+        await star_ledger.debit(mock_db, uuid.uuid4(), 10, "swipes")
+
+    assert exc.value.available == Decimal("3")
+    mock_db.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_apply_touches_rows_in_id_order(mock_db):
+    low, high = sorted([uuid.uuid4(), uuid.uuid4()], key=str)
+    order = []
+    record = AsyncMock(side_effect=lambda db, uid, *a: order.append(uid) or Decimal(0))
+
+    with patch.object(star_ledger, "debit", record), patch.object(star_ledger, "credit", record):
+        await star_ledger.apply(mock_db, [(high, -10, "gift"), (low, 1, "gift_bonus")])
+
+    assert order == [low, high]
+
+
+def test_split_capacity_sums_to_max_quantity():
+    gift = SimpleNamespace(max_quantity=50)
+    sent = [7] + [0] * (GIFT_COUNTER_SHARDS - 1)
+
+    capacity = _split_capacity(gift, sent)
+
+    assert sum(capacity) == 50
+    assert capacity[0] >= 7
+    assert max(capacity[1:]) - min(capacity[1:]) <= 1
+    assert _split_capacity(SimpleNamespace(max_quantity=None), sent) == [None] * len(sent)
+
+
+@pytest.mark.asyncio
+async def test_claim_limited_gift_skips_locked_shards(mock_db):
+    gift = SimpleNamespace(id=uuid.uuid4(), max_quantity=100, times_sent=0)
+    _initialized_gifts.add(gift.id)
+    mock_db.execute = AsyncMock(return_value=_returning(3))
+
+    assert await claim_gift_slot(mock_db, gift) == 3
+    sql = _sql(mock_db.execute.await_args)
+    assert "SKIP LOCKED" in sql
+    assert "gift_send_counters.sent < gift_send_counters.capacity" in sql
+
+
+@pytest.mark.asyncio
+async def test_claim_limited_gift_sold_out(mock_db):
+    gift = SimpleNamespace(id=uuid.uuid4(), max_quantity=10, times_sent=10)
+    _initialized_gifts.add(gift.id)
+    mock_db.execute = AsyncMock(return_value=_returning(None))
+    mock_db.scalar = AsyncMock(return_value=0)
+
+    with pytest.raises(GiftUnavailable) as exc:
+        await claim_gift_slot(mock_db, gift)
+    assert exc.value.reason == "sold_out"
@@ -1,8 +1,9 @@
 """Tests for Stories service."""
 import pytest
 import uuid
+from types import SimpleNamespace
 from datetime import datetime, timedelta
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from backend.services.social.stories import (
     create_story,
@@ -261,3 +262,57 @@ def test_story_duration_hours():
 def test_max_stories_per_user():
     """MAX_STORIES_PER_USER should be 10."""
     assert MAX_STORIES_PER_USER == 10
+
+
+@pytest.mark.asyncio
+async def test_stories_feed_db_fallback_batches_authors(mock_db, user_id):
+    """Without Redis the feed hydrates authors in one query, no db.get per story."""
+    partner_id = uuid.uuid4()
+    now = datetime.utcnow()
+
+    def make_story(author):
+        s = MagicMock()
+        s.id = uuid.uuid4()
+        s.user_id = author
+        s.media_url = "https://example.com/s.jpg"
+        s.media_type = "image"
+        s.caption = None
+        s.view_count = 0
+        s.created_at = now
+        s.expires_at = now + timedelta(hours=12)
+        return s
+
+    stories = [make_story(partner_id), make_story(partner_id), make_story(user_id)]
+
+    matches_result = MagicMock()
+    matches_result.all.return_value = [(user_id, partner_id)]
+    stories_result = MagicMock()
+    stories_result.scalars.return_value.all.return_value = stories
+    viewed_result = MagicMock()
+    viewed_result.all.return_value = [(stories[0].id,)]
+    authors_result = MagicMock()
+    card_fields = dict(
+        age=25, gender="female", bio=None, height=None, smoking=None, drinking=None,
+        education=None, looking_for=None, children=None, is_verified=False, is_vip=False,
+        city=None, last_seen=None, created_at=now, interests=[],
+        is_active=True, subscription_tier="free", latitude=None, longitude=None,
+    )
+    authors_result.all.return_value = [
+        SimpleNamespace(id=partner_id, name="Partner", photos=["p.jpg"], **card_fields),
+        SimpleNamespace(id=user_id, name="Me", photos=None, **card_fields),
+    ]
+    mock_db.execute = AsyncMock(side_effect=[
+        matches_result, stories_result, viewed_result, authors_result
+    ])
+    mock_db.get = AsyncMock()
+
+    with patch("backend.services.social.story_tray.build_tray", AsyncMock(return_value=None)):
+        feed = await get_stories_feed(mock_db, user_id)
+
+    mock_db.get.assert_not_called()
+    assert mock_db.execute.await_count == 4
+    assert feed[0]["is_me"] is True
+    partner = feed[1]
+    assert partner["user_name"] == "Partner"
+    assert partner["has_unseen"] is True
+    assert [s["is_viewed"] for s in partner["stories"]].count(True) == 1
@@ -0,0 +1,171 @@
+"""Tests for the Redis story tray: ordering, seen bitsets, buffered view counts."""
+import uuid
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from backend.services.social import story_tray
+from backend.services.social.story_tray import (
+    build_tray, index_stories, record_view, flush_view_counts,
+    AUTHOR_KEY, DATA_KEY, VIEW_COUNT_KEY, VIEW_DIRTY_KEY, VIEW_LOG_KEY, EMPTY_MARKER,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _story(author, hours_ago, view_count=0):
+    created = datetime.utcnow() - timedelta(hours=hours_ago)
+    return SimpleNamespace(
+        id=uuid.uuid4(), user_id=author, media_url="https://example.com/s.jpg", media_type="image",
+        caption=None, view_count=view_count, created_at=created, expires_at=created + timedelta(hours=24),
+    )
+
+
+def _db(stories):
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = stories
+    db = AsyncMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+@pytest_asyncio.fixture
+async def r():
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    with patch.object(story_tray.redis_manager, "get_redis", AsyncMock(return_value=client)):
+        yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def world():
+    viewer, old, seen, fresh, silent = (uuid.uuid4() for _ in range(5))
+    stories = {
+        "me": _story(viewer, 5),
+        "old": _story(old, 6),
+        "seen": _story(seen, 3),
+        "fresh": _story(fresh, 1),
+    }
+    partners = {str(old), str(seen), str(fresh), str(silent)}
+    names = {str(uid): {"name": f"user-{uid}", "photo": None} for uid in (viewer, old, seen, fresh, silent)}
+    with patch("backend.services.chat.presence.get_partner_ids_batch",
+               AsyncMock(return_value={str(viewer): partners})), \
+            patch.object(story_tray, "hydrate_authors", AsyncMock(side_effect=lambda db, ids: {a: names[a] for a in ids})):
+        yield SimpleNamespace(viewer=viewer, silent=silent, stories=stories)
+
+
+@pytest.mark.asyncio
+async def test_tray_is_me_then_unseen_then_oldest_first_and_cached(r, world):
+    db = _db([s for key, s in world.stories.items() if key != "seen"])
+    cards = await index_stories(r, [world.stories["seen"]])
+    await record_view(r, str(world.viewer), cards[str(world.stories["seen"].id)])
+
+    feed = await build_tray(db, world.viewer)
+
+    # "seen" was indexed already, the other authors are loaded in one query
+    db.execute.assert_awaited_once()
+    assert [f["user_id"] for f in feed] == [
+        str(world.viewer),
+        str(world.stories["old"].user_id),
+        str(world.stories["fresh"].user_id),
+        str(world.stories["seen"].user_id),
+    ]
+    assert [f["has_unseen"] for f in feed] == [True, True, True, False]
+    # Author without stories is cached as empty, not queried again
+    assert await r.zrange(AUTHOR_KEY.format(str(world.silent)), 0, -1) == [EMPTY_MARKER]
+
+    again = await build_tray(db, world.viewer)
+    assert again == feed
+    db.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_record_view_sets_seen_bit_and_counts(r, world):
+    story = world.stories["fresh"]
+    card = (await index_stories(r, [story]))[str(story.id)]
+    other = (await index_stories(r, [world.stories["old"]]))[str(world.stories["old"].id)]
+
+    assert await record_view(r, str(world.viewer), card) == 1
+    assert await record_view(r, str(world.viewer), card) is None     # repeat view
+    assert await record_view(r, str(uuid.uuid4()), card) == 2
+
+    feed = await build_tray(_db([world.stories["me"]]), world.viewer)
+    by_author = {f["user_id"]: f["stories"][0] for f in feed}
+    assert by_author[str(story.user_id)]["is_viewed"] is True
+    assert by_author[str(story.user_id)]["view_count"] == 2
+    # Seq numbers differ per story, so the neighbour's bit stays clear
+    assert other["seq"] != card["seq"]
+    assert by_author[str(world.stories["old"].user_id)]["is_viewed"] is False
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_counts_and_clears_dirty_set(r, world):
+    story = world.stories["fresh"]
+    card = (await index_stories(r, [story]))[str(story.id)]
+    for _ in range(3):
+        await record_view(r, str(uuid.uuid4()), card)
+    db = AsyncMock()
+
+    assert await flush_view_counts(db) == 1
+
+    views, counts = (call.args[0].compile(dialect=postgresql.dialect()) for call in db.execute.await_args_list)
+    assert "INSERT INTO story_views" in str(views) and "NOT (EXISTS" in str(views)
+    assert sum(1 for v in views.params.values() if v == story.id) == 3
+    assert "greatest" in str(counts).lower()
+    assert list(counts.params.values()) == [story.id, 3]
+    db.commit.assert_awaited_once()
+    assert not await r.exists(VIEW_DIRTY_KEY) and not await r.exists(VIEW_LOG_KEY)
+    assert await r.hget(VIEW_COUNT_KEY, str(story.id)) == "3"
+    assert await flush_view_counts(db) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_returns_ids_to_dirty_set(r, world):
+    story = world.stories["fresh"]
+    card = (await index_stories(r, [story]))[str(story.id)]
+    await record_view(r, str(uuid.uuid4()), card)
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=RuntimeError("db down"))
+
+    assert await flush_view_counts(db) == 0
+    db.rollback.assert_awaited_once()
+    assert await r.smembers(VIEW_DIRTY_KEY) == {str(story.id)}
+    assert await r.llen(VIEW_LOG_KEY) == 1
+
+
+@pytest.mark.asyncio
+async def test_reindexed_story_keeps_its_seen_bit(r, world):
+    story = world.stories["fresh"]
+    card = (await index_stories(r, [story]))[str(story.id)]
+    await index_stories(r, [world.stories["old"]])
+    await record_view(r, str(world.viewer), card)
+
+    await r.delete(DATA_KEY.format(str(story.id)))
+    again = (await index_stories(r, [story]))[str(story.id)]
+
+    assert again["seq"] == card["seq"]
+    assert await record_view(r, str(world.viewer), again) is None
+
+
+@pytest.mark.asyncio
+async def test_view_story_with_cached_card_does_not_touch_db(r, world):
+    from backend.services.social import stories
+
+    story = world.stories["fresh"]
+    await index_stories(r, [story])
+    db = AsyncMock()
+
+    with patch.object(stories.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        first = await stories.view_story(db, story.id, world.viewer)
+        repeat = await stories.view_story(db, story.id, world.viewer)
+
+    assert first == {"success": True, "view_count": 1}
+    assert repeat["already_viewed"] is True and repeat["view_count"] == 1
+    db.get.assert_not_awaited()
+    db.execute.assert_not_awaited()
+    db.commit.assert_not_awaited()
+    assert await r.llen(VIEW_LOG_KEY) == 1
@@ -0,0 +1,147 @@
+"""Tests for the rate-limited Telegram sender against a fake Bot API server."""
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import telegram_sender as ts
+from backend.services.telegram_sender import TelegramRateLimiter, TelegramSender
+
+
+class FakeBotAPI:
+    """Records every call; `flood` makes the first N sendMessage calls return 429."""
+
+    def __init__(self, flood: int = 0, retry_after: int = 1):
+        self.calls = []
+        self.flood = flood
+        self.retry_after = retry_after
+
+    async def handle(self, request):
+        payload = await request.json()
+        self.calls.append((request.match_info["method"], payload, time.monotonic()))
+        if self.flood:
+            self.flood -= 1
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": "Too Many Requests",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        if str(payload.get("chat_id")) == "403":
+            return web.json_response({"ok": False, "error_code": 403, "description": "bot was blocked"}, status=403)
+        return web.json_response({"ok": True, "result": {"message_id": len(self.calls)}})
+
+
+@pytest_asyncio.fixture
+async def fake_api():
+    async def start(**kwargs):
+        api = FakeBotAPI(**kwargs)
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", api.handle)
+        server = TestServer(app)
+        await server.start_server()
+        servers.append(server)
+        return api, str(server.make_url("")).rstrip("/")
+
+    servers = []
+    with patch.object(ts.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        yield start
+    for server in servers:
+        await server.close()
+
+
+def _sender(url, rate=30, chat_interval=0.2):
+    return TelegramSender(TelegramRateLimiter(rate=rate, chat_interval=chat_interval), api_url=url, token="TEST")
+
+
+@pytest.mark.asyncio
+async def test_global_rate_is_respected(fake_api):
+    api, url = await fake_api()
+    sender = _sender(url, rate=20)
+    start = time.monotonic()
+    results = await asyncio.gather(*(sender.send_message(i, "hi") for i in range(40)))
+    elapsed = time.monotonic() - start
+    await sender.close()
+
+    assert all(results) and len(api.calls) == 40
+    assert elapsed >= 0.9        # 20 burst + 20 more at 20/s
+
+
+@pytest.mark.asyncio
+async def test_same_chat_is_spaced(fake_api):
+    api, url = await fake_api()
+    sender = _sender(url, chat_interval=0.2)
+    await asyncio.gather(*(sender.send_message(1, f"m{i}") for i in range(3)))
+    await sender.close()
+
+    times = [t for _, _, t in api.calls]
+    assert [p["text"] for _, p, _ in api.calls] == ["m0", "m1", "m2"]
+    assert all(b - a >= 0.18 for a, b in zip(times, times[1:]))
+
+
+@pytest.mark.asyncio
+async def test_429_is_retried_after_retry_after(fake_api):
+    api, url = await fake_api(flood=1, retry_after=1)
+    sender = _sender(url)
+    assert await sender.send_message(7, "hello") is True
+    await sender.close()
+
+    assert len(api.calls) == 2
+    assert api.calls[1][2] - api.calls[0][2] >= 0.95
+
+
+@pytest.mark.asyncio
+async def test_queued_notifications_are_coalesced(fake_api):
+    api, url = await fake_api()
+    sender = _sender(url, chat_interval=0.3)
+    button = {"inline_keyboard": [[{"text": "open", "url": "https://t.me"}]]}
+    results = await asyncio.gather(
+        sender.send_message(5, "first", reply_markup=button, coalesce=True),
+        sender.send_message(5, "second", reply_markup=button, coalesce=True),
+        sender.send_message(5, "third", reply_markup=button, coalesce=True),
+        sender.send_message(5, "other", coalesce=True),          # different keyboard: own message
+    )
+    await sender.close()
+
+    assert all(results)
+    texts = [p["text"] for _, p, _ in api.calls]
+    assert texts == ["first\n\nsecond\n\nthird", "other"]
+
+
+@pytest.mark.asyncio
+async def test_permanent_error_is_not_retried(fake_api):
+    api, url = await fake_api()
+    sender = _sender(url)
+    assert await sender.send_message(403, "hi") is False
+    await sender.close()
+    assert len(api.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_broadcast_queues_without_waiting(fake_api):
+    api, url = await fake_api()
+    sender = _sender(url)
+    assert await sender.broadcast(range(5), "news") == 5
+    assert sender.pending() + len(api.calls) == 5
+    while sender.pending() or sender._drains:
+        await asyncio.sleep(0.01)
+    await sender.close()
+    assert sorted(p["chat_id"] for _, p, _ in api.calls) == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_shared_window_blocks_when_other_workers_used_it():
+    limiter = TelegramRateLimiter(rate=2)
+    r = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=[[3, True], [1, True]])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    r.pipeline = lambda **kwargs: pipe
+
+    with patch.object(ts.redis_manager, "get_redis", AsyncMock(return_value=r)), \
+            patch.object(ts.asyncio, "sleep", AsyncMock()) as sleep:
+        await limiter.acquire()
+    assert pipe.execute.await_count == 2
+    sleep.assert_awaited_once()
@@ -0,0 +1,127 @@
+"""Tests for the Telegram webhook update queue."""
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import telegram_updates as tu
+from backend.services.telegram_updates import TelegramUpdateQueue, SEEN_KEY, STREAM_KEY, GROUP
+
+
+@pytest.mark.asyncio
+async def test_local_queue_skips_retried_update_ids():
+    handled = []
+    queue = TelegramUpdateQueue(handler=AsyncMock(side_effect=handled.append))
+
+    with patch.object(tu.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        assert await queue.enqueue({"update_id": 1}) is True
+        assert await queue.enqueue({"update_id": 1}) is False     # Telegram retry
+        assert await queue.enqueue({"update_id": 2}) is True
+        while await queue.process_local(timeout=0):
+            pass
+
+    assert [u["update_id"] for u in handled] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_handler_error_does_not_stop_the_queue():
+    handler = AsyncMock(side_effect=[RuntimeError("boom"), None])
+    queue = TelegramUpdateQueue(handler=handler)
+
+    with patch.object(tu.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        await queue.enqueue({"update_id": 1})
+        await queue.enqueue({"update_id": 2})
+        assert await queue.process_local(timeout=0) == 1
+        assert await queue.process_local(timeout=0) == 1
+    assert handler.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_redis_enqueue_is_idempotent_on_update_id():
+    r = MagicMock()
+    r.set = AsyncMock(side_effect=[True, None])
+    r.xadd = AsyncMock()
+    queue = TelegramUpdateQueue(handler=AsyncMock())
+
+    with patch.object(tu.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        assert await queue.enqueue({"update_id": 5}) is True
+        assert await queue.enqueue({"update_id": 5}) is False
+
+    r.set.assert_awaited_with(SEEN_KEY.format(5), "queued", nx=True, ex=tu.SEEN_TTL)
+    r.xadd.assert_awaited_once()
+    assert r.xadd.call_args.args[0] == STREAM_KEY
+
+
+@pytest.mark.asyncio
+async def test_worker_handles_marks_done_and_acks():
+    handler = AsyncMock()
+    queue = TelegramUpdateQueue(handler=handler)
+    entries = [("1-0", {"update": json.dumps({"update_id": 7})}), ("2-0", {"update": json.dumps({"update_id": 8})})]
+    r = MagicMock()
+    r.get = AsyncMock(side_effect=[None, "done"])        # update 8 was already handled before a crash
+    r.set = AsyncMock()
+    r.xack = AsyncMock()
+
+    assert await queue._process_entries(r, entries) == 2
+
+    handler.assert_awaited_once_with({"update_id": 7})
+    r.set.assert_awaited_once_with(SEEN_KEY.format(7), "done", ex=tu.SEEN_TTL)
+    r.xack.assert_awaited_once_with(STREAM_KEY, GROUP, "1-0", "2-0")
+
+
+@pytest.mark.asyncio
+async def test_reader_reclaims_only_entries_not_in_flight():
+    queue = TelegramUpdateQueue(handler=AsyncMock())
+    queue._in_flight.add("1-0")
+    r = MagicMock()
+    r.xgroup_create = AsyncMock()
+    r.xautoclaim = AsyncMock(return_value=["0-0", [("1-0", {}), ("2-0", {})], []])
+    r.xreadgroup = AsyncMock(return_value=[[STREAM_KEY, [("3-0", {})]]])
+
+    assert [e[0] for e in await queue.read_batch(r, "c")] == ["2-0", "3-0"]
+    assert [e[0] for e in await queue.read_batch(r, "c")] == ["3-0"]     # next claim after CLAIM_INTERVAL
+    r.xautoclaim.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_blocking_reads_use_the_dedicated_pool():
+    import asyncio
+    queue = TelegramUpdateQueue(handler=AsyncMock(), workers=2)
+    blocking, shared = MagicMock(), MagicMock()
+    blocking.xgroup_create = AsyncMock()
+    blocking.xautoclaim = AsyncMock(return_value=["0-0", [], []])
+    blocking.xreadgroup = AsyncMock(side_effect=[[[STREAM_KEY, [("1-0", {"update": json.dumps({"update_id": 1})})]]]] + [[]] * 1000)
+    shared.get = AsyncMock(return_value=None)
+    shared.set = AsyncMock()
+    shared.xack = AsyncMock()
+
+    with patch.object(tu.redis_manager, "get_blocking_redis", AsyncMock(return_value=blocking)), \
+         patch.object(tu.redis_manager, "get_redis", AsyncMock(return_value=shared)):
+        queue.start()
+        for _ in range(50):
+            await asyncio.sleep(0)
+            if shared.xack.await_count:
+                break
+        await queue.stop()
+
+    queue.handler.assert_awaited_once_with({"update_id": 1})
+    shared.xack.assert_awaited_once_with(STREAM_KEY, GROUP, "1-0")
+    shared.xreadgroup.assert_not_called()
+    assert queue._in_flight == set()
+
+
+@pytest.mark.asyncio
+async def test_webhook_acknowledges_without_processing():
+    from backend.api import bot_webhook
+
+    request = MagicMock()
+    request.headers = {"X-Telegram-Bot-Api-Secret-Token": bot_webhook.WEBHOOK_SECRET}
+    request.json = AsyncMock(return_value={"update_id": 10})
+    enqueue = AsyncMock(return_value=True)
+
+    with patch.object(bot_webhook, "BOT_TOKEN", "x"), \
+            patch.object(bot_webhook.update_queue, "enqueue", enqueue), \
+            patch.object(bot_webhook, "get_bot_and_dp") as get_bot:
+        assert await bot_webhook.telegram_webhook(request) == {"ok": True, "queued": True}
+
+    enqueue.assert_awaited_once_with({"update_id": 10})
+    get_bot.assert_not_called()
@@ -0,0 +1,86 @@
+"""Tests for the shared text safety engine."""
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.services import text_safety as ts
+from backend.services.text_safety import TextSafetyEngine, normalize
+from backend.services.moderation import ModerationService
+from backend.services.nsfw_detection import NSFWDetectionService
+
+
+def test_normalization_defeats_leet_homoglyphs_and_repeats():
+    # "к" and "о" below are Cyrillic
+    assert normalize("K1LLLL") == normalize("kill") == "kil"
+    assert normalize("кaзинo") == normalize("казино")
+
+
+def test_homoglyphs_fold_only_inside_mixed_script_words():
+    assert normalize("мат") == "мат"            # plain Russian stays Cyrillic
+    assert normalize("Matthew") == "mathew"
+    assert normalize("kill!") == "kil!"
+    assert normalize("2024") == "2024"
+
+
+@pytest.mark.parametrize("text", [
+    "Matthew", "Mateo", "My name is Mateo", "information about the format",
+    "Kilimanjaro trip", "lost 5 kilos", "математика", "scampi and shiitake",
+])
+def test_common_names_and_words_are_not_flagged(text):
+    engine = TextSafetyEngine()
+    assert engine.categories(text) == set()
+    assert ModerationService.check_text(text) is True
+    assert ModerationService.sanitize_text(text) == text
+
+
+def test_dictionary_words_match_whole_words_and_stems():
+    engine = TextSafetyEngine()
+    assert "toxicity" in engine.categories("I will kill it")
+    assert "toxicity" in engine.categories("what the fucking hell")   # "fuck*" stem
+    assert "spam" in engine.categories("Купи криптовалюту сейчас")
+    assert "banned" in engine.categories("без мата, это мат")
+    assert ModerationService.sanitize_text("this is a scam!") == "this is a ****!"
+
+
+def test_one_scan_returns_categorized_hits():
+    engine = TextSafetyEngine()
+    categories = engine.categories("k1lll yourself, быстрые деньги! xxx")
+    assert {"toxicity", "harassment", "spam"} <= categories
+
+
+def test_short_words_match_only_whole():
+    engine = TextSafetyEngine()
+    assert "toxicity" in engine.categories("XXXX")
+    assert engine.categories("a x b") == set()
+
+
+def test_mask_maps_back_to_original_text():
+    assert ModerationService.sanitize_text("This is a ScAm, baadword") == "This is a ****, ********"
+    assert ModerationService.check_text("just hello") is True
+
+
+@pytest.mark.asyncio
+async def test_analyze_text_keeps_priorities():
+    service = NSFWDetectionService()
+    with patch.object(ts.redis_manager, "get_redis", AsyncMock(return_value=None)):
+        assert await service.analyze_text("go die") == (True, "harassment")
+        assert await service.analyze_text("heyyyyyyy") == (True, "spam")
+        assert await service.analyze_text("hi there") == (False, "safe")
+
+
+@pytest.mark.asyncio
+async def test_reload_picks_up_admin_dictionary():
+    engine = TextSafetyEngine()
+    r = MagicMock()
+    r.get = AsyncMock(return_value="2")
+    r.hgetall = AsyncMock(return_value={"spam": json.dumps(["промокод"])})
+
+    with patch.object(ts.redis_manager, "get_redis", AsyncMock(return_value=r)):
+        await engine.maybe_reload()
+        assert "spam" in engine.categories("Лови промокод")
+        assert "spam" not in engine.categories("казино")   # the category is replaced as a whole
+
+        r.get = AsyncMock(return_value="3")
+        await engine.maybe_reload()          # within RELOAD_INTERVAL: no Redis call
+        r.get.assert_not_awaited()
+    assert engine.version == "2"
@@ -0,0 +1,118 @@
+"""Tests for WebSocket wire protocols and per-connection send queues."""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from backend.services.chat.protocol import negotiate, JSON, COMPACT, MSGPACK
+from backend.services.chat.channel import ClientChannel, SLOW_CONSUMER_CLOSE_CODE
+from backend.services.chat import ConnectionManager
+
+
+VERBOSE_MESSAGE = {
+    "type": "text",
+    "id": "msg-1",
+    "message_id": "msg-1",
+    "match_id": "m1",
+    "sender_id": "u1",
+    "receiver_id": "u2",
+    "content": "hello",
+    "text": "hello",
+    "created_at": "2024-01-01T00:00:00",
+    "timestamp": "2024-01-01T00:00:00",
+}
+
+
+def test_negotiate_defaults_to_json():
+    assert negotiate(None) is JSON
+    assert negotiate("bogus") is JSON
+    assert negotiate("compact") is COMPACT
+
+
+def test_compact_drops_aliases_and_shortens_keys():
+    encoded = COMPACT.encode(VERBOSE_MESSAGE)
+    payload = json.loads(encoded)
+
+    assert payload == {
+        "t": "text", "i": "msg-1", "m": "m1", "s": "u1", "r": "u2",
+        "c": "hello", "ts": "2024-01-01T00:00:00",
+    }
+    assert len(encoded) < len(JSON.encode(VERBOSE_MESSAGE)) / 2
+
+
+def test_compact_decode_expands_client_frames():
+    decoded = COMPACT.decode('{"t":"message","m":"m1","c":"hi"}')
+    assert decoded == {"type": "message", "match_id": "m1", "content": "hi", "text": "hi"}
+
+
+@pytest.mark.asyncio
+async def test_compact_reaction_resolves_its_message():
+    from backend.api.chat import websocket as ws_api
+
+    frame = COMPACT.decode(COMPACT.encode({"type": "reaction", "message_id": "msg-1", "emoji": "❤️", "action": "add"}))
+    assert frame["message_id"] == "msg-1"
+
+    with patch.object(ws_api, "add_reaction", AsyncMock(return_value=None)) as add:
+        await ws_api._handle_reaction("u1", frame)
+    add.assert_awaited_once_with("msg-1", "u1", "❤️")
+
+
+@pytest.mark.skipif(MSGPACK is None, reason="msgpack not installed")
+def test_msgpack_roundtrip():
+    frame = MSGPACK.encode(VERBOSE_MESSAGE)
+    assert isinstance(frame, bytes)
+    decoded = MSGPACK.decode(frame)
+    assert decoded["content"] == "hello"
+    assert decoded["type"] == "text"
+
+
+@pytest.mark.asyncio
+async def test_channel_writer_encodes_with_codec():
+    ws = AsyncMock()
+    channel = ClientChannel(ws, COMPACT)
+    channel.start()
+    channel.send({"type": "pong"})
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    ws.send_text.assert_awaited_once_with('{"t":"pong"}')
+    channel.close()
+
+
+@pytest.mark.asyncio
+async def test_channel_drops_droppable_then_closes_slow_consumer():
+    ws = AsyncMock()
+    channel = ClientChannel(ws, JSON, maxsize=1)  # writer not started: queue stays full
+    assert channel.send({"type": "text", "content": "a"}) is True
+
+    assert channel.send({"type": "typing"}) is False
+    assert channel.dropped == 1
+    assert channel.closed is False
+
+    assert channel.send({"type": "text", "content": "b"}) is False
+    assert channel.closed is True
+    await asyncio.sleep(0)
+    ws.close.assert_awaited_once()
+    assert ws.close.await_args.kwargs["code"] == SLOW_CONSUMER_CLOSE_CODE
+
+
+@pytest.mark.asyncio
+async def test_send_personal_does_not_wait_for_slow_socket():
+    """One stalled socket must not block delivery to the user's other sockets."""
+    manager = ConnectionManager()
+    stalled = AsyncMock()
+    async def stall(_):
+        await asyncio.sleep(3600)
+
+    stalled.send_text = AsyncMock(side_effect=stall)
+    fast = AsyncMock()
+    await manager.connect(stalled, "u1")
+    await manager.connect(fast, "u1")
+
+    await asyncio.wait_for(manager.send_personal("u1", {"type": "text"}), timeout=1)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    fast.send_text.assert_awaited_once()
+
+    manager.disconnect(stalled, "u1")
+    manager.disconnect(fast, "u1")
@@ -38,14 +38,12 @@ export default function SettingsPage() {
         setExporting(true);
         haptic.medium();
         try {
-            const data = await authService.exportData();
-            const blob = new Blob([JSON.stringify(data, null, 2)], { type: 'application/json' });
-            const url = URL.createObjectURL(blob);
+            const url = await authService.exportData();
             const a = document.createElement('a');
             a.href = url;
-            a.download = 'mambax-data-export.json';
+            a.download = 'mambax-data-export.ndjson.gz';
             a.click();
-            URL.revokeObjectURL(url);
+            if (url.startsWith('blob:')) URL.revokeObjectURL(url);
         } catch (e) {
             console.error('Export failed:', e);
         } finally {
@@ -3,6 +3,8 @@ import { getApiUrl } from "@/utils/env";
 type RequestConfig = RequestInit & {
     skipAuth?: boolean;
     silent?: boolean;
+    // 'blob' for file downloads (body returned as-is instead of parsed JSON)
+    responseType?: 'json' | 'blob';
 };
 
 class HttpClient {
@@ -86,7 +88,7 @@ class HttpClient {
     }
 
     public async request<T>(endpoint: string, config: RequestConfig = {}): Promise<T> {
-        const { skipAuth, silent, headers, ...customConfig } = config;
+        const { skipAuth, silent, responseType, headers, ...customConfig } = config;
         const url = `${this.baseUrl}${endpoint}`;
 
         console.log(`[HTTP] ${customConfig.method || 'GET'} ${endpoint} (skipAuth=${!!skipAuth}, hasToken=${!!this.token})`);
@@ -126,6 +128,7 @@ class HttpClient {
                     
                     if (retryResponse.ok) {
                         if (retryResponse.status === 204) return {} as T;
+                        if (responseType === 'blob') return await retryResponse.blob() as T;
                         return await retryResponse.json();
                     }
                     
@@ -155,6 +158,10 @@ class HttpClient {
                 return {} as T;
             }
 
+            if (responseType === 'blob') {
+                return await response.blob() as T;
+            }
+
             return await response.json();
         } catch (error: unknown) {
             this.handleError(error, silent);
@@ -3,7 +3,10 @@
  */
 
 import { httpClient } from "@/lib/http-client";
-import type { AuthResponse, PhotoUploadResponse, UserProfile } from "./types";
+import type { AuthResponse, DataExportDownload, DataExportJob, PhotoUploadResponse, UserProfile } from "./types";
+
+const EXPORT_POLL_MS = 2000;
+const EXPORT_TIMEOUT_MS = 10 * 60 * 1000;
 
 export const authApi = {
     async login(phone: string, otp: string) {
@@ -92,8 +95,41 @@ export const authApi = {
         return httpClient.delete("/api/users/me");
     },
 
-    async exportData() {
-        return httpClient.get("/api/users/me/export");
+    async requestDataExport(): Promise<DataExportJob> {
+        try {
+            return await httpClient.post<DataExportJob>("/api/users/me/export");
+        } catch (e) {
+            // 429: an export was requested recently — continue with that job
+            const err = e as Error & { status?: number; data?: { detail?: { job_id?: string } } };
+            const jobId = err.status === 429 ? err.data?.detail?.job_id : undefined;
+            if (!jobId) throw e;
+            return authApi.getDataExport(jobId);
+        }
+    },
+
+    async getDataExport(jobId: string) {
+        return httpClient.get<DataExportJob>(`/api/users/me/export/${jobId}`);
+    },
+
+    async downloadDataExport(jobId: string) {
+        return httpClient.get<DataExportDownload>(`/api/users/me/export/${jobId}/download`);
+    },
+
+    /** Request an export, wait for the background job and return a link to the archive (gzip NDJSON). */
+    async exportData(): Promise<string> {
+        let job = await authApi.requestDataExport();
+        const deadline = Date.now() + EXPORT_TIMEOUT_MS;
+        while (job.status === "pending" || job.status === "running") {
+            if (Date.now() > deadline) throw new Error("Export is taking too long, try again later");
+            await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_MS));
+            job = await authApi.getDataExport(job.job_id);
+        }
+        if (job.status !== "completed") throw new Error(job.error || `Export ${job.status}`);
+        const { url } = await authApi.downloadDataExport(job.job_id);
+        if (/^https?:\/\//.test(url)) return url;
+        // No object storage (dev): the file endpoint needs the auth header
+        const blob = await httpClient.get<Blob>(url, { responseType: 'blob' });
+        return URL.createObjectURL(blob);
     },
 
     async addStarsDev(amount: number) {
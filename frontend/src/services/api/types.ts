@@ -14,6 +14,25 @@ export interface PhotoUploadResponse {
     photos: string[];
 }
 
+export interface DataExportJob {
+    job_id: string;
+    status: 'pending' | 'running' | 'completed' | 'failed' | 'expired';
+    progress: number;
+    current_section: string | null;
+    rows_written: number;
+    size_bytes: number | null;
+    error: string | null;
+    created_at: string;
+    completed_at: string | null;
+    expires_at: string | null;
+    download_url: string | null;
+}
+
+export interface DataExportDownload {
+    url: string;                 // signed storage URL, or an API path when storage cannot sign (dev)
+    expires_in: number | null;
+}
+
 export interface MatchUser {
     id: string;
     name: string;